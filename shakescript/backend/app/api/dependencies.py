@@ -1,12 +1,18 @@
 import logging
+import time
 import requests
-from fastapi import Depends, Header, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Request, status
 from supabase import create_client, Client
 from app.core.config import settings
+from app.core.metrics import instrument_client, registry, route_template, stage
+from app.services.ai_service.schedulerAI import llm_scheduler
 from app.services.core_service import StoryService
+from app.services.db_service import DBService
 
 # Base Supabase client
-supabase_client: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+supabase_client: Client = instrument_client(
+    create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+)
 
 
 def get_user_client(authorization: str = Header(...)) -> tuple[Client, dict]:
@@ -30,7 +36,8 @@ def get_user_client(authorization: str = Header(...)) -> tuple[Client, dict]:
             "Content-Type": "application/json",
         }
 
-        response = requests.get(verify_url, headers=headers)
+        with stage("auth"):
+            response = requests.get(verify_url, headers=headers)
         logging.info(f"Auth API response status: {response.status_code}")
 
         if response.status_code != 200:
@@ -50,7 +57,7 @@ def get_user_client(authorization: str = Header(...)) -> tuple[Client, dict]:
 
         user_client.postgrest.auth(token)
 
-        return user_client, user_data
+        return instrument_client(user_client), user_data
 
     except HTTPException:
         raise
@@ -73,7 +80,32 @@ def get_story_service(auth_data: tuple = Depends(get_user_client)) -> StoryServi
     Provides a StoryService with an authenticated Supabase client.
     """
     client, user_data = auth_data
-    return StoryService(client)
+    return StoryService(client, auth_id=user_data.get("id"))
+
+
+def get_priority_story_service(
+    request: Request, auth_data: tuple = Depends(get_user_client)
+):
+    """
+    StoryService for the expensive LLM endpoints (generate-batch,
+    refine-batch, summary). Resolves the user's tier so their LLM calls use
+    that priority lane, sheds the request when the lane is saturated, and
+    records request latency per tier.
+    """
+    client, user_data = auth_data
+    auth_id = user_data.get("id")
+    tier = DBService(client).get_user_tier(auth_id)
+    llm_scheduler().admit(tier)
+    started = time.perf_counter()
+    try:
+        yield StoryService(client, auth_id=auth_id, tier=tier)
+    finally:
+        registry.observe(
+            "shakescript_tier_request_duration_seconds",
+            time.perf_counter() - started,
+            tier=tier,
+            route=route_template(request.scope),
+        )
 
 
 def get_current_user(auth_data: tuple = Depends(get_user_client)) -> dict:
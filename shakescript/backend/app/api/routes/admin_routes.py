@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from app.core.config import settings
+from app.core.profiling import is_admin_token, profile_store
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    """
+    Profiling endpoints are admin-only and disappear when profiling is off.
+    """
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@router.get(
+    "/profiles",
+    summary="List recent request profiles",
+    dependencies=[Depends(require_admin)],
+)
+def list_profiles():
+    return {"profiles": profile_store.list()}
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    summary="cProfile and tracemalloc report of a profiled request",
+    dependencies=[Depends(require_admin)],
+)
+def get_profile(profile_id: str):
+    record = profile_store.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found or evicted")
+    return {"id": record.id, **record.meta, **record.report}
+
+
+@router.get(
+    "/profiles/{profile_id}/download",
+    summary="Download the raw .prof file (pstats / snakeviz compatible)",
+    dependencies=[Depends(require_admin)],
+)
+def download_profile(profile_id: str):
+    record = profile_store.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found or evicted")
+    return Response(
+        content=record.prof_bytes,
+        media_type="application/octet-stream",
+        headers={
+            "Content-Disposition": f'attachment; filename="profile-{record.id}.prof"'
+        },
+    )
@@ -1,20 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from app.core.profiling import ProfilingRoute
 from app.api.dependencies import get_current_user, get_user_client
 from app.services.db_service import DBService
+from app.utils.http_cache import cached_user_response
 from ...models.user_schema import UserDashboard, UserResponse, UserStats
 from datetime import datetime, timezone  # Make sure timezone is imported
 
-router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+router = APIRouter(prefix="/dashboard", tags=["dashboard"], route_class=ProfilingRoute)
 
 
 @router.get("/", response_model=UserDashboard, summary="Get all user dashboard data")
 def get_user_dashboard(
+    request: Request,
+    response: Response,
     user: dict = Depends(get_current_user),
     auth_data: tuple = Depends(get_user_client),
 ):
     """
     Retrieves all necessary data for the user dashboard, including the user profile,
     detailed statistics, and a list of recent stories.
+    Responses are cached per user and support If-None-Match revalidation.
     """
     client, user_data = auth_data
     auth_id = user.get("auth_id")
@@ -23,27 +28,30 @@ def get_user_dashboard(
             status_code=403, detail="Could not identify user from token."
         )
 
-    # Initialize the DB service with the authenticated client
-    db_service = DBService(client)
+    def load_dashboard() -> UserDashboard:
+        # Initialize the DB service with the authenticated client
+        db_service = DBService(client)
 
-    profile_data = db_service.get_user_profile(auth_id)
-    if "error" in profile_data:
-        raise HTTPException(status_code=404, detail=profile_data["error"])
+        profile_data = db_service.get_user_profile(auth_id)
+        if "error" in profile_data:
+            raise HTTPException(status_code=404, detail=profile_data["error"])
 
-    created_at_str = profile_data.get("created_at")
-    naive_created_at = datetime.fromisoformat(created_at_str)
-    created_at = naive_created_at.replace(tzinfo=timezone.utc)
+        created_at_str = profile_data.get("created_at")
+        naive_created_at = datetime.fromisoformat(created_at_str)
+        created_at = naive_created_at.replace(tzinfo=timezone.utc)
 
-    stats_data = db_service.get_user_stats(auth_id, created_at)
+        stats_data = db_service.get_user_stats(auth_id, created_at)
 
-    recent_stories_data = db_service.get_recent_stories(auth_id)
+        recent_stories_data = db_service.get_recent_stories(auth_id)
 
-    user_response = UserResponse(**profile_data)
-    user_stats = UserStats(**stats_data)
+        user_response = UserResponse(**profile_data)
+        user_stats = UserStats(**stats_data)
 
-    return UserDashboard(
-        user=user_response,
-        stats=user_stats,
-        recent_stories=recent_stories_data,
-        premium_status=user_response.is_premium,
-    )
+        return UserDashboard(
+            user=user_response,
+            stats=user_stats,
+            recent_stories=recent_stories_data,
+            premium_status=user_response.is_premium,
+        )
+
+    return cached_user_response(request, response, auth_id, "dashboard", load_dashboard)
@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Body, Request, Response
 from starlette.status import HTTP_404_NOT_FOUND
 from ...models.schemas import (
     Feedback,
     ErrorResponse,
     EpisodeBatchResponse,
 )
-from app.api.dependencies import get_story_service, get_current_user
+from app.core.idempotency import idempotent
+from app.core.profiling import ProfilingRoute
+from app.utils.http_cache import expected_story_version
+from app.api.dependencies import (
+    get_story_service,
+    get_priority_story_service,
+    get_current_user,
+)
 from app.services.core_service import StoryService
-from typing import Union, List
+from typing import Union, List, Optional
 from fastapi import BackgroundTasks
 
-router = APIRouter(prefix="/episodes", tags=["episodes"])
+router = APIRouter(prefix="/episodes", tags=["episodes"], route_class=ProfilingRoute)
 
 # Generate batch endpoint
 @router.post(
@@ -20,35 +27,45 @@ router = APIRouter(prefix="/episodes", tags=["episodes"])
 )
 async def generate_batch(
     story_id: int,
+    request: Request,
+    response: Response,
     batch_size: int = Query(1, ge=1),
     hinglish: bool = Query(False),
     refinement_type: str = Query("HUMAN", enum=["AI", "HUMAN"]),
-    service: StoryService = Depends(get_story_service),
+    idempotency_key: Optional[str] = Header(None),
+    if_match: Optional[str] = Header(None),
+    service: StoryService = Depends(get_priority_story_service),
     user: dict = Depends(get_current_user),
 ):
     auth_id = user.get("auth_id")
-    story_data = service.get_story_info(story_id, auth_id)
-    if "error" in story_data:
-        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=story_data["error"])
+    expected_version = expected_story_version(if_match, story_id)
+
+    def run():
+        with service.story_lease(story_id, auth_id, expected_version):
+            story_data = service.get_story_info(story_id, auth_id)
+            if "error" in story_data:
+                raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=story_data["error"])
 
-    current_episode = story_data.get("current_episode", 1)
-    if current_episode > story_data.get("num_episodes", 0):
-        return {"error": "All episodes generated", "episodes": []}
+            current_episode = story_data.get("current_episode", 1)
+            if current_episode > story_data.get("num_episodes", 0):
+                return {"error": "All episodes generated", "episodes": []}
 
-    episodes = service.generate_and_refine_batch(
-        story_id, batch_size, hinglish, refinement_type, auth_id
-    )
+            episodes = service.generate_and_refine_batch(
+                story_id, batch_size, hinglish, refinement_type, auth_id
+            )
 
-    if refinement_type == "AI":
-        message = "All episodes generated, refined, and stored successfully"
-    else:
-        message = "Batch generated, awaiting human refinement"
+        if refinement_type == "AI":
+            message = "All episodes generated, refined, and stored successfully"
+        else:
+            message = "Batch generated, awaiting human refinement"
 
-    return {
-        "status": "success",
-        "episodes": episodes,
-        "message": message,
-    }
+        return {
+            "status": "success",
+            "episodes": episodes,
+            "message": message,
+        }
+
+    return await idempotent(request, response, auth_id, idempotency_key, run)
 
 # Validate batch endpoint
 @router.post(
@@ -58,12 +75,22 @@ async def generate_batch(
 )
 async def validate_batch(
     story_id: int,
+    request: Request,
+    response: Response,
     background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None),
+    if_match: Optional[str] = Header(None),
     service: StoryService = Depends(get_story_service),
     user: dict = Depends(get_current_user),
 ):
     auth_id = user.get("auth_id")
-    return service.validate_episode_batch(story_id, auth_id, background_tasks)
+    expected_version = expected_story_version(if_match, story_id)
+
+    def run():
+        with service.story_lease(story_id, auth_id, expected_version):
+            return service.validate_episode_batch(story_id, auth_id, background_tasks)
+
+    return await idempotent(request, response, auth_id, idempotency_key, run)
 
 #refine_batch endpoint
 @router.post(
@@ -73,9 +100,19 @@ async def validate_batch(
 )
 async def refine_batch(
     story_id: int,
+    request: Request,
+    response: Response,
     feedback: List[Feedback] = Body(...),
-    service: StoryService = Depends(get_story_service),
+    idempotency_key: Optional[str] = Header(None),
+    if_match: Optional[str] = Header(None),
+    service: StoryService = Depends(get_priority_story_service),
     user: dict = Depends(get_current_user),
 ):
     auth_id = user.get("auth_id")
-    return service.refine_episode_batch(story_id, feedback, auth_id)
+    expected_version = expected_story_version(if_match, story_id)
+
+    def run():
+        with service.story_lease(story_id, auth_id, expected_version):
+            return service.refine_episode_batch(story_id, feedback, auth_id)
+
+    return await idempotent(request, response, auth_id, idempotency_key, run)
@@ -1,16 +1,109 @@
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from starlette.status import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
 from ...models.schemas import (
     StoryListResponse,
     StoryResponse,
     ErrorResponse,
+    EpisodePage,
 )
 from app.services.core_service import StoryService
-from app.api.dependencies import get_story_service, get_current_user
-from typing import Annotated, Union, Dict, Any, List
+from app.core.idempotency import idempotent
+from app.core.profiling import ProfilingRoute
+from app.api.dependencies import (
+    get_story_service,
+    get_priority_story_service,
+    get_current_user,
+)
+from typing import Annotated, Union, Dict, Any, List, Literal, Optional
+from app.core.config import settings
 from app.utils import parse_user_prompt
+from app.utils.fast_json import fast_json_response
+from app.utils.http_cache import (
+    cached_user_response,
+    matched_etag,
+    not_modified,
+    story_etag,
+)
+
+router = APIRouter(prefix="/stories", tags=["stories"], route_class=ProfilingRoute)
+
+# Upper bounds keep response sizes independent of story length.
+MAX_EPISODE_PAGE_SIZE = 50
+MAX_STORY_PAGE_SIZE = 200
+
+
+def _check_story_version(
+    request: Request, service: StoryService, story_id: int, auth_id: str
+):
+    """
+    Header-only version lookup. Returns (etag, 304 response or None); the etag
+    is None when the story does not exist or has no version (before
+    migrations/001), and such a story is served without one.
+    """
+    version = service.get_story_version(story_id, auth_id)
+    if version is None:
+        return None, None
+    etag = story_etag(story_id, version)
+    matched = matched_etag(request.headers.get("if-none-match"), etag)
+    if matched is not None:
+        return etag, not_modified(matched)
+    return etag, None
+
+
+def _story_payload(
+    story_info: Dict[str, Any], batch_size: int, refinement_method: str
+) -> Dict[str, Any]:
+    return {
+        "story_id": story_info.get("id"),
+        "title": story_info.get("title"),
+        "setting": story_info.get("setting"),
+        "characters": story_info.get("characters", {}),
+        "special_instructions": story_info.get("special_instructions"),
+        "story_outline": story_info.get("story_outline"),
+        "current_episode": story_info.get("current_episode"),
+        "episodes": story_info.get("episodes", []),
+        "summary": story_info.get("summary"),
+        "protagonist": story_info.get("protagonist"),
+        "timeline": story_info.get("timeline"),
+        "batch_size": batch_size,
+        "refinement_method": refinement_method,
+        "total_episodes": story_info.get("num_episodes"),
+        "next_episode_cursor": story_info.get("next_episode_cursor"),
+    }
+
+
+def _story_response(
+    story_info: Dict[str, Any], batch_size: int, refinement_method: str
+) -> StoryResponse:
+    return StoryResponse(**_story_payload(story_info, batch_size, refinement_method))
+
+
+def _respond(request: Request, response: Response, payload: Dict[str, Any]):
+    """
+    Return the payload through the fast serialiser when enabled; otherwise let
+    FastAPI validate and encode it as usual.
+    """
+    if not settings.FAST_JSON_RESPONSES:
+        return payload
+    headers = {
+        key: value
+        for key, value in response.headers.items()
+        if key not in ("content-length", "content-type")
+    }
+    return fast_json_response(request, payload, headers=headers)
 
-router = APIRouter(prefix="/stories", tags=["stories"])
 
 @router.get(
     "/all",
@@ -18,11 +111,19 @@ router = APIRouter(prefix="/stories", tags=["stories"])
     summary="Retrieve all stories",
 )
 def get_all_stories(
+    request: Request,
+    response: Response,
+    cursor: Optional[int] = Query(
+        None, ge=0, description="Return stories with an id greater than this cursor"
+    ),
+    limit: int = Query(50, ge=1, le=MAX_STORY_PAGE_SIZE),
     service: StoryService = Depends(get_story_service),
     user: dict = Depends(get_current_user),
 ):
     """
-    Retrieve a list of all stories with a structured response for the authenticated user.
+    Retrieve a page of stories with a structured response for the authenticated user.
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page.
+    Responses are cached per user and support If-None-Match revalidation.
     """
     auth_id = user.get("auth_id")
     if not auth_id:
@@ -30,12 +131,25 @@ def get_all_stories(
             status_code=403, detail="Could not identify user from token."
         )
 
-    stories_from_db = service.get_all_stories(auth_id)
+    def load_stories():
+        stories_from_db = service.get_all_stories(auth_id, cursor, limit + 1)
+        next_cursor = None
+        if len(stories_from_db) > limit:
+            stories_from_db = stories_from_db[:limit]
+            next_cursor = stories_from_db[-1].story_id
+        return (
+            {
+                "status": "success",
+                "stories": stories_from_db,
+                "next_cursor": next_cursor,
+                "message": "Stories found",
+            }
+            if stories_from_db
+            else {"status": "success", "stories": [], "message": "No stories found"}
+        )
 
-    return (
-        {"status": "success", "stories": stories_from_db, "message": "Stories found"}
-        if stories_from_db
-        else {"status": "success", "stories": [], "message": "No stories found"}
+    return cached_user_response(
+        request, response, auth_id, f"stories:{cursor}:{limit}", load_stories
     )
 
 @router.post(
@@ -44,6 +158,8 @@ def get_all_stories(
     summary="Create a new story",
 )
 async def create_story(
+    request: Request,
+    response: Response,
     service: Annotated[StoryService, Depends(get_story_service)],
     prompt: str = Body(..., description="Detailed story idea or prompt"),
     num_episodes: int = Body(..., description="Total number of episodes", ge=1),
@@ -54,6 +170,7 @@ async def create_story(
         "AI", description="Refinement method: 'AI' or 'Human'", regex="^(AI|HUMAN)$"
     ),
     hinglish: bool = Body(False, description="Generate in Hinglish if true"),
+    idempotency_key: Optional[str] = Header(None),
     user: dict = Depends(get_current_user),
 ):
     prompt = parse_user_prompt(prompt)
@@ -63,38 +180,28 @@ async def create_story(
             status_code=403, detail="Could not identify user from token."
         )
 
-    result = await service.create_story(
-        prompt, num_episodes, refinement, hinglish, auth_id
-    )
-    if "error" in result:
-        raise HTTPException(HTTP_400_BAD_REQUEST, detail=result["error"])
+    async def run():
+        result = await service.create_story(
+            prompt, num_episodes, refinement, hinglish, auth_id
+        )
+        if "error" in result:
+            raise HTTPException(HTTP_400_BAD_REQUEST, detail=result["error"])
 
-    story_info = service.get_story_info(result["story_id"], auth_id)
-    if "error" in story_info:
-        raise HTTPException(HTTP_404_NOT_FOUND, detail=story_info["error"])
+        story_info = await run_in_threadpool(
+            service.get_story_page, result["story_id"], auth_id
+        )
+        if "error" in story_info:
+            raise HTTPException(HTTP_404_NOT_FOUND, detail=story_info["error"])
 
-    story_for_response = StoryResponse(
-        story_id=story_info.get("id"),
-        title=story_info.get("title"),
-        setting=story_info.get("setting"),
-        characters=story_info.get("characters", {}),
-        special_instructions=story_info.get("special_instructions"),
-        story_outline=story_info.get("story_outline"),
-        current_episode=story_info.get("current_episode"),
-        episodes=story_info.get("episodes", []),
-        summary=story_info.get("summary"),
-        protagonist=story_info.get("protagonist"),
-        timeline=story_info.get("timeline"),
-        batch_size=batch_size,
-        refinement_method=refinement,
-        total_episodes=story_info.get("num_episodes"),
-    )
+        story_for_response = _story_response(story_info, batch_size, refinement)
 
-    return {
-        "status": "success",
-        "story": story_for_response,
-        "message": "Story created successfully",
-    }
+        return {
+            "status": "success",
+            "story": story_for_response,
+            "message": "Story created successfully",
+        }
+
+    return await idempotent(request, response, auth_id, idempotency_key, run)
 
 
 @router.get(
@@ -104,42 +211,171 @@ async def create_story(
 )
 def get_story(
     story_id: int,
+    request: Request,
+    response: Response,
+    episode_cursor: int = Query(
+        0, ge=0, description="Return episodes numbered after this cursor"
+    ),
+    episode_limit: int = Query(10, ge=1, le=MAX_EPISODE_PAGE_SIZE),
+    include_content: bool = Query(
+        True, description="Set to false to return episode metadata only"
+    ),
     service: StoryService = Depends(get_story_service),
     user: dict = Depends(get_current_user),
 ):
+    """
+    Retrieve a story with one page of its episodes.
+    Pass the returned `next_episode_cursor` back as `episode_cursor` for the next page.
+    Sends the story version as a strong ETag; If-None-Match is answered with 304
+    from a header-only query.
+    """
     auth_id = user.get("auth_id")
     if not auth_id:
         raise HTTPException(
             status_code=403, detail="Could not identify user from token."
         )
 
-    story_info = service.get_story_info(story_id, auth_id)
+    if request.headers.get("if-none-match"):
+        _, cached = _check_story_version(request, service, story_id, auth_id)
+        if cached is not None:
+            return cached
+
+    story_info = service.get_story_page(
+        story_id, auth_id, episode_cursor, episode_limit, include_content
+    )
     if "error" in story_info:
         raise HTTPException(HTTP_404_NOT_FOUND, detail=story_info["error"])
+    if story_info.get("version") is not None:
+        response.headers["ETag"] = story_etag(story_id, story_info["version"])
+
+    batch_size = story_info.get("batch_size", 1)
+    refinement_method = story_info.get("refinement_method", "AI")
+    if settings.FAST_JSON_RESPONSES:
+        story_for_response = _story_payload(story_info, batch_size, refinement_method)
+    else:
+        story_for_response = _story_response(story_info, batch_size, refinement_method)
 
-    story_for_response = StoryResponse(
-        story_id=story_info.get("id"),
-        title=story_info.get("title"),
-        setting=story_info.get("setting"),
-        characters=story_info.get("characters", {}),
-        special_instructions=story_info.get("special_instructions"),
-        story_outline=story_info.get("story_outline"),
-        current_episode=story_info.get("current_episode"),
-        episodes=story_info.get("episodes", []),
-        summary=story_info.get("summary"),
-        protagonist=story_info.get("protagonist"),
-        timeline=story_info.get("timeline"),
-        batch_size=story_info.get("batch_size", 1),
-        refinement_method=story_info.get("refinement_method", "AI"),
-        total_episodes=story_info.get("num_episodes"),
+    return _respond(
+        request,
+        response,
+        {
+            "status": "success",
+            "story": story_for_response,
+            "message": "Story retrieved successfully",
+        },
     )
-    print(story_info.get("episodes"))
 
-    return {
-        "status": "success",
-        "story": story_for_response,
-        "message": "Story retrieved successfully",
-    }
+
+@router.get(
+    "/{story_id}/episodes",
+    response_model=EpisodePage,
+    summary="Retrieve a page of a story's episodes",
+)
+def get_story_episodes(
+    story_id: int,
+    request: Request,
+    response: Response,
+    cursor: int = Query(0, ge=0, description="Return episodes numbered after this cursor"),
+    limit: int = Query(20, ge=1, le=MAX_EPISODE_PAGE_SIZE),
+    include_content: bool = Query(False),
+    service: StoryService = Depends(get_story_service),
+    user: dict = Depends(get_current_user),
+):
+    auth_id = user.get("auth_id")
+    if not auth_id:
+        raise HTTPException(
+            status_code=403, detail="Could not identify user from token."
+        )
+
+    etag, cached = _check_story_version(request, service, story_id, auth_id)
+    if cached is not None:
+        return cached
+    if etag is None and not service.story_exists(story_id, auth_id):
+        raise HTTPException(
+            HTTP_404_NOT_FOUND, detail="Story not found or you do not have access."
+        )
+    if etag is not None:
+        response.headers["ETag"] = etag
+    return _respond(
+        request,
+        response,
+        service.get_episodes_page(story_id, auth_id, cursor, limit, include_content),
+    )
+
+
+@router.get(
+    "/{story_id}/episodes/{episode_number}",
+    response_model=Dict[str, Any],
+    summary="Retrieve a single episode with its content",
+)
+def get_story_episode(
+    story_id: int,
+    episode_number: int,
+    request: Request,
+    response: Response,
+    service: StoryService = Depends(get_story_service),
+    user: dict = Depends(get_current_user),
+):
+    auth_id = user.get("auth_id")
+    if not auth_id:
+        raise HTTPException(
+            status_code=403, detail="Could not identify user from token."
+        )
+
+    etag, cached = _check_story_version(request, service, story_id, auth_id)
+    if cached is not None:
+        return cached
+
+    episode = service.get_episode(story_id, episode_number, auth_id)
+    if episode is None:
+        raise HTTPException(
+            HTTP_404_NOT_FOUND,
+            detail=f"Episode {episode_number} not found for story {story_id}",
+        )
+    if etag is not None:
+        response.headers["ETag"] = etag
+    return _respond(request, response, {"status": "success", "episode": episode})
+
+
+@router.get(
+    "/{story_id}/export",
+    response_class=StreamingResponse,
+    summary="Export a whole story as txt, md, jsonl or epub",
+)
+def export_story(
+    story_id: int,
+    request: Request,
+    export_format: Literal["txt", "md", "jsonl", "epub"] = Query("txt", alias="format"),
+    service: StoryService = Depends(get_story_service),
+    user: dict = Depends(get_current_user),
+):
+    """
+    Stream every episode of a story in order. Episodes are read from the DB a
+    page at a time while the response is written, so memory use does not grow
+    with the story. Carries the story ETag; If-None-Match is answered with 304.
+    """
+    auth_id = user.get("auth_id")
+    if not auth_id:
+        raise HTTPException(
+            status_code=403, detail="Could not identify user from token."
+        )
+
+    export = service.export_story(story_id, auth_id, export_format)
+    if "error" in export:
+        raise HTTPException(HTTP_404_NOT_FOUND, detail=export["error"])
+
+    headers = {"Content-Disposition": f'attachment; filename="{export["filename"]}"'}
+    version = export["story"].get("version")
+    if version is not None:
+        etag = story_etag(story_id, version)
+        # Exports are never content-coded, so only the plain tag matches.
+        if matched_etag(request.headers.get("if-none-match"), etag) == etag:
+            export["body"].close()
+            return not_modified(etag)
+        headers["ETag"] = etag
+    return StreamingResponse(
+        export["body"], media_type=export["media_type"], headers=headers
+    )
 
 
 @router.post(
@@ -149,7 +385,7 @@ def get_story(
 )
 def update_story_summary(
     story_id: int,
-    service: Annotated[StoryService, Depends(get_story_service)],
+    service: Annotated[StoryService, Depends(get_priority_story_service)],
     user: dict = Depends(get_current_user),
 ):
     auth_id = user.get("auth_id")
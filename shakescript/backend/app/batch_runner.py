@@ -0,0 +1,264 @@
+"""
+Headless batch generation for catalogue stories.
+
+Drives StoryService directly (no HTTP) over a JSONL manifest, one
+BatchStoryRequest per line, with a bounded pool of worker threads. Every
+story's progress is appended to a checkpoint file, so re-running the same
+command after an interruption skips finished stories and continues the
+others from their stored current_episode instead of creating them again.
+HUMAN-refinement stories are validated as generated (no one reviews them).
+
+LLM calls still go through the governor in schedulerAI, which is shared with
+the API workers on the same host, so a large run queues behind the configured
+concurrency instead of starving interactive users.
+
+    python -m app.batch_runner manifest.jsonl --auth-id <user uuid>
+        [--workers 4] [--checkpoint manifest.jsonl.checkpoint] [--tier free]
+
+Manifest line:
+    {"key": "harbour-1", "prompt": "...", "num_episodes": 6, "batch_size": 2,
+     "refinement": "AI", "hinglish": false, "auth_id": null}
+
+A batch that leaves a story's current_episode where it was fails that story
+rather than being retried forever. Prints a JSON report with episodes/min and
+tokens/min on exit.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+from fastapi import HTTPException
+from supabase import create_client
+from app.core.config import settings
+from app.core.metrics import TokenMeter, instrument_client
+from app.models.schemas import BatchStoryRequest
+from app.services.ai_service import AIService, default_model
+from app.services.core_service import StoryService
+from app.services.embedding_service import EmbeddingService
+from app.utils import parse_user_prompt
+
+logger = logging.getLogger(__name__)
+
+
+def load_manifest(path: str) -> List[BatchStoryRequest]:
+    entries, seen = [], set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = BatchStoryRequest(**json.loads(line))
+            if entry.key in seen:
+                raise ValueError(f"Duplicate manifest key {entry.key!r} on line {line_number}")
+            seen.add(entry.key)
+            entries.append(entry)
+    return entries
+
+
+class Checkpoint:
+    """
+    Append-only JSONL log of story progress, keyed by manifest key. The last
+    record per key wins; each append is fsynced so a crash loses at most the
+    batch in flight.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.state: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn final line from a killed run.
+                        continue
+                    self.state[record["key"]] = record
+
+    def get(self, key: str) -> Dict[str, Any]:
+        return self.state.get(key, {})
+
+    def record(self, key: str, **fields):
+        with self._lock:
+            record = {**self.state.get(key, {}), **fields, "key": key, "at": time.time()}
+            self.state[key] = record
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        client,
+        checkpoint: Checkpoint,
+        auth_id: Optional[str] = None,
+        tier: Optional[str] = None,
+        workers: int = 4,
+        model=None,
+        embedding_model=None,
+    ):
+        self.client = client
+        self.checkpoint = checkpoint
+        self.auth_id = auth_id
+        self.tier = tier
+        self.workers = workers
+        self.model = model
+        self.embedding_model = embedding_model
+        # Set to stop after the batches in flight (Ctrl-C, or tests).
+        self.stop = threading.Event()
+        self._lock = threading.Lock()
+        self.episodes = 0
+        self.tokens = 0
+
+    def service_for(self, auth_id: str, meter: TokenMeter) -> StoryService:
+        embedding_service = EmbeddingService(
+            self.client, embedding_model=self.embedding_model
+        )
+        ai_service = AIService(
+            self.client,
+            model=meter,
+            embedding_service=embedding_service,
+            auth_id=auth_id,
+            tier=self.tier,
+        )
+        return StoryService(
+            self.client, ai_service=ai_service, embedding_service=embedding_service
+        )
+
+    def _create(self, service: StoryService, entry: BatchStoryRequest, auth_id: str) -> int:
+        result = asyncio.run(
+            service.create_story(
+                parse_user_prompt(entry.prompt),
+                entry.num_episodes,
+                entry.refinement,
+                entry.hinglish,
+                auth_id,
+            )
+        )
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        self.checkpoint.record(entry.key, status="created", story_id=result["story_id"])
+        return result["story_id"]
+
+    def run_story(self, entry: BatchStoryRequest) -> str:
+        if self.checkpoint.get(entry.key).get("status") == "done":
+            return "skipped"
+        if self.stop.is_set():
+            return "interrupted"
+        auth_id = entry.auth_id or self.auth_id
+        meter = TokenMeter(self.model or default_model())
+        service = self.service_for(auth_id, meter)
+        try:
+            story_id = self.checkpoint.get(entry.key).get("story_id")
+            story = service.get_story_info(story_id, auth_id) if story_id else {"error": "new"}
+            if "error" in story:
+                story_id = self._create(service, entry, auth_id)
+                story = service.get_story_info(story_id, auth_id)
+
+            while story["current_episode"] <= story["num_episodes"]:
+                if self.stop.is_set():
+                    return "interrupted"
+                before = story["current_episode"]
+                if not story.get("current_episodes_content"):
+                    service.generate_and_refine_batch(
+                        story_id, entry.batch_size, entry.hinglish, entry.refinement, auth_id
+                    )
+                if entry.refinement == "HUMAN":
+                    service.validate_episode_batch(story_id, auth_id, None)
+                story = service.get_story_info(story_id, auth_id)
+                if "error" in story:
+                    raise RuntimeError(story["error"])
+                if story["current_episode"] == before:
+                    raise RuntimeError(f"No progress past episode {before}")
+                self.checkpoint.record(
+                    entry.key,
+                    status="running",
+                    current_episode=story["current_episode"],
+                    tokens=self.checkpoint.get(entry.key).get("tokens", 0) + meter.tokens,
+                )
+                self._add(story["current_episode"] - before, meter)
+
+            self.checkpoint.record(entry.key, status="done")
+            return "done"
+        except HTTPException as e:
+            self._add(0, meter)
+            self.checkpoint.record(entry.key, status="failed", error=str(e.detail))
+        except Exception as e:
+            logger.exception("Batch story %s failed", entry.key)
+            self._add(0, meter)
+            self.checkpoint.record(entry.key, status="failed", error=str(e))
+        return "failed"
+
+    def _add(self, episodes: int, meter: TokenMeter):
+        with self._lock:
+            self.episodes += episodes
+            self.tokens += meter.tokens
+        meter.tokens = 0
+
+    def run(self, entries: Iterable[BatchStoryRequest]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self.run_story, entry) for entry in entries]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                logger.warning("Interrupted; finishing batches in flight")
+                self.stop.set()
+                pool.shutdown(wait=True, cancel_futures=True)
+        outcomes: Dict[str, int] = {}
+        for future in futures:
+            outcome = "interrupted" if future.cancelled() else future.result()
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        minutes = (time.perf_counter() - started) / 60
+        return {
+            "stories": outcomes,
+            "episodes": self.episodes,
+            "tokens": self.tokens,
+            "elapsed_s": round(minutes * 60, 3),
+            "episodes_per_min": round(self.episodes / minutes, 2) if minutes else 0.0,
+            "tokens_per_min": round(self.tokens / minutes, 1) if minutes else 0.0,
+            "checkpoint": self.checkpoint.path,
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("manifest")
+    parser.add_argument("--auth-id", help="Owner of stories whose manifest line has no auth_id")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--checkpoint", help="Defaults to <manifest>.checkpoint")
+    parser.add_argument("--tier", default=settings.LLM_DEFAULT_TIER)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    entries = load_manifest(args.manifest)
+    missing = [e.key for e in entries if not (e.auth_id or args.auth_id)]
+    if missing:
+        parser.error(f"--auth-id is required for manifest entries without auth_id: {missing[:5]}")
+
+    client = instrument_client(create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY))
+
+    runner = BatchRunner(
+        client,
+        Checkpoint(args.checkpoint or f"{args.manifest}.checkpoint"),
+        auth_id=args.auth_id,
+        tier=args.tier,
+        workers=args.workers,
+    )
+    report = runner.run(entries)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["stories"].get("failed") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+# A *_PATH setting that keeps a store in process memory instead of SQLite.
+MEMORY_PATH = ":memory:"
+
+
+class MemoryCacheBackend:
+    """In-process TTL + LRU store keyed by (namespace, name)"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._names: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, name: str) -> Optional[Any]:
+        key = (namespace, name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, namespace: str, name: str, value: Any) -> None:
+        key = (namespace, name)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            self._names.setdefault(namespace, set()).add(name)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+
+    def invalidate(self, namespace: str) -> None:
+        with self._lock:
+            for name in self._names.pop(namespace, set()):
+                self._entries.pop((namespace, name), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._names.clear()
+
+    def _discard(self, key: Tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+        names = self._names.get(key[0])
+        if names is not None:
+            names.discard(key[1])
+            if not names:
+                del self._names[key[0]]
+
+
+def sqlite_connection(local: threading.local, path: str) -> sqlite3.Connection:
+    """
+    This thread's connection to `path`, opened per process: a connection
+    inherited across fork() (gunicorn --preload imports the app in the
+    master) must not be used, so the child opens its own.
+    """
+    conn = getattr(local, "conn", None)
+    if conn is None or local.pid != os.getpid():
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        local.conn, local.pid = conn, os.getpid()
+    return conn
+
+
+def create_sqlite_schema(path: str, *statements: str) -> None:
+    """Run DDL on a short-lived connection, so none is kept at import time."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    try:
+        for statement in statements:
+            conn.execute(statement)
+    finally:
+        conn.close()
+
+
+class SqliteCacheBackend:
+    """
+    On-disk store shared by every worker on the same host.
+    Values must be JSON serialisable.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        create_sqlite_schema(
+            path,
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, touched_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, name))",
+            "CREATE INDEX IF NOT EXISTS cache_touched ON cache (touched_at)",
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        return sqlite_connection(self._local, self.path)
+
+    def get(self, namespace: str, name: str) -> Optional[Any]:
+        now = time.time()
+        row = (
+            self._conn()
+            .execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND name = ?",
+                (namespace, name),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        if row[1] < now:
+            self._conn().execute(
+                "DELETE FROM cache WHERE namespace = ? AND name = ?", (namespace, name)
+            )
+            return None
+        return json.loads(row[0])
+
+    def set(self, namespace: str, name: str, value: Any) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+            (namespace, name, json.dumps(value), now + self.ttl_seconds, now),
+        )
+        conn.execute(
+            "DELETE FROM cache WHERE rowid IN ("
+            " SELECT rowid FROM cache ORDER BY touched_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def invalidate(self, namespace: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM cache")
+
+
+class ReadCache:
+    """
+    Read-through cache for per-user read models (dashboard, story list).
+    Entries are namespaced by auth_id so a single write can drop everything
+    derived from that user's data.
+    """
+
+    def __init__(self, backend=None, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled and backend is not None
+
+    def get(self, auth_id: str, name: str) -> Optional[Any]:
+        if not self.enabled or not auth_id:
+            return None
+        try:
+            return self.backend.get(auth_id, name)
+        except Exception as e:
+            logging.warning(f"Read cache lookup failed: {e}")
+            return None
+
+    def set(self, auth_id: str, name: str, value: Any) -> None:
+        if not self.enabled or not auth_id:
+            return
+        try:
+            self.backend.set(auth_id, name, value)
+        except Exception as e:
+            logging.warning(f"Read cache store failed: {e}")
+
+    def get_or_load(self, auth_id: str, name: str, loader) -> Any:
+        cached = self.get(auth_id, name)
+        if cached is not None:
+            return cached
+        value = loader()
+        self.set(auth_id, name, value)
+        return value
+
+    def invalidate(self, auth_id: str) -> None:
+        if not self.enabled or not auth_id:
+            return
+        try:
+            self.backend.invalidate(auth_id)
+        except Exception as e:
+            logging.warning(f"Read cache invalidation failed for {auth_id}: {e}")
+
+    def clear(self) -> None:
+        if self.enabled:
+            self.backend.clear()
+
+
+class RetrievalCache:
+    """
+    Retrieved chunks keyed by (story, query hash, k). Each story has a
+    generation stored next to the entries; invalidate() replaces it, which
+    orphans every entry of the story in O(1) (they age out by TTL/LRU).
+    Generations are timestamps rather than a counter, so one that was
+    evicted is never reissued and cannot resurrect older entries. The
+    generation is read before loading, so a result computed while the chunks
+    were being rewritten is stored under the old generation.
+
+    A story's pinned (foundational) chunks are kept apart under their own
+    generation, since they only change when a foundational episode is
+    rechunked.
+    """
+
+    GENERATIONS = "retrieval-generation"
+    PINNED_GENERATIONS = "retrieval-pinned-generation"
+
+    def __init__(self, backend=None, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled and backend is not None
+
+    def _generation(self, story_id: int, generations: str = GENERATIONS) -> int:
+        generation = self.backend.get(generations, str(story_id))
+        if generation is None:
+            generation = time.time_ns()
+            self.backend.set(generations, str(story_id), generation)
+        return generation
+
+    def _get_or_load(self, namespace: str, name: str, loader, keep=lambda value: True) -> Any:
+        try:
+            cached = self.backend.get(namespace, name)
+        except Exception as e:
+            logging.warning(f"Retrieval cache lookup failed: {e}")
+            return loader()
+        if cached is not None:
+            registry.inc("shakescript_retrieval_cache_total", outcome="hit")
+            return cached
+        registry.inc("shakescript_retrieval_cache_total", outcome="miss")
+        value = loader()
+        if keep(value):
+            try:
+                self.backend.set(namespace, name, value)
+            except Exception as e:
+                logging.warning(f"Retrieval cache store failed: {e}")
+        return value
+
+    def get_or_load(self, story_id: int, auth_id: str, query: str, k: int, loader) -> Any:
+        if not self.enabled:
+            return loader()
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        try:
+            generation = self._generation(story_id)
+        except Exception as e:
+            logging.warning(f"Retrieval cache lookup failed: {e}")
+            return loader()
+        return self._get_or_load(
+            f"retrieval:{story_id}", f"{generation}:{auth_id}:{digest}:{k}", loader
+        )
+
+    def pinned(self, story_id: int, auth_id: str, limit: int, loader) -> Any:
+        """
+        A story's pinned chunks. Only a full list (`limit` chunks) is kept:
+        until then the foundational episodes may still be being chunked.
+        """
+        if not self.enabled:
+            return loader()
+        try:
+            generation = self._generation(story_id, self.PINNED_GENERATIONS)
+        except Exception as e:
+            logging.warning(f"Retrieval cache lookup failed: {e}")
+            return loader()
+        return self._get_or_load(
+            f"retrieval-pinned:{story_id}",
+            f"{generation}:{auth_id}",
+            loader,
+            keep=lambda chunks: len(chunks) >= limit,
+        )
+
+    def query_embedding(self, query: str, kind: str, loader):
+        """
+        The float32 embedding of a query text, kept packed as `kind` (float32
+        or int8; empty means not cached). Independent of any story's chunks.
+        """
+        from app.utils import vectors
+
+        if not self.enabled or not kind:
+            return vectors.as_float32(loader())
+        name = f"{kind}:{hashlib.sha1(query.encode('utf-8')).hexdigest()}"
+        packed = self._get_or_load(
+            "query-embedding", name, lambda: vectors.pack(loader(), kind)
+        )
+        return vectors.unpack(packed)
+
+    def invalidate(self, story_id: int, pinned: bool = False) -> None:
+        """Drop the story's retrievals, and its pinned chunks too if `pinned`"""
+        if not self.enabled:
+            return
+        generations = [self.GENERATIONS] + ([self.PINNED_GENERATIONS] if pinned else [])
+        try:
+            for namespace in generations:
+                generation = max(time.time_ns(), self._generation(story_id, namespace) + 1)
+                self.backend.set(namespace, str(story_id), generation)
+        except Exception as e:
+            logging.warning(f"Retrieval cache invalidation failed for story {story_id}: {e}")
+
+    def clear(self) -> None:
+        if self.enabled:
+            self.backend.clear()
+
+
+def _build_read_cache() -> ReadCache:
+    """
+    SQLite in READ_CACHE_PATH (default a temp-dir file), so a write on one
+    worker drops the entry the others would serve; ":memory:" keeps entries
+    per process, where another worker's writes go unseen until the TTL.
+    """
+    if not settings.READ_CACHE_ENABLED:
+        return ReadCache(enabled=False)
+    if settings.READ_CACHE_PATH == MEMORY_PATH:
+        backend = MemoryCacheBackend(
+            settings.READ_CACHE_TTL_SECONDS, settings.READ_CACHE_MAX_ENTRIES
+        )
+    else:
+        backend = SqliteCacheBackend(
+            settings.READ_CACHE_PATH
+            or os.path.join(tempfile.gettempdir(), "shakescript-read-cache.sqlite3"),
+            settings.READ_CACHE_TTL_SECONDS,
+            settings.READ_CACHE_MAX_ENTRIES,
+        )
+    return ReadCache(backend)
+
+
+read_cache = _build_read_cache()
+
+
+def _build_retrieval_cache() -> RetrievalCache:
+    if not settings.RETRIEVAL_CACHE_ENABLED:
+        return RetrievalCache(enabled=False)
+    if settings.RETRIEVAL_CACHE_PATH:
+        backend = SqliteCacheBackend(
+            settings.RETRIEVAL_CACHE_PATH,
+            settings.RETRIEVAL_CACHE_TTL_SECONDS,
+            settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+        )
+    else:
+        backend = MemoryCacheBackend(
+            min(settings.RETRIEVAL_CACHE_TTL_SECONDS, settings.RETRIEVAL_CACHE_MEMORY_TTL_SECONDS),
+            settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+        )
+    return RetrievalCache(backend)
+
+
+retrieval_cache = _build_retrieval_cache()
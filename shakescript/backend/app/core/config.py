@@ -15,6 +15,197 @@ class Settings(BaseSettings):
     CHUNK_SIZE: int = 500
     OVERLAP: int = 100
 
+    # Embeddings in insert payloads and RPC parameters (app/utils/vectors.py):
+    # json (list of floats), float32 or int8 (compact pgvector text literals).
+    EMBEDDING_WIRE_FORMAT: str = "float32"
+
+    # Per-user read cache (dashboard, story list, tier). Entries live in a
+    # SQLite file shared by the host's gunicorn workers (READ_CACHE_PATH,
+    # default a temp-dir file), so a write on any worker drops them; ":memory:"
+    # keeps them per process, stale on the others for up to the TTL.
+    READ_CACHE_ENABLED: bool = True
+    READ_CACHE_TTL_SECONDS: float = 30.0
+    READ_CACHE_MAX_ENTRIES: int = 2048
+    READ_CACHE_PATH: str = ""
+
+    # Retrieved chunks per (story, query, k), dropped when the story's chunks
+    # are rewritten. RETRIEVAL_CACHE_PATH shares entries (and invalidations)
+    # with the other gunicorn workers and an embedding worker on the host.
+    # Without it each process keeps its own entries and misses the others'
+    # invalidations, so they live only RETRIEVAL_CACHE_MEMORY_TTL_SECONDS.
+    RETRIEVAL_CACHE_ENABLED: bool = True
+    RETRIEVAL_CACHE_TTL_SECONDS: float = 600.0
+    RETRIEVAL_CACHE_MEMORY_TTL_SECONDS: float = 30.0
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 4096
+    RETRIEVAL_CACHE_PATH: str = ""
+    # Query embeddings are kept in the same cache, packed as float32 or int8
+    # (a quarter of the size, slightly lossy); empty disables them.
+    QUERY_EMBEDDING_CACHE_FORMAT: str = "float32"
+
+    # Chunks of the opening and midpoint episodes are merged into every
+    # retrieval (cached per story). FOUNDATIONAL_CHUNKS_ENABLED flags them at
+    # ingestion and fetches them by story alone; it needs the is_foundational
+    # column from migrations/005. Off, they are found through the story's
+    # num_episodes.
+    FOUNDATIONAL_CHUNKS_ENABLED: bool = False
+
+    # Hybrid retrieval: a per-story BM25 index over chunk text (app/services/
+    # bm25_index.py) fused with the vector matches by reciprocal rank. A query
+    # made mostly (HYBRID_LEXICAL_ENTITY_SHARE) of character or place names
+    # is answered from the index alone, without an embedding call. Those names
+    # weigh HYBRID_ENTITY_BOOST times more than other BM25 terms.
+    HYBRID_RETRIEVAL_ENABLED: bool = False
+    HYBRID_CANDIDATES: int = 20
+    HYBRID_RRF_K: int = 60
+    HYBRID_ENTITY_BOOST: float = 3.0
+    HYBRID_LEXICAL_ENTITY_SHARE: float = 0.6
+    BM25_MAX_STORIES: int = 256
+
+    # Idempotency-Key on the expensive POSTs (create story, generate, refine,
+    # validate). Results are replayed for IDEMPOTENCY_TTL_SECONDS; a duplicate
+    # of a running request polls for up to IDEMPOTENCY_WAIT_SECONDS, and a
+    # claim whose request died is freed after IDEMPOTENCY_LOCK_SECONDS. Keys
+    # live in a SQLite file shared by the host's gunicorn workers
+    # (IDEMPOTENCY_PATH, default a temp-dir file); ":memory:" keeps them per
+    # process, which only holds up with a single worker.
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_TTL_SECONDS: float = 86400.0
+    IDEMPOTENCY_LOCK_SECONDS: float = 600.0
+    IDEMPOTENCY_WAIT_SECONDS: float = 120.0
+    IDEMPOTENCY_POLL_SECONDS: float = 0.05
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000
+    IDEMPOTENCY_PATH: str = ""
+
+    # Story/episode reads: serialise with orjson/msgspec when installed and
+    # compress (br/gzip) bodies above the threshold.
+    FAST_JSON_RESPONSES: bool = True
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    RESPONSE_GZIP_LEVEL: int = 5
+    RESPONSE_BROTLI_QUALITY: int = 4
+    # Episodes fetched per query by GET /stories/{id}/export, which streams the
+    # story and holds at most one page in memory.
+    EXPORT_PAGE_SIZE: int = 50
+
+    # Per-request DB/LLM/embedding counters (Server-Timing header) and
+    # Prometheus histograms at /metrics. Disabled means no wrappers at all.
+    METRICS_ENABLED: bool = True
+    METRICS_SERVER_TIMING: bool = True
+    # Bytes of DB rows sent and received (db bytes= in Server-Timing) cost a
+    # second serialisation of every payload; turn on to investigate sizes.
+    METRICS_DB_BYTES: bool = False
+
+    # Span tracing across routes/services/DB. TRACING_EXPORTERS is a comma
+    # separated list of memory, jsonl, otlp (OTLP/HTTP JSON to the endpoint).
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTERS: str = "jsonl"
+    TRACING_JSONL_PATH: str = "traces.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318"
+    TRACING_SERVICE_NAME: str = "shakescript-backend"
+
+    # Admin-only per-request cProfile + tracemalloc (X-Profile-Token header).
+    # Off by default; profiles are kept in a ring buffer.
+    PROFILING_ENABLED: bool = False
+    PROFILING_ADMIN_TOKEN: str = ""
+    PROFILING_MAX_PROFILES: int = 20
+    PROFILING_MAX_BYTES: int = 50 * 1024 * 1024
+    PROFILING_TRACEMALLOC_FRAMES: int = 10
+    PROFILING_TOP_N: int = 50
+
+    # Gemini/OpenAI/llama_index are imported on first use. WARMUP_ON_STARTUP
+    # imports them when the app starts instead; under gunicorn --preload the
+    # master warms once before forking (gunicorn.conf.py).
+    WARMUP_ON_STARTUP: bool = False
+
+    # LLM router: providers in failover order (gemini, openai). With hedging on,
+    # a backup request is sent once the current one is slower than the
+    # provider's LLM_HEDGE_PERCENTILE latency (LLM_HEDGE_DEFAULT_DELAY_MS until
+    # LLM_HEDGE_MIN_SAMPLES calls have been seen); the first response wins.
+    LLM_PROVIDERS: str = "gemini"
+    LLM_OPENAI_MODEL: str = "gpt-4o-mini"
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_HEDGE_DEFAULT_DELAY_MS: float = 15000
+    LLM_ROUTER_MAX_WORKERS: int = 32
+
+    # Per-provider retries: exponential backoff with full jitter, honouring
+    # Retry-After up to LLM_RETRY_MAX_WAIT seconds. The provider's breaker opens
+    # after LLM_BREAKER_FAILURES consecutive transient failures and lets one
+    # probe through every LLM_BREAKER_RESET_SECONDS.
+    LLM_RETRY_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 8.0
+    LLM_RETRY_MAX_WAIT: float = 30.0
+    LLM_BREAKER_FAILURES: int = 5
+    LLM_BREAKER_RESET_SECONDS: float = 30.0
+
+    # Global LLM governor: at most LLM_MAX_CONCURRENCY calls in flight across
+    # all workers on the host (flock slots in LLM_LOCK_DIR, default a temp
+    # dir), shared tokens/requests-per-minute budgets (0 = unlimited) and fair
+    # queueing per user in each worker. Waiting past LLM_QUEUE_MAX_WAIT is a 503.
+    LLM_SCHEDULER_ENABLED: bool = True
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_TOKENS_PER_MINUTE: int = 0
+    LLM_REQUESTS_PER_MINUTE: int = 0
+    LLM_BUDGET_BURST_SECONDS: float = 60.0
+    LLM_EXPECTED_OUTPUT_TOKENS: int = 1000
+    LLM_QUEUE_MAX_WAIT: float = 60.0
+    LLM_LOCK_DIR: str = ""
+
+    # Priority lanes: tiers share LLM capacity by weight; a waiter older than
+    # LLM_PRIORITY_AGING_SECONDS goes next regardless, so free users are never
+    # starved. Expensive requests are shed with 503 once their tier's queue in
+    # the worker reaches LLM_TIER_MAX_QUEUE (tiers not listed are unlimited).
+    LLM_TIER_WEIGHTS: str = "premium:4,free:1"
+    LLM_TIER_MAX_QUEUE: str = "free:64"
+    LLM_PRIORITY_AGING_SECONDS: float = 20.0
+    LLM_DEFAULT_TIER: str = "free"
+
+    # Speculative prefetch (HUMAN refinement): generate batch N+1 in the
+    # background while batch N is reviewed. It is served by generate-batch only
+    # if the stored last episode is still PREFETCH_MIN_SIMILARITY (word-level
+    # ratio) close to the draft it continued from; otherwise its tokens are
+    # wasted. Hit rate = hit / (hit + miss + invalidated + stale + expired).
+    # generate-batch waits up to PREFETCH_WAIT_SECONDS for a batch still in
+    # flight before generating from scratch.
+    SPECULATIVE_PREFETCH_ENABLED: bool = False
+    PREFETCH_MIN_SIMILARITY: float = 0.9
+    PREFETCH_TTL_SECONDS: float = 1800.0
+    PREFETCH_WAIT_SECONDS: float = 30.0
+    PREFETCH_MAX_ENTRIES: int = 256
+    PREFETCH_MAX_WORKERS: int = 4
+
+    # Per-story lease around generate/refine/validate-batch. Off by default:
+    # it needs the acquire/release_story_lease functions from
+    # migrations/002_story_lease.sql, so enable it once that has been applied.
+    # A concurrent request on the same story gets 409 with Retry-After capped
+    # at STORY_LEASE_RETRY_AFTER; a lease whose worker died lapses after
+    # STORY_LEASE_SECONDS.
+    STORY_LEASE_ENABLED: bool = False
+    STORY_LEASE_SECONDS: int = 60
+    STORY_LEASE_RETRY_AFTER: int = 5
+
+    # Store a batch of episodes with one store_episode_batch call instead of
+    # per-episode writes. Off by default: it needs the SQL function from
+    # migrations/003_store_episode_batch.sql, so enable it once that has been
+    # applied.
+    BATCH_EPISODE_STORE_ENABLED: bool = False
+
+    # Embedding outbox (migrations/004_embedding_jobs.sql): validated episodes
+    # are queued as embedding_jobs and chunked by app/workers/embedding_worker.py
+    # instead of FastAPI BackgroundTasks. Needs the worker running. Drafting
+    # waits up to EMBEDDING_WAIT_SECONDS for the story's pending jobs.
+    EMBEDDING_QUEUE_ENABLED: bool = False
+    EMBEDDING_WAIT_SECONDS: float = 10.0
+    EMBEDDING_WAIT_POLL_SECONDS: float = 0.25
+    EMBEDDING_WORKER_BATCH_SIZE: int = 8
+    EMBEDDING_WORKER_CONCURRENCY: int = 2
+    EMBEDDING_WORKER_POLL_SECONDS: float = 1.0
+    EMBEDDING_WORKER_LOCK_SECONDS: int = 300
+    EMBEDDING_WORKER_MAX_ATTEMPTS: int = 5
+    EMBEDDING_WORKER_RETRY_BASE_SECONDS: float = 5.0
+    EMBEDDING_WORKER_RETRY_MAX_SECONDS: float = 600.0
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
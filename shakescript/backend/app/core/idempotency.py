@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+from app.core.cache import MEMORY_PATH, create_sqlite_schema, sqlite_connection
+from app.core.config import settings
+from app.core.metrics import registry, route_template
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+PENDING = "pending"
+DONE = "done"
+
+# Errors that are the request's final answer and are replayed like a
+# success. Anything else (409 in progress or lease held, 412 stale If-Match,
+# 429 limits, 5xx) depends on the moment, so the key is freed for a retry.
+REPLAYED_ERRORS = frozenset({404, 422})
+
+
+class MemoryIdempotencyStore:
+    """
+    In-process records keyed by (auth_id, key). A record is either pending
+    (claimed by a running request until lease_until) or done (a stored
+    response until expires_at).
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._records: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def claim(
+        self, scope: str, key: str, fingerprint: str, lease_seconds: float
+    ) -> Optional[Dict[str, Any]]:
+        """Claim the key for this request; returns the live record if taken."""
+        now = time.time()
+        with self._lock:
+            record = self._records.get((scope, key))
+            if record is not None and not _expired(record, now):
+                return dict(record)
+            self._records[(scope, key)] = {
+                "state": PENDING,
+                "fingerprint": fingerprint,
+                "lease_until": now + lease_seconds,
+            }
+            if len(self._records) > self.max_entries:
+                for stale in [k for k, r in self._records.items() if _expired(r, now)]:
+                    del self._records[stale]
+        return None
+
+    def complete(self, scope: str, key: str, fingerprint: str, response: Dict[str, Any], ttl_seconds: float):
+        with self._lock:
+            self._records[(scope, key)] = {
+                "state": DONE,
+                "fingerprint": fingerprint,
+                "response": response,
+                "expires_at": time.time() + ttl_seconds,
+            }
+
+    def release(self, scope: str, key: str):
+        with self._lock:
+            self._records.pop((scope, key), None)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+class SqliteIdempotencyStore:
+    """Same records in a local SQLite file, shared by every worker on the host."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        create_sqlite_schema(
+            path,
+            "CREATE TABLE IF NOT EXISTS idempotency ("
+            " scope TEXT NOT NULL, key TEXT NOT NULL, record TEXT NOT NULL,"
+            " valid_until REAL NOT NULL, PRIMARY KEY (scope, key))",
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        return sqlite_connection(self._local, self.path)
+
+    def claim(
+        self, scope: str, key: str, fingerprint: str, lease_seconds: float
+    ) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front, so two workers cannot both
+        # see the key as free.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT record, valid_until FROM idempotency WHERE scope = ? AND key = ?",
+                (scope, key),
+            ).fetchone()
+            if row is not None and row[1] >= now:
+                conn.execute("COMMIT")
+                return json.loads(row[0])
+            record = {"state": PENDING, "fingerprint": fingerprint}
+            conn.execute(
+                "INSERT OR REPLACE INTO idempotency VALUES (?, ?, ?, ?)",
+                (scope, key, json.dumps(record), now + lease_seconds),
+            )
+            conn.execute(
+                "DELETE FROM idempotency WHERE rowid IN ("
+                " SELECT rowid FROM idempotency ORDER BY valid_until DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return None
+
+    def complete(self, scope: str, key: str, fingerprint: str, response: Dict[str, Any], ttl_seconds: float):
+        record = {"state": DONE, "fingerprint": fingerprint, "response": response}
+        self._conn().execute(
+            "INSERT OR REPLACE INTO idempotency VALUES (?, ?, ?, ?)",
+            (scope, key, json.dumps(record), time.time() + ttl_seconds),
+        )
+
+    def release(self, scope: str, key: str):
+        self._conn().execute(
+            "DELETE FROM idempotency WHERE scope = ? AND key = ?", (scope, key)
+        )
+
+    def clear(self):
+        self._conn().execute("DELETE FROM idempotency")
+
+
+def _expired(record: Dict[str, Any], now: float) -> bool:
+    if record["state"] == PENDING:
+        return record["lease_until"] < now
+    return record["expires_at"] < now
+
+
+def _build_store():
+    """
+    SQLite in IDEMPOTENCY_PATH (default a temp-dir file), so duplicates that
+    land on different workers of the host still meet; ":memory:" keeps keys
+    per process, which is only correct with a single worker.
+    """
+    if settings.IDEMPOTENCY_PATH == MEMORY_PATH:
+        return MemoryIdempotencyStore(settings.IDEMPOTENCY_MAX_ENTRIES)
+    return SqliteIdempotencyStore(
+        settings.IDEMPOTENCY_PATH
+        or os.path.join(tempfile.gettempdir(), "shakescript-idempotency.sqlite3"),
+        settings.IDEMPOTENCY_MAX_ENTRIES,
+    )
+
+
+store = _build_store()
+
+
+async def request_fingerprint(request: Request) -> str:
+    """Hash of what makes two submissions the same request."""
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.url.path.encode())
+    digest.update(str(sorted(request.query_params.multi_items())).encode())
+    digest.update(await request.body())
+    return digest.hexdigest()
+
+
+def _replay(response: Response, stored: Dict[str, Any], route: str):
+    registry.inc("shakescript_idempotency_total", outcome="replayed", route=route)
+    response.headers[REPLAYED_HEADER] = "true"
+    if "error" in stored:
+        raise HTTPException(
+            status_code=stored["status_code"],
+            detail=stored["error"],
+            headers={REPLAYED_HEADER: "true"},
+        )
+    return stored["body"]
+
+
+async def _call(run: Callable[[], Any]):
+    if inspect.iscoroutinefunction(run):
+        return await run()
+    # Sync work (LLM calls, the story lease) runs in the threadpool so the
+    # event loop keeps serving, including duplicates polling for this key.
+    result = await run_in_threadpool(run)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def idempotent(
+    request: Request,
+    response: Response,
+    auth_id: str,
+    key: Optional[str],
+    run: Callable[[], Any],
+):
+    """
+    Run `run()` (sync or async) at most once per (user, Idempotency-Key). A duplicate that
+    arrives while the first is running waits for it and gets the same
+    response; later duplicates within IDEMPOTENCY_TTL_SECONDS get the stored
+    response (Idempotent-Replayed: true). Reusing a key for a different
+    request is a 422. Only successes and REPLAYED_ERRORS are stored; after
+    any other error the key is released, so the client's retry runs again.
+    """
+    if not settings.IDEMPOTENCY_ENABLED or not key or not auth_id:
+        return await _call(run)
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"
+        )
+
+    route = route_template(request.scope)
+    fingerprint = await request_fingerprint(request)
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        record = store.claim(auth_id, key, fingerprint, settings.IDEMPOTENCY_LOCK_SECONDS)
+        if record is None:
+            break
+        if record["fingerprint"] != fingerprint:
+            registry.inc("shakescript_idempotency_total", outcome="conflict", route=route)
+            raise HTTPException(
+                status_code=422,
+                detail=f"{IDEMPOTENCY_HEADER} was already used for a different request",
+            )
+        if record["state"] == DONE:
+            return _replay(response, record["response"], route)
+        # Same request still running elsewhere: join it.
+        if time.monotonic() >= deadline:
+            registry.inc("shakescript_idempotency_total", outcome="in_progress", route=route)
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress",
+                headers={"Retry-After": "5"},
+            )
+        registry.inc("shakescript_idempotency_waits_total", route=route)
+        await asyncio.sleep(settings.IDEMPOTENCY_POLL_SECONDS)
+
+    registry.inc("shakescript_idempotency_total", outcome="executed", route=route)
+    try:
+        result = await _call(run)
+    except HTTPException as e:
+        if e.status_code in REPLAYED_ERRORS:
+            store.complete(
+                auth_id,
+                key,
+                fingerprint,
+                {"status_code": e.status_code, "error": e.detail},
+                settings.IDEMPOTENCY_TTL_SECONDS,
+            )
+        else:
+            store.release(auth_id, key)
+        raise
+    except BaseException:
+        store.release(auth_id, key)
+        raise
+    try:
+        store.complete(
+            auth_id,
+            key,
+            fingerprint,
+            {"body": jsonable_encoder(result)},
+            settings.IDEMPOTENCY_TTL_SECONDS,
+        )
+    except Exception as e:
+        # The work is done; a lost record only means a retry would run again.
+        logging.warning(f"Idempotency record store failed: {e}")
+        store.release(auth_id, key)
+    return result
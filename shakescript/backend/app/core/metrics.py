@@ -0,0 +1,460 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+# Stages a request spends time in. Nested stages overlap (chunk_store includes
+# its own embed and db calls), so they are not meant to sum to the total.
+STAGES = ("auth", "db", "llm_queue", "llm", "embed", "chunk_store")
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+class RequestMetrics:
+    """Counters for one request: calls, ms, bytes and tokens per stage."""
+
+    __slots__ = ("stages", "started")
+
+    def __init__(self):
+        self.stages: Dict[str, List[float]] = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage: str, ms: float, nbytes: int = 0, tokens: int = 0):
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = [0, 0.0, 0, 0]
+        entry[0] += 1
+        entry[1] += ms
+        entry[2] += nbytes
+        entry[3] += tokens
+
+    def server_timing(self) -> str:
+        parts = []
+        for stage, (calls, ms, nbytes, tokens) in self.stages.items():
+            desc = f"calls={calls}"
+            if nbytes:
+                desc += f" bytes={nbytes}"
+            if tokens:
+                desc += f" tokens={tokens}"
+            parts.append(f'{stage};dur={ms:.1f};desc="{desc}"')
+        total = (time.perf_counter() - self.started) * 1000
+        parts.append(f"total;dur={total:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    "request_metrics", default=None
+)
+
+
+def current_request_metrics() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+class _Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(DURATION_BUCKETS, value)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Process-local Prometheus registry. With several gunicorn workers each
+    worker reports its own series; scrape them per worker or aggregate by pod.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], _Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def value(self, name: str, **labels: str) -> float:
+        """Current value of a counter or gauge series (0 if never set)."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        lines: List[str] = []
+        with self._lock:
+            histograms = sorted(
+                (k, (list(h.buckets), h.sum, h.count)) for k, h in self._histograms.items()
+            )
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+
+        declared = set()
+        for (name, labels), (buckets, total, count) in histograms:
+            if name not in declared:
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            cumulative = 0
+            for bound, hits in zip(DURATION_BUCKETS, buckets):
+                cumulative += hits
+                lines.append(
+                    f"{name}_bucket{_labels(labels, le=repr(bound))} {cumulative}"
+                )
+            lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {count}')
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            if name not in declared:
+                lines.append(f"# TYPE {name} gauge")
+                declared.add(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in pairs) + "}"
+
+
+registry = MetricsRegistry()
+
+
+def record(stage: str, ms: float, nbytes: int = 0, tokens: int = 0):
+    """Add one call to the current request's counters and the process totals."""
+    request_metrics = _current.get()
+    if request_metrics is not None:
+        request_metrics.add(stage, ms, nbytes, tokens)
+    registry.inc("shakescript_stage_calls_total", stage=stage)
+    if nbytes:
+        registry.inc("shakescript_stage_bytes_total", nbytes, stage=stage)
+    if tokens:
+        registry.inc("shakescript_llm_tokens_total", tokens, stage=stage)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block of work as one call of `name` (e.g. auth, chunk_store)."""
+    if not settings.METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+
+def _payload_size(data: Any) -> int:
+    """
+    JSON size of a DB payload. postgrest does not keep the raw body, so rows
+    are serialised again; only done with METRICS_DB_BYTES.
+    """
+    if data is None or not settings.METRICS_DB_BYTES:
+        return 0
+    if isinstance(data, (str, bytes)):
+        return len(data)
+    try:
+        from app.utils.fast_json import dumps
+
+        return len(dumps(data))
+    except Exception:
+        return len(json.dumps(data, default=str))
+
+
+class _InstrumentedBuilder:
+    """
+    Wraps a postgrest request builder; every chained call returns another
+    wrapper until execute(), which is timed as one `db` round trip.
+    """
+
+    __slots__ = ("_builder", "_payload_bytes")
+
+    def __init__(self, builder, payload_bytes: int = 0):
+        self._builder = builder
+        self._payload_bytes = payload_bytes
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if name == "execute":
+            return self._execute
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, "execute"):
+                payload_bytes = self._payload_bytes
+                if name in ("insert", "upsert", "update") and args:
+                    payload_bytes += _payload_size(args[0])
+                return _InstrumentedBuilder(result, payload_bytes)
+            return result
+
+        return chained
+
+    def _execute(self):
+        start = time.perf_counter()
+        result = self._builder.execute()
+        ms = (time.perf_counter() - start) * 1000
+        nbytes = self._payload_bytes + _payload_size(getattr(result, "data", None))
+        record("db", ms, nbytes)
+        return result
+
+
+class InstrumentedClient:
+    """Supabase client proxy that times table()/rpc() round trips."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str):
+        return _InstrumentedBuilder(self._client.table(name))
+
+    def from_(self, name: str):
+        return _InstrumentedBuilder(self._client.from_(name))
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None, *args, **kwargs):
+        return _InstrumentedBuilder(
+            self._client.rpc(name, params or {}, *args, **kwargs),
+            _payload_size(params),
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def token_count(prompt: str, response) -> int:
+    usage = getattr(response, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None) if usage else None
+    if total:
+        return int(total)
+    # Rough estimate when the backend does not report usage (~4 chars/token).
+    return (len(prompt) + len(getattr(response, "text", "") or "")) // 4
+
+
+class InstrumentedModel:
+    """GenerativeModel proxy that times generate_content as one `llm` call."""
+
+    def __init__(self, model):
+        self._model = model
+
+    def generate_content(self, contents, *args, **kwargs):
+        start = time.perf_counter()
+        response = self._model.generate_content(contents, *args, **kwargs)
+        ms = (time.perf_counter() - start) * 1000
+        prompt = contents if isinstance(contents, str) else str(contents)
+        text = getattr(response, "text", "") or ""
+        record(
+            "llm",
+            ms,
+            len(prompt.encode("utf-8")) + len(text.encode("utf-8")),
+            token_count(prompt, response),
+        )
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+class TokenMeter:
+    """
+    Model proxy that adds up tokens for one unit of work (a batch-runner
+    story, a speculative batch), independent of METRICS_ENABLED.
+    """
+
+    def __init__(self, model):
+        self._model = model
+        self.tokens = 0
+
+    def generate_content(self, contents, *args, **kwargs):
+        response = self._model.generate_content(contents, *args, **kwargs)
+        prompt = contents if isinstance(contents, str) else str(contents)
+        self.tokens += token_count(prompt, response)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+@lru_cache(maxsize=1)
+def _instrumented_embedding_class():
+    # Built lazily so this module does not import llama_index on its own.
+    from llama_index.core.base.embeddings.base import BaseEmbedding
+    from pydantic import PrivateAttr
+
+    class InstrumentedEmbedding(BaseEmbedding):
+        """
+        Delegating embedding model; a real BaseEmbedding so the semantic
+        splitter accepts it. Each (batch) embedding call is one `embed` call.
+        """
+
+        _inner: Any = PrivateAttr()
+
+        def __init__(self, inner, **kwargs):
+            super().__init__(
+                model_name=getattr(inner, "model_name", "unknown"),
+                embed_batch_size=getattr(inner, "embed_batch_size", 10),
+                **kwargs,
+            )
+            self._inner = inner
+
+        def _timed(self, fn, texts):
+            start = time.perf_counter()
+            result = fn()
+            nbytes = sum(len(t.encode("utf-8")) for t in texts)
+            record("embed", (time.perf_counter() - start) * 1000, nbytes)
+            return result
+
+        def _get_text_embedding(self, text: str):
+            return self._timed(lambda: self._inner._get_text_embedding(text), [text])
+
+        def _get_text_embeddings(self, texts):
+            return self._timed(lambda: self._inner._get_text_embeddings(texts), texts)
+
+        def _get_query_embedding(self, query: str):
+            return self._timed(lambda: self._inner._get_query_embedding(query), [query])
+
+        async def _aget_query_embedding(self, query: str):
+            return self._get_query_embedding(query)
+
+    return InstrumentedEmbedding
+
+
+def instrument_client(client):
+    if not settings.METRICS_ENABLED or isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client)
+
+
+def instrument_model(model):
+    if not settings.METRICS_ENABLED or isinstance(model, InstrumentedModel):
+        return model
+    return InstrumentedModel(model)
+
+
+def instrument_embedding(embedding_model):
+    if not settings.METRICS_ENABLED:
+        return embedding_model
+    wrapper = _instrumented_embedding_class()
+    if isinstance(embedding_model, wrapper):
+        return embedding_model
+    return wrapper(embedding_model)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: opens a RequestMetrics per HTTP request, adds the
+    Server-Timing header and records request/stage histograms by route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_metrics = RequestMetrics()
+        token = _current.set(request_metrics)
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if settings.METRICS_SERVER_TIMING:
+                    headers = list(message.get("headers", []))
+                    headers.append(
+                        (b"server-timing", request_metrics.server_timing().encode("latin-1"))
+                    )
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            path = route_template(scope)
+            if path != "/metrics":
+                _observe_request(scope["method"], path, status["code"], request_metrics)
+
+
+def route_template(scope) -> str:
+    """
+    Path template of the matched route, e.g. /api/v1/stories/{story_id}.
+    Depending on the FastAPI version the matched route may only know its path
+    inside the included router, so the router prefix is recovered from the
+    leading segments of the request path.
+    """
+    template = getattr(scope.get("route"), "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope.get("path", "")
+    extra = path.rstrip("/").count("/") - template.rstrip("/").count("/")
+    if extra > 0:
+        return "/".join(path.split("/")[: extra + 1]) + template
+    return template
+
+
+def _observe_request(method: str, route: str, status: int, request_metrics: RequestMetrics):
+    elapsed = time.perf_counter() - request_metrics.started
+    registry.observe(
+        "shakescript_request_duration_seconds",
+        elapsed,
+        method=method,
+        route=route,
+        status=str(status),
+    )
+    for stage_name, (calls, ms, _, _) in request_metrics.stages.items():
+        registry.observe(
+            "shakescript_request_stage_seconds", ms / 1000, route=route, stage=stage_name
+        )
+        registry.inc(
+            "shakescript_request_stage_calls_total", calls, route=route, stage=stage_name
+        )
@@ -0,0 +1,259 @@
+import cProfile
+import functools
+import hmac
+import inspect
+import io
+import logging
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from fastapi.routing import APIRoute
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile-token"
+
+
+class ProfileRecord:
+    __slots__ = ("id", "meta", "report", "prof_bytes", "size")
+
+    def __init__(self, profile_id: str, meta: Dict[str, Any], report: Dict[str, Any], prof_bytes: bytes):
+        self.id = profile_id
+        self.meta = meta
+        self.report = report
+        self.prof_bytes = prof_bytes
+        self.size = len(prof_bytes) + len(report.get("cprofile", ""))
+
+
+class ProfileStore:
+    """Ring buffer of recent profiles, capped by count and total bytes."""
+
+    def __init__(self, max_profiles: int, max_bytes: int):
+        self.max_profiles = max_profiles
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[str, ProfileRecord]" = OrderedDict()
+        self._bytes = 0
+
+    def add(self, record: ProfileRecord):
+        with self._lock:
+            self._records[record.id] = record
+            self._bytes += record.size
+            while self._records and (
+                len(self._records) > self.max_profiles or self._bytes > self.max_bytes
+            ):
+                _, evicted = self._records.popitem(last=False)
+                self._bytes -= evicted.size
+
+    def get(self, profile_id: str) -> Optional[ProfileRecord]:
+        with self._lock:
+            return self._records.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {**record.meta, "id": record.id, "bytes": record.size}
+                for record in reversed(self._records.values())
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._bytes = 0
+
+
+profile_store = ProfileStore(
+    settings.PROFILING_MAX_PROFILES, settings.PROFILING_MAX_BYTES
+)
+
+
+class ProfileSession:
+    """State of one profiled request; the profiler runs only inside endpoints."""
+
+    def __init__(self, profile_id: str):
+        self.id = profile_id
+        self.profiler = cProfile.Profile()
+        self.started_tracemalloc = False
+        self.snapshot_before: Optional[tracemalloc.Snapshot] = None
+
+
+_active: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+
+# tracemalloc and the report are process-wide, so profile one request at a time.
+_session_lock = threading.Lock()
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    expected = settings.PROFILING_ADMIN_TOKEN
+    return bool(expected and token) and hmac.compare_digest(token, expected)
+
+
+def _requested_token(scope) -> Optional[str]:
+    # Header only: a query-string token ends up in access logs, proxies and
+    # browser history.
+    for name, value in scope.get("headers") or []:
+        if name == PROFILE_HEADER:
+            return value.decode("latin-1")
+    return None
+
+
+def _profiled(fn):
+    """Run `fn` under the request's profiler, if this request is profiled."""
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            session = _active.get()
+            if session is None:
+                return await fn(*args, **kwargs)
+            # Async endpoints run on the event loop, so other requests' work
+            # interleaved at await points can show up in this profile.
+            session.profiler.enable()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                session.profiler.disable()
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        session = _active.get()
+        if session is None:
+            return fn(*args, **kwargs)
+        # Sync endpoints run in the threadpool; cProfile is per thread, so
+        # enable it here rather than in the middleware.
+        session.profiler.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            session.profiler.disable()
+
+    return wrapper
+
+
+class _ProfilingRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+
+# Routers pass route_class=ProfilingRoute; with profiling off it is a plain
+# APIRoute, so endpoints are not wrapped at all.
+ProfilingRoute = _ProfilingRoute if settings.PROFILING_ENABLED else APIRoute
+
+
+# Allocations made by the profiler itself are noise in the report.
+_OWN_ALLOCATIONS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+    tracemalloc.Filter(False, pstats.__file__),
+)
+
+
+def _build_report(session: ProfileSession, top: int) -> Dict[str, Any]:
+    stream = io.StringIO()
+    stats = pstats.Stats(session.profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(top)
+    report: Dict[str, Any] = {"cprofile": stream.getvalue()}
+
+    if session.snapshot_before is not None:
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS)
+        before = session.snapshot_before.filter_traces(_OWN_ALLOCATIONS)
+        diff = after.compare_to(before, "lineno")
+        report["tracemalloc"] = {
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "top_allocations": [
+                {
+                    "location": str(stat.traceback[0]) if stat.traceback else "?",
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in diff[:top]
+            ],
+        }
+    return report
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware. A request carrying the admin token in the
+    X-Profile-Token header runs its endpoint under cProfile with a tracemalloc
+    snapshot diff; the result is kept in profile_store and its id returned in
+    the X-Profile-Id header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _requested_token(scope)
+        if token is None or not is_admin_token(token):
+            return await self.app(scope, receive, send)
+        if not _session_lock.acquire(blocking=False):
+            return await self.app(scope, receive, _with_header(send, b"x-profile-status", b"busy"))
+
+        session = ProfileSession(os.urandom(8).hex())
+        status = {"code": 500}
+        started = time.perf_counter()
+        try:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+                session.started_tracemalloc = True
+            tracemalloc.reset_peak()
+            session.snapshot_before = tracemalloc.take_snapshot()
+
+            async def send_with_id(message):
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+                await send(message)
+
+            token_ctx = _active.set(session)
+            try:
+                await self.app(
+                    scope, receive, _with_header(send_with_id, b"x-profile-id", session.id.encode())
+                )
+            finally:
+                _active.reset(token_ctx)
+                self._store(scope, session, status["code"], started)
+        finally:
+            if session.started_tracemalloc:
+                tracemalloc.stop()
+            _session_lock.release()
+
+    def _store(self, scope, session: ProfileSession, status: int, started: float):
+        try:
+            report = _build_report(session, settings.PROFILING_TOP_N)
+            session.profiler.create_stats()
+            prof_bytes = marshal.dumps(session.profiler.stats)
+        except Exception as e:
+            logger.warning("Failed to build profile %s: %s", session.id, e)
+            return
+        meta = {
+            "method": scope["method"],
+            "path": scope.get("path", ""),
+            "status": status,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        profile_store.add(ProfileRecord(session.id, meta, report, prof_bytes))
+
+
+def _with_header(send, name: bytes, value: bytes):
+    async def wrapped(message):
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": list(message.get("headers", [])) + [(name, value)]}
+        await send(message)
+
+    return wrapped
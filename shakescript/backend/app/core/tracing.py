@@ -0,0 +1,508 @@
+import atexit
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """One timed unit of work. Ids are hex strings in W3C/OTLP format."""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "error",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = {}
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class InMemorySpanExporter:
+    """Keeps finished spans in a list; for tests and benchmarks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def get_finished_spans(self) -> List[Span]:
+        with self._lock:
+            return list(self.spans)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def shutdown(self):
+        pass
+
+
+class JsonLinesSpanExporter:
+    """Appends one JSON object per finished span to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def shutdown(self):
+        pass
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpSpanExporter:
+    """
+    Batches spans and POSTs them as OTLP/HTTP JSON to {endpoint}/v1/traces
+    from a daemon thread, so requests never wait on the collector. The thread
+    starts with the first span of each process: the exporter is built at
+    import, which with gunicorn --preload happens in the master, and forked
+    workers inherit the object but not its thread.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        service_name: str,
+        headers: Optional[Dict[str, str]] = None,
+        batch_size: int = 256,
+        flush_interval: float = 2.0,
+        max_queue: int = 10000,
+    ):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue: Optional["queue.Queue[Optional[Span]]"] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """This process's queue and flush thread, started on first use."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(
+                target=self._run, args=(self._queue,), name="otlp-span-exporter", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def export(self, span: Span):
+        self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            logger.warning("OTLP span queue full, dropping span %s", span.name)
+
+    def encode(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": self.service_name}}
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "shakescript"},
+                            "spans": [
+                                {
+                                    "traceId": span.trace_id,
+                                    "spanId": span.span_id,
+                                    "parentSpanId": span.parent_id or "",
+                                    "name": span.name,
+                                    "kind": 1,
+                                    "startTimeUnixNano": str(span.start_ns),
+                                    "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                                    "attributes": [
+                                        {"key": key, "value": _otlp_value(value)}
+                                        for key, value in span.attributes.items()
+                                    ],
+                                    "status": (
+                                        {"code": 2, "message": span.error}
+                                        if span.error
+                                        else {"code": 1}
+                                    ),
+                                }
+                                for span in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def _send(self, spans: List[Span]):
+        import requests
+
+        try:
+            response = requests.post(
+                self.url, data=json.dumps(self.encode(spans)), headers=self.headers, timeout=5
+            )
+            if response.status_code >= 400:
+                logger.warning("OTLP export failed: %s %s", response.status_code, response.text[:200])
+        except Exception as e:
+            logger.warning("OTLP export failed: %s", e)
+
+    def _run(self, spans: "queue.Queue[Optional[Span]]"):
+        batch: List[Span] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                span = spans.get(timeout=timeout)
+            except queue.Empty:
+                span = None
+            else:
+                if span is None:
+                    break
+                batch.append(span)
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._send(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+        if batch:
+            self._send(batch)
+
+    def shutdown(self):
+        if self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class Tracer:
+    def __init__(self, exporters: Optional[List[Any]] = None):
+        self.exporters: List[Any] = list(exporters or [])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    def remove_exporter(self, exporter):
+        self.exporters.remove(exporter)
+
+    def _finish(self, span: Span):
+        span.end_ns = time.time_ns()
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logger.warning("Span exporter %s failed: %s", type(exporter).__name__, e)
+
+    @contextmanager
+    def start_span(
+        self,
+        name: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[Span] = None,
+        trace_id: Optional[str] = None,
+    ):
+        if not self.exporters:
+            yield NOOP_SPAN
+            return
+        parent = parent or _current_span.get()
+        if parent is not None:
+            span = Span(name, parent.trace_id, parent.span_id)
+        else:
+            span = Span(name, trace_id or os.urandom(16).hex())
+        if attributes:
+            span.attributes.update(attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    def shutdown(self):
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+def _build_tracer() -> Tracer:
+    if not settings.TRACING_ENABLED:
+        return Tracer()
+    exporters = []
+    for name in (e.strip() for e in settings.TRACING_EXPORTERS.split(",")):
+        if name == "memory":
+            exporters.append(InMemorySpanExporter())
+        elif name == "jsonl":
+            exporters.append(JsonLinesSpanExporter(settings.TRACING_JSONL_PATH))
+        elif name == "otlp":
+            exporters.append(
+                OtlpHttpSpanExporter(
+                    settings.TRACING_OTLP_ENDPOINT, settings.TRACING_SERVICE_NAME
+                )
+            )
+        elif name:
+            logger.warning("Unknown tracing exporter '%s' ignored", name)
+    return Tracer(exporters)
+
+
+tracer = _build_tracer()
+atexit.register(tracer.shutdown)
+
+
+def span(name: str, **attributes: Any):
+    """Context manager for a child span of the current one."""
+    return tracer.start_span(name, attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def set_attribute(key: str, value: Any):
+    current = _current_span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+def traced(name: str, *arg_names: str):
+    """
+    Decorator: run the function in a span, recording the named arguments
+    (e.g. "story_id", "episode_number") as attributes. Works on sync and
+    async functions; a single flag check when tracing is off.
+    """
+
+    def decorator(fn: Callable):
+        signature = inspect.signature(fn)
+
+        def attributes(args, kwargs) -> Dict[str, Any]:
+            if not arg_names:
+                return {}
+            bound = signature.bind_partial(*args, **kwargs).arguments
+            return {key: bound[key] for key in arg_names if key in bound}
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.exporters:
+                    return await fn(*args, **kwargs)
+                with tracer.start_span(name, attributes(args, kwargs)):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.exporters:
+                return fn(*args, **kwargs)
+            with tracer.start_span(name, attributes(args, kwargs)):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Bind the current span to `fn` so that, when it later runs as a
+    BackgroundTask (after the response, possibly in another thread), its
+    spans join the request's trace.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return fn
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            token = _current_span.set(parent)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _current_span.reset(token)
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current_span.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_span.reset(token)
+
+    return wrapper
+
+
+class TracedModel:
+    """GenerativeModel proxy: one `llm.generate_content` span per call."""
+
+    def __init__(self, model):
+        self._model = model
+
+    def generate_content(self, contents, *args, **kwargs):
+        if not tracer.exporters:
+            return self._model.generate_content(contents, *args, **kwargs)
+        prompt = contents if isinstance(contents, str) else str(contents)
+        with tracer.start_span(
+            "llm.generate_content", {"prompt_chars": len(prompt)}
+        ) as current:
+            response = self._model.generate_content(contents, *args, **kwargs)
+            current.set_attribute(
+                "response_chars", len(getattr(response, "text", "") or "")
+            )
+            return response
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+def trace_model(model):
+    if not settings.TRACING_ENABLED or isinstance(model, TracedModel):
+        return model
+    return TracedModel(model)
+
+
+def _parse_traceparent(header: Optional[str]):
+    # W3C: version-traceid-parentid-flags
+    if not header:
+        return None, None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    return parts[1], parts[2]
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening the root span of each HTTP request. Honours
+    an incoming W3C traceparent header and echoes the trace in the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.exporters:
+            return await self.app(scope, receive, send)
+
+        from app.core.metrics import route_template
+
+        headers = dict(scope.get("headers") or [])
+        trace_id, parent_id = _parse_traceparent(
+            headers.get(b"traceparent", b"").decode("latin-1")
+        )
+        remote_parent = None
+        if trace_id:
+            remote_parent = Span("remote", trace_id)
+            remote_parent.span_id = parent_id
+
+        with tracer.start_span(
+            f"HTTP {scope['method']}",
+            {"http.method": scope["method"], "http.target": scope.get("path", "")},
+            parent=remote_parent,
+        ) as root:
+
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    root.set_attribute("http.status_code", message["status"])
+                    headers = list(message.get("headers", []))
+                    headers.append(
+                        (
+                            b"traceparent",
+                            f"00-{root.trace_id}-{root.span_id}-01".encode("latin-1"),
+                        )
+                    )
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                route = route_template(scope)
+                root.name = f"{scope['method']} {route}"
+                root.set_attribute("http.route", route)
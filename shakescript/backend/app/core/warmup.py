@@ -0,0 +1,68 @@
+import logging
+import time
+from importlib import import_module
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Imported on first use by the services (see default_model,
+# default_embedding_model); tests/test_startup.py checks they stay out of
+# `import app.main`.
+HEAVY_MODULES = (
+    "numpy",
+    "google.generativeai",
+    "openai",
+    "llama_index.core",
+    "llama_index.core.node_parser",
+    "llama_index.embeddings.gemini",
+)
+
+_warm = False
+
+
+def is_warm() -> bool:
+    return _warm
+
+
+def warmup() -> Dict[str, float]:
+    """
+    Import the heavy SDKs and build shared read-only state (sentence tokenizer,
+    OpenAPI schema) so the first request does not pay for them.
+
+    Safe to run before fork (gunicorn --preload): it opens no sockets or
+    threads. Clients and models are still created lazily in each worker.
+    Returns the time spent per step in ms.
+    """
+    global _warm
+    timings: Dict[str, float] = {}
+
+    def step(name, fn):
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            logger.warning("Warmup step %s failed: %s", name, e)
+        timings[name] = round((time.perf_counter() - start) * 1000, 3)
+
+    for module in HEAVY_MODULES:
+        step(f"import {module}", lambda module=module: import_module(module))
+    step("punkt_tokenizer", _load_sentence_tokenizer)
+    step("openapi_schema", _build_openapi_schema)
+
+    _warm = True
+    logger.info("Warmup finished in %.1f ms", sum(timings.values()))
+    return timings
+
+
+def _load_sentence_tokenizer():
+    # The semantic splitter's default sentence splitter loads NLTK punkt on
+    # its first call (~300 ms); load it once here instead.
+    from llama_index.core.utils import globals_helper
+
+    globals_helper.punkt_tokenizer
+
+
+def _build_openapi_schema():
+    from app.main import app
+
+    app.openapi()
@@ -1,22 +1,38 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
+from app.core import metrics, profiling, tracing, warmup
+from app.core.config import settings
+from app.services.ai_service.resilienceAI import LLMUnavailableError
 from app.api.routes import (
     stories_routes,
     episodes_routes,
     auth_routes,
     dashboard_routes,
+    admin_routes,
 )
 
 # Define the security scheme for the Authorization header.
 api_key_header = APIKeyHeader(name="Authorization", auto_error=False)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Already warm when gunicorn preloaded the app and warmed the master.
+    if settings.WARMUP_ON_STARTUP and not warmup.is_warm():
+        warmup.warmup()
+    yield
+
+
 # Initialize the FastAPI application
 app = FastAPI(
     title="Shakescript API",
     description="API for generating and managing stories.",
     version="1.0.0",
     dependencies=[Depends(api_key_header)],
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -29,11 +45,37 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Per-request Server-Timing and Prometheus histograms
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Admin-only request profiling
+if settings.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# Root span per request; added last so it wraps the metrics middleware
+if settings.TRACING_ENABLED:
+    app.add_middleware(tracing.TracingMiddleware)
+
 # Include all the different API routers
 app.include_router(auth_routes.router, prefix="/api/v1", tags=["authentication"])
 app.include_router(stories_routes.router, prefix="/api/v1", tags=["stories"])
 app.include_router(episodes_routes.router, prefix="/api/v1", tags=["episodes"])
 app.include_router(dashboard_routes.router, prefix="/api/v1", tags=["dashboard"])
+app.include_router(admin_routes.router, prefix="/api/v1", tags=["admin"])
+
+
+@app.exception_handler(LLMUnavailableError)
+def llm_unavailable(request, exc: LLMUnavailableError):
+    """
+    Every LLM provider's breaker is open, or the LLM queue is full: fail fast
+    with 503 instead of holding a worker until capacity frees up.
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, int(exc.retry_after + 0.999)))},
+    )
 
 
 @app.get("/", tags=["Root"])
@@ -42,3 +84,15 @@ def read_root():
     A simple root endpoint to confirm that the API is running.
     """
     return {"message": "Welcome to the Shakescript API!"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint for request and stage histograms.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(
+        metrics.registry.render(), media_type="text/plain; version=0.0.4"
+    )
@@ -20,6 +20,18 @@ class StoryCreate(BaseModel):
     num_episodes: int
 
 
+class BatchStoryRequest(BaseModel):
+    """One line of an app.batch_runner manifest."""
+
+    key: str
+    prompt: str
+    num_episodes: int
+    batch_size: int = 2
+    refinement: str = "AI"
+    hinglish: bool = False
+    auth_id: Optional[str] = None
+
+
 class StoryResponse(BaseModel):
     story_id: int
     title: str
@@ -35,6 +47,12 @@ class StoryResponse(BaseModel):
     batch_size: int
     refinement_method: str
     total_episodes: int
+    next_episode_cursor: Optional[int] = None
+
+
+class EpisodePage(BaseModel):
+    episodes: List[Dict[str, Any]]
+    next_cursor: Optional[int] = None
 
 
 class EpisodeResponse(BaseModel):
@@ -68,6 +86,7 @@ class StoryListItem(BaseModel):
 
 class StoryListResponse(BaseModel):
     stories: List[StoryListItem]
+    next_cursor: Optional[int] = None
 
 
 class EpisodeBatchResponse(BaseModel):
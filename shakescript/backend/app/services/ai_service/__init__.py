@@ -1,10 +1,13 @@
-import google.generativeai as genai
-from openai import OpenAI
+from functools import cached_property, lru_cache
 from app.core.config import settings
+from app.core.metrics import instrument_model
+from app.core.tracing import trace_model
 from .metadata_extractorAI import extract_metadata
 from .episode_generatorAI import AIGeneration
 from .utilsAI import AIUtils
 from .prompts import AIPrompts
+from .routerAI import build_router
+from .schedulerAI import schedule_model
 from .ai_refinementAI import (
     validate_batch,
     is_consistent_with_previous,
@@ -19,17 +22,41 @@ from supabase import Client
 from typing import Dict, List, Any, Optional
 
 
+@lru_cache(maxsize=1)
+def default_model():
+    """
+    Process-wide LLM router over settings.LLM_PROVIDERS. Provider SDKs are
+    imported on first call, so importing the app stays cheap.
+    """
+    return build_router()
+
+
 class AIService:
-    def __init__(self, client: Client):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
-        self.openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.embedding_service = EmbeddingService(client)
+    def __init__(
+        self,
+        client: Client,
+        model=None,
+        embedding_service: Optional[EmbeddingService] = None,
+        auth_id: Optional[str] = None,
+        tier: Optional[str] = None,
+    ):
+        # Outermost: the scheduler's queue wait is not counted as llm time,
+        # except for a router, which takes a slot per provider attempt.
+        self.model = schedule_model(
+            trace_model(instrument_model(model or default_model())), auth_id, tier
+        )
+        self.embedding_service = embedding_service or EmbeddingService(client)
         self.generation = AIGeneration(self.model, self.embedding_service)
         self.utils = AIUtils()
         self.prompts = AIPrompts()
         self.client = client
 
+    @cached_property
+    def openai_client(self):
+        from openai import OpenAI
+
+        return OpenAI(api_key=settings.OPENAI_API_KEY)
+
     def call_llm(
         self, prompt: str, max_tokens: int = 1000, temperature: float = 0.7
     ) -> str:
@@ -1,3 +1,7 @@
+from app.core.tracing import traced
+
+
+@traced("ai.validate_batch", "story_id")
 def validate_batch(self, story_id, episodes, prev_episodes, metadata, auth_id):
     """
     Validate a batch of episodes for narrative consistency and quality.
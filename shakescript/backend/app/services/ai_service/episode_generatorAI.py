@@ -1,5 +1,6 @@
 import json
 from typing import Dict, List, Any
+from app.core.tracing import traced
 from app.services.ai_service.utilsAI import AIUtils
 from app.services.embedding_service import EmbeddingService
 from app.services.ai_service.prompts import AIPrompts
@@ -12,6 +13,7 @@ class AIGeneration:
         self.utils = AIUtils()
         self.prompts = AIPrompts()
 
+    @traced("ai.generate_episode", "story_id", "episode_number", "hinglish")
     def generate_episode_helper(
         self,
         num_episodes: int,
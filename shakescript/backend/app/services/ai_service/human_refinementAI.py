@@ -1,3 +1,7 @@
+from app.core.tracing import traced
+
+
+@traced("ai.regenerate_batch", "story_id")
 def regenerate_batch(
     self, story_id, episodes, prev_episodes, metadata, feedback_list, auth_id
 ):
@@ -1,9 +1,11 @@
 from app.utils import parse_user_prompt
+from app.core.tracing import traced
 import json
 from typing import Dict
 import re
 
 
+@traced("ai.extract_metadata", "num_episodes", "hinglish")
 def extract_metadata(
     self, user_prompt: str, num_episodes: int, hinglish: bool, auth_id: str = None
 ) -> Dict:
@@ -0,0 +1,241 @@
+import random
+import threading
+import time
+from contextlib import nullcontext
+from email.utils import parsedate_to_datetime
+from typing import Callable, ContextManager, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import registry
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Transport-level failures from the SDKs that carry no status code.
+RETRYABLE_NAMES = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "DeadlineExceeded",
+    "ServiceUnavailable",
+    "ResourceExhausted",
+    "TooManyRequests",
+    "InternalServerError",
+    "RetryError",
+}
+
+
+class LLMUnavailableError(Exception):
+    """No LLM capacity right now; the API answers 503 with Retry-After."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """A provider's breaker is open; callers should fail fast or fail over."""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(
+            f"LLM provider {provider} is unavailable, retry in {retry_after:.0f}s",
+            retry_after,
+        )
+        self.provider = provider
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def _parse_retry_after(value) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(str(value)).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Server-requested wait: Retry-After(-Ms) headers or Gemini's RetryInfo."""
+    explicit = getattr(exc, "retry_after", None)
+    if explicit is not None:
+        return _parse_retry_after(explicit)
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if headers is not None:
+        millis = headers.get("retry-after-ms")
+        if millis is not None:
+            parsed = _parse_retry_after(millis)
+            return parsed / 1000 if parsed is not None else None
+        parsed = _parse_retry_after(headers.get("retry-after"))
+        if parsed is not None:
+            return parsed
+    for detail in getattr(exc, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    return None
+
+
+def classify_error(exc: Exception) -> Tuple[bool, Optional[float]]:
+    """Return (retryable, retry_after). Bad requests and auth errors are fatal."""
+    if isinstance(exc, CircuitOpenError):
+        return False, exc.retry_after
+    status = _status_code(exc)
+    if status is not None:
+        retryable = status in RETRYABLE_STATUS
+    else:
+        retryable = isinstance(exc, (TimeoutError, ConnectionError)) or any(
+            cls.__name__ in RETRYABLE_NAMES for cls in type(exc).__mro__
+        )
+    return retryable, retry_after_seconds(exc) if retryable else None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter; Retry-After wins when longer."""
+
+    def __init__(
+        self,
+        attempts: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        max_wait: Optional[float] = None,
+    ):
+        self.attempts = attempts or settings.LLM_RETRY_ATTEMPTS
+        self.base_delay = settings.LLM_RETRY_BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = settings.LLM_RETRY_MAX_DELAY if max_delay is None else max_delay
+        self.max_wait = settings.LLM_RETRY_MAX_WAIT if max_wait is None else max_wait
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """Seconds to wait before retry number `attempt` (1-based), None to give up."""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is None:
+            return backoff
+        if retry_after > self.max_wait:
+            return None
+        return max(retry_after, backoff)
+
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitBreaker:
+    """
+    Per-provider breaker. Opens after `failure_threshold` consecutive transient
+    failures; after `reset_timeout` one probe call is let through (half open)
+    and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+    ):
+        self.provider = provider
+        self.failure_threshold = failure_threshold or settings.LLM_BREAKER_FAILURES
+        self.reset_timeout = (
+            settings.LLM_BREAKER_RESET_SECONDS if reset_timeout is None else reset_timeout
+        )
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        registry.set_gauge("shakescript_llm_breaker_state", 0, provider=provider)
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        self.state = state
+        registry.set_gauge(
+            "shakescript_llm_breaker_state", BREAKER_STATES[state], provider=self.provider
+        )
+        registry.inc(
+            "shakescript_llm_breaker_transitions_total", provider=self.provider, state=state
+        )
+        print(f"LLM breaker for {self.provider} is now {state}")
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if self.retry_after() > 0:
+                    return False
+                self._transition("half_open")
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._transition("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            probe_failed = self.state == "half_open"
+            self._probing = False
+            if probe_failed or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition("open")
+
+
+def call_with_retry(
+    provider: str,
+    fn: Callable,
+    policy: RetryPolicy,
+    breaker: CircuitBreaker,
+    admission: Optional[Callable[[], ContextManager]] = None,
+):
+    """
+    Run fn(permit) with retries on transient errors, guarded by the provider's
+    breaker. Each attempt runs inside admission() (the LLM scheduler's slot),
+    whose value is the permit; the slot is not held while backing off.
+    """
+    admission = admission or nullcontext
+    attempt = 0
+    while True:
+        if breaker.state == "open" and breaker.retry_after() > 0:
+            # Fail fast without queueing for a slot first.
+            registry.inc("shakescript_llm_short_circuits_total", provider=provider)
+            raise CircuitOpenError(provider, breaker.retry_after())
+        with admission() as permit:
+            if not breaker.allow():
+                registry.inc("shakescript_llm_short_circuits_total", provider=provider)
+                raise CircuitOpenError(provider, breaker.retry_after())
+            try:
+                result = fn(permit)
+            except Exception as e:
+                retryable, retry_after = classify_error(e)
+                if not retryable:
+                    # The provider answered; the request itself was bad.
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                attempt += 1
+                delay = policy.delay(attempt, retry_after) if attempt < policy.attempts else None
+                if delay is None:
+                    raise
+                error = e
+            else:
+                breaker.record_success()
+                return result
+        registry.inc(
+            "shakescript_llm_retries_total", provider=provider, error=type(error).__name__
+        )
+        print(f"Retrying {provider} in {delay:.2f}s after {type(error).__name__}: {error}")
+        time.sleep(delay)
@@ -0,0 +1,367 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import registry, token_count
+from app.core.tracing import set_attribute
+from .resilienceAI import CircuitBreaker, RetryPolicy, call_with_retry
+from .schedulerAI import LLMQueueTimeout, attempt_slot
+
+
+class LLMResponse:
+    """Minimal generate_content result for providers that are not Gemini."""
+
+    __slots__ = ("text", "usage_metadata")
+
+    def __init__(self, text: str, total_tokens: Optional[int] = None):
+        self.text = text
+        self.usage_metadata = (
+            SimpleNamespace(total_token_count=total_tokens) if total_tokens else None
+        )
+
+
+class ModelProvider:
+    """Any object with generate_content (a GenerativeModel or a fake)."""
+
+    def __init__(self, model, name: str = "model"):
+        self.name = name
+        self._model = model
+
+    @property
+    def model(self):
+        return self._model
+
+    def generate_content(self, contents, *args, **kwargs):
+        return self.model.generate_content(contents, *args, **kwargs)
+
+
+class GeminiProvider(ModelProvider):
+    def __init__(self, model=None, model_name: str = "gemini-2.0-flash"):
+        super().__init__(model, "gemini")
+        self.model_name = model_name
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=settings.GEMINI_API_KEY)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+
+class OpenAIProvider:
+    """Chat completions behind the generate_content interface."""
+
+    def __init__(self, client=None, model_name: Optional[str] = None):
+        self.name = "openai"
+        self.model_name = model_name or settings.LLM_OPENAI_MODEL
+        self._client = client
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+
+                    self._client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        return self._client
+
+    def generate_content(self, contents, *args, **kwargs):
+        prompt = contents if isinstance(contents, str) else str(contents)
+        completion = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        usage = getattr(completion, "usage", None)
+        return LLMResponse(
+            completion.choices[0].message.content or "",
+            getattr(usage, "total_tokens", None),
+        )
+
+
+class FakeProvider:
+    """
+    Scriptable provider for benchmarks and drills. Every `slow_every`-th call
+    takes `slow_latency` instead of `latency`; every `fail_every`-th call
+    raises `error`. `script` lists per-call outcomes to play first (an
+    exception to raise, or None to answer). Responses come from `model` when
+    given, else `text`.
+    """
+
+    def __init__(
+        self,
+        name: str = "fake",
+        model=None,
+        text: str = "",
+        latency: float = 0.0,
+        slow_every: int = 0,
+        slow_latency: float = 0.0,
+        fail_every: int = 0,
+        error: type = RuntimeError,
+        script: Optional[List[Optional[Exception]]] = None,
+    ):
+        self.name = name
+        self.model = model
+        self.text = text
+        self.latency = latency
+        self.slow_every = slow_every
+        self.slow_latency = slow_latency
+        self.fail_every = fail_every
+        self.error = error
+        self.script = deque(script or [])
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+            scripted = self.script.popleft() if self.script else None
+        if scripted is not None:
+            raise scripted
+        slow = self.slow_every and n % self.slow_every == 0
+        delay = self.slow_latency if slow else self.latency
+        if delay:
+            time.sleep(delay)
+        if self.fail_every and n % self.fail_every == 0:
+            raise self.error(f"{self.name}: injected failure on call {n}")
+        if self.model is not None:
+            return self.model.generate_content(contents, *args, **kwargs)
+        return LLMResponse(self.text)
+
+
+class ProviderStats:
+    """Rolling latency window plus call/error/hedge counters for one provider."""
+
+    def __init__(self, window: int = 256):
+        self._lock = threading.Lock()
+        self.latencies: deque = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.hedges_won = 0
+
+    def observe(self, ms: float, ok: bool):
+        with self._lock:
+            self.calls += 1
+            if ok:
+                self.latencies.append(ms)
+            else:
+                self.errors += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, max(0, round(p / 100 * len(samples)) - 1))
+        return samples[rank]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "hedges_won": self.hedges_won,
+            "samples": len(self.latencies),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+        }
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    # Created on first hedged call so nothing is started before gunicorn forks.
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.LLM_ROUTER_MAX_WORKERS,
+                    thread_name_prefix="llm-router",
+                )
+    return _executor
+
+
+class LLMRouter:
+    """
+    Stands in for the GenerativeModel: generate_content tries the providers in
+    order, failing over on errors. Each provider call is retried on transient
+    errors and guarded by that provider's circuit breaker, so an open breaker
+    fails over (or fails fast) without waiting. With hedging on, if the
+    current attempt is slower than its provider's `hedge_percentile` latency
+    a backup request goes to the next provider (or the same one when there is
+    only one) and the first successful response wins; the loser finishes in
+    the background. Under a ScheduledModel every provider attempt takes its
+    own scheduler slot (`admits_attempts`); running out of LLM capacity is not
+    a provider failure, so it is raised without failing over.
+    """
+
+    admits_attempts = True
+
+    def __init__(
+        self,
+        providers: List[Any],
+        hedge: Optional[bool] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: Optional[int] = None,
+        hedge_default_delay_ms: Optional[float] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breakers: Optional[Dict[str, CircuitBreaker]] = None,
+    ):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = providers
+        self.hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+        self.hedge_percentile = hedge_percentile or settings.LLM_HEDGE_PERCENTILE
+        self.hedge_min_samples = (
+            settings.LLM_HEDGE_MIN_SAMPLES if hedge_min_samples is None else hedge_min_samples
+        )
+        self.hedge_default_delay_ms = (
+            hedge_default_delay_ms or settings.LLM_HEDGE_DEFAULT_DELAY_MS
+        )
+        self.provider_stats = {p.name: ProviderStats() for p in providers}
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breakers = breakers or {p.name: CircuitBreaker(p.name) for p in providers}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {**s.snapshot(), "breaker": self.breakers[name].state}
+            for name, s in self.provider_stats.items()
+        }
+
+    def hedge_delay_ms(self, provider) -> float:
+        stats = self.provider_stats[provider.name]
+        if len(stats.latencies) < self.hedge_min_samples:
+            return self.hedge_default_delay_ms
+        return stats.percentile(self.hedge_percentile)
+
+    def _call(self, provider, contents, args, kwargs):
+        return call_with_retry(
+            provider.name,
+            lambda permit: self._attempt(provider, contents, args, kwargs, permit),
+            self.retry_policy,
+            self.breakers[provider.name],
+            lambda: attempt_slot(contents),
+        )
+
+    def _attempt(self, provider, contents, args, kwargs, permit=None):
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = provider.generate_content(contents, *args, **kwargs)
+            ok = True
+            if permit is not None:
+                prompt = contents if isinstance(contents, str) else str(contents)
+                permit.actual_tokens = token_count(prompt, response)
+            return response
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            self.provider_stats[provider.name].observe(ms, ok)
+            registry.observe(
+                "shakescript_llm_provider_duration_seconds",
+                ms / 1000,
+                provider=provider.name,
+                outcome="ok" if ok else "error",
+            )
+
+    def generate_content(self, contents, *args, **kwargs):
+        if self.hedge:
+            return self._hedged(contents, args, kwargs)
+        last_error = None
+        for index, provider in enumerate(self.providers):
+            if index:
+                registry.inc("shakescript_llm_failovers_total", provider=provider.name)
+            try:
+                response = self._call(provider, contents, args, kwargs)
+            except LLMQueueTimeout:
+                raise
+            except Exception as e:
+                print(f"LLM provider {provider.name} failed: {e}")
+                last_error = e
+                continue
+            set_attribute("llm.provider", provider.name)
+            return response
+        raise last_error
+
+    def _hedged(self, contents, args, kwargs):
+        # One extra attempt on the same provider when it is the only one.
+        order = self.providers if len(self.providers) > 1 else self.providers * 2
+        attempts = iter(order)
+        pending: Dict[Any, Any] = {}
+        hedged = set()
+
+        def launch(provider, hedge=False):
+            ctx = contextvars.copy_context()
+            future = _pool().submit(ctx.run, self._call, provider, contents, args, kwargs)
+            pending[future] = provider
+            if hedge:
+                hedged.add(future)
+                registry.inc("shakescript_llm_hedges_total", provider=provider.name)
+            return time.perf_counter() + self.hedge_delay_ms(provider) / 1000
+
+        deadline = launch(next(attempts))
+        last_error = None
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                backup = next(attempts, None)
+                deadline = None
+                if backup is not None:
+                    launch(backup, hedge=True)
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    print(f"LLM provider {provider.name} failed: {e}")
+                    last_error = e
+                    if isinstance(e, LLMQueueTimeout):
+                        # Capacity is shared by every provider; wait on the
+                        # attempt still in flight, if any, but do not fail over.
+                        if not pending:
+                            raise
+                        continue
+                    if not pending:
+                        failover = next(attempts, None)
+                        if failover is not None:
+                            registry.inc(
+                                "shakescript_llm_failovers_total", provider=failover.name
+                            )
+                            deadline = launch(failover)
+                    continue
+                if future in hedged:
+                    self.provider_stats[provider.name].hedges_won += 1
+                    registry.inc("shakescript_llm_hedges_won_total", provider=provider.name)
+                set_attribute("llm.provider", provider.name)
+                set_attribute("llm.hedged", bool(hedged))
+                return response
+        raise last_error
+
+
+def build_router() -> LLMRouter:
+    """Router over settings.LLM_PROVIDERS, in failover order."""
+    builders = {"gemini": GeminiProvider, "openai": OpenAIProvider}
+    providers = []
+    for name in settings.LLM_PROVIDERS.split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in builders:
+            raise ValueError(f"Unknown LLM provider: {name}")
+        providers.append(builders[name]())
+    return LLMRouter(providers)
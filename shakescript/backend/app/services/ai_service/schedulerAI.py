@@ -0,0 +1,465 @@
+import fcntl
+import heapq
+import itertools
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import record, registry, token_count
+from .resilienceAI import LLMUnavailableError
+
+ANONYMOUS = "anonymous"
+
+
+class LLMQueueTimeout(LLMUnavailableError):
+    """Waited longer than LLM_QUEUE_MAX_WAIT for a slot or token budget."""
+
+    def __init__(self, waited: float):
+        super().__init__(
+            f"LLM capacity exhausted after waiting {waited:.1f}s", retry_after=5.0
+        )
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Prompt tokens (~4 chars/token) plus the expected response length."""
+    return len(prompt) // 4 + settings.LLM_EXPECTED_OUTPUT_TOKENS
+
+
+class FileSemaphore:
+    """
+    Cross-process semaphore: one lock file per slot, held with flock. The
+    kernel drops the lock if a worker dies, so slots never leak. File
+    descriptors are opened per process (after fork).
+    """
+
+    def __init__(self, directory: str, slots: int):
+        self.directory = directory
+        self.slots = slots
+        self._pid = None
+        self._fds: List[int] = []
+        self._held = set()
+
+    def _open(self):
+        if self._pid == os.getpid():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._fds = [
+            os.open(os.path.join(self.directory, f"slot-{i}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+            for i in range(self.slots)
+        ]
+        self._held = set()
+        self._pid = os.getpid()
+
+    def try_acquire(self) -> Optional[int]:
+        """Return a slot index, or None if all are taken. Caller serialises."""
+        self._open()
+        for index, fd in enumerate(self._fds):
+            if index in self._held:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            self._held.add(index)
+            return index
+        return None
+
+    def release(self, index: int):
+        fcntl.flock(self._fds[index], fcntl.LOCK_UN)
+        self._held.discard(index)
+
+    def in_use(self) -> int:
+        return len(self._held)
+
+
+class SharedTokenBucket:
+    """
+    Tokens-per-minute and requests-per-minute budget shared by every worker
+    on the host. State (tokens, requests, updated_at) lives in one small file
+    and is updated under flock. A rate of 0 disables that budget. The bucket
+    holds `burst_seconds` worth of budget (60 = a full minute up front).
+    """
+
+    _STATE = struct.Struct("ddd")
+
+    def __init__(
+        self,
+        path: str,
+        tokens_per_minute: int,
+        requests_per_minute: int,
+        burst_seconds: float = 60.0,
+    ):
+        self.path = path
+        self.tpm = tokens_per_minute
+        self.rpm = requests_per_minute
+        self.token_capacity = tokens_per_minute * burst_seconds / 60
+        self.request_capacity = max(1.0, requests_per_minute * burst_seconds / 60)
+        self._pid = None
+        self._fd = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.tpm or self.rpm)
+
+    @contextmanager
+    def _state(self):
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            raw = os.pread(self._fd, self._STATE.size, 0)
+            now = time.time()
+            if len(raw) == self._STATE.size:
+                tokens, requests, updated = self._STATE.unpack(raw)
+                elapsed = max(0.0, now - updated)
+                tokens = min(self.token_capacity, tokens + elapsed * self.tpm / 60)
+                requests = min(self.request_capacity, requests + elapsed * self.rpm / 60)
+            else:
+                tokens, requests = self.token_capacity, self.request_capacity
+            state = [tokens, requests]
+            yield state
+            os.pwrite(self._fd, self._STATE.pack(state[0], state[1], now), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def take(self, tokens: int) -> float:
+        """Spend `tokens` and one request; return 0, or seconds until affordable."""
+        if not self.enabled:
+            return 0.0
+        tokens = min(tokens, self.token_capacity) if self.tpm else 0
+        with self._state() as state:
+            wait = 0.0
+            if self.tpm and state[0] < tokens:
+                wait = (tokens - state[0]) * 60 / self.tpm
+            if self.rpm and state[1] < 1:
+                wait = max(wait, (1 - state[1]) * 60 / self.rpm)
+            if wait == 0.0:
+                state[0] -= tokens
+                state[1] -= 1 if self.rpm else 0
+            return wait
+
+    def adjust(self, tokens: int):
+        """Correct the estimate once real usage is known (may go into debt)."""
+        if not self.tpm or not tokens:
+            return
+        with self._state() as state:
+            state[0] = min(self.token_capacity, state[0] - tokens)
+
+
+def parse_tier_map(spec: str) -> Dict[str, float]:
+    """'premium:4,free:1' -> {'premium': 4.0, 'free': 1.0}"""
+    result = {}
+    for part in spec.split(","):
+        if ":" in part:
+            name, value = part.split(":", 1)
+            result[name.strip()] = float(value)
+    return result
+
+
+class _Waiter:
+    __slots__ = ("auth_id", "tier", "cost", "tag", "seq", "enqueued", "cancelled")
+
+    def __init__(self, auth_id: str, tier: str, cost: int, tag: float, seq: int):
+        self.auth_id = auth_id
+        self.tier = tier
+        self.cost = cost
+        self.tag = tag
+        self.seq = seq
+        self.enqueued = time.perf_counter()
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.tag, self.seq) < (other.tag, other.seq)
+
+
+class _Lane:
+    """One tier's waiters, fair-queued by auth_id (start-time fair queueing)."""
+
+    def __init__(self, name: str, weight: float):
+        self.name = name
+        self.weight = weight
+        self.queue: List[_Waiter] = []
+        self.waiting = 0
+        self.vtime = 0.0
+        self.finish: Dict[str, float] = {}
+        # Stride-scheduling position of the lane; advances by cost / weight.
+        self.pass_value = 0.0
+
+    def head(self) -> Optional[_Waiter]:
+        while self.queue and self.queue[0].cancelled:
+            heapq.heappop(self.queue)
+        return self.queue[0] if self.queue else None
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM calls. A call needs a cross-process slot
+    (FileSemaphore) and token budget (SharedTokenBucket); while it waits it is
+    queued in this worker in its tier's lane. Lanes share capacity by weight
+    (stride scheduling over estimated tokens), and inside a lane users are
+    served by start-time fair queueing, so one user's burst of long prompts
+    cannot starve the others. A lane head that has waited longer than
+    `aging_seconds` goes next regardless of weight (starvation protection).
+    """
+
+    def __init__(
+        self,
+        slots: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        burst_seconds: Optional[float] = None,
+        lock_dir: Optional[str] = None,
+        max_wait: Optional[float] = None,
+        poll_interval: float = 0.05,
+        tier_weights: Optional[Dict[str, float]] = None,
+        tier_max_queue: Optional[Dict[str, float]] = None,
+        aging_seconds: Optional[float] = None,
+    ):
+        lock_dir = lock_dir or settings.LLM_LOCK_DIR or os.path.join(
+            tempfile.gettempdir(), "shakescript-llm"
+        )
+        self.semaphore = FileSemaphore(
+            lock_dir, settings.LLM_MAX_CONCURRENCY if slots is None else slots
+        )
+        self.bucket = SharedTokenBucket(
+            os.path.join(lock_dir, "budget.state"),
+            settings.LLM_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute,
+            settings.LLM_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute,
+            settings.LLM_BUDGET_BURST_SECONDS if burst_seconds is None else burst_seconds,
+        )
+        self.max_wait = settings.LLM_QUEUE_MAX_WAIT if max_wait is None else max_wait
+        self.poll_interval = poll_interval
+        self.tier_weights = (
+            parse_tier_map(settings.LLM_TIER_WEIGHTS) if tier_weights is None else tier_weights
+        )
+        self.tier_max_queue = (
+            parse_tier_map(settings.LLM_TIER_MAX_QUEUE) if tier_max_queue is None else tier_max_queue
+        )
+        self.aging_seconds = (
+            settings.LLM_PRIORITY_AGING_SECONDS if aging_seconds is None else aging_seconds
+        )
+        self._cond = threading.Condition()
+        self._lanes: Dict[str, _Lane] = {}
+        self._seq = itertools.count()
+        self._waiting = 0
+
+    def queue_depth(self, tier: Optional[str] = None) -> int:
+        if tier is None:
+            return self._waiting
+        lane = self._lanes.get(tier)
+        return lane.waiting if lane else 0
+
+    def admit(self, tier: str):
+        """
+        Admission for an expensive request: shed it with a 503 when its tier's
+        queue in this worker is already longer than LLM_TIER_MAX_QUEUE.
+        """
+        limit = self.tier_max_queue.get(tier)
+        if limit and self.queue_depth(tier) >= limit:
+            registry.inc("shakescript_llm_admission_rejected_total", tier=tier)
+            raise LLMUnavailableError(
+                f"Generation capacity is saturated for {tier} users", retry_after=10.0
+            )
+
+    def _lane(self, tier: str) -> _Lane:
+        lane = self._lanes.get(tier)
+        if lane is None:
+            lane = self._lanes[tier] = _Lane(tier, self.tier_weights.get(tier, 1.0))
+        return lane
+
+    def _enqueue(self, auth_id: str, tier: str, cost: int) -> _Waiter:
+        lane = self._lane(tier)
+        if not lane.waiting:
+            # A lane coming back from idle does not get credit for the idle time.
+            active = [l.pass_value for l in self._lanes.values() if l.waiting]
+            if active:
+                lane.pass_value = max(lane.pass_value, min(active))
+        start = max(lane.vtime, lane.finish.get(auth_id, 0.0))
+        lane.finish[auth_id] = start + cost
+        waiter = _Waiter(auth_id, tier, cost, start, next(self._seq))
+        heapq.heappush(lane.queue, waiter)
+        lane.waiting += 1
+        self._waiting += 1
+        registry.set_gauge("shakescript_llm_queue_depth", lane.waiting, tier=tier)
+        return waiter
+
+    def _dequeue(self, waiter: _Waiter):
+        lane = self._lanes[waiter.tier]
+        if lane.queue and lane.queue[0] is waiter:
+            heapq.heappop(lane.queue)
+        else:
+            waiter.cancelled = True
+        lane.head()
+        lane.waiting -= 1
+        self._waiting -= 1
+        registry.set_gauge("shakescript_llm_queue_depth", lane.waiting, tier=lane.name)
+        if not lane.waiting:
+            # Idle: forget per-user clocks so they do not grow without bound.
+            lane.vtime = 0.0
+            lane.finish.clear()
+
+    def _next(self) -> Optional[_Waiter]:
+        """The waiter allowed to try for a slot next."""
+        heads = [head for head in (lane.head() for lane in self._lanes.values()) if head]
+        if not heads:
+            return None
+        now = time.perf_counter()
+        aged = [h for h in heads if now - h.enqueued >= self.aging_seconds]
+        if aged:
+            return min(aged, key=lambda h: h.enqueued)
+        return min(heads, key=lambda h: (self._lanes[h.tier].pass_value, h.seq))
+
+    def _try_admit(self, cost: int) -> Optional[int]:
+        slot = self.semaphore.try_acquire()
+        if slot is None:
+            return None
+        if self.bucket.take(cost) > 0:
+            self.semaphore.release(slot)
+            return None
+        return slot
+
+    @contextmanager
+    def slot(self, auth_id: Optional[str], prompt: str, tier: Optional[str] = None):
+        """Hold one admission for an LLM call; yields a Permit."""
+        auth_id = auth_id or ANONYMOUS
+        tier = tier or settings.LLM_DEFAULT_TIER
+        cost = estimate_tokens(prompt)
+        started = time.perf_counter()
+        with self._cond:
+            waiter = self._enqueue(auth_id, tier, cost)
+            try:
+                while True:
+                    if self._next() is waiter:
+                        slot = self._try_admit(cost)
+                        if slot is not None:
+                            break
+                    waited = time.perf_counter() - started
+                    if waited >= self.max_wait:
+                        registry.inc("shakescript_llm_queue_timeouts_total", tier=tier)
+                        raise LLMQueueTimeout(waited)
+                    # Slots freed by other workers are not signalled; poll.
+                    self._cond.wait(min(self.poll_interval, self.max_wait - waited))
+            except BaseException:
+                self._dequeue(waiter)
+                self._cond.notify_all()
+                raise
+            lane = self._lanes[tier]
+            lane.vtime = waiter.tag
+            lane.pass_value += cost / lane.weight
+            self._dequeue(waiter)
+            self._cond.notify_all()
+
+        wait_ms = (time.perf_counter() - started) * 1000
+        record("llm_queue", wait_ms)
+        registry.observe("shakescript_llm_queue_wait_seconds", wait_ms / 1000, tier=tier)
+        permit = Permit(self, cost)
+        try:
+            yield permit
+        finally:
+            with self._cond:
+                self.semaphore.release(slot)
+                self._cond.notify_all()
+            if permit.actual_tokens is not None:
+                self.bucket.adjust(permit.actual_tokens - cost)
+
+
+class Permit:
+    __slots__ = ("scheduler", "estimated_tokens", "actual_tokens")
+
+    def __init__(self, scheduler: LLMScheduler, estimated_tokens: int):
+        self.scheduler = scheduler
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
+
+
+class _Caller:
+    __slots__ = ("scheduler", "auth_id", "tier")
+
+    def __init__(self, scheduler: LLMScheduler, auth_id: Optional[str], tier: Optional[str]):
+        self.scheduler = scheduler
+        self.auth_id = auth_id
+        self.tier = tier
+
+
+# Set by ScheduledModel around a call to a model that admits each provider
+# attempt itself (LLMRouter); read by attempt_slot.
+_caller: ContextVar[Optional[_Caller]] = ContextVar("llm_caller", default=None)
+
+
+@contextmanager
+def attempt_slot(contents):
+    """
+    Scheduler admission for one request sent to a provider, on behalf of the
+    ScheduledModel call in progress; yields its Permit, or None outside one.
+    """
+    caller = _caller.get()
+    if caller is None:
+        yield None
+        return
+    prompt = contents if isinstance(contents, str) else str(contents)
+    with caller.scheduler.slot(caller.auth_id, prompt, caller.tier) as permit:
+        yield permit
+
+
+class ScheduledModel:
+    """
+    Model proxy that takes a scheduler slot for each generate_content call.
+    A model with `admits_attempts` (LLMRouter) is called without one and takes
+    a slot per provider attempt instead, so retries, hedges and failovers each
+    hold their own slot and are charged their own tokens.
+    """
+
+    def __init__(
+        self,
+        model,
+        auth_id: Optional[str] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        tier: Optional[str] = None,
+    ):
+        self._model = model
+        self.auth_id = auth_id
+        self.tier = tier
+        self._scheduler = scheduler
+
+    def generate_content(self, contents, *args, **kwargs):
+        scheduler = self._scheduler or llm_scheduler()
+        if getattr(self._model, "admits_attempts", False):
+            token = _caller.set(_Caller(scheduler, self.auth_id, self.tier))
+            try:
+                return self._model.generate_content(contents, *args, **kwargs)
+            finally:
+                _caller.reset(token)
+        prompt = contents if isinstance(contents, str) else str(contents)
+        with scheduler.slot(self.auth_id, prompt, self.tier) as permit:
+            response = self._model.generate_content(contents, *args, **kwargs)
+            permit.actual_tokens = token_count(prompt, response)
+            return response
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+def schedule_model(model, auth_id: Optional[str] = None, tier: Optional[str] = None):
+    if not settings.LLM_SCHEDULER_ENABLED or isinstance(model, ScheduledModel):
+        return model
+    return ScheduledModel(model, auth_id, tier=tier)
@@ -1,5 +1,6 @@
 from typing import Dict, Any
 import json, re
+from app.utils.json_repair import extract_episode
 
 class AIUtils:
     def __init__(self) -> None:
@@ -51,49 +52,7 @@ class AIUtils:
     def _parse_episode_response(
         self, response_text: str, metadata: Dict[str, Any]
     ) -> Dict[str, Any]:
-        try:
-            return json.loads(response_text)
-        except json.JSONDecodeError:
-            json_pattern = r"```(?:json)?\s*\n(.*?)\n```"
-            matches = re.findall(json_pattern, response_text, re.DOTALL)
-            if matches:
-                try:
-                    return json.loads(matches[0])
-                except:
-                    cleaned_text = matches[0].replace("'", '"')
-                    try:
-                        return json.loads(cleaned_text)
-                    except:
-                        pass
-            json_pattern2 = r'{[\s\S]*"episode_title"[\s\S]*"episode_content"[\s\S]*}'
-            match = re.search(json_pattern2, response_text)
-            if match:
-                try:
-                    cleaned_json = match.group(0).replace("'", '"')
-                    return json.loads(cleaned_json)
-                except:
-                    pass
-            title_match = re.search(r'"episode_title":\s*"([^"]+)"', response_text)
-            content_match = re.search(
-                r'"episode_content":\s*"([^"]*(?:(?:"[^"]*)*[^"])*)"', response_text
-            )
-            summary_match = re.search(r'"episode_summary":\s*"([^"]+)"', response_text)
-            episode_title = (
-                title_match.group(1)
-                if title_match
-                else f"Episode {metadata.get('current_episode', 1)}"
-            )
-            episode_content = content_match.group(1) if content_match else response_text
-            episode_summary = (
-                summary_match.group(1)
-                if summary_match
-                else "Episode summary not available."
-            )
-            return {
-                "episode_title": episode_title,
-                "episode_content": episode_content,
-                "episode_summary": episode_summary,
-            }
+        return extract_episode(response_text, metadata, include_summary=True)
 
     def _parse_and_clean_response(
         self, raw_text: str, metadata: Dict[str, Any]
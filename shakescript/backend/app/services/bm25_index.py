@@ -0,0 +1,204 @@
+"""
+In-process BM25 indexes over chunk text, one per story, for hybrid retrieval.
+
+A story's index is built from its chunks on first use, then kept up to date
+as EmbeddingService stores chunks in this process. Chunks written by
+another process are picked up once the story's index is dropped (drafting
+does so after waiting for the embedding queue). The least recently used
+stories are evicted beyond BM25_MAX_STORIES.
+"""
+
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from app.core.config import settings
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have he her his i in is it its "
+    "of on or she that the their them they this to was were will with you".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[List[Dict[str, Any]]], k: int = 60, key: str = "id"
+) -> List[Dict[str, Any]]:
+    """
+    Merge ranked lists by sum(1 / (k + rank)). The first occurrence of each
+    item is kept, with the fused score under "rrf_score".
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            entry = fused.setdefault(item[key], {**item, "rrf_score": 0.0})
+            entry["rrf_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda item: item["rrf_score"], reverse=True)
+
+
+class BM25Index:
+    """Okapi BM25 over one story's chunks, updated per episode."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[Any, Tuple[Dict[str, Any], Counter, int]] = {}
+        self.postings: Dict[str, Dict[Any, int]] = {}
+        self.by_episode: Dict[Any, List[Any]] = {}
+        self.total_length = 0
+        self.entities: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def _add(self, chunk: Dict[str, Any]) -> None:
+        terms = Counter(tokenize(chunk.get("content") or ""))
+        length = sum(terms.values())
+        meta = {
+            field: chunk.get(field)
+            for field in ("id", "episode_id", "episode_number", "chunk_number", "content")
+        }
+        meta["importance_score"] = chunk.get("importance_score") or 0
+        self.docs[chunk["id"]] = (meta, terms, length)
+        self.by_episode.setdefault(chunk.get("episode_id"), []).append(chunk["id"])
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[chunk["id"]] = tf
+        characters = chunk.get("characters") or []
+        self._add_entities([characters] if isinstance(characters, str) else characters)
+
+    def _remove_episode(self, episode_id: Any) -> None:
+        for doc_id in self.by_episode.pop(episode_id, []):
+            _, terms, length = self.docs.pop(doc_id)
+            self.total_length -= length
+            for term in terms:
+                posting = self.postings[term]
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def _add_entities(self, names: Iterable[str]) -> None:
+        for name in names:
+            for term in tokenize(name or ""):
+                self.entities[term] = self.entities.get(term, 0) + 1
+
+    def add_entities(self, names: Iterable[str]) -> None:
+        """Names (places, artefacts) that count as entities besides the characters."""
+        with self.lock:
+            self._add_entities(names)
+
+    def replace_episodes(self, episode_ids: Iterable[Any], chunks: List[Dict[str, Any]]) -> None:
+        """Swap in the freshly stored chunks of these episodes."""
+        with self.lock:
+            for episode_id in episode_ids:
+                self._remove_episode(episode_id)
+            for chunk in chunks:
+                self._add(chunk)
+
+    def entity_share(self, query: str) -> float:
+        """Fraction of the query's terms that are known entity names."""
+        terms = tokenize(query)
+        if not terms:
+            return 0.0
+        return sum(term in self.entities for term in terms) / len(terms)
+
+    def search(self, query: str, k: int, entity_boost: float = 1.0) -> List[Dict[str, Any]]:
+        """Top-k chunks; query terms that are entity names weigh `entity_boost` times more."""
+        with self.lock:
+            n = len(self.docs)
+            if not n:
+                return []
+            avgdl = self.total_length / n or 1.0
+            scores: Dict[Any, float] = {}
+            for term, qtf in Counter(tokenize(query)).items():
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                if term in self.entities:
+                    idf *= entity_boost
+                for doc_id, tf in posting.items():
+                    length = self.docs[doc_id][2]
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + qtf * idf * tf * (self.k1 + 1) / norm
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [{**self.docs[doc_id][0], "bm25_score": score} for doc_id, score in best]
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+
+class BM25Indexes:
+    """Per-story indexes, built on first use and LRU-evicted."""
+
+    def __init__(self, max_stories: int):
+        self.max_stories = max_stories
+        self._indexes: "OrderedDict[int, BM25Index]" = OrderedDict()
+        # Writes seen while a story's index is being built, and how many builds
+        # are in flight: a build that overlapped a write is used for its own
+        # query but not kept.
+        self._epochs: Dict[int, int] = {}
+        self._builds: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, story_id: int, loader: Callable[[], Tuple[List[Dict[str, Any]], List[str]]]) -> BM25Index:
+        """The story's index; `loader` returns (chunks, extra entity names)."""
+        with self._lock:
+            index = self._indexes.get(story_id)
+            if index is not None:
+                self._indexes.move_to_end(story_id)
+                return index
+            epoch = self._epochs.setdefault(story_id, 0)
+            self._builds[story_id] = self._builds.get(story_id, 0) + 1
+        try:
+            chunks, entities = loader()
+            index = BM25Index()
+            index.replace_episodes([], chunks)
+            index.add_entities(entities)
+        except Exception:
+            self._finish_build(story_id)
+            raise
+        self._finish_build(story_id, index, epoch)
+        return index
+
+    def _finish_build(self, story_id: int, index: Optional[BM25Index] = None, epoch: int = 0) -> None:
+        with self._lock:
+            if index is not None and self._epochs[story_id] == epoch and story_id not in self._indexes:
+                self._indexes[story_id] = index
+                while len(self._indexes) > self.max_stories:
+                    self._indexes.popitem(last=False)
+            self._builds[story_id] -= 1
+            if not self._builds[story_id]:
+                del self._builds[story_id]
+                del self._epochs[story_id]
+
+    def peek(self, story_id: int) -> Optional[BM25Index]:
+        with self._lock:
+            return self._indexes.get(story_id)
+
+    def replace_episodes(self, story_id: int, episode_ids: List[Any], chunks: List[Dict[str, Any]]) -> None:
+        """Apply a chunk write; stories that are not indexed here are skipped."""
+        with self._lock:
+            if story_id in self._epochs:
+                self._epochs[story_id] += 1
+            index = self._indexes.get(story_id)
+        if index is not None:
+            index.replace_episodes(episode_ids, chunks)
+
+    def drop(self, story_id: int) -> None:
+        with self._lock:
+            if story_id in self._epochs:
+                self._epochs[story_id] += 1
+            self._indexes.pop(story_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            for story_id in self._epochs:
+                self._epochs[story_id] += 1
+            self._indexes.clear()
+
+
+indexes = BM25Indexes(settings.BM25_MAX_STORIES)
@@ -1,11 +1,13 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from app.models.schemas import Feedback, StoryListItem
 from app.services.db_service import DBService
 from app.services.ai_service import AIService
 from app.services.embedding_service import EmbeddingService
 from app.services.core_service import (
     ai_refinement_core,
+    export_core,
     human_refinement_core,
+    lease_core,
     utils_core,
     story_generator_core,
 )
@@ -16,11 +18,26 @@ from supabase import Client
 
 
 class StoryService:
-    def __init__(self, client: Client):
-        self.ai_service = AIService(client)
+    def __init__(
+        self,
+        client: Client,
+        ai_service: Optional[AIService] = None,
+        embedding_service: Optional[EmbeddingService] = None,
+        auth_id: Optional[str] = None,
+        tier: Optional[str] = None,
+    ):
+        # One EmbeddingService is shared with the AIService; both can be
+        # injected (benchmarks pass fakes that never leave the process).
+        self.embedding_service = embedding_service or EmbeddingService(client)
+        # auth_id and tier pick the LLM scheduler's lane and fair-queue flow.
+        self.ai_service = ai_service or AIService(
+            client,
+            embedding_service=self.embedding_service,
+            auth_id=auth_id,
+            tier=tier,
+        )
         self.db_service = DBService(client)
-        self.embedding_service = EmbeddingService(client)
-        self.client = client  
+        self.client = client
         self.DEFAULT_BATCH_SIZE = 2
 
     async def create_story(
@@ -38,8 +55,55 @@ class StoryService:
     def get_story_info(self, story_id: int, auth_id: str) -> Dict[str, Any]:
         return utils_core.get_story_info(self, story_id, auth_id)
 
-    def get_all_stories(self, auth_id: str) -> List[StoryListItem]:
-        return utils_core.get_all_stories(self, auth_id)
+    def get_story_page(
+        self,
+        story_id: int,
+        auth_id: str,
+        episode_cursor: int = 0,
+        episode_limit: int = 10,
+        include_content: bool = True,
+    ) -> Dict[str, Any]:
+        return utils_core.get_story_page(
+            self, story_id, auth_id, episode_cursor, episode_limit, include_content
+        )
+
+    def get_story_version(self, story_id: int, auth_id: str) -> Optional[int]:
+        return self.db_service.get_story_version(story_id, auth_id)
+
+    def story_exists(self, story_id: int, auth_id: str) -> bool:
+        return self.db_service.story_exists(story_id, auth_id)
+
+    def story_lease(
+        self, story_id: int, auth_id: str, expected_version: Optional[int] = None
+    ):
+        return lease_core.story_lease(self, story_id, auth_id, expected_version)
+
+    def get_episodes_page(
+        self,
+        story_id: int,
+        auth_id: str,
+        cursor: int = 0,
+        limit: int = 10,
+        include_content: bool = True,
+    ) -> Dict[str, Any]:
+        return utils_core.get_episodes_page(
+            self, story_id, auth_id, cursor, limit, include_content
+        )
+
+    def get_episode(
+        self, story_id: int, episode_number: int, auth_id: str
+    ) -> Optional[Dict[str, Any]]:
+        return utils_core.get_episode(self, story_id, episode_number, auth_id)
+
+    def export_story(
+        self, story_id: int, auth_id: str, export_format: str
+    ) -> Dict[str, Any]:
+        return export_core.export_story(self, story_id, auth_id, export_format)
+
+    def get_all_stories(
+        self, auth_id: str, after: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[StoryListItem]:
+        return utils_core.get_all_stories(self, auth_id, after, limit)
 
     def generate_multiple_episodes(
         self,
@@ -53,11 +117,16 @@ class StoryService:
             self, story_id, start_episode, num_episodes, hinglish, auth_id
         )
 
+    def wait_for_embeddings(
+        self, story_id: int, auth_id: str, timeout: Optional[float] = None
+    ) -> bool:
+        return utils_core.wait_for_embeddings(self, story_id, auth_id, timeout)
+
     def update_story_summary(self, story_id: int, auth_id: str) -> Dict[str, Any]:
         return utils_core.update_story_summary(self, story_id, auth_id)
 
     def store_validated_episodes(
-            self, story_id: int, episodes: List[Dict[str, Any]], total_episodes: int, auth_id: str, background_tasks
+            self, story_id: int, episodes: List[Dict[str, Any]], total_episodes: int, auth_id: str, background_tasks=None
     ) -> None:
         return utils_core.store_validated_episodes(self, story_id, episodes, total_episodes, auth_id, background_tasks)
 
@@ -80,6 +149,9 @@ class StoryService:
             story_id, episodes, auth_id
         )
 
+    def get_all_episodes(self, story_id: int, auth_id: str) -> List[Dict]:
+        return self.db_service.get_all_episodes(story_id, auth_id)
+
     def get_refined_episodes(self, story_id: int, auth_id: str) -> List[Dict]:
         return self.db_service.get_refined_episodes(story_id, auth_id)
 
@@ -126,5 +198,7 @@ class StoryService:
             auth_id,
         )
 
-    def set_story_completed(self, story_id: int, completed: bool = True):
-        return self.db_service.set_story_completed(story_id, completed)
+    def set_story_completed(
+        self, story_id: int, completed: bool = True, auth_id: str = None
+    ):
+        return self.db_service.set_story_completed(story_id, completed, auth_id)
@@ -1,3 +1,7 @@
+from app.core.tracing import span, traced
+
+
+@traced("story.refine_batch_by_ai", "story_id", "current_episode", "batch_size")
 def refine_batch_by_ai(
     self,
     story_id,
@@ -15,6 +19,21 @@ def refine_batch_by_ai(
     attempt = 0
     validation_result = {}
 
+    # generate_and_refine_batch does not pass metadata; derive it from the story
+    if metadata is None:
+        metadata = {
+            "title": story_data["title"],
+            "setting": story_data["setting"],
+            "key_events": story_data.get("key_events", []),
+            "special_instructions": story_data.get("special_instructions", ""),
+            "story_outline": story_data.get("story_outline", []),
+            "current_episode": current_episode,
+            "num_episodes": story_data.get("num_episodes", 0),
+            "story_id": story_id,
+            "characters": story_data.get("characters", {}),
+            "hinglish": hinglish,
+        }
+
     # Fetch last 2 episodes before current batch if no previous episodes provided
     if not prev_episodes and current_episode > 1:
         prev_batch_end = current_episode - 1
@@ -33,23 +52,27 @@ def refine_batch_by_ai(
 
     # Validate and refine batch up to max_attempts
     while attempt < max_attempts:
-        validation_result = self.ai_service.validate_batch(
-            story_id, episodes, prev_episodes, metadata, auth_id
-        )
-        if validation_result.get("status") == "success":
-            print(f"Batch validated successfully on attempt {attempt+1}")
-            break
-
-        print(f"Batch needs refinement - attempt {attempt+1}")
-        if validation_result.get("feedback"):
-            print(f"Feedback: {validation_result.get('feedback')}")
-            episodes = self.ai_service.regenerate_batch(
-                story_id,
-                validation_result["episodes"],
-                prev_episodes,
-                metadata,
-                validation_result.get("feedback", []),
+        with span("ai.refinement_attempt", story_id=story_id, attempt=attempt + 1) as current:
+            validation_result = self.ai_service.validate_batch(
+                story_id, episodes, prev_episodes, metadata, auth_id
             )
+            current.set_attribute("status", validation_result.get("status"))
+            if validation_result.get("status") == "success":
+                print(f"Batch validated successfully on attempt {attempt+1}")
+                break
+
+            print(f"Batch needs refinement - attempt {attempt+1}")
+            if validation_result.get("feedback"):
+                print(f"Feedback: {validation_result.get('feedback')}")
+                current.set_attribute("feedback_items", len(validation_result["feedback"]))
+                episodes = self.ai_service.regenerate_batch(
+                    story_id,
+                    validation_result["episodes"],
+                    prev_episodes,
+                    metadata,
+                    validation_result.get("feedback", []),
+                    auth_id,
+                )
         attempt += 1
 
     # Proceed even if refinement failed after max attempts
@@ -60,9 +83,9 @@ def refine_batch_by_ai(
 
     # Update current episode number in story
     new_current_episode = current_episode + len(episodes)
-    self.client.table("stories").update({"current_episode": new_current_episode}).eq(
-        "id", story_id
-    ).eq("auth_id", auth_id).execute()
+    self.db_service.update_story(
+        story_id, {"current_episode": new_current_episode}, auth_id
+    )
 
     self.clear_current_episodes_content(story_id, auth_id)
 
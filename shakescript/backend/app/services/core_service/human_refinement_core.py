@@ -2,7 +2,10 @@ from typing import List, Dict
 from fastapi import HTTPException
 from starlette.status import HTTP_404_NOT_FOUND
 from app.models.schemas import Feedback
+from app.core.tracing import traced
+from app.services.core_service import prefetch_core
 
+@traced("story.refine_episode_batch", "story_id")
 def refine_episode_batch(
     self,
     story_id: int,
@@ -62,6 +65,7 @@ def refine_episode_batch(
     )
 
     self.update_current_episodes_content(story_id, refined_episodes, auth_id)
+    prefetch_core.on_draft_refined(self, story_id, story_data, refined_episodes, auth_id)
 
     return {
         "status": "pending",
@@ -70,6 +74,7 @@ def refine_episode_batch(
     }
 
 
+@traced("story.validate_episode_batch", "story_id")
 def validate_episode_batch(
     self,
     story_id: int,
@@ -91,6 +96,7 @@ def validate_episode_batch(
 
     total_episodes = story_data["num_episodes"]
     self.store_validated_episodes(story_id, current_episodes_content, total_episodes, auth_id, background_tasks)
+    prefetch_core.on_batch_validated(self, story_id, story_data.get("version"), auth_id)
 
     max_episode = max([ep.get("episode_number", 0) for ep in current_episodes_content], default=0)
     next_episode = max_episode + 1
@@ -0,0 +1,117 @@
+"""
+Per-story generation lease and optimistic version check.
+
+generate-batch, refine-batch and validate-batch run under a lease on the
+story row (migrations/002_story_lease.sql). A second request for the same
+story while one is running is answered 409 straight away, before any LLM
+call, instead of generating the same episodes twice and racing on
+store_episode. The lease is renewed in the background every third of
+STORY_LEASE_SECONDS, so it only lapses when its holder has died.
+
+Clients may send If-Match with the story ETag they last saw; a stale
+version is answered 412 in the same round trip that takes the lease, or
+after a header-only version read when STORY_LEASE_ENABLED is off.
+
+Metrics:
+  shakescript_story_lease_total{outcome}  acquired, busy, stale, lost
+"""
+
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.metrics import registry
+from app.utils.http_cache import story_etag
+
+
+class _Heartbeat:
+    """Renews a held lease until stopped."""
+
+    def __init__(self, service, story_id: int, auth_id: str, holder: str):
+        self.service = service
+        self.story_id = story_id
+        self.auth_id = auth_id
+        self.holder = holder
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        ttl = settings.STORY_LEASE_SECONDS
+        while not self.stopped.wait(ttl / 3):
+            try:
+                result = self.service.db_service.acquire_story_lease(
+                    self.story_id, self.auth_id, self.holder, ttl
+                )
+            except Exception as e:
+                print(f"Lease renewal failed for story {self.story_id}: {e}")
+                continue
+            if result.get("status") != "acquired":
+                # Someone took over after the lease lapsed; the running request
+                # finishes, but the overlap is worth knowing about.
+                registry.inc("shakescript_story_lease_total", outcome="lost")
+                print(f"Lost lease on story {self.story_id}: {result.get('status')}")
+                return
+
+    def stop(self):
+        self.stopped.set()
+
+
+def _stale(story_id: int, version: int) -> HTTPException:
+    return HTTPException(
+        status_code=412,
+        detail="Story has changed since it was read",
+        headers={"ETag": story_etag(story_id, version)},
+    )
+
+
+@contextmanager
+def story_lease(
+    self, story_id: int, auth_id: str, expected_version: Optional[int] = None
+) -> Iterator[Optional[int]]:
+    """
+    Hold the story's lease for the duration of the block; yields the story
+    version seen when it was taken. Raises 404 (no such story), 412 (stale
+    expected_version) or 409 (another request holds the lease).
+    """
+    if not settings.STORY_LEASE_ENABLED:
+        if expected_version is None:
+            yield None
+            return
+        # A story without a version (before migrations/001) cannot be stale.
+        version = self.get_story_version(story_id, auth_id)
+        if version is not None and version != expected_version:
+            raise _stale(story_id, version)
+        yield version
+        return
+
+    holder = uuid.uuid4().hex
+    result = self.db_service.acquire_story_lease(
+        story_id, auth_id, holder, settings.STORY_LEASE_SECONDS, expected_version
+    )
+    status = result.get("status")
+    registry.inc("shakescript_story_lease_total", outcome=status)
+    if status == "missing":
+        raise HTTPException(status_code=404, detail="Story not found")
+    if status == "stale":
+        raise _stale(story_id, result["version"])
+    if status == "busy":
+        retry_after = min(int(result.get("retry_after") or 1), settings.STORY_LEASE_RETRY_AFTER)
+        raise HTTPException(
+            status_code=409,
+            detail="Another request is already generating or validating this story",
+            headers={"Retry-After": str(max(retry_after, 1))},
+        )
+
+    heartbeat = _Heartbeat(self, story_id, auth_id, holder)
+    try:
+        yield result.get("version")
+    finally:
+        heartbeat.stop()
+        try:
+            self.db_service.release_story_lease(story_id, auth_id, holder)
+        except Exception as e:
+            # The lease expires on its own; the next request just waits for it.
+            print(f"Lease release failed for story {story_id}: {e}")
@@ -0,0 +1,326 @@
+"""
+Speculative prefetch for the HUMAN refinement flow.
+
+While a user reviews batch N, batch N+1 is generated in the background
+against the draft and parked in a side buffer; nothing is stored or charged
+against the user's episode limits until generate-batch asks for exactly that
+batch. It is served only if the previous episode as stored by
+validate-batch is still close to the draft it was generated from, and the
+story has not been written since except by the refine/validate-batch calls
+for that draft (its version is carried across those); a refinement that
+changes the last episode materially discards it and starts a new speculation
+from the refined draft. generate-batch waits at most PREFETCH_WAIT_SECONDS for
+a batch still being generated, then generates as usual.
+
+The buffer is per process: with several gunicorn workers a generate-batch
+that lands on another worker is a miss (visible in the hit rate).
+
+Metrics:
+  shakescript_prefetch_total{outcome}        hit, miss, invalidated, stale,
+                                             expired, evicted, failed, rejected,
+                                             timeout
+  shakescript_prefetch_tokens_total{outcome} served or wasted LLM tokens
+  shakescript_prefetch_wait_seconds          time a hit waited for its batch
+"""
+
+import difflib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.metrics import TokenMeter, registry
+from app.core.tracing import propagate, set_attribute
+from app.services.ai_service.episode_generatorAI import AIGeneration
+from app.services.core_service.story_generator_core import (
+    draft_episodes,
+    store_drafted_episodes,
+)
+
+Key = Tuple[str, int]
+
+
+class Speculation:
+    """
+    One background batch, the draft episode it continues from and the story
+    version it expects at generate-batch.
+    """
+
+    def __init__(
+        self,
+        start_episode: int,
+        count: int,
+        hinglish: bool,
+        basis: str,
+        version: Optional[int] = None,
+    ):
+        self.start_episode = start_episode
+        self.count = count
+        self.hinglish = hinglish
+        self.basis = basis
+        self.version = version
+        self.created = time.monotonic()
+        self.meter: Optional[TokenMeter] = None
+        self.future: Optional[Future] = None
+
+    def matches(self, start_episode: int, count: int, hinglish: bool) -> bool:
+        return (self.start_episode, self.count, self.hinglish) == (
+            start_episode,
+            count,
+            hinglish,
+        )
+
+    def expired(self) -> bool:
+        return time.monotonic() - self.created > settings.PREFETCH_TTL_SECONDS
+
+
+def discard(speculation: Speculation, outcome: str):
+    """Drop a speculation; its tokens (once generation ends) count as wasted."""
+    registry.inc("shakescript_prefetch_total", outcome=outcome)
+    if speculation.future is None or speculation.future.cancel():
+        return
+    speculation.future.add_done_callback(
+        lambda _: registry.inc(
+            "shakescript_prefetch_tokens_total",
+            speculation.meter.tokens,
+            outcome="wasted",
+        )
+    )
+
+
+class PrefetchBuffer:
+    """Process-local side buffer, one speculation per (auth_id, story_id)."""
+
+    def __init__(self):
+        self._entries: "OrderedDict[Key, Speculation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: Key, speculation: Speculation):
+        dropped = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                dropped.append((previous, "stale"))
+            self._entries[key] = speculation
+            for other_key, other in list(self._entries.items()):
+                if other.expired():
+                    dropped.append((self._entries.pop(other_key), "expired"))
+            while len(self._entries) > settings.PREFETCH_MAX_ENTRIES:
+                dropped.append((self._entries.popitem(last=False)[1], "evicted"))
+            registry.set_gauge("shakescript_prefetch_buffered", len(self._entries))
+        for old, outcome in dropped:
+            discard(old, outcome)
+
+    def get(self, key: Key) -> Optional[Speculation]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def pop(self, key: Key) -> Optional[Speculation]:
+        with self._lock:
+            speculation = self._entries.pop(key, None)
+            registry.set_gauge("shakescript_prefetch_buffered", len(self._entries))
+            return speculation
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            registry.set_gauge("shakescript_prefetch_buffered", 0)
+
+
+buffer = PrefetchBuffer()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    # Created on first use so nothing is started before gunicorn forks.
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PREFETCH_MAX_WORKERS,
+                    thread_name_prefix="prefetch",
+                )
+    return _executor
+
+
+def is_similar(draft: str, stored: str) -> bool:
+    """Word-level similarity of two versions of an episode."""
+    if draft == stored:
+        return True
+    ratio = difflib.SequenceMatcher(
+        None, draft.split(), stored.split(), autojunk=False
+    ).ratio()
+    return ratio >= settings.PREFETCH_MIN_SIMILARITY
+
+
+def schedule_prefetch(
+    self,
+    story_id: int,
+    story_data: Dict[str, Any],
+    draft: List[Dict[str, Any]],
+    batch_size: int,
+    hinglish: bool,
+    auth_id: str,
+) -> Optional[Speculation]:
+    """Start generating the batch after `draft` in the background."""
+    if not settings.SPECULATIVE_PREFETCH_ENABLED or not draft:
+        return None
+    last = draft[-1]
+    if "error" in last or not last.get("episode_content"):
+        return None
+    start_episode = last["episode_number"] + 1
+    remaining = story_data["num_episodes"] - start_episode + 1
+    if remaining <= 0:
+        return None
+
+    speculation = Speculation(
+        start_episode,
+        min(batch_size, remaining),
+        hinglish,
+        last["episode_content"],
+        # After the draft was saved to current_episodes_content.
+        self.get_story_version(story_id, auth_id),
+    )
+    # Same scheduler lane as the user's own calls, metered per speculation.
+    speculation.meter = TokenMeter(self.ai_service.model)
+    generator = AIGeneration(speculation.meter, self.embedding_service)
+    prev_episodes = [
+        {
+            "episode_number": ep["episode_number"],
+            "content": ep.get("episode_content", ""),
+            "title": ep.get("episode_title", ""),
+        }
+        for ep in draft[-2:]
+    ]
+    speculation.future = _pool().submit(
+        propagate(draft_episodes),
+        self,
+        story_data,
+        story_id,
+        speculation.start_episode,
+        speculation.count,
+        hinglish,
+        auth_id,
+        prev_episodes,
+        generator,
+    )
+    buffer.put((auth_id, story_id), speculation)
+    registry.inc("shakescript_prefetch_scheduled_total")
+    return speculation
+
+
+def take_prefetched(
+    self,
+    story_id: int,
+    start_episode: int,
+    count: int,
+    hinglish: bool,
+    auth_id: str,
+    version: Optional[int] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    The speculative batch for this generate-batch, stored and charged, or None
+    to generate as usual. `version` is the story's version as this request
+    read it.
+    """
+    if not settings.SPECULATIVE_PREFETCH_ENABLED:
+        return None
+    speculation = buffer.pop((auth_id, story_id))
+    if speculation is None:
+        if start_episode > 1:
+            registry.inc("shakescript_prefetch_total", outcome="miss")
+        return None
+    if speculation.expired():
+        discard(speculation, "expired")
+        return None
+    if not speculation.matches(start_episode, count, hinglish):
+        discard(speculation, "stale")
+        return None
+    if speculation.version is not None and speculation.version != version:
+        # Written since the speculation was scheduled (another tab, an edit).
+        discard(speculation, "invalidated")
+        return None
+
+    previous = self.db_service.get_episodes_by_range(
+        story_id, start_episode - 1, start_episode - 1, auth_id
+    )
+    if not previous or not is_similar(speculation.basis, previous[0].get("content", "")):
+        discard(speculation, "invalidated")
+        return None
+
+    waited = time.perf_counter()
+    try:
+        drafts = speculation.future.result(timeout=settings.PREFETCH_WAIT_SECONDS)
+    except TimeoutError:
+        discard(speculation, "timeout")
+        return None
+    except Exception as e:
+        print(f"Speculative batch for story {story_id} failed: {e}")
+        discard(speculation, "failed")
+        return None
+    registry.observe("shakescript_prefetch_wait_seconds", time.perf_counter() - waited)
+    if not drafts or "error" in drafts[-1]:
+        discard(speculation, "failed")
+        return None
+
+    limit_check = self.db_service.check_and_update_episode_limits(auth_id)
+    if "error" in limit_check:
+        discard(speculation, "rejected")
+        raise HTTPException(status_code=429, detail=limit_check["error"])
+
+    episodes = store_drafted_episodes(self, story_id, drafts, auth_id)
+    registry.inc("shakescript_prefetch_total", outcome="hit")
+    registry.inc(
+        "shakescript_prefetch_tokens_total", speculation.meter.tokens, outcome="served"
+    )
+    set_attribute("prefetch_hit", True)
+    return episodes
+
+
+def on_draft_refined(
+    self,
+    story_id: int,
+    story_data: Dict[str, Any],
+    refined: List[Dict[str, Any]],
+    auth_id: str,
+):
+    """
+    Discard the speculation if refinement moved the last episode (or the
+    story changed before it), then re-speculate. `story_data` is the story
+    as read before the refined draft was saved.
+    """
+    key = (auth_id, story_id)
+    speculation = buffer.get(key)
+    if speculation is None or not refined:
+        return
+    if speculation.version == story_data.get("version") and is_similar(
+        speculation.basis, refined[-1].get("episode_content", "")
+    ):
+        speculation.version = self.get_story_version(story_id, auth_id)
+        return
+    if buffer.pop(key) is speculation:
+        discard(speculation, "invalidated")
+    schedule_prefetch(
+        self,
+        story_id,
+        story_data,
+        refined,
+        speculation.count,
+        speculation.hinglish,
+        auth_id,
+    )
+
+
+def on_batch_validated(self, story_id: int, validated_version: Optional[int], auth_id: str):
+    """
+    Carry the speculation across the validate-batch that stored its draft;
+    `validated_version` is the story version that validate-batch read.
+    """
+    speculation = buffer.get((auth_id, story_id))
+    if speculation is not None and speculation.version == validated_version:
+        speculation.version = self.get_story_version(story_id, auth_id)
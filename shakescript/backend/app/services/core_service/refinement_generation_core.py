@@ -1,6 +1,9 @@
 from typing import List, Dict, Any
+from app.core.tracing import traced
+from app.services.core_service import prefetch_core
 
 
+@traced("story.generate_and_refine_batch", "story_id", "batch_size", "refinement_type")
 def generate_and_refine_batch(
     self,
     story_id: int,
@@ -20,9 +23,21 @@ def generate_and_refine_batch(
     remaining_episodes = story_data["num_episodes"] - current_episode + 1
     effective_batch_size = min(batch_size, remaining_episodes)
 
-    episodes = self.generate_multiple_episodes(
-        story_id, current_episode, effective_batch_size, hinglish, auth_id
-    )
+    episodes = None
+    if refinement_type == "HUMAN":
+        episodes = prefetch_core.take_prefetched(
+            self,
+            story_id,
+            current_episode,
+            effective_batch_size,
+            hinglish,
+            auth_id,
+            story_data.get("version"),
+        )
+    if episodes is None:
+        episodes = self.generate_multiple_episodes(
+            story_id, current_episode, effective_batch_size, hinglish, auth_id
+        )
 
     # Store the initial batch in current_episodes_content and persist immediately
     story_data["current_episodes_content"] = episodes
@@ -31,6 +46,12 @@ def generate_and_refine_batch(
         f"Generated batch for episodes {current_episode} to {current_episode + effective_batch_size - 1}"
     )
 
+    if refinement_type == "HUMAN":
+        # Next batch starts generating while this one is reviewed.
+        prefetch_core.schedule_prefetch(
+            self, story_id, story_data, episodes, batch_size, hinglish, auth_id
+        )
+
     # Apply AI refinement internally if requested
     if refinement_type == "AI":
         return self.refine_batch_by_ai(
@@ -1,8 +1,13 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 import json
+from app.core.config import settings
+from app.core.tracing import traced
+from app.services.core_service.utils_core import wait_for_embeddings
 
 
+@traced("story.create", "num_episodes", "refinement_method")
 async def create_story(
     self,
     prompt: str,
@@ -13,17 +18,26 @@ async def create_story(
 ) -> Dict[str, Any]:
     """
     Logic for extracting metadata from the user prompt.
+    The LLM call (which may wait in the scheduler queue and back off between
+    retries) and the inserts run in the threadpool, off the event loop.
     """
     full_prompt = f"{prompt} number of episodes = {num_episodes}"
-    metadata = self.ai_service.extract_metadata(full_prompt, num_episodes, hinglish)
+    metadata = await run_in_threadpool(
+        self.ai_service.extract_metadata, full_prompt, num_episodes, hinglish
+    )
     if "error" in metadata:
         return metadata
-    story_id = self.db_service.store_story_metadata(
-        metadata, num_episodes, refinement_method, auth_id
+    story_id = await run_in_threadpool(
+        self.db_service.store_story_metadata,
+        metadata,
+        num_episodes,
+        refinement_method,
+        auth_id,
     )
     return {"story_id": story_id, "title": metadata.get("Title", "Untitled Story")}
 
 
+@traced("story.generate_episodes", "story_id", "start_episode", "num_episodes")
 def generate_multiple_episodes(
     self,
     story_id: int,
@@ -43,9 +57,30 @@ def generate_multiple_episodes(
     if "error" in story_data:
         return [story_data]
 
-    # Determine starting episode number
-    current_episode = start_episode
+    drafts = draft_episodes(
+        self, story_data, story_id, start_episode, num_episodes, hinglish, auth_id
+    )
+    return store_drafted_episodes(self, story_id, drafts, auth_id)
+
 
+def draft_episodes(
+    self,
+    story_data: Dict[str, Any],
+    story_id: int,
+    start_episode: int,
+    num_episodes: int,
+    hinglish: bool = False,
+    auth_id: str = "",
+    prev_episodes: Optional[List[Dict[str, Any]]] = None,
+    generator=None,
+) -> List[Dict[str, Any]]:
+    """
+    Generate episode data without storing it. Each episode sees the two
+    before it, starting from `prev_episodes` (speculative prefetch passes the
+    draft under review). A failed episode ends the list with an error dict.
+    """
+    generator = generator or self.ai_service
+    wait_for_embeddings(self, story_id, auth_id)
     story_metadata = {
         "title": story_data["title"],
         "setting": story_data["setting"],
@@ -54,57 +89,79 @@ def generate_multiple_episodes(
         "story_outline": story_data["story_outline"],
         "timeline": story_data["timeline"],
     }
-
-    episodes = []
+    context = list(prev_episodes or [])
+    drafts = []
 
     for i in range(num_episodes):
-        episode_number = current_episode + i
-
-        prev_episodes = [
-            {
-                "episode_number": ep["episode_number"],
-                "content": ep["episode_content"],
-                "title": ep["episode_title"],
-            }
-            for ep in episodes[-2:]
-        ]
-
+        episode_number = start_episode + i
         story_metadata["current_episode"] = episode_number
 
-        episode_data = self.ai_service.generate_episode_helper(
+        episode_data = generator.generate_episode_helper(
             num_episodes,
             story_metadata,
             episode_number,
             json.dumps(story_data["characters"]),
             story_id,
-            prev_episodes,
+            context[-2:],
             hinglish,
             auth_id=auth_id,
         )
 
         if "error" in episode_data or not episode_data.get("episode_content"):
-            error_result = {
-                "error": "Failed to generate episode content",
+            return drafts + [
+                {
+                    "error": "Failed to generate episode content",
+                    "episode_number": episode_number,
+                    "episode_data": episode_data,
+                }
+            ]
+
+        drafts.append({**episode_data, "episode_number": episode_number})
+        context.append(
+            {
                 "episode_number": episode_number,
-                "episode_data": episode_data,
+                "content": episode_data["episode_content"],
+                "title": episode_data["episode_title"],
             }
-            return episodes + [error_result]
-
-        episode_id = self.db_service.store_episode(
-            story_id, episode_data, episode_number, auth_id
         )
 
-        episode_result = {
-            "episode_id": episode_id,
-            "episode_number": episode_number,
-            "episode_title": episode_data["episode_title"],
-            "episode_content": episode_data["episode_content"],
-            "episode_summary": episode_data.get("episode_summary", ""),
-            "episode_emotional_state": episode_data.get(
-                "episode_emotional_state", "neutral"
-            ),
+    return drafts
+
+
+def store_drafted_episodes(
+    self, story_id: int, drafts: List[Dict[str, Any]], auth_id: str
+) -> List[Dict[str, Any]]:
+    """Store drafts from draft_episodes; an error entry is passed through as is."""
+    stored = []
+    for draft in drafts:
+        if "error" in draft:
+            break
+        stored.append(draft)
+
+    if settings.BATCH_EPISODE_STORE_ENABLED:
+        episode_ids = self.db_service.store_episode_batch(story_id, stored, auth_id)
+    else:
+        episode_ids = {
+            draft["episode_number"]: self.db_service.store_episode(
+                story_id, draft, draft["episode_number"], auth_id
+            )
+            for draft in stored
         }
 
-        episodes.append(episode_result)
+    episodes = []
+    for draft in stored:
+        episode_id = episode_ids[draft["episode_number"]]
+        episodes.append(
+            {
+                "episode_id": episode_id,
+                "episode_number": draft["episode_number"],
+                "episode_title": draft["episode_title"],
+                "episode_content": draft["episode_content"],
+                "episode_summary": draft.get("episode_summary", ""),
+                "episode_emotional_state": draft.get(
+                    "episode_emotional_state", "neutral"
+                ),
+            }
+        )
 
-    return episodes
+    return episodes + drafts[len(stored) : len(stored) + 1]
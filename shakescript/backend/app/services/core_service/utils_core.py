@@ -1,13 +1,69 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from app.models.schemas import StoryListItem
+import time
+from datetime import datetime, timezone
+from app.core.cache import retrieval_cache
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.tracing import propagate, traced
+from app.services.bm25_index import indexes as bm25_indexes
+from app.services.db_service.storyDB import format_episode
 from fastapi import BackgroundTasks
 
 def get_story_info(self, story_id: int, auth_id: str) -> Dict[str, Any]:
     return self.db_service.get_story_info(story_id, auth_id)
 
 
-def get_all_stories(self, auth_id: str) -> List[StoryListItem]:
-    stories_from_db = self.db_service.get_all_stories(auth_id)
+def get_story_page(
+    self,
+    story_id: int,
+    auth_id: str,
+    episode_cursor: int = 0,
+    episode_limit: int = 10,
+    include_content: bool = True,
+) -> Dict[str, Any]:
+    """
+    Story info + characters with a single page of episodes instead of all of them.
+    """
+    story_info = self.db_service.get_story_header(story_id, auth_id)
+    if "error" in story_info:
+        return story_info
+    page = get_episodes_page(
+        self, story_id, auth_id, episode_cursor, episode_limit, include_content
+    )
+    story_info["episodes"] = page["episodes"]
+    story_info["next_episode_cursor"] = page["next_cursor"]
+    return story_info
+
+
+def get_episodes_page(
+    self,
+    story_id: int,
+    auth_id: str,
+    cursor: int = 0,
+    limit: int = 10,
+    include_content: bool = True,
+) -> Dict[str, Any]:
+    page = self.db_service.get_episodes_page(
+        story_id, auth_id, cursor, limit, include_content
+    )
+    return {
+        "episodes": [format_episode(ep) for ep in page["episodes"]],
+        "next_cursor": page["next_cursor"],
+    }
+
+
+def get_episode(
+    self, story_id: int, episode_number: int, auth_id: str
+) -> Optional[Dict[str, Any]]:
+    episode = self.db_service.get_episode(story_id, episode_number, auth_id)
+    return format_episode(episode) if episode else None
+
+
+def get_all_stories(
+    self, auth_id: str, after: Optional[int] = None, limit: Optional[int] = None
+) -> List[StoryListItem]:
+    stories_from_db = self.db_service.get_all_stories(auth_id, after, limit)
     return [
         StoryListItem(
             story_id=story.get("id"),
@@ -43,6 +99,7 @@ def _update_story_memory(
     )
 
 
+@traced("story.update_summary", "story_id")
 def update_story_summary(self, story_id: int, auth_id: str) -> Dict[str, Any]:
     story_data = self.get_story_info(story_id, auth_id)
     if "error" in story_data:
@@ -50,64 +107,167 @@ def update_story_summary(self, story_id: int, auth_id: str) -> Dict[str, Any]:
     episode_summaries = "\n".join(ep["summary"] for ep in story_data["episodes"])
     instruction = f"Create a 150-200 word audio teaser summary for '{story_data['title']}' based on: {episode_summaries}. Use vivid, short sentences. End with a hook."
     summary = self.ai_service.model.generate_content(instruction).text.strip()
-    self.client.table("stories").update({"summary": summary}).eq("id", story_id).eq(
-        "auth_id", auth_id
-    ).execute()
+    self.db_service.update_story(story_id, {"summary": summary}, auth_id)
     return {"status": "success", "summary": summary}
 
 
+@traced("story.store_validated_episodes", "story_id", "total_episodes")
 def store_validated_episodes(
     self,
     story_id: int,
     episodes: List[Dict[str, Any]],
     total_episodes: int,
     auth_id: str,
-    background_tasks: BackgroundTasks,
+    background_tasks: Optional[BackgroundTasks] = None,
 ) -> None:
     """
     Store the validated episodes and update the story's progress.
+    With EMBEDDING_QUEUE_ENABLED chunking is queued as embedding_jobs for
+    app/workers/embedding_worker.py; otherwise it runs as a background task
+    when background_tasks is given, else inline (AI refinement path,
+    benchmarks).
     """
     if not episodes:
         print("No episodes to store")
         return
 
+    numbered = []
     for episode in episodes:
-        episode_number = episode.get("episode_number")
-        if not episode_number:
+        if not episode.get("episode_number"):
             print(f"Warning: Episode missing 'number' field: {episode}")
             continue
+        numbered.append(episode)
 
-        episode_id = self.db_service.store_episode(
-            story_id, episode, episode_number, auth_id
-        )
+    def character_names(episode):
+        return [char["Name"] for char in episode.get("characters_featured", [])]
+
+    with_content = [episode for episode in numbered if episode.get("episode_content")]
+    for episode in numbered:
+        if not episode.get("episode_content"):
+            print(f"Warning: No episode_content for episode {episode}")
+    queued = settings.EMBEDDING_QUEUE_ENABLED
 
-        character_names = (
-            [char["Name"] for char in episode.get("characters_featured", [])]
-            if "characters_featured" in episode
-            else []
+    if settings.BATCH_EPISODE_STORE_ENABLED and numbered:
+        # Episodes, characters, progress, the buffer clear and the embedding
+        # jobs in one round trip.
+        episode_ids = self.db_service.store_episode_batch(
+            story_id,
+            numbered,
+            auth_id,
+            total_episodes,
+            clear_buffer=True,
+            embedding_jobs=[
+                {
+                    "episode_number": episode["episode_number"],
+                    "character_names": character_names(episode),
+                }
+                for episode in with_content
+            ]
+            if queued
+            else None,
         )
+    else:
+        episode_ids = {
+            episode["episode_number"]: self.db_service.store_episode(
+                story_id, episode, episode["episode_number"], auth_id
+            )
+            for episode in numbered
+        }
+        if queued:
+            self.db_service.enqueue_embedding_jobs(
+                [
+                    {
+                        "story_id": story_id,
+                        "episode_id": episode_ids[episode["episode_number"]],
+                        "episode_number": episode["episode_number"],
+                        "auth_id": auth_id,
+                        "character_names": character_names(episode),
+                    }
+                    for episode in with_content
+                ]
+            )
 
-        if episode.get("episode_content"):
-            background_tasks.add_task(
-                self.embedding_service._process_and_store_chunks,
+    if queued:
+        print(f"Queued chunking for {len(with_content)} validated episodes")
+    else:
+        for episode in with_content:
+            episode_number = episode["episode_number"]
+            chunk_args = (
                 story_id,
-                episode_id,
+                episode_ids[episode_number],
                 episode_number,
                 episode["episode_content"],
-                character_names,
+                character_names(episode),
                 auth_id,
             )
+            if background_tasks is not None:
+                background_tasks.add_task(
+                    propagate(self.embedding_service._process_and_store_chunks),
+                    *chunk_args,
+                )
+            else:
+                self.embedding_service._process_and_store_chunks(*chunk_args)
             print(f"Chunking completed for validated episode {episode_number}")
-        else:
-            print(f"Warning: No episode_content for episode {episode}")
+
+    if settings.BATCH_EPISODE_STORE_ENABLED and numbered:
+        return
 
     max_episode_num = max([ep.get("episode_number", 0) for ep in episodes], default=0)
 
     is_completed = True if max_episode_num >= total_episodes else False
     if max_episode_num > 0:
-        self.client.table("stories").update(
-            {"current_episode": max_episode_num + 1, "is_completed": is_completed}
-        ).eq("id", story_id).eq("auth_id", auth_id).execute()
+        self.db_service.update_story(
+            story_id,
+            {"current_episode": max_episode_num + 1, "is_completed": is_completed},
+            auth_id,
+        )
         print(f"Updated story current_episode to {max_episode_num + 1} and set is_completed to {is_completed}")
 
     self.clear_current_episodes_content(story_id, auth_id)
+
+
+# story_id -> when this process last brought its retrieval cache and BM25
+# index up to date with the embedding worker (ISO time, UTC).
+_embeddings_seen: Dict[int, str] = {}
+
+
+def wait_for_embeddings(
+    self, story_id: int, auth_id: str, timeout: Optional[float] = None
+) -> bool:
+    """
+    Wait until the story has no pending or running embedding jobs, so
+    retrieval sees the latest validated episodes. Gives up after `timeout`
+    (EMBEDDING_WAIT_SECONDS) and generates with what is indexed; returns
+    whether the queue was drained.
+    """
+    timeout = settings.EMBEDDING_WAIT_SECONDS if timeout is None else timeout
+    if not settings.EMBEDDING_QUEUE_ENABLED:
+        return True
+    checked_at = datetime.now(timezone.utc).isoformat()
+    pending = had_jobs = 0
+    if timeout > 0:
+        start = time.monotonic()
+        while True:
+            pending = self.db_service.count_active_embedding_jobs(story_id, auth_id)
+            had_jobs = had_jobs or pending
+            waited = time.monotonic() - start
+            if not pending or waited >= timeout:
+                break
+            time.sleep(min(settings.EMBEDDING_WAIT_POLL_SECONDS, timeout - waited))
+        outcome = "timeout" if pending else ("drained" if waited else "idle")
+        registry.inc("shakescript_embedding_wait_total", outcome=outcome)
+        registry.observe("shakescript_embedding_wait_seconds", waited)
+    # The worker may run on another host and cannot reach this process's
+    # retrieval cache or BM25 index, so drop the story's entries here, but
+    # only when its chunks may have changed: jobs were queued, or some
+    # finished since the last drop. An idle story keeps its warm entries.
+    seen = _embeddings_seen.get(story_id)
+    if had_jobs or seen is None or self.db_service.embedding_jobs_completed_since(
+        story_id, auth_id, seen
+    ):
+        retrieval_cache.invalidate(story_id)
+        bm25_indexes.drop(story_id)
+    _embeddings_seen[story_id] = checked_at
+    if pending:
+        print(f"Story {story_id}: {pending} embedding jobs still pending after {timeout}s")
+    return not pending
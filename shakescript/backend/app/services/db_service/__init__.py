@@ -2,8 +2,9 @@ from .usersDB import UsersDB
 from .storyDB import StoryDB
 from .episodesDB import EpisodesDB
 from .charactersDB import CharactersDB
+from .embeddingJobsDB import EmbeddingJobsDB
 from supabase import Client
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from datetime import datetime 
 
 
@@ -14,13 +15,35 @@ class DBService:
         self.episodes = EpisodesDB(client)
         self.characters = CharactersDB(client)
         self.users = UsersDB(client)
+        self.embedding_jobs = EmbeddingJobsDB(client)
 
-    def get_all_stories(self, auth_id: str):
-        return self.stories.get_all_stories(auth_id)
+    def get_all_stories(
+        self, auth_id: str, after: Optional[int] = None, limit: Optional[int] = None
+    ):
+        return self.stories.get_all_stories(auth_id, after, limit)
 
     def get_story_info(self, story_id: int, auth_id: str):
         return self.stories.get_story_info(story_id, auth_id)
 
+    def get_story_version(self, story_id: int, auth_id: str):
+        return self.stories.get_story_version(story_id, auth_id)
+
+    def story_exists(self, story_id: int, auth_id: str) -> bool:
+        return self.stories.story_exists(story_id, auth_id)
+
+    def acquire_story_lease(
+        self, story_id: int, auth_id: str, holder: str, ttl_seconds: int, expected_version=None
+    ):
+        return self.stories.acquire_story_lease(
+            story_id, auth_id, holder, ttl_seconds, expected_version
+        )
+
+    def release_story_lease(self, story_id: int, auth_id: str, holder: str):
+        return self.stories.release_story_lease(story_id, auth_id, holder)
+
+    def get_story_header(self, story_id: int, auth_id: str):
+        return self.stories.get_story_header(story_id, auth_id)
+
     def store_story_metadata(self, metadata, num_episodes, refinement_method, auth_id: str):
         return self.stories.store_story_metadata(metadata, num_episodes,refinement_method, auth_id)
 
@@ -43,6 +66,28 @@ class DBService:
             story_id, episode_data, current_episode, auth_id
         )
 
+    def store_episode_batch(
+        self,
+        story_id,
+        episodes,
+        auth_id: str,
+        total_episodes=None,
+        clear_buffer=False,
+        embedding_jobs=None,
+    ):
+        return self.episodes.store_episode_batch(
+            story_id, episodes, auth_id, total_episodes, clear_buffer, embedding_jobs
+        )
+
+    def enqueue_embedding_jobs(self, jobs: List[Dict[str, Any]]):
+        return self.embedding_jobs.enqueue(jobs)
+
+    def count_active_embedding_jobs(self, story_id: int, auth_id: str) -> int:
+        return self.embedding_jobs.count_active(story_id, auth_id)
+
+    def embedding_jobs_completed_since(self, story_id: int, auth_id: str, since: str) -> bool:
+        return self.embedding_jobs.completed_since(story_id, auth_id, since)
+
     def get_previous_episodes(self, story_id, current_episode, auth_id: str, limit=3):
         return self.episodes.get_previous_episodes(
             story_id, current_episode, auth_id, limit
@@ -51,6 +96,16 @@ class DBService:
     def get_all_episodes(self, story_id, auth_id: str):
         return self.episodes.get_all_episodes(story_id, auth_id)
 
+    def get_episodes_page(
+        self, story_id, auth_id: str, after=0, limit=10, include_content=True
+    ):
+        return self.episodes.get_episodes_page(
+            story_id, auth_id, after, limit, include_content
+        )
+
+    def get_episode(self, story_id, episode_number, auth_id: str):
+        return self.episodes.get_episode(story_id, episode_number, auth_id)
+
     def get_episodes_by_range(self, story_id, start_episode, end_episode, auth_id: str):
         return self.episodes.get_episodes_by_range(
             story_id, start_episode, end_episode, auth_id
@@ -59,8 +114,11 @@ class DBService:
     def update_character_state(self, story_id, character_data, auth_id: str):
         return self.characters.update_character_state(story_id, character_data, auth_id)
 
-    def set_story_completed(self, story_id: int, completed: bool):
-        self.stories.set_story_completed(story_id, completed)
+    def set_story_completed(self, story_id: int, completed: bool, auth_id: str):
+        self.stories.set_story_completed(story_id, completed, auth_id)
+
+    def update_story(self, story_id: int, fields: Dict[str, Any], auth_id: str):
+        return self.stories.update_story(story_id, fields, auth_id)
 
     def get_user_profile(self, auth_id: str) -> Dict:
         return self.users.get_user_profile(auth_id)
@@ -68,6 +126,9 @@ class DBService:
     def get_user_stats(self, auth_id: str, created_at: datetime) -> Dict:
         return self.users.get_user_stats(auth_id, created_at)
 
+    def get_user_tier(self, auth_id: str) -> str:
+        return self.users.get_user_tier(auth_id)
+
     def get_recent_stories(self, auth_id: str, limit: int = 5) -> List[Dict]:
         return self.stories.get_recent_stories(auth_id, limit)
 
@@ -1,15 +1,53 @@
 from supabase import Client
 from typing import Dict, List
 import json
+from app.core.tracing import traced
+
+
+def merge_character_changes(character_lists: List[List[Dict]]) -> List[Dict]:
+    """
+    Fold the characters_featured lists of a batch (in episode order) into one
+    change per character for store_episode_batch. Later episodes win for
+    role/description/is_active, relationships are merged, and every
+    appearance keeps its emotional state so milestones replay as before.
+    """
+    merged: Dict[str, Dict] = {}
+    for characters in character_lists:
+        for char in characters or []:
+            entry = merged.setdefault(
+                char["Name"],
+                {
+                    "name": char["Name"],
+                    "role": None,
+                    "description": None,
+                    "relationship": {},
+                    "is_active": None,
+                    "emotional_states": [],
+                },
+            )
+            if "Role" in char:
+                entry["role"] = char["Role"]
+            if "Description" in char:
+                entry["description"] = char["Description"]
+            if "role_active" in char:
+                entry["is_active"] = char["role_active"]
+            entry["relationship"].update(char.get("Relationship", {}))
+            entry["emotional_states"].append(char.get("Emotional_State"))
+    return list(merged.values())
 
 
 class CharactersDB:
     def __init__(self, client: Client):
         self.client = client
 
+    @traced("db.update_character_state", "story_id")
     def update_character_state(
-        self, story_id: int, character_data: List[Dict], auth_id: str
+        self,
+        story_id: int,
+        character_data: List[Dict],
+        auth_id: str,
     ) -> None:
+        """Merge per-episode character changes into the characters table"""
         if not character_data:
             return
 
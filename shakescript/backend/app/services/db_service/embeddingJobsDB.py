@@ -0,0 +1,109 @@
+from supabase import Client
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional
+
+ACTIVE = ["pending", "running"]
+
+
+def _utc(seconds_from_now: float = 0.0) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds_from_now)).isoformat()
+
+
+class EmbeddingJobsDB:
+    """embedding_jobs outbox (migrations/004_embedding_jobs.sql)"""
+
+    def __init__(self, client: Client):
+        self.client = client
+
+    def enqueue(self, jobs: List[Dict[str, Any]]) -> None:
+        """
+        Queue (or re-queue) chunking for episodes outside store_episode_batch.
+        Each job: story_id, episode_id, episode_number, auth_id, character_names.
+        """
+        if not jobs:
+            return
+        now = _utc()
+        self.client.table("embedding_jobs").upsert(
+            [
+                {
+                    **job,
+                    "status": "pending",
+                    "attempts": 0,
+                    "available_at": now,
+                    "enqueued_at": now,
+                    "locked_by": None,
+                    "locked_until": None,
+                    "last_error": None,
+                    "done_at": None,
+                }
+                for job in jobs
+            ],
+            on_conflict="episode_id",
+        ).execute()
+
+    def claim(self, worker: str, limit: int, lock_seconds: int) -> List[Dict[str, Any]]:
+        """Claim ready jobs for `worker`; each comes with its episode's content"""
+        result = self.client.rpc(
+            "claim_embedding_jobs",
+            {"p_worker": worker, "p_limit": limit, "p_lock_seconds": lock_seconds},
+        ).execute()
+        return result.data or []
+
+    def complete(self, job_ids: List[int], worker: str) -> None:
+        """Mark jobs done unless they were re-queued or reclaimed meanwhile"""
+        self.client.table("embedding_jobs").update(
+            {"status": "done", "done_at": _utc(), "locked_by": None, "locked_until": None}
+        ).in_("id", job_ids).eq("locked_by", worker).eq("status", "running").execute()
+
+    def fail(
+        self, job_id: int, worker: str, error: str, retry_in: Optional[float]
+    ) -> None:
+        """Back off and retry after `retry_in` seconds, or give up when None"""
+        fields = {"last_error": error[:2000], "locked_by": None, "locked_until": None}
+        if retry_in is None:
+            fields["status"] = "failed"
+        else:
+            fields.update(status="pending", available_at=_utc(retry_in))
+        self.client.table("embedding_jobs").update(fields).eq("id", job_id).eq(
+            "locked_by", worker
+        ).eq("status", "running").execute()
+
+    def count_active(self, story_id: int, auth_id: str) -> int:
+        """Pending or running jobs of a story"""
+        result = (
+            self.client.table("embedding_jobs")
+            .select("id", count="exact")
+            .eq("story_id", story_id)
+            .eq("auth_id", auth_id)
+            .in_("status", ACTIVE)
+            .limit(1)
+            .execute()
+        )
+        return result.count or 0
+
+    def completed_since(self, story_id: int, auth_id: str, since: str) -> bool:
+        """Whether any job of the story finished after `since` (ISO time)"""
+        result = (
+            self.client.table("embedding_jobs")
+            .select("id")
+            .eq("story_id", story_id)
+            .eq("auth_id", auth_id)
+            .eq("status", "done")
+            .gt("done_at", since)
+            .limit(1)
+            .execute()
+        )
+        return bool(result.data)
+
+    def backlog(self) -> Dict[str, Any]:
+        """Queue depth and the oldest waiting job's enqueue time, in one query"""
+        result = (
+            self.client.table("embedding_jobs")
+            .select("id, enqueued_at", count="exact")
+            .in_("status", ACTIVE)
+            .order("enqueued_at")
+            .limit(1)
+            .execute()
+        )
+        oldest = result.data[0]["enqueued_at"] if result.data else None
+        return {"depth": result.count or 0, "oldest_enqueued_at": oldest}
@@ -1,14 +1,33 @@
 from supabase import Client
-from app.services.db_service.charactersDB import CharactersDB
-from typing import Dict, List, Any
+from app.services.db_service.charactersDB import CharactersDB, merge_character_changes
+from app.core.cache import read_cache
+from app.core.tracing import traced
+from typing import Dict, List, Any, Optional
 import json
 
 
+def episode_row(
+    story_id: int, episode_data: Dict, episode_number: int, auth_id: str
+) -> Dict[str, Any]:
+    """episodes row for an episode as produced by the generator"""
+    return {
+        "story_id": story_id,
+        "episode_number": episode_number,
+        "title": episode_data.get("episode_title", f"Episode {episode_number}"),
+        "content": episode_data.get("episode_content", ""),
+        "summary": episode_data.get("episode_summary", ""),
+        "key_events": json.dumps(episode_data.get("Key Events", [])),
+        "emotional_state": episode_data.get("episode_emotional_state", "neutral"),
+        "auth_id": auth_id,
+    }
+
+
 class EpisodesDB:
     def __init__(self, client: Client):
         self.client = client
         self.CharactersDB = CharactersDB(client)
 
+    @traced("db.store_episode", "story_id", "current_episode")
     def store_episode(
         self, story_id: int, episode_data: Dict, current_episode: int, auth_id: str
     ) -> int:
@@ -16,20 +35,7 @@ class EpisodesDB:
         episode_result = (
             self.client.table("episodes")
             .upsert(
-                {
-                    "story_id": story_id,
-                    "episode_number": current_episode,
-                    "title": episode_data.get(
-                        "episode_title", f"Episode {current_episode}"
-                    ),
-                    "content": episode_data.get("episode_content", ""),
-                    "summary": episode_data.get("episode_summary", ""),
-                    "key_events": json.dumps(episode_data.get("Key Events", [])),
-                    "emotional_state": episode_data.get(
-                        "episode_emotional_state", "neutral"
-                    ),
-                    "auth_id": auth_id,
-                },
+                episode_row(story_id, episode_data, current_episode, auth_id),
                 on_conflict="story_id,episode_number",
             )
             .execute()
@@ -40,7 +46,9 @@ class EpisodesDB:
 
         # Update characters related to this episode
         self.CharactersDB.update_character_state(
-            story_id, episode_data.get("characters_featured", []), auth_id
+            story_id,
+            episode_data.get("characters_featured", []),
+            auth_id,
         )
 
         # Update story-level settings, events, and timeline
@@ -85,8 +93,70 @@ class EpisodesDB:
                 "timeline": json.dumps(current_timeline + new_timeline),
             }
         ).eq("id", story_id).eq("auth_id", auth_id).execute()
+        read_cache.invalidate(auth_id)
         return episode_id
 
+    @traced("db.store_episode_batch", "story_id")
+    def store_episode_batch(
+        self,
+        story_id: int,
+        episodes: List[Dict],
+        auth_id: str,
+        total_episodes: Optional[int] = None,
+        clear_buffer: bool = False,
+        embedding_jobs: Optional[List[Dict]] = None,
+    ) -> Dict[int, int]:
+        """
+        Store a batch of episodes (each with its episode_number) in one
+        transaction via the store_episode_batch SQL function: bulk upsert,
+        merged character changes, one story update (progress, settings, key
+        events, timeline, version) and optionally the buffer clear.
+        is_completed is set only when total_episodes is given. embedding_jobs
+        ([{episode_number, character_names}]) are queued in the same
+        transaction. Returns {episode_number: episode_id}.
+        """
+        if not episodes:
+            return {}
+        settings: Dict[str, Any] = {}
+        key_events: List[str] = []
+        timeline: List[Dict[str, Any]] = []
+        for episode in episodes:
+            settings.update(episode.get("Settings", {}))
+            for e in episode.get("Key Events", []):
+                major = e.get("tier") in ["foundational", "character-defining"]
+                if major and e["event"] not in key_events:
+                    key_events.append(e["event"])
+                timeline.append(
+                    {
+                        "event": e["event"],
+                        "episode": episode["episode_number"],
+                        "resolved": major,
+                    }
+                )
+        last = max(ep["episode_number"] for ep in episodes)
+        params = {
+            "p_story_id": story_id,
+            "p_auth_id": auth_id,
+            "p_episodes": [
+                episode_row(story_id, ep, ep["episode_number"], auth_id)
+                for ep in episodes
+            ],
+            "p_characters": merge_character_changes(
+                [ep.get("characters_featured", []) for ep in episodes]
+            ),
+            "p_settings": settings,
+            "p_key_events": key_events,
+            "p_timeline": timeline,
+            "p_current_episode": last + 1,
+            "p_is_completed": None if total_episodes is None else last >= total_episodes,
+            "p_clear_buffer": clear_buffer,
+        }
+        if embedding_jobs is not None:
+            params["p_embedding_jobs"] = embedding_jobs
+        result = self.client.rpc("store_episode_batch", params).execute()
+        read_cache.invalidate(auth_id)
+        return {row["episode_number"]: row["id"] for row in result.data or []}
+
     def get_previous_episodes(
         self, story_id: int, current_episode: int, auth_id: str, limit: int = 3
     ) -> List[Dict]:
@@ -112,6 +182,7 @@ class EpisodesDB:
             for ep in result.data or []
         ]
 
+    @traced("db.get_episodes_by_range", "story_id", "start_episode", "end_episode")
     def get_episodes_by_range(
         self, story_id: int, start_episode: int, end_episode: int, auth_id: str
     ) -> List[Dict[str, Any]]:
@@ -147,3 +218,52 @@ class EpisodesDB:
         except Exception as e:
             print(f"Error fetching all episodes: {e}")
             return []
+
+    @traced("db.get_episodes_page", "story_id", "after", "limit")
+    def get_episodes_page(
+        self,
+        story_id: int,
+        auth_id: str,
+        after: int = 0,
+        limit: int = 10,
+        include_content: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Fetch one page of episodes ordered by episode_number, starting after the
+        `after` cursor. Fetches one extra row to know whether another page exists.
+        """
+        columns = (
+            "id, episode_number, title, summary, emotional_state, key_events"
+            + (", content" if include_content else "")
+        )
+        result = (
+            self.client.table("episodes")
+            .select(columns)
+            .eq("story_id", story_id)
+            .eq("auth_id", auth_id)
+            .gt("episode_number", after)
+            .order("episode_number")
+            .limit(limit + 1)
+            .execute()
+        )
+        rows = result.data or []
+        next_cursor: Optional[int] = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["episode_number"]
+        return {"episodes": rows, "next_cursor": next_cursor}
+
+    def get_episode(
+        self, story_id: int, episode_number: int, auth_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch a single episode with its full content"""
+        result = (
+            self.client.table("episodes")
+            .select("*")
+            .eq("story_id", story_id)
+            .eq("auth_id", auth_id)
+            .eq("episode_number", episode_number)
+            .limit(1)
+            .execute()
+        )
+        return result.data[0] if result.data else None
@@ -1,7 +1,14 @@
 from supabase import Client
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import json
 import logging
+from postgrest.exceptions import APIError
+from app.core.cache import read_cache
+from app.core.tracing import traced
+
+
+# Postgres error code for a column that does not exist.
+UNDEFINED_COLUMN = "42703"
 
 
 def _safe_json_loads(json_string: str, default_type: Any = None):
@@ -17,22 +24,109 @@ def _safe_json_loads(json_string: str, default_type: Any = None):
         return default_type() if callable(default_type) else default_type
 
 
+def format_episode(ep: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape an episodes row for API responses; content is optional"""
+    episode = {"id": ep["id"], "number": ep["episode_number"], "title": ep["title"]}
+    if "content" in ep:
+        episode["content"] = ep["content"]
+    episode.update(
+        {
+            "summary": ep.get("summary"),
+            "emotional_state": ep.get("emotional_state", "neutral"),
+            "key_events": _safe_json_loads(ep.get("key_events"), list),
+        }
+    )
+    return episode
+
+
 class StoryDB:
     def __init__(self, client: Client):
         self.client = client
 
-    def get_all_stories(self, auth_id: str) -> List[Dict[str, Any]]:
-        """Fetch all stories for a user (minimal fields for listing)"""
-        result = (
+    def get_all_stories(
+        self, auth_id: str, after: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Fetch stories for a user (minimal fields for listing), ordered by id"""
+        query = (
             self.client.table("stories")
             .select("id, title, genre, is_completed")
             .eq("auth_id", auth_id)
-            .execute()
         )
+        if after is not None:
+            query = query.gt("id", after)
+        query = query.order("id")
+        if limit is not None:
+            query = query.limit(limit)
+        result = query.execute()
         return result.data if result.data else []
 
-    def get_story_info(self, story_id: int, auth_id: str) -> Dict:
-        """Fetch complete story info including episodes + characters"""
+    def get_story_version(self, story_id: int, auth_id: str) -> Optional[int]:
+        """
+        Header-only lookup of the story version, used for conditional GETs.
+        None when the story does not exist, or has no version because
+        migrations/001_story_version.sql has not been applied yet.
+        """
+        try:
+            result = (
+                self.client.table("stories")
+                .select("id, version")
+                .eq("id", story_id)
+                .eq("auth_id", auth_id)
+                .execute()
+            )
+        except APIError as e:
+            if e.code != UNDEFINED_COLUMN:
+                raise
+            return None
+        if not result.data:
+            return None
+        return result.data[0].get("version")
+
+    def story_exists(self, story_id: int, auth_id: str) -> bool:
+        """Whether the user owns a story with this id"""
+        result = (
+            self.client.table("stories")
+            .select("id")
+            .eq("id", story_id)
+            .eq("auth_id", auth_id)
+            .execute()
+        )
+        return bool(result.data)
+
+    def acquire_story_lease(
+        self,
+        story_id: int,
+        auth_id: str,
+        holder: str,
+        ttl_seconds: int,
+        expected_version: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Take or renew the story's generation lease (and check its version) in
+        one round trip. Returns {"status": acquired|busy|stale|missing, ...}.
+        """
+        result = self.client.rpc(
+            "acquire_story_lease",
+            {
+                "p_story_id": story_id,
+                "p_auth_id": auth_id,
+                "p_holder": holder,
+                "p_ttl_seconds": ttl_seconds,
+                "p_expected_version": expected_version,
+            },
+        ).execute()
+        return result.data or {"status": "missing"}
+
+    def release_story_lease(self, story_id: int, auth_id: str, holder: str) -> None:
+        """Drop the lease if `holder` still owns it"""
+        self.client.rpc(
+            "release_story_lease",
+            {"p_story_id": story_id, "p_auth_id": auth_id, "p_holder": holder},
+        ).execute()
+
+    @traced("db.get_story_header", "story_id")
+    def get_story_header(self, story_id: int, auth_id: str) -> Dict:
+        """Fetch story info + characters without loading any episodes"""
         story_result = (
             self.client.table("stories")
             .select("*")
@@ -53,33 +147,13 @@ class StoryDB:
         story_row["key_events"] = _safe_json_loads(story_row.get("key_events"), list)
         story_row["current_episodes_content"] = _safe_json_loads(story_row.get("current_episodes_content"), list)
 
-        episodes_result = (
-            self.client.table("episodes")
-            .select("*")
-            .eq("story_id", story_id)
-            .order("episode_number")
-            .execute()
-        )
-        episodes_list = [
-            {
-                "id": ep["id"],
-                "number": ep["episode_number"],
-                "title": ep["title"],
-                "content": ep["content"],
-                "summary": ep["summary"],
-                "emotional_state": ep.get("emotional_state", "neutral"),
-                "key_events": _safe_json_loads(ep.get("key_events"), list),
-            }
-            for ep in episodes_result.data
-        ]
-
         characters_result = (
             self.client.table("characters")
             .select("*")
             .eq("story_id", story_id)
             .execute()
         )
-        characters = [
+        story_row["characters"] = [
             {
                 "Name": char["name"],
                 "Role": char["role"],
@@ -91,11 +165,26 @@ class StoryDB:
             }
             for char in characters_result.data
         ]
+        return story_row
+
+    @traced("db.get_story_info", "story_id")
+    def get_story_info(self, story_id: int, auth_id: str) -> Dict:
+        """Fetch complete story info including episodes + characters"""
+        story_row = self.get_story_header(story_id, auth_id)
+        if "error" in story_row:
+            return story_row
 
-        story_row["episodes"] = episodes_list
-        story_row["characters"] = characters
+        episodes_result = (
+            self.client.table("episodes")
+            .select("*")
+            .eq("story_id", story_id)
+            .order("episode_number")
+            .execute()
+        )
+        story_row["episodes"] = [format_episode(ep) for ep in episodes_result.data]
         return story_row
 
+    @traced("db.store_story_metadata", "num_episodes")
     def store_story_metadata(
         self, metadata: Dict, num_episodes: int, refinement_method: str, auth_id: str
     ) -> int:
@@ -142,15 +231,16 @@ class StoryDB:
         ]
         if character_data_list:
             self.client.table("characters").insert(character_data_list).execute()
+        read_cache.invalidate(auth_id)
         return story_id
 
     def update_story_current_episodes_content(
         self, story_id: int, episodes: List[Dict], auth_id: str
     ):
         """Update current episodes buffer for story refinement"""
-        self.client.table("stories").update(
-            {"current_episodes_content": json.dumps(episodes)}
-        ).eq("id", story_id).eq("auth_id", auth_id).execute()
+        self.update_story(
+            story_id, {"current_episodes_content": json.dumps(episodes)}, auth_id
+        )
 
     def get_refined_episodes(self, story_id: int, auth_id: str) -> List[Dict]:
         """Return the current episodes buffer (refinement stage)"""
@@ -159,29 +249,27 @@ class StoryDB:
 
     def clear_current_episodes_content(self, story_id: int, auth_id: str):
         """Clear current episodes buffer after validation"""
-        self.client.table("stories").update(
-            {"current_episodes_content": json.dumps([])}
-        ).eq("id", story_id).eq("auth_id", auth_id).execute()
+        self.update_story(story_id, {"current_episodes_content": json.dumps([])}, auth_id)
+
+    @traced("db.update_story", "story_id")
+    def update_story(self, story_id: int, fields: Dict[str, Any], auth_id: str):
+        """Apply a partial update to a story row owned by the user"""
+        self.client.table("stories").update(fields).eq("id", story_id).eq(
+            "auth_id", auth_id
+        ).execute()
+        read_cache.invalidate(auth_id)
 
     def delete_story(self, story_id: int, auth_id: str) -> None:
         """Delete story + related characters, episodes, and chunks (bulk delete)"""
-        story = (
-            self.client.table("stories")
-            .select("id")
-            .eq("id", story_id)
-            .eq("auth_id", auth_id)
-            .execute()
-        )
-        if not story.data:
+        if not self.story_exists(story_id, auth_id):
             raise ValueError(f"Story with ID {story_id} not found")
 
         self.client.table("stories").delete().eq("id", story_id).execute()
+        read_cache.invalidate(auth_id)
 
-    def set_story_completed(self, story_id: int, completed: bool):
+    def set_story_completed(self, story_id: int, completed: bool, auth_id: str):
         """Mark a story as completed"""
-        self.client.table("stories").update({"is_completed": completed}).eq(
-            "id", story_id
-        ).execute()
+        self.update_story(story_id, {"is_completed": completed}, auth_id)
 
     def get_recent_stories(self, auth_id: str, limit: int = 5) -> List[Dict]:
         """Fetch recent stories for dashboard"""
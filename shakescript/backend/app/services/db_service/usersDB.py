@@ -1,11 +1,14 @@
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any
 from supabase import Client
+from app.core.cache import read_cache
+from app.core.tracing import traced
 
 class UsersDB:
     def __init__(self, client: Client):
         self.client = client
 
+    @traced("db.check_and_update_episode_limits")
     def check_and_update_episode_limits(self, auth_id: str) -> Dict[str, Any]:
         """Check daily/monthly episode limits and update counters"""
         now = datetime.now(timezone.utc)
@@ -64,6 +67,7 @@ class UsersDB:
             .execute()
         )
 
+        read_cache.invalidate(auth_id)
         if not update_res.data:
             return {"error": "Failed to update user limits."}
 
@@ -83,6 +87,22 @@ class UsersDB:
             return {"error": "User profile not found."}
         return result.data
 
+    def get_user_tier(self, auth_id: str) -> str:
+        """'premium' or 'free'; cached per user like the dashboard."""
+        cached = read_cache.get(auth_id, "tier")
+        if cached is not None:
+            return cached
+        result = (
+            self.client.table("users")
+            .select("is_premium")
+            .eq("auth_id", auth_id)
+            .limit(1)
+            .execute()
+        )
+        tier = "premium" if result.data and result.data[0].get("is_premium") else "free"
+        read_cache.set(auth_id, "tier", tier)
+        return tier
+
     def get_user_stats(self, auth_id: str, created_at: datetime) -> Dict:
         """Return story + episode stats + account age"""
         # Fetch stories + user in parallel calls
@@ -1,27 +1,55 @@
-from llama_index.core.node_parser import SemanticSplitterNodeParser
-from llama_index.core.schema import Document
+from functools import cached_property, lru_cache
+from app.core.cache import retrieval_cache
 from app.core.config import settings
+from app.core.metrics import instrument_embedding, registry, stage
+from app.core.tracing import traced
+from app.services.bm25_index import indexes as bm25_indexes, reciprocal_rank_fusion
 from app.services.db_service import DBService
 from supabase import Client
 from typing import List, Dict
-from llama_index.embeddings.gemini import GeminiEmbedding
+
+# Foundational chunks merged into every retrieval.
+PINNED_CHUNKS = 2
+
+
+def is_foundational(episode_number: int, num_episodes: int) -> bool:
+    """The opening and midpoint episodes anchor every later one."""
+    return episode_number == 1 or episode_number == int(num_episodes * 0.5)
+
+
+@lru_cache(maxsize=1)
+def default_embedding_model():
+    """Process-wide Gemini embedder; llama_index is imported on first use."""
+    from llama_index.embeddings.gemini import GeminiEmbedding
+
+    return GeminiEmbedding(
+        model_name="models/embedding-001",
+        api_key=settings.GEMINI_API_KEY,
+    )
 
 
 class EmbeddingService:
-    def __init__(self, client: Client):
-        self.embedding_model = GeminiEmbedding(
-            model_name="models/embedding-001",
-            api_key=settings.GEMINI_API_KEY,
+    def __init__(self, client: Client, embedding_model=None):
+        self.embedding_model = instrument_embedding(
+            embedding_model or default_embedding_model()
         )
         self.db_service = DBService(client)
-        self.splitter = SemanticSplitterNodeParser(
+        self.client = client
+        # self.embedding_model = HuggingFaceEmbedding(model_name=settings.EMBEDDING_MODEL)
+
+    @cached_property
+    def splitter(self):
+        # Built on first chunking; most requests only read.
+        from llama_index.core.node_parser import SemanticSplitterNodeParser
+
+        return SemanticSplitterNodeParser(
             embed_model=self.embedding_model,
             buffer_size=1,
             breakpoint_percentile_threshold=95,
         )
-        self.client = client
-        # self.embedding_model = HuggingFaceEmbedding(model_name=settings.EMBEDDING_MODEL)
 
+    @traced("embedding.process_and_store_chunks", "story_id", "episode_number")
+    @stage("chunk_store")
     def _process_and_store_chunks(
         self,
         story_id: int,
@@ -34,41 +62,116 @@ class EmbeddingService:
         """
         This function is used to divide the episodes into chunks and store it in the DB.
         """
-        doc = Document(text=content)
+        self.process_and_store_batch(
+            [
+                {
+                    "story_id": story_id,
+                    "episode_id": episode_id,
+                    "episode_number": episode_number,
+                    "content": content,
+                    "characters": characters,
+                    "auth_id": auth_id,
+                }
+            ]
+        )
+
+    @traced("embedding.process_and_store_batch")
+    def process_and_store_batch(self, episodes: List[Dict]) -> int:
+        """
+        Chunk and embed several episodes (story_id, episode_id, episode_number,
+        content, characters, auth_id) with one embedding batch and one insert.
+        Earlier chunks of these episodes are replaced, so a retry is safe.
+        Returns the number of chunks stored.
+        """
+        from llama_index.core.schema import Document
+        from app.utils import vectors
+
+        docs = [
+            Document(text=episode["content"], id_=str(i))
+            for i, episode in enumerate(episodes)
+        ]
         nodes = self.splitter.get_nodes_from_documents(
-            [doc], embed_model=self.embedding_model
+            docs, embed_model=self.embedding_model
+        )
+        embeddings = vectors.as_matrix(
+            self.embedding_model.get_text_embedding_batch([node.text for node in nodes])
         )
 
+        num_episodes: Dict[int, int] = {}
+        chunk_numbers: Dict[int, int] = {}
         chunk_data = []
-        for chunk_number, node in enumerate(nodes):
-            content = node.text
-            embedding = self.embedding_model.get_text_embedding(content)
-            importance_score = self._calculate_importance_score(
-                story_id, content, characters, episode_number, auth_id
-            )
-
+        for node, embedding in zip(nodes, embeddings):
+            episode = episodes[int(node.ref_doc_id)]
+            story_id = episode["story_id"]
+            if story_id not in num_episodes:
+                story_info = self.db_service.get_story_header(story_id, episode["auth_id"])
+                num_episodes[story_id] = (
+                    0 if "error" in story_info else story_info.get("num_episodes", 1)
+                ) or 1
+            chunk_number = chunk_numbers.get(episode["episode_id"], 0)
+            chunk_numbers[episode["episode_id"]] = chunk_number + 1
             chunk_data.append(
                 {
                     "story_id": story_id,
-                    "episode_id": episode_id,
-                    "episode_number": episode_number,
+                    "episode_id": episode["episode_id"],
+                    "episode_number": episode["episode_number"],
                     "chunk_number": chunk_number,
-                    "content": content,
-                    "characters": characters,
-                    "embedding": embedding,
-                    "importance_score": importance_score,
-                    "auth_id": auth_id,
+                    "content": node.text,
+                    "characters": episode["characters"],
+                    "embedding": vectors.encode_for_insert(
+                        embedding, settings.EMBEDDING_WIRE_FORMAT
+                    ),
+                    "importance_score": self._calculate_importance_score(
+                        node.text,
+                        episode["characters"],
+                        episode["episode_number"],
+                        num_episodes[story_id],
+                    ),
+                    "auth_id": episode["auth_id"],
                 }
             )
+            if settings.FOUNDATIONAL_CHUNKS_ENABLED:
+                chunk_data[-1]["is_foundational"] = is_foundational(
+                    episode["episode_number"], num_episodes[story_id]
+                )
 
-        if not chunk_data:
-            return
+        stored = None
+        try:
+            self.client.table("chunks").delete().in_(
+                "episode_id", [episode["episode_id"] for episode in episodes]
+            ).execute()
+            if not chunk_data:
+                stored = []
+                return 0
 
-        result = self.client.table("chunks").insert(chunk_data).execute()
+            result = self.client.table("chunks").insert(chunk_data).execute()
 
-        if not result.data:
-            raise ValueError("Failed to store chunks in the database")
+            if not result.data:
+                raise ValueError("Failed to store chunks in the database")
+            stored = result.data
+            return len(chunk_data)
+        finally:
+            # After the write: a retrieval that ran meanwhile was cached under
+            # the old generation and is dropped with it.
+            for story_id in {episode["story_id"] for episode in episodes}:
+                written = [e for e in episodes if e["story_id"] == story_id]
+                if stored is None:
+                    bm25_indexes.drop(story_id)
+                else:
+                    bm25_indexes.replace_episodes(
+                        story_id,
+                        [e["episode_id"] for e in written],
+                        [chunk for chunk in stored if chunk["story_id"] == story_id],
+                    )
+                retrieval_cache.invalidate(
+                    story_id,
+                    pinned=any(
+                        is_foundational(e["episode_number"], num_episodes.get(story_id, 1))
+                        for e in written
+                    ),
+                )
 
+    @traced("embedding.retrieve_relevant_chunks", "story_id", "k")
     def retrieve_relevant_chunks(
         self,
         story_id: int,
@@ -76,40 +179,39 @@ class EmbeddingService:
         auth_id: str,
         k: int = 5,
     ) -> List[Dict]:
-        query_embedding = self.embedding_model.get_text_embedding(current_episode_info)
+        """
+        Top-k chunks for the episode being written. Cached per story until
+        its chunks are rewritten; regenerations during refinement hit the
+        cache.
+        """
+        return retrieval_cache.get_or_load(
+            story_id,
+            auth_id,
+            current_episode_info,
+            k,
+            lambda: self._retrieve_relevant_chunks(story_id, current_episode_info, auth_id, k),
+        )
 
-        chunks_result = self.client.rpc(
-            "match_chunks",
-            {
-                "p_story_id": story_id,
-                "p_auth_id": auth_id,
-                "p_query_embedding": query_embedding,
-                "p_k": k,
-            },
-        ).execute()
+    def _retrieve_relevant_chunks(
+        self,
+        story_id: int,
+        current_episode_info: str,
+        auth_id: str,
+        k: int,
+    ) -> List[Dict]:
+        if settings.HYBRID_RETRIEVAL_ENABLED:
+            matches = self._hybrid_matches(story_id, current_episode_info, auth_id, k)
+        else:
+            matches = self._vector_matches(story_id, current_episode_info, auth_id, k)
 
-        foundational_chunks = (
-            self.client.table("chunks")
-            .select("id, episode_number, chunk_number, content, importance_score")
-            .eq("story_id", story_id)
-            .eq("auth_id", auth_id)
-            .in_(
-                "episode_number",
-                [
-                    1,
-                    int(
-                        self.db_service.get_story_info(story_id, auth_id)[
-                            "num_episodes"
-                        ]
-                        * 0.5
-                    ),
-                ],
-            )
-            .limit(2)
-            .execute()
+        foundational_chunks = retrieval_cache.pinned(
+            story_id,
+            auth_id,
+            PINNED_CHUNKS,
+            lambda: self._foundational_chunks(story_id, auth_id),
         )
 
-        chunks = (chunks_result.data or []) + (foundational_chunks.data or [])
+        chunks = matches + foundational_chunks
         return [
             {
                 "id": chunk["id"],
@@ -119,32 +221,120 @@ class EmbeddingService:
             }
             for chunk in sorted(
                 chunks,
-                key=lambda x: (x.get("importance_score", 0), x.get("similarity", 0)),
+                key=lambda x: (
+                    x.get("importance_score", 0),
+                    x.get("rrf_score", x.get("similarity", 0)),
+                ),
                 reverse=True,
             )[:k]
         ]
 
+    def _vector_matches(
+        self, story_id: int, query: str, auth_id: str, k: int
+    ) -> List[Dict]:
+        from app.utils import vectors
+
+        query_embedding = retrieval_cache.query_embedding(
+            query,
+            settings.QUERY_EMBEDDING_CACHE_FORMAT,
+            lambda: self.embedding_model.get_text_embedding(query),
+        )
+        wire_format = "json" if settings.EMBEDDING_WIRE_FORMAT == "json" else "float32"
+        result = self.client.rpc(
+            "match_chunks",
+            {
+                "p_story_id": story_id,
+                "p_auth_id": auth_id,
+                "p_query_embedding": vectors.encode_for_insert(query_embedding, wire_format),
+                "p_k": k,
+            },
+        ).execute()
+        return result.data or []
+
+    def _hybrid_matches(
+        self, story_id: int, query: str, auth_id: str, k: int
+    ) -> List[Dict]:
+        """
+        BM25 and vector candidates fused by reciprocal rank; the BM25 ones
+        alone when the query is mostly character or place names.
+        """
+        index = bm25_indexes.get(story_id, lambda: self._bm25_corpus(story_id, auth_id))
+        candidates = max(k, settings.HYBRID_CANDIDATES)
+        lexical = index.search(query, candidates, settings.HYBRID_ENTITY_BOOST)
+        if (
+            len(lexical) >= k
+            and index.entity_share(query) >= settings.HYBRID_LEXICAL_ENTITY_SHARE
+        ):
+            registry.inc("shakescript_hybrid_retrieval_total", path="lexical")
+            return reciprocal_rank_fusion([lexical], settings.HYBRID_RRF_K)
+        registry.inc("shakescript_hybrid_retrieval_total", path="fused")
+        vector = self._vector_matches(story_id, query, auth_id, candidates)
+        return reciprocal_rank_fusion([vector, lexical], settings.HYBRID_RRF_K)
+
+    def _bm25_corpus(self, story_id: int, auth_id: str):
+        """A story's chunks, plus its characters and places as entity names."""
+        chunks = (
+            self.client.table("chunks")
+            .select("id, episode_id, episode_number, chunk_number, content, importance_score, characters")
+            .eq("story_id", story_id)
+            .eq("auth_id", auth_id)
+            .order("episode_number")
+            .order("chunk_number")
+            .execute()
+        )
+        header = self.db_service.get_story_header(story_id, auth_id)
+        entities = [] if "error" in header else [
+            *(header.get("setting") or {}).keys(),
+            *(character.get("Name", "") for character in header.get("characters", [])),
+        ]
+        return chunks.data or [], entities
+
+    def _foundational_chunks(self, story_id: int, auth_id: str) -> List[Dict]:
+        """
+        The first chunks of the opening and midpoint episodes: flagged ones
+        with FOUNDATIONAL_CHUNKS_ENABLED, else by episode number, which takes
+        a lookup of the story's length first.
+        """
+        query = (
+            self.client.table("chunks")
+            .select("id, episode_number, chunk_number, content, importance_score")
+            .eq("story_id", story_id)
+            .eq("auth_id", auth_id)
+        )
+        if settings.FOUNDATIONAL_CHUNKS_ENABLED:
+            query = query.eq("is_foundational", True)
+        else:
+            story = (
+                self.client.table("stories")
+                .select("num_episodes")
+                .eq("id", story_id)
+                .eq("auth_id", auth_id)
+                .execute()
+            )
+            if not story.data:
+                return []
+            num_episodes = story.data[0].get("num_episodes") or 1
+            query = query.in_("episode_number", [1, int(num_episodes * 0.5)])
+        result = (
+            query.order("episode_number")
+            .order("chunk_number")
+            .limit(PINNED_CHUNKS)
+            .execute()
+        )
+        return result.data or []
+
     def _calculate_importance_score(
         self,
-        story_id: int,
         chunk: str,
         characters: List[str],
         episode_number: int,
-        auth_id: str,
+        num_episodes: int,
     ) -> float:
         score = 0
         for char in characters:
             if char.lower() in chunk.lower():
                 score += 1
 
-        story_info = self.db_service.get_story_info(story_id, auth_id)
-        if "error" in story_info:
-            return score
-
-        num_episodes = story_info.get("num_episodes", 1)
-        if num_episodes == 0:
-            num_episodes = 1
-
-        if episode_number == 1 or episode_number == int(num_episodes * 0.5):
+        if is_foundational(episode_number, num_episodes):
             score += 2
         return score
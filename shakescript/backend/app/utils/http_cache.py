@@ -0,0 +1,106 @@
+import hashlib
+import json
+from typing import Any, Callable, Optional
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from app.core.cache import read_cache
+
+# Content codings a body may be sent with (app/utils/fast_json.py).
+CODINGS = ("gzip", "br")
+
+
+def compute_etag(payload: Any) -> str:
+    """
+    Weak ETag derived from the JSON form of a response payload.
+    """
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return f'W/"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+
+
+def story_etag(story_id: int, version: int) -> str:
+    """
+    Strong ETag for any representation of a story at a given version.
+    """
+    return f'"story-{story_id}-v{version}"'
+
+
+def expected_story_version(if_match: Optional[str], story_id: int) -> Optional[int]:
+    """
+    Story version required by an If-Match header, None when there is no
+    precondition. A tag that is not this story's ETag can never match: 412.
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+    prefix = f'"story-{story_id}-v'
+    for candidate in if_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith(prefix) and candidate.endswith('"'):
+            version = candidate[len(prefix) : -1]
+            if version.isdigit():
+                return int(version)
+    raise HTTPException(status_code=412, detail="If-Match does not match this story")
+
+
+def coded_etag(etag: str, coding: Optional[str]) -> str:
+    """
+    ETag of a body sent with a content coding. gzip/br bodies are different
+    bytes from the identity one, so a strong tag gets the coding as a suffix
+    ("story-1-v3-gzip", RFC 9110 8.8.3); weak tags are left as they are.
+    """
+    if not coding or etag.startswith("W/"):
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+
+def matched_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """
+    Weak comparison of an If-None-Match header against an ETag or one of its
+    coded variants; returns the tag that matched (what a 304 should carry).
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    variants = {
+        coded_etag(etag, coding).removeprefix("W/"): coded_etag(etag, coding)
+        for coding in (None, *CODINGS)
+    }
+    for candidate in if_none_match.split(","):
+        tag = variants.get(candidate.strip().removeprefix("W/"))
+        if tag is not None:
+            return tag
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    return matched_etag(if_none_match, etag) is not None
+
+
+def not_modified(etag: str) -> Response:
+    # Which coded tag applies depends on Accept-Encoding.
+    return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+
+
+def cached_user_response(
+    request: Request,
+    response: Response,
+    auth_id: str,
+    name: str,
+    loader: Callable[[], Any],
+):
+    """
+    Serve a per-user read model from the read cache, loading it on a miss.
+    Returns a bare 304 when the client already holds the current version.
+    """
+    entry = read_cache.get(auth_id, name)
+    if entry is None:
+        body = jsonable_encoder(loader())
+        entry = {"etag": compute_etag(body), "body": body}
+        read_cache.set(auth_id, name, entry)
+
+    if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return not_modified(entry["etag"])
+
+    response.headers["ETag"] = entry["etag"]
+    response.headers["Cache-Control"] = "private, no-cache"
+    return entry["body"]
@@ -0,0 +1,232 @@
+import json
+from typing import Any, Dict, List, Optional
+
+# Characters that may legitimately follow the closing quote of a JSON string,
+# and characters that may start the next value after a comma.
+_STRING_TERMINATORS = frozenset(":}]")
+_VALUE_STARTS = frozenset("\"'{}[]-0123456789")
+_JSON_ESCAPES = frozenset('"\\/bfnrtu')
+_WHITESPACE = frozenset(" \t\r\n")
+_BARE_WORD = frozenset(
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789+-._"
+)
+_BARE_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+# How many "{" positions to try before giving up; keeps the worst case linear.
+MAX_START_CANDIDATES = 3
+
+
+def strip_code_fences(text: str) -> str:
+    """
+    Return the body of the first ``` fenced block, or the text unchanged.
+    An unterminated fence keeps everything after the opening line.
+    """
+    start = text.find("```")
+    if start == -1:
+        return text
+    body_start = text.find("\n", start + 3)
+    if body_start == -1:
+        return text[start + 3 :]
+    end = text.find("```", body_start + 1)
+    return text[body_start + 1 : end if end != -1 else len(text)]
+
+
+def _skip_whitespace(text: str, index: int) -> int:
+    while index < len(text) and text[index] in _WHITESPACE:
+        index += 1
+    return index
+
+
+def _closes_string(text: str, index: int) -> bool:
+    """
+    Decide whether the quote at `index` ends the current string. It does when
+    what follows looks like JSON structure rather than more prose. The
+    lookahead only covers whitespace and at most one comma, none of which can
+    be inspected again by another quote's lookahead.
+    """
+    after = _skip_whitespace(text, index + 1)
+    if after >= len(text):
+        return True
+    follower = text[after]
+    if follower in _STRING_TERMINATORS:
+        return True
+    if follower == ",":
+        after = _skip_whitespace(text, after + 1)
+        return after >= len(text) or text[after] in _VALUE_STARTS
+    return False
+
+
+def _bare_word(word: str) -> str:
+    if word in ("true", "false", "null"):
+        return word
+    if word in _BARE_LITERALS:
+        return _BARE_LITERALS[word]
+    if word[0] in "-0123456789":
+        try:
+            float(word)
+            return word
+        except ValueError:
+            pass
+    return json.dumps(word)
+
+
+def repair_json(text: str, start: int = 0) -> Optional[str]:
+    """
+    Single left-to-right pass that turns the JSON-ish value starting at `start`
+    into strict JSON. Handles trailing commas, unescaped quotes and raw
+    newlines inside strings, single-quoted strings, Python literals, truncated
+    output and prose after the closing brace. Every character is visited a
+    constant number of times, so runtime is linear in len(text).
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    i = start
+    n = len(text)
+
+    def drop_trailing_comma():
+        if out and out[-1] == ",":
+            out.pop()
+
+    while i < n:
+        ch = text[i]
+
+        if ch in _WHITESPACE:
+            i += 1
+            continue
+
+        if ch == '"' or ch == "'":
+            quote = ch
+            out.append('"')
+            i += 1
+            while i < n:
+                c = text[i]
+                if c == "\\" and i + 1 < n:
+                    nxt = text[i + 1]
+                    if nxt in _JSON_ESCAPES:
+                        out.append(c + nxt)
+                    elif nxt == "'":
+                        out.append("'")
+                    else:
+                        out.append("\\\\" + nxt)
+                    i += 2
+                    continue
+                if c == quote:
+                    if _closes_string(text, i):
+                        break
+                    # A quote in the middle of prose: keep it as content.
+                    out.append('\\"' if quote == '"' else "'")
+                    i += 1
+                    continue
+                if c == '"':
+                    out.append('\\"')
+                elif c in _ESCAPES:
+                    out.append(_ESCAPES[c])
+                elif c < " ":
+                    out.append(f"\\u{ord(c):04x}")
+                else:
+                    out.append(c)
+                i += 1
+            out.append('"')
+            i += 1
+            continue
+
+        if ch == "{" or ch == "[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            i += 1
+            continue
+
+        if ch == "}" or ch == "]":
+            if not stack:
+                break
+            drop_trailing_comma()
+            if out and out[-1] == ":":
+                out.append("null")
+            out.append(stack.pop())
+            i += 1
+            if not stack:
+                break
+            continue
+
+        if ch == "," or ch == ":":
+            if not stack:
+                break
+            if ch == "," and out and out[-1] in (",", "[", "{"):
+                i += 1
+                continue
+            out.append(ch)
+            i += 1
+            continue
+
+        if ch in _BARE_WORD:
+            j = i
+            while j < n and text[j] in _BARE_WORD:
+                j += 1
+            out.append(_bare_word(text[i:j]))
+            i = j
+            continue
+
+        # Anything else outside a string (stray prose, comments) is skipped.
+        i += 1
+
+    if not out:
+        return None
+    drop_trailing_comma()
+    if out[-1] == ":":
+        out.append("null")
+    while stack:
+        drop_trailing_comma()
+        out.append(stack.pop())
+    return "".join(out)
+
+
+def extract_json(text: str) -> Optional[Any]:
+    """
+    Best-effort extraction of the first JSON object from LLM output.
+    Returns None if nothing parseable is found.
+    """
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError, RecursionError):
+        pass
+
+    body = strip_code_fences(text)
+    start = body.find("{")
+    for _ in range(MAX_START_CANDIDATES):
+        if start == -1:
+            break
+        repaired = repair_json(body, start)
+        if repaired:
+            try:
+                return json.loads(repaired)
+            except (json.JSONDecodeError, RecursionError):
+                pass
+        start = body.find("{", start + 1)
+    return None
+
+
+def extract_episode(
+    response_text: str, metadata: Dict[str, Any], include_summary: bool = False
+) -> Dict[str, Any]:
+    """
+    Parse an episode generation response into a dict with at least
+    episode_title and episode_content.
+    """
+    data = extract_json(response_text)
+    if isinstance(data, dict) and data.get("episode_content"):
+        return data
+
+    data = data if isinstance(data, dict) else {}
+    episode = {
+        "episode_title": data.get("episode_title")
+        or f"Episode {metadata.get('current_episode', 1)}",
+        "episode_content": data.get("episode_content") or response_text,
+    }
+    if include_summary:
+        episode["episode_summary"] = (
+            data.get("episode_summary") or "Episode summary not available."
+        )
+    return episode
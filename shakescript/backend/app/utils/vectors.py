@@ -0,0 +1,108 @@
+"""
+Embedding vectors as float32 arrays, int8 scalar quantisation and compact
+encodings.
+
+An embedding as a list of Python floats is ~25 KB per 768-d vector and ~15 KB
+of JSON. Here it is a float32 array (3 KB), or int8 values with one float32
+scale per vector (~0.8 KB). Two encodings:
+
+  to_pgvector   pgvector text literal for inserts and RPC parameters, with
+                only the precision float32 (or int8) carries
+  pack/unpack   base64 of the raw bytes, for local caches (JSON-safe, so the
+                SQLite cache backend can hold it)
+
+numpy is imported with this module; import it where vectors are handled, not
+at app startup.
+"""
+
+import base64
+import struct
+from typing import Iterable, NamedTuple, Sequence, Union
+import numpy as np
+
+VectorLike = Union[Sequence[float], np.ndarray]
+
+WIRE_FORMATS = ("json", "float32", "int8")
+
+# pack() headers
+_FLOAT32 = b"f"
+_INT8 = b"q"
+
+
+class QuantizedVector(NamedTuple):
+    values: np.ndarray  # int8
+    scale: float
+
+
+def as_float32(vector: VectorLike) -> np.ndarray:
+    return np.asarray(vector, dtype=np.float32).reshape(-1)
+
+
+def as_matrix(vectors: Iterable[VectorLike]) -> np.ndarray:
+    """(n, dim) float32 matrix from a batch of embeddings."""
+    return np.asarray(list(vectors), dtype=np.float32)
+
+
+def quantize_int8(vector: VectorLike) -> QuantizedVector:
+    """Symmetric scalar quantisation: values in [-127, 127] times `scale`."""
+    values = as_float32(vector)
+    peak = float(np.max(np.abs(values))) if values.size else 0.0
+    scale = peak / 127.0 if peak else 1.0
+    quantized = np.clip(np.rint(values / scale), -127, 127).astype(np.int8)
+    return QuantizedVector(quantized, scale)
+
+
+def dequantize(quantized: QuantizedVector) -> np.ndarray:
+    return quantized.values.astype(np.float32) * np.float32(quantized.scale)
+
+
+def to_pgvector(vector: VectorLike, decimals: int = 8) -> str:
+    """
+    '[v1,v2,...]' rounded to `decimals` places, written as integers with an
+    exponent ('1234567e-8'), which is both shorter and much faster to format
+    than floats. Unit-norm embeddings need ~8 places to keep float32 precision.
+    """
+    scaled = np.rint(as_float32(vector).astype(np.float64) * 10.0**decimals)
+    suffix = f"e-{decimals}"
+    return "[" + (suffix + ",").join(map(str, scaled.astype(np.int64).tolist())) + suffix + "]"
+
+
+def from_pgvector(text: str) -> np.ndarray:
+    return np.array(text.strip("[]").split(","), dtype=np.float32)
+
+
+def encode_for_insert(vector: VectorLike, wire_format: str) -> Union[str, list]:
+    """
+    An embedding as sent to PostgREST. json is the list of floats as before;
+    float32 and int8 are pgvector text literals, the latter rounded through
+    int8 quantisation (5 places is all it carries).
+    """
+    if wire_format == "json":
+        return [float(v) for v in vector]
+    if wire_format == "float32":
+        return to_pgvector(vector)
+    if wire_format == "int8":
+        return to_pgvector(dequantize(quantize_int8(vector)), decimals=5)
+    raise ValueError(f"Unknown embedding wire format {wire_format!r}; expected one of {WIRE_FORMATS}")
+
+
+def pack(vector: VectorLike, kind: str = "float32") -> str:
+    """base64 of float32 bytes, or of an int8 vector and its scale."""
+    if kind == "int8":
+        quantized = quantize_int8(vector)
+        raw = _INT8 + struct.pack("<f", quantized.scale) + quantized.values.tobytes()
+    elif kind == "float32":
+        raw = _FLOAT32 + as_float32(vector).astype("<f4").tobytes()
+    else:
+        raise ValueError(f"Unknown vector kind {kind!r}; expected float32 or int8")
+    return base64.b64encode(raw).decode("ascii")
+
+
+def unpack(data: str) -> np.ndarray:
+    raw = base64.b64decode(data)
+    if raw[:1] == _INT8:
+        (scale,) = struct.unpack("<f", raw[1:5])
+        return dequantize(QuantizedVector(np.frombuffer(raw[5:], dtype=np.int8), scale))
+    if raw[:1] == _FLOAT32:
+        return np.frombuffer(raw[1:], dtype="<f4").astype(np.float32)
+    raise ValueError("Not a packed vector")
@@ -0,0 +1,221 @@
+"""
+Embedding worker: drains the embedding_jobs outbox (migrations/004_embedding_jobs.sql).
+
+Each of --concurrency slots claims up to --batch-size ready jobs at a time,
+chunks and embeds all of their episodes with one embedding batch and one
+insert, and marks them done. If a batch fails, its jobs are retried one by
+one so a single bad episode cannot hold back the others. A failing job is
+retried with exponential backoff and marked failed after
+EMBEDDING_WORKER_MAX_ATTEMPTS. A crashed worker's claims are picked up again
+once their lock expires.
+
+Metrics (served on --metrics-port at /metrics):
+  shakescript_embedding_jobs_total{outcome}   done, retried, failed
+  shakescript_embedding_job_lag_seconds       enqueue -> done
+  shakescript_embedding_batch_seconds         one claimed batch
+  shakescript_embedding_queue_depth           pending + running jobs
+  shakescript_embedding_queue_oldest_seconds  age of the oldest of them
+
+    python -m app.workers.embedding_worker [--concurrency 2] [--batch-size 8]
+        [--poll-interval 1] [--metrics-port 9101] [--once]
+"""
+
+import argparse
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import instrument_client, registry
+from app.services.db_service.embeddingJobsDB import EmbeddingJobsDB
+from app.services.embedding_service import EmbeddingService
+
+logger = logging.getLogger(__name__)
+
+
+def _age(timestamp: Optional[str]) -> float:
+    if not timestamp:
+        return 0.0
+    enqueued = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    return max(0.0, (datetime.now(timezone.utc) - enqueued).total_seconds())
+
+
+class EmbeddingWorker:
+    def __init__(
+        self,
+        client,
+        embedding_service: Optional[EmbeddingService] = None,
+        worker_id: Optional[str] = None,
+        batch_size: int = settings.EMBEDDING_WORKER_BATCH_SIZE,
+        concurrency: int = settings.EMBEDDING_WORKER_CONCURRENCY,
+        poll_interval: float = settings.EMBEDDING_WORKER_POLL_SECONDS,
+    ):
+        self.jobs = EmbeddingJobsDB(client)
+        self.embedding_service = embedding_service or EmbeddingService(client)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stop = threading.Event()
+
+    def retry_in(self, attempts: int) -> Optional[float]:
+        """Backoff before the next attempt, None once attempts are used up."""
+        if attempts >= settings.EMBEDDING_WORKER_MAX_ATTEMPTS:
+            return None
+        delay = min(
+            settings.EMBEDDING_WORKER_RETRY_BASE_SECONDS * 2 ** (attempts - 1),
+            settings.EMBEDDING_WORKER_RETRY_MAX_SECONDS,
+        )
+        return delay * random.uniform(0.5, 1.0)
+
+    def _embed(self, jobs: List[Dict[str, Any]], holder: str):
+        self.embedding_service.process_and_store_batch(
+            [
+                {
+                    "story_id": job["story_id"],
+                    "episode_id": job["episode_id"],
+                    "episode_number": job["episode_number"],
+                    "content": job["content"],
+                    "characters": job.get("character_names") or [],
+                    "auth_id": job["auth_id"],
+                }
+                for job in jobs
+            ]
+        )
+        self.jobs.complete([job["id"] for job in jobs], holder)
+        for job in jobs:
+            registry.inc("shakescript_embedding_jobs_total", outcome="done")
+            registry.observe("shakescript_embedding_job_lag_seconds", _age(job.get("enqueued_at")))
+
+    def _fail(self, job: Dict[str, Any], holder: str, error: Exception):
+        retry_in = self.retry_in(job["attempts"])
+        outcome = "failed" if retry_in is None else "retried"
+        registry.inc("shakescript_embedding_jobs_total", outcome=outcome)
+        logger.warning(
+            f"Embedding job {job['id']} (story {job['story_id']} episode "
+            f"{job['episode_number']}) {outcome} after attempt {job['attempts']}: {error}"
+        )
+        self.jobs.fail(job["id"], holder, f"{type(error).__name__}: {error}", retry_in)
+
+    def process_batch(self, slot: int = 0) -> int:
+        """Claim and process one batch; returns how many jobs were claimed."""
+        holder = f"{self.worker_id}/{slot}"
+        jobs = self.jobs.claim(holder, self.batch_size, settings.EMBEDDING_WORKER_LOCK_SECONDS)
+        if not jobs:
+            return 0
+        start = time.perf_counter()
+        try:
+            self._embed(jobs, holder)
+        except Exception as batch_error:
+            if len(jobs) == 1:
+                self._fail(jobs[0], holder, batch_error)
+            else:
+                for job in jobs:
+                    try:
+                        self._embed([job], holder)
+                    except Exception as e:
+                        self._fail(job, holder, e)
+        registry.observe("shakescript_embedding_batch_seconds", time.perf_counter() - start)
+        return len(jobs)
+
+    def refresh_backlog(self) -> Dict[str, Any]:
+        backlog = self.jobs.backlog()
+        registry.set_gauge("shakescript_embedding_queue_depth", backlog["depth"])
+        registry.set_gauge(
+            "shakescript_embedding_queue_oldest_seconds", _age(backlog["oldest_enqueued_at"])
+        )
+        return backlog
+
+    def _slot(self, slot: int, until_idle: bool):
+        while not self.stop.is_set():
+            try:
+                claimed = self.process_batch(slot)
+            except Exception as e:
+                logger.warning(f"Embedding worker slot {slot}: {e}")
+                claimed = 0
+            if not claimed:
+                if until_idle:
+                    return
+                self.stop.wait(self.poll_interval)
+
+    def run(self, until_idle: bool = False):
+        """
+        Run --concurrency slots until stop is set (or, with until_idle, until
+        no job is ready), refreshing the backlog gauges every poll interval.
+        """
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="embed") as pool:
+            slots = [pool.submit(self._slot, i, until_idle) for i in range(self.concurrency)]
+            try:
+                while not self.stop.is_set() and not all(s.done() for s in slots):
+                    try:
+                        self.refresh_backlog()
+                    except Exception as e:
+                        logger.warning(f"Embedding backlog query failed: {e}")
+                    self.stop.wait(self.poll_interval)
+            except BaseException:
+                # Let the slots finish their current batch before the pool joins them.
+                self.stop.set()
+                raise
+        self.refresh_backlog()
+
+
+def serve_metrics(port: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=settings.EMBEDDING_WORKER_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_WORKER_BATCH_SIZE)
+    parser.add_argument("--poll-interval", type=float, default=settings.EMBEDDING_WORKER_POLL_SECONDS)
+    parser.add_argument("--metrics-port", type=int, help="Serve /metrics on this port")
+    parser.add_argument("--once", action="store_true", help="Exit once no job is ready")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from supabase import create_client
+
+    client = instrument_client(create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY))
+    worker = EmbeddingWorker(
+        client,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+    )
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop.set())
+    try:
+        worker.run(until_idle=args.once)
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+Offline benchmarks for the backend. Run from shakescript/backend, e.g.
+
+    python -m benchmarks.bench_serialization
+
+Nothing here talks to Supabase or Gemini: benchmarks.fakes provides in-memory
+stand-ins for the Supabase client, the Gemini model and the embedder, and
+placeholder credentials are set so that app.core.config can be imported
+without a .env file.
+"""
+
+import os
+
+for _name in ("SUPABASE_URL", "SUPABASE_KEY", "GEMINI_API_KEY", "OPENAI_API_KEY"):
+    os.environ.setdefault(_name, "http://localhost" if _name == "SUPABASE_URL" else "offline")
@@ -0,0 +1,76 @@
+"""
+Headless batch runner (app/batch_runner.py) against the fake backends.
+
+The same manifest is run with 1 worker and with --workers; reports
+episodes/min and tokens/min for each. Completion, resume and failure
+handling are tested in tests/test_batch_runner.py.
+
+    python -m benchmarks.bench_batch_runner [--stories 8] [--episodes 4]
+        [--workers 4] [--llm-latency 0.01]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+from app.batch_runner import BatchRunner, Checkpoint
+from app.models.schemas import BatchStoryRequest
+from benchmarks.fakes import fake_backend
+
+
+def manifest(args):
+    # One owner per story keeps each under the per-user daily episode limit.
+    return [
+        BatchStoryRequest(
+            key=f"story-{i}",
+            prompt=f"A lighthouse keeper finds letter number {i}",
+            num_episodes=args.episodes,
+            batch_size=2,
+            refinement="HUMAN" if i % 2 else "AI",
+            auth_id=f"catalogue-{i}",
+        )
+        for i in range(args.stories)
+    ]
+
+
+def run(args, entries, workers, checkpoint_path):
+    client, model, embedder = fake_backend([e.auth_id for e in entries], args.llm_latency)
+    runner = BatchRunner(
+        client,
+        Checkpoint(checkpoint_path),
+        workers=workers,
+        model=model,
+        embedding_model=embedder,
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        return runner.run(entries)
+
+
+def throughput(args):
+    entries = manifest(args)
+    results = {}
+    for workers in (1, args.workers):
+        path = os.path.join(tempfile.mkdtemp(), "checkpoint")
+        report = run(args, entries, workers, path)
+        results[f"workers_{workers}"] = {
+            k: report[k] for k in ("stories", "episodes", "episodes_per_min", "tokens_per_min")
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stories", type=int, default=8)
+    parser.add_argument("--episodes", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    results = throughput(args)
+    print(json.dumps({"benchmark": "batch_runner", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
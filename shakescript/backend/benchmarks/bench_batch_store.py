@@ -0,0 +1,105 @@
+"""
+Per-episode vs batched storage of a validated batch
+(EpisodesDB.store_episode_batch, migrations/003_store_episode_batch.sql).
+
+For each batch size, stores the same validated episodes through
+store_validated_episodes with BATCH_EPISODE_STORE_ENABLED off and on, at
+--db-latency seconds per round trip. Every episode features the two seeded
+characters plus a new one, and shifts emotional states, so the character
+merge and milestones are exercised. Chunking is left to background tasks
+that are not run; only storage is measured.
+
+Reports DB round trips and latency per mode. That the batched store leaves
+the same state as the per-episode path in one round trip is tested in
+tests/test_batch_store.py.
+
+    python -m benchmarks.bench_batch_store [--sizes 1,2,5,10] [--db-latency 0.005]
+        [--repeat 3]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+from fastapi import BackgroundTasks
+from app.core.config import settings
+from benchmarks.bench_story_service import AUTH_ID, offline_world
+from benchmarks.fakes import _prose
+
+STATES = ("hopeful", "anxious", "hopeful", "grim", "resolute")
+
+
+def batch(size: int):
+    episodes = []
+    for n in range(1, size + 1):
+        episodes.append(
+            {
+                "episode_number": n,
+                "episode_title": f"Episode {n}",
+                "episode_content": _prose(120, n),
+                "episode_summary": f"Summary {n}",
+                "episode_emotional_state": STATES[n % len(STATES)],
+                "Key Events": [
+                    {"event": f"Clue {n}", "tier": "foundational"},
+                    {"event": f"Rumour {n}", "tier": "minor"},
+                ],
+                "Settings": {f"Pier {n % 3}": "Wet planks"},
+                "characters_featured": [
+                    {"Name": "Mira", "Emotional_State": STATES[n % len(STATES)]},
+                    {"Name": "Captain Rhee", "Relationship": {"Mira": f"ally {n}"}},
+                    {
+                        "Name": f"Stranger {n % 2}",
+                        "Role": "Witness",
+                        "Emotional_State": STATES[(n + 1) % len(STATES)],
+                    },
+                ],
+            }
+        )
+    return episodes
+
+
+def store(args, size: int, batched: bool):
+    settings.BATCH_EPISODE_STORE_ENABLED = batched
+    latencies, trips = [], 0
+    for _ in range(args.repeat):
+        world = offline_world(db_latency=args.db_latency)
+        story_id = world.seed_story(0, size, 120)
+        service = world.service()
+        before = world.db.calls
+        start = time.perf_counter()
+        service.store_validated_episodes(story_id, batch(size), size, AUTH_ID, BackgroundTasks())
+        latencies.append((time.perf_counter() - start) * 1000)
+        trips = world.db.calls - before
+    return {"db_round_trips": trips, "latency_ms": round(statistics.median(latencies), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1,2,3,4,5,6,7,8,9,10")
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    enabled = settings.BATCH_EPISODE_STORE_ENABLED
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for size in (int(s) for s in args.sizes.split(",")):
+                per_episode, batched = store(args, size, False), store(args, size, True)
+                results.append(
+                    {
+                        "batch_size": size,
+                        "per_episode": per_episode,
+                        "batched": batched,
+                        "speedup": round(per_episode["latency_ms"] / batched["latency_ms"], 1),
+                    }
+                )
+    finally:
+        settings.BATCH_EPISODE_STORE_ENABLED = enabled
+    print(json.dumps({"benchmark": "batch_store", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Embedding outbox and worker (app/workers/embedding_worker.py).
+
+Validated episodes are stored with EMBEDDING_QUEUE_ENABLED on the fake
+backends, then drained by EmbeddingWorker:
+
+  batching    --stories x --episodes jobs drained with --batch-size vs 1 job
+              per claim: embedding requests, DB round trips and drain time
+  wait        how long drafting waits for the story's pending jobs when a
+              worker starts late, and when none runs before the timeout
+
+Crash recovery, retries, the concurrency limit, the wait and when it drops
+the retrieval cache, and the backlog metrics are tested in
+tests/test_embedding_queue.py.
+
+    python -m benchmarks.bench_embedding_queue [--stories 4] [--episodes 6]
+        [--batch-size 8] [--concurrency 2] [--embed-latency 0.02]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import threading
+import time
+from fastapi import BackgroundTasks
+from app.core.config import settings
+from app.core.metrics import registry
+from app.workers.embedding_worker import EmbeddingWorker
+from benchmarks.bench_batch_store import batch
+from benchmarks.bench_story_service import AUTH_ID, World, offline_world
+
+
+def world(args, stories: int, episodes: int):
+    w = offline_world(db_latency=args.db_latency, embed_latency=args.embed_latency)
+    service = w.service()
+    story_ids = []
+    for _ in range(stories):
+        story_id = w.seed_story(0, episodes, 120)
+        service.store_validated_episodes(story_id, batch(episodes), episodes, AUTH_ID, BackgroundTasks())
+        story_ids.append(story_id)
+    return w, story_ids
+
+
+def worker_for(w: World, embedding_service=None, **kwargs) -> EmbeddingWorker:
+    service = w.service()
+    return EmbeddingWorker(
+        service.client,
+        embedding_service=embedding_service or service.embedding_service,
+        poll_interval=0.01,
+        **kwargs,
+    )
+
+
+def chunk_keys(w: World):
+    return [(c["episode_id"], c["chunk_number"]) for c in w.db.tables.get("chunks", [])]
+
+
+def statuses(w: World):
+    out = {}
+    for job in w.db.tables.get("embedding_jobs", []):
+        out[job["status"]] = out.get(job["status"], 0) + 1
+    return out
+
+
+def drain(args, batch_size: int):
+    w, _ = world(args, args.stories, args.episodes)
+    queued = statuses(w)
+    embeds, trips = w.embedder.calls, w.db.calls
+    start = time.perf_counter()
+    worker_for(w, batch_size=batch_size, concurrency=args.concurrency).run(until_idle=True)
+    keys = chunk_keys(w)
+    return {
+        "queued": queued.get("pending", 0),
+        "done": statuses(w).get("done", 0),
+        "embedding_requests": w.embedder.calls - embeds,
+        "db_round_trips": w.db.calls - trips,
+        "drain_ms": round((time.perf_counter() - start) * 1000, 1),
+        "chunks": len(keys),
+        "duplicate_chunks": len(keys) - len(set(keys)),
+    }
+
+
+def batching(args):
+    return {"one_per_claim": drain(args, 1), "batched": drain(args, args.batch_size)}
+
+
+def wait(args):
+    w, (story_id,) = world(args, 1, args.episodes)
+    service = w.service()
+    start = time.perf_counter()
+    timed_out = service.wait_for_embeddings(story_id, AUTH_ID, timeout=0.2)
+    timeout_ms = (time.perf_counter() - start) * 1000
+
+    late = threading.Timer(0.2, lambda: worker_for(w).run(until_idle=True))
+    late.start()
+    start = time.perf_counter()
+    drained = service.wait_for_embeddings(story_id, AUTH_ID, timeout=5)
+    drained_ms = (time.perf_counter() - start) * 1000
+    late.join()
+    return {
+        "no_worker": {"drained": timed_out, "waited_ms": round(timeout_ms)},
+        "late_worker": {"drained": drained, "waited_ms": round(drained_ms)},
+    }
+
+
+SCENARIOS = (batching, wait)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stories", type=int, default=4)
+    parser.add_argument("--episodes", type=int, default=6)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    enabled = settings.EMBEDDING_QUEUE_ENABLED
+    settings.EMBEDDING_QUEUE_ENABLED = True
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for scenario in SCENARIOS:
+                registry.clear()
+                results[scenario.__name__] = scenario(args)
+    finally:
+        settings.EMBEDDING_QUEUE_ENABLED = enabled
+    print(json.dumps({"benchmark": "embedding_queue", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
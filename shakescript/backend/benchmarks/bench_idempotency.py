@@ -0,0 +1,146 @@
+"""
+Idempotency-Key handling on the expensive POSTs (app/core/idempotency.py).
+
+Runs the real routes through TestClient on the fake backends:
+
+  concurrent_duplicates  --clients identical generate-batch calls at once,
+                         with one key and without: statuses, replays, LLM
+                         calls and wall time for each
+  replay                 latency and DB/LLM work of a retry answered from
+                         the stored result, next to the first call
+  cross_worker           --processes processes racing to claim one key in a
+                         shared SQLite store: winners and claim time
+
+The behaviour (one execution per key, replay, 422 on reuse, errors that
+release the key, the same-event-loop join) is tested in
+tests/test_idempotency.py.
+
+    python -m benchmarks.bench_idempotency [--clients 8] [--llm-latency 0.02]
+        [--processes 4]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from app.core import idempotency
+from app.core.idempotency import REPLAYED_HEADER, SqliteIdempotencyStore
+from app.main import app
+from benchmarks.bench_story_service import API, AUTH_ID, client_for, offline_world
+
+HEADERS = {"Authorization": "Bearer bench"}
+
+
+def world(args):
+    w = offline_world(llm_latency=args.llm_latency, episode_words=200)
+    idempotency.store.clear()
+    return w, w.seed_story(0, 4, 200)
+
+
+def generate(client, story_id, key=None, batch_size=2):
+    headers = dict(HEADERS, **({"Idempotency-Key": key} if key else {}))
+    return client.post(
+        f"{API}/episodes/{story_id}/generate-batch",
+        params={"batch_size": batch_size, "refinement_type": "HUMAN"},
+        headers=headers,
+    )
+
+
+def burst(args, key):
+    w, story_id = world(args)
+    results = [None] * args.clients
+
+    def call(i):
+        results[i] = generate(client_for(w), story_id, key)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(args.clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {
+        "statuses": sorted({r.status_code for r in results}),
+        "replayed": sum(1 for r in results if r.headers.get(REPLAYED_HEADER) == "true"),
+        "episode_llm_calls": w.model.calls_by_kind.get("episode", 0),
+        "wall_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def concurrent_duplicates(args):
+    return {"with_key": burst(args, "retry-1"), "without_key": burst(args, None)}
+
+
+def replay(args):
+    w, story_id = world(args)
+    client = client_for(w)
+    timings = []
+    for _ in range(2):
+        before = w.counters()
+        start = time.perf_counter()
+        generate(client, story_id, "retry-2")
+        elapsed = time.perf_counter() - start
+        after = w.counters()
+        timings.append(
+            {
+                "ms": round(elapsed * 1000, 1),
+                **{k: after[k] - before[k] for k in ("db_round_trips", "llm_calls")},
+            }
+        )
+    return {"first": timings[0], "retry": timings[1]}
+
+
+def _claim(path, barrier, wins):
+    store = SqliteIdempotencyStore(path, 100)
+    barrier.wait()
+    if store.claim(AUTH_ID, "race", "fp", 60) is None:
+        with wins.get_lock():
+            wins.value += 1
+
+
+def cross_worker(args):
+    ctx = multiprocessing.get_context("fork")
+    path = os.path.join(tempfile.mkdtemp(), "idempotency.db")
+    SqliteIdempotencyStore(path, 100)
+    barrier, wins = ctx.Barrier(args.processes), ctx.Value("i", 0)
+    procs = [ctx.Process(target=_claim, args=(path, barrier, wins)) for _ in range(args.processes)]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    return {
+        "processes": args.processes,
+        "winners": wins.value,
+        "wall_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+SCENARIOS = (concurrent_duplicates, replay, cross_worker)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.02)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    results = {}
+    # Service prints would interleave with the report; silenced once here
+    # because redirect_stdout is process-wide and not safe per thread.
+    with contextlib.redirect_stdout(io.StringIO()):
+        for scenario in SCENARIOS:
+            results[scenario.__name__] = scenario(args)
+    app.dependency_overrides.clear()
+    idempotency.store.clear()
+    print(json.dumps({"benchmark": "idempotency", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Episode-response parsing: app.utils.json_repair vs the previous regex cascade.
+
+Runs a fuzz corpus of malformed LLM outputs (code fences, stray prose, trailing
+commas, unescaped quotes, apostrophes, truncation, random mutations) through
+both parsers, then times adversarial inputs of growing size. The legacy
+parser is quadratic on an unterminated episode_content string; per case,
+`growth` is the repair parser's time per character at the largest size over
+that at the smallest (about 1 when linear). The correctness and linearity
+checks live in tests/test_json_repair.py.
+
+    python -m benchmarks.bench_json_extract [--fuzz 2000] [--sizes 1000 4000 16000]
+"""
+
+import argparse
+import json
+import random
+import re
+import statistics
+import time
+from app.utils.json_repair import extract_episode
+
+WORDS = "mira's lantern flickered as the tide said \"wait\" and the harbour held its breath".split()
+
+
+def legacy_parse_episode_response(response_text, metadata):
+    """Copy of AIUtils._parse_episode_response before the repair parser."""
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        json_pattern = r"```(?:json)?\s*\n(.*?)\n```"
+        matches = re.findall(json_pattern, response_text, re.DOTALL)
+        if matches:
+            try:
+                return json.loads(matches[0])
+            except Exception:
+                cleaned_text = matches[0].replace("'", '"')
+                try:
+                    return json.loads(cleaned_text)
+                except Exception:
+                    pass
+        json_pattern2 = r'{[\s\S]*"episode_title"[\s\S]*"episode_content"[\s\S]*}'
+        match = re.search(json_pattern2, response_text)
+        if match:
+            try:
+                cleaned_json = match.group(0).replace("'", '"')
+                return json.loads(cleaned_json)
+            except Exception:
+                pass
+        title_match = re.search(r'"episode_title":\s*"([^"]+)"', response_text)
+        content_match = re.search(
+            r'"episode_content":\s*"([^"]*(?:(?:"[^"]*)*[^"])*)"', response_text
+        )
+        return {
+            "episode_title": title_match.group(1) if title_match else "Episode 1",
+            "episode_content": content_match.group(1) if content_match else response_text,
+        }
+
+
+def _content(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _mutations(rng, title, content):
+    """Yield (kind, text, expected content, match mode) for one episode."""
+    doc = {"episode_title": title, "episode_content": content, "episode_summary": "s"}
+    strict = json.dumps(doc)
+    raw = (
+        '{"episode_title": "%s", "episode_content": "%s", "episode_summary": "s"}'
+        % (title, content)
+    )
+    yield "strict", strict, content, "exact"
+    yield "fenced", f"```json\n{strict}\n```", content, "exact"
+    yield "prose", f"Sure! Here is the episode:\n{strict}\nLet me know if you want changes.", content, "exact"
+    yield "trailing_comma", strict[:-1] + ",}", content, "exact"
+    yield "unescaped_quotes", raw, content, "exact"
+    yield "fenced_unescaped", f"```json\n{raw}\n```", content, "exact"
+    yield "single_quoted", raw.replace('"', "'"), content.replace('"', "'"), "exact"
+    yield "truncated", strict[: int(len(strict) * 0.8)], content, "prefix"
+    chars = list(strict)
+    for _ in range(3):
+        pos = rng.randrange(len(chars))
+        op = rng.random()
+        if op < 0.4:
+            del chars[pos]
+        elif op < 0.8:
+            chars.insert(pos, rng.choice('"\',{}[]:\n'))
+        else:
+            chars[pos] = rng.choice("\"'")
+    yield "random", "".join(chars), content, "structured"
+
+
+def _recovered(result, text, expected, mode) -> bool:
+    if not isinstance(result, dict):
+        return False
+    got = result.get("episode_content")
+    if not isinstance(got, str) or not got:
+        return False
+    if mode == "exact":
+        return got == expected
+    if mode == "prefix":
+        return expected.startswith(got.rstrip("\\"))
+    # "structured": something other than the raw-text fallback came out.
+    return got != text
+
+
+def fuzz(count: int, seed: int = 11):
+    rng = random.Random(seed)
+    stats = {}
+    for _ in range(count):
+        title = f"Episode {rng.randint(1, 99)}"
+        content = _content(rng, rng.randint(20, 200))
+        for kind, text, expected, mode in _mutations(rng, title, content):
+            row = stats.setdefault(
+                kind,
+                {"cases": 0, "mode": mode, "legacy_ok": 0, "repair_ok": 0, "legacy_ms": [], "repair_ms": []},
+            )
+            row["cases"] += 1
+            for name, fn in (
+                ("legacy", legacy_parse_episode_response),
+                ("repair", lambda t, m: extract_episode(t, m, include_summary=True)),
+            ):
+                start = time.perf_counter()
+                try:
+                    result = fn(text, {"current_episode": 1})
+                except Exception:
+                    result = None
+                row[f"{name}_ms"].append((time.perf_counter() - start) * 1000)
+                if _recovered(result, text, expected, mode):
+                    row[f"{name}_ok"] += 1
+
+    return {
+        kind: {
+            "cases": row["cases"],
+            "check": row["mode"],
+            "legacy_ok_pct": round(100 * row["legacy_ok"] / row["cases"], 1),
+            "repair_ok_pct": round(100 * row["repair_ok"] / row["cases"], 1),
+            "legacy_median_ms": round(statistics.median(row["legacy_ms"]), 4),
+            "repair_median_ms": round(statistics.median(row["repair_ms"]), 4),
+        }
+        for kind, row in stats.items()
+    }
+
+
+def adversarial(size: int):
+    # Unterminated content string: truncated model output with no closing quote.
+    yield "unterminated_content", '{"episode_title": "T", "episode_content": "' + "a" * size
+    yield "quote_storm", '{"episode_content": "' + 'x" ' * (size // 3)
+    yield "deep_nesting", "[" * size + "]" * (size // 2)
+    yield "brace_soup", "{" * size
+
+
+def worst_case(sizes, legacy_limit: int):
+    rows = []
+    for size in sizes:
+        for kind, text in adversarial(size):
+            row = {"case": kind, "size": size}
+            start = time.perf_counter()
+            extract_episode(text, {})
+            row["repair_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            if size <= legacy_limit:
+                start = time.perf_counter()
+                try:
+                    legacy_parse_episode_response(text, {})
+                except Exception:
+                    pass
+                row["legacy_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            rows.append(row)
+    return rows
+
+
+def growth(rows):
+    """Per case, time per input character at the largest size over the smallest."""
+    out = {}
+    for case in sorted({row["case"] for row in rows}):
+        series = sorted((r for r in rows if r["case"] == case), key=lambda r: r["size"])
+        small, large = series[0], series[-1]
+        per_char_small = max(small["repair_ms"], 0.05) / small["size"]
+        out[case] = round((large["repair_ms"] / large["size"]) / per_char_small, 2)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--fuzz", type=int, default=500)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 4000, 16000, 64000])
+    parser.add_argument(
+        "--legacy-limit",
+        type=int,
+        default=8000,
+        help="skip the legacy parser above this size (it is quadratic)",
+    )
+    args = parser.parse_args()
+
+    rows = worst_case(args.sizes, args.legacy_limit)
+    print(
+        json.dumps(
+            {
+                "benchmark": "json_extract",
+                "fuzz": fuzz(args.fuzz),
+                "worst_case": rows,
+                "growth": growth(rows),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Tail latency and error handling of the LLM router with fake providers.
+
+Scenarios (FakeProvider injects delays and failures deterministically):
+  tail_unhedged / tail_hedged   one provider, every --slow-every-th call slow
+  failover                      primary fails every 3rd call, backup healthy
+  outage                        primary always fails, backup healthy
+  hedged_failover               two providers, slow + failing primary, hedging on
+
+Reports p50/p99 latency, success rate and provider calls (the extra load
+hedging costs). Failover and hedging behaviour is tested in
+tests/test_llm_router.py.
+
+    python -m benchmarks.bench_llm_router [--calls 300] [--latency 0.02]
+        [--slow-every 10] [--slow-latency 0.4] [--concurrency 4]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.services.ai_service.routerAI import FakeProvider, LLMRouter
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+def drive(router, providers, args):
+    def one(i):
+        start = time.perf_counter()
+        try:
+            router.generate_content(f"prompt {i}")
+            ok = True
+        except Exception:
+            ok = False
+        return (time.perf_counter() - start) * 1000, ok
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Steady state: give the router its latency samples before measuring.
+        for i in range(router.hedge_min_samples):
+            one(i)
+        for provider in providers:
+            provider.calls = 0
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(one, range(args.calls)))
+        # Let hedged losers finish so their calls are counted.
+        time.sleep(args.slow_latency)
+    latencies = [ms for ms, _ in results]
+    return {
+        "success_rate": round(sum(ok for _, ok in results) / len(results), 4),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3),
+        },
+        "provider_calls": {p.name: p.calls for p in providers},
+        "extra_calls_pct": round(
+            (sum(p.calls for p in providers) - args.calls) / args.calls * 100, 2
+        ),
+        "router_stats": router.stats(),
+    }
+
+
+def scenarios(args):
+    def slow(name="primary", fail_every=0):
+        return FakeProvider(
+            name,
+            text="ok",
+            latency=args.latency,
+            slow_every=args.slow_every,
+            slow_latency=args.slow_latency,
+            fail_every=fail_every,
+        )
+
+    def healthy(name="backup"):
+        return FakeProvider(name, text="ok", latency=args.latency)
+
+    hedge = dict(hedge_percentile=args.hedge_percentile, hedge_min_samples=20)
+
+    def tail(hedged):
+        providers = [slow()]
+        return LLMRouter(providers, hedge=hedged, **hedge), providers
+
+    def failover():
+        providers = [healthy("primary"), healthy()]
+        providers[0].fail_every = 3
+        return LLMRouter(providers, hedge=False), providers
+
+    def outage():
+        providers = [healthy("primary"), healthy()]
+        providers[0].fail_every = 1
+        return LLMRouter(providers, hedge=False), providers
+
+    def hedged_failover():
+        providers = [slow(fail_every=7), healthy()]
+        return LLMRouter(providers, hedge=True, **hedge), providers
+
+    yield "tail_unhedged", lambda: tail(False)
+    yield "tail_hedged", lambda: tail(True)
+    yield "failover", failover
+    yield "outage", outage
+    yield "hedged_failover", hedged_failover
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per normal call")
+    parser.add_argument("--slow-every", type=int, default=10)
+    parser.add_argument("--slow-latency", type=float, default=0.4, help="seconds per slow call")
+    parser.add_argument("--hedge-percentile", type=float, default=90.0)
+    args = parser.parse_args()
+
+    results = {}
+    for name, setup in scenarios(args):
+        router, providers = setup()
+        results[name] = drive(router, providers, args)
+    print(json.dumps({"benchmark": "llm_router", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+The LLM governor (app/services/ai_service/schedulerAI.py) under load.
+
+  fairness       one heavy user floods the queue, light users arrive later;
+                 light-user latency with fair queueing vs one FIFO flow
+  cross_process  several worker processes share the flock slots; peak calls
+                 in flight and throughput against the cap
+  budget         sustained throughput under a requests-per-minute bucket
+
+Fake providers sleep instead of calling a model. Slot, charge and timeout
+behaviour is tested in tests/test_llm_scheduler.py.
+
+    python -m benchmarks.bench_llm_scheduler [--slots 2] [--latency 0.02]
+        [--processes 3]
+"""
+
+import argparse
+import json
+import multiprocessing
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.services.ai_service.routerAI import FakeProvider
+from app.services.ai_service.schedulerAI import LLMScheduler, ScheduledModel
+
+PROMPT = "Write the next episode. " * 20
+
+
+def scheduler(lock_dir, **kwargs):
+    kwargs.setdefault("tokens_per_minute", 0)
+    kwargs.setdefault("requests_per_minute", 0)
+    return LLMScheduler(lock_dir=lock_dir, poll_interval=0.005, **kwargs)
+
+
+def timed_calls(model, n):
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        model.generate_content(PROMPT)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def fairness(args):
+    def run(fair):
+        sched = scheduler(tempfile.mkdtemp(), slots=args.slots)
+        provider = FakeProvider("fake", text="ok", latency=args.latency)
+        heavy = ScheduledModel(provider, "heavy", scheduler=sched)
+        # Without fairness everyone shares one flow, i.e. plain FIFO.
+        light_users = [f"light-{i}" if fair else "heavy" for i in range(args.light_users)]
+        with ThreadPoolExecutor(max_workers=args.heavy_threads + args.light_users) as pool:
+            heavy_jobs = [
+                pool.submit(timed_calls, heavy, args.heavy_calls)
+                for _ in range(args.heavy_threads)
+            ]
+            time.sleep(args.latency * 2)
+            light_jobs = [
+                pool.submit(timed_calls, ScheduledModel(provider, user, scheduler=sched), args.light_calls)
+                for user in light_users
+            ]
+            light = [ms for job in light_jobs for ms in job.result()]
+            heavy_ms = [ms for job in heavy_jobs for ms in job.result()]
+        return {
+            "light_mean_ms": round(statistics.mean(light), 3),
+            "light_max_ms": round(max(light), 3),
+            "heavy_mean_ms": round(statistics.mean(heavy_ms), 3),
+        }
+
+    return {"fair": run(True), "fifo": run(False)}
+
+
+def _worker(lock_dir, slots, latency, threads, calls, in_flight, peak, lock):
+    sched = scheduler(lock_dir, slots=slots)
+
+    class Counting:
+        def generate_content(self, contents):
+            with lock:
+                in_flight.value += 1
+                peak.value = max(peak.value, in_flight.value)
+            time.sleep(latency)
+            with lock:
+                in_flight.value -= 1
+            return None
+
+    model = ScheduledModel(Counting(), "user", scheduler=sched)
+    workers = [threading.Thread(target=timed_calls, args=(model, calls)) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+
+def cross_process(args):
+    ctx = multiprocessing.get_context("fork")
+    lock_dir = tempfile.mkdtemp()
+    in_flight, peak, lock = ctx.Value("i", 0), ctx.Value("i", 0), ctx.Lock()
+    threads, calls = 6, 10
+    start = time.perf_counter()
+    procs = [
+        ctx.Process(
+            target=_worker,
+            args=(lock_dir, args.slots, args.latency, threads, calls, in_flight, peak, lock),
+        )
+        for _ in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+    total = args.processes * threads * calls
+    result = {
+        "calls": total,
+        "cap": args.slots,
+        "peak_in_flight": peak.value,
+        "calls_per_s": round(total / elapsed, 1),
+        "ideal_calls_per_s": round(args.slots / args.latency, 1),
+    }
+    return result
+
+
+def budget(args):
+    rpm = 1200
+    sched = scheduler(tempfile.mkdtemp(), slots=8, requests_per_minute=rpm, burst_seconds=1)
+    model = ScheduledModel(FakeProvider("fake", text="ok"), "user", scheduler=sched)
+    calls, burst = 80, rpm / 60
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: timed_calls(model, calls // 8), range(8)))
+    elapsed = time.perf_counter() - start
+    sustained = (calls - burst) / elapsed
+    result = {
+        "calls": calls,
+        "rpm": rpm,
+        "elapsed_s": round(elapsed, 3),
+        "sustained_calls_per_s": round(sustained, 2),
+        "limit_calls_per_s": rpm / 60,
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--slots", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--heavy-threads", type=int, default=8)
+    parser.add_argument("--heavy-calls", type=int, default=5)
+    parser.add_argument("--light-users", type=int, default=6)
+    parser.add_argument("--light-calls", type=int, default=2)
+    args = parser.parse_args()
+
+    results = {scenario.__name__: scenario(args) for scenario in (fairness, cross_process, budget)}
+    print(json.dumps({"benchmark": "llm_scheduler", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
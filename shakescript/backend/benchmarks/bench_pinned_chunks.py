@@ -0,0 +1,137 @@
+"""
+Pinned foundational chunks (chunks.is_foundational, migrations/005_foundational_chunks.sql).
+
+On the fake backends:
+
+  round_trips DB round trips and latency per retrieval of a new query: the
+              previous implementation (episode 1 and the midpoint looked up
+              through get_story_info on every call), and with the pinned
+              chunks cached, found by episode number (the default) or by
+              the flag (FOUNDATIONAL_CHUNKS_ENABLED)
+
+That the ranking matches the previous implementation, that only a
+foundational rechunk reloads the pins and that a partly chunked foundation
+is not pinned are tested in tests/test_pinned_chunks.py.
+
+    python -m benchmarks.bench_pinned_chunks [--length 11] [--queries 5]
+        [--db-latency 0.002]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+from app.core.config import settings
+from app.core.metrics import registry
+from app.utils import vectors
+from benchmarks.bench_story_service import AUTH_ID, World, offline_world
+from benchmarks.fakes import _prose
+
+
+def world(args) -> World:
+    return offline_world(db_latency=args.db_latency)
+
+
+def previous(service, story_id: int, query: str, k: int = 5):
+    """
+    retrieve_relevant_chunks as it was before the foundational flag, with
+    the query sent in the same wire format, so exact ties rank alike.
+    """
+    embedding_service = service.embedding_service
+    query_embedding = vectors.encode_for_insert(
+        embedding_service.embedding_model.get_text_embedding(query), "float32"
+    )
+    chunks_result = service.client.rpc(
+        "match_chunks",
+        {"p_story_id": story_id, "p_auth_id": AUTH_ID, "p_query_embedding": query_embedding, "p_k": k},
+    ).execute()
+    num_episodes = embedding_service.db_service.get_story_info(story_id, AUTH_ID)["num_episodes"]
+    foundational = (
+        service.client.table("chunks")
+        .select("id, episode_number, chunk_number, content, importance_score")
+        .eq("story_id", story_id)
+        .eq("auth_id", AUTH_ID)
+        .in_("episode_number", [1, int(num_episodes * 0.5)])
+        .limit(2)
+        .execute()
+    )
+    chunks = (chunks_result.data or []) + (foundational.data or [])
+    return [
+        {
+            "id": chunk["id"],
+            "episode_number": chunk["episode_number"],
+            "chunk_number": chunk["chunk_number"],
+            "content": chunk.get("content"),
+        }
+        for chunk in sorted(
+            chunks,
+            key=lambda x: (x.get("importance_score", 0), x.get("similarity", 0)),
+            reverse=True,
+        )[:k]
+    ]
+
+
+def current(service, story_id: int, query: str, k: int = 5):
+    return service.embedding_service.retrieve_relevant_chunks(story_id, query, AUTH_ID, k=k)
+
+
+def queries(n: int):
+    return [_prose(40, 7 * i + 3) for i in range(n)]
+
+
+def timed(args, retrieve):
+    w = world(args)
+    story_id = w.seed_story(args.length, 0, 400)
+    service = w.service()
+    trips, latencies = [], []
+    for query in queries(args.queries):
+        before = w.db.calls
+        start = time.perf_counter()
+        retrieve(service, story_id, query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        trips.append(w.db.calls - before)
+    return {"db_round_trips": trips, "median_ms": round(statistics.median(latencies), 2)}
+
+
+def flagged(enabled: bool):
+    def retrieve(service, story_id: int, query: str, k: int = 5):
+        before = settings.FOUNDATIONAL_CHUNKS_ENABLED
+        settings.FOUNDATIONAL_CHUNKS_ENABLED = enabled
+        try:
+            return current(service, story_id, query, k)
+        finally:
+            settings.FOUNDATIONAL_CHUNKS_ENABLED = before
+
+    return retrieve
+
+
+def round_trips(args):
+    return {
+        "previous": timed(args, previous),
+        "pinned_by_episode": timed(args, flagged(False)),
+        "pinned_by_flag": timed(args, flagged(True)),
+    }
+
+
+SCENARIOS = (round_trips,)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--length", type=int, default=11)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for scenario in SCENARIOS:
+            registry.clear()
+            results[scenario.__name__] = scenario(args)
+    print(json.dumps({"benchmark": "pinned_chunks", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
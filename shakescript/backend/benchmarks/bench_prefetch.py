@@ -0,0 +1,100 @@
+"""
+Speculative prefetch of the next HUMAN batch (core_service/prefetch_core.py).
+
+Walks stories through the HUMAN flow on the fake backends (generate-batch,
+--review seconds of reading, optional refine, validate-batch, next
+generate-batch) with prefetch off and on, per review pattern:
+
+  accept        the draft is validated unchanged: every later batch is a hit
+  refine_early  feedback on the first episode only: the speculation stays valid
+  refine_last   feedback rewrites the last episode: the speculation is wasted
+                and restarted from the refined draft
+
+Reports generate-batch latency for batches after the first, hit rate and
+served/wasted tokens. Hit, invalidation, version and timeout behaviour is
+tested in tests/test_prefetch.py.
+
+    python -m benchmarks.bench_prefetch [--batches 4] [--batch-size 2]
+        [--llm-latency 0.02] [--review 0.3]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.schemas import Feedback
+from app.services.core_service import prefetch_core
+from benchmarks.bench_story_service import AUTH_ID, offline_world
+
+OUTCOMES = ("hit", "miss", "invalidated", "stale", "expired", "failed", "timeout")
+
+
+def walk(args, pattern: str, enabled: bool):
+    settings.SPECULATIVE_PREFETCH_ENABLED = enabled
+    prefetch_core.buffer.clear()
+    registry.clear()
+    world = offline_world(llm_latency=args.llm_latency, episode_words=300)
+    service = world.service()
+    story_id = world.seed_story(0, args.batches * args.batch_size, 300)
+    world.db.table("stories").update({"refinement_method": "HUMAN"}).eq(
+        "id", story_id
+    ).execute()
+
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for batch in range(args.batches):
+            start = time.perf_counter()
+            episodes = service.generate_and_refine_batch(
+                story_id, args.batch_size, False, "HUMAN", AUTH_ID
+            )
+            if batch:
+                latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(args.review)
+            if pattern != "accept":
+                target = episodes[0] if pattern == "refine_early" else episodes[-1]
+                service.refine_episode_batch(
+                    story_id,
+                    [Feedback(episode_number=target["episode_number"], feedback="Darker")],
+                    AUTH_ID,
+                )
+                time.sleep(args.review)
+            service.validate_episode_batch(story_id, AUTH_ID, None)
+        # Let the last speculations finish so their tokens are counted.
+        time.sleep(args.review)
+
+    stored = world.db.tables.get("episodes", [])
+    outcomes = {o: registry.value("shakescript_prefetch_total", outcome=o) for o in OUTCOMES}
+    lookups = sum(outcomes.values())
+    return {
+        "generate_mean_ms": round(statistics.mean(latencies), 3),
+        "episodes_stored": len(stored),
+        "hit_rate": round(outcomes["hit"] / lookups, 3) if lookups else None,
+        "outcomes": {k: int(v) for k, v in outcomes.items() if v},
+        "tokens_served": int(registry.value("shakescript_prefetch_tokens_total", outcome="served")),
+        "tokens_wasted": int(registry.value("shakescript_prefetch_tokens_total", outcome="wasted")),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batches", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--llm-latency", type=float, default=0.02)
+    parser.add_argument("--review", type=float, default=0.3)
+    args = parser.parse_args()
+
+    results = {}
+    try:
+        for pattern in ("accept", "refine_early", "refine_last"):
+            results[pattern] = {"off": walk(args, pattern, False), "on": walk(args, pattern, True)}
+    finally:
+        settings.SPECULATIVE_PREFETCH_ENABLED = False
+    print(json.dumps({"benchmark": "prefetch", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
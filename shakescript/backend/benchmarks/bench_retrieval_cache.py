@@ -0,0 +1,109 @@
+"""
+Retrieval cache (RetrievalCache in app/core/cache.py).
+
+On the fake backends, with a story of --episodes stored episodes and chunks:
+
+  repeat      --repeat retrievals of the same (story, query, k), as in the AI
+              refinement loop, with the cache off and on: embedding requests,
+              DB round trips and latency
+  constant    the cost of invalidating a story with 10 and --entries cached
+              retrievals
+
+Invalidation (scoped to the story, after the embedding wait, and shared
+through RETRIEVAL_CACHE_PATH) and the per-process TTL are tested in
+tests/test_retrieval_cache.py.
+
+    python -m benchmarks.bench_retrieval_cache [--episodes 6] [--repeat 20]
+        [--entries 2000] [--db-latency 0.002] [--embed-latency 0.01]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+from app.core.cache import MemoryCacheBackend, RetrievalCache, retrieval_cache
+from app.core.metrics import registry
+from benchmarks.bench_story_service import AUTH_ID, World, offline_world
+
+QUERY = "EPISODE 3\nCONTENT: the harbour bell rang twice before dawn"
+
+
+def world(args) -> World:
+    return offline_world(db_latency=args.db_latency, embed_latency=args.embed_latency)
+
+
+def outcomes():
+    return {
+        outcome: int(registry.value("shakescript_retrieval_cache_total", outcome=outcome))
+        for outcome in ("hit", "miss")
+    }
+
+
+def retrieve(w: World, story_id: int, query: str = QUERY):
+    return w.service().embedding_service.retrieve_relevant_chunks(story_id, query, AUTH_ID, k=5)
+
+
+def repeated(args, enabled: bool):
+    retrieval_cache.enabled = enabled
+    try:
+        w = world(args)
+        story_id = w.seed_story(args.episodes, 4, 300)
+        embeds, trips = w.embedder.calls, w.db.calls
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            retrieve(w, story_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        retrieval_cache.enabled = True
+    return {
+        "embedding_requests": w.embedder.calls - embeds,
+        "db_round_trips": w.db.calls - trips,
+        "first_ms": round(latencies[0], 2),
+        "median_ms": round(statistics.median(latencies), 3),
+    }
+
+
+def repeat(args):
+    return {"cache_off": repeated(args, False), "cache_on": repeated(args, True), **outcomes()}
+
+
+def invalidate_ms(entries: int, rounds: int = 200) -> float:
+    cache = RetrievalCache(MemoryCacheBackend(600, entries + 10))
+    for i in range(entries):
+        cache.get_or_load(1, AUTH_ID, f"query {i}", 5, lambda: [])
+    start = time.perf_counter()
+    for _ in range(rounds):
+        cache.invalidate(1)
+    return (time.perf_counter() - start) * 1000 / rounds
+
+
+def constant(args):
+    small, large = invalidate_ms(10), invalidate_ms(args.entries)
+    return {"entries_10_ms": round(small, 4), f"entries_{args.entries}_ms": round(large, 4)}
+
+
+SCENARIOS = (repeat, constant)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--episodes", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for scenario in SCENARIOS:
+            registry.clear()
+            results[scenario.__name__] = scenario(args)
+    print(json.dumps({"benchmark": "retrieval_cache", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Serialisation cost of GET /stories/{id} payloads.
+
+Compares the default path (StoryResponse validation + jsonable_encoder + json.dumps,
+which is what FastAPI does for the route) against app.utils.fast_json, and reports
+bytes on the wire with and without compression.
+
+    python -m benchmarks.bench_serialization [--episodes 10 100 500] [--repeat 5]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import statistics
+import time
+from fastapi.encoders import jsonable_encoder
+from app.models.schemas import StoryResponse
+from app.utils import fast_json
+
+WORDS = (
+    "the storm rolled over the harbour while mira counted lanterns and the old "
+    "captain argued with the tide about promises nobody had kept"
+).split()
+
+
+def make_story(num_episodes: int, words_per_episode: int = 700, seed: int = 7):
+    rng = random.Random(seed)
+    episodes = [
+        {
+            "id": n,
+            "number": n,
+            "title": f"Episode {n}",
+            "content": " ".join(rng.choice(WORDS) for _ in range(words_per_episode)),
+            "summary": " ".join(rng.choice(WORDS) for _ in range(60)),
+            "emotional_state": "tense",
+            "key_events": [
+                {"event": f"event {n}.{i}", "tier": "contextual"} for i in range(3)
+            ],
+        }
+        for n in range(1, num_episodes + 1)
+    ]
+    return {
+        "story_id": 1,
+        "title": "Benchmark Story",
+        "setting": {"Harbour": "A storm-battered port town"},
+        "characters": [
+            {"Name": f"Character {i}", "Role": "Support", "Description": "..."}
+            for i in range(8)
+        ],
+        "special_instructions": "suspenseful",
+        "story_outline": [{"Ep 1-5": "Setup", "Phase_name": "Exposition"}],
+        "current_episode": num_episodes + 1,
+        "episodes": episodes,
+        "summary": None,
+        "protagonist": [{"Name": "Mira", "Motivation": "Home", "Fear": "Sea"}],
+        "timeline": [{"event": "arrival", "episode": 1, "resolved": True}],
+        "batch_size": 2,
+        "refinement_method": "HUMAN",
+        "total_episodes": num_episodes,
+        "next_episode_cursor": None,
+    }
+
+
+def default_path(story):
+    body = {"status": "success", "story": StoryResponse(**story), "message": "ok"}
+    return json.dumps(
+        jsonable_encoder(body), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def fast_path(story):
+    return fast_json.dumps({"status": "success", "story": story, "message": "ok"})
+
+
+def timed(fn, story, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(story)
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def run(sizes, repeat: int):
+    results = []
+    for size in sizes:
+        story = make_story(size)
+        body = fast_path(story)
+        gz_start = time.perf_counter()
+        gz = gzip.compress(body, compresslevel=5)
+        gz_ms = (time.perf_counter() - gz_start) * 1000
+        row = {
+            "episodes": size,
+            "default_ms": timed(default_path, story, repeat),
+            "fast_ms": timed(fast_path, story, repeat),
+            "fast_backend": fast_json.BACKEND,
+            "bytes_identity": len(body),
+            "bytes_gzip": len(gz),
+            "gzip_ms": round(gz_ms, 3),
+        }
+        if fast_json.brotli is not None:
+            br_start = time.perf_counter()
+            row["bytes_br"] = len(fast_json.brotli.compress(body, quality=4))
+            row["br_ms"] = round((time.perf_counter() - br_start) * 1000, 3)
+        results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--episodes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps({"benchmark": "serialization", "results": run(args.episodes, args.repeat)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Cold-start cost of a worker: `import app.main` in a fresh interpreter.
+
+Runs `python -X importtime -c "import app.main"` in subprocesses, reports the
+cumulative import time of app.main and the slowest top-level imports, and
+lists any heavy SDK (app.core.warmup.HEAVY_MODULES) imported at startup;
+tests/test_startup.py fails on those. Also times app.core.warmup.warmup()
+after the import, i.e. what a preloaded gunicorn master pays once before
+forking.
+
+    python -m benchmarks.bench_startup [--repeat 5] [--top 15]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from app.core.warmup import HEAVY_MODULES
+
+WARMUP_SNIPPET = (
+    "import json, time; import app.main; from app.core import warmup; "
+    "t = time.perf_counter(); steps = warmup.warmup(); "
+    "print(json.dumps({'total_ms': (time.perf_counter() - t) * 1000, 'steps': steps}))"
+)
+
+
+def parse_importtime(stderr: str):
+    """Return [(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def import_once():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", "import app.main"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return parse_importtime(result.stderr)
+
+
+def warmup_once():
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", WARMUP_SNIPPET],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(args):
+    totals, rows = [], []
+    for _ in range(args.repeat):
+        rows = import_once()
+        app_main = next(r for r in rows if r[0] == "app.main")
+        totals.append(app_main[2] / 1000)
+
+    imported = {r[0] for r in rows}
+    eager_heavy = [m for m in HEAVY_MODULES if m in imported]
+    # Direct children of the interpreter's import roots, slowest first.
+    top_level = sorted((r for r in rows if r[3] <= 1), key=lambda r: r[2], reverse=True)
+    warm = warmup_once()
+    median = statistics.median(totals)
+    return {
+        "import_app_main_ms": {
+            "median": round(median, 3),
+            "min": round(min(totals), 3),
+            "max": round(max(totals), 3),
+        },
+        "modules_imported": len(imported),
+        "eager_heavy_modules": eager_heavy,
+        "slowest_imports": [
+            {"module": name, "cumulative_ms": round(cum / 1000, 3)}
+            for name, _, cum, _ in top_level[: args.top]
+        ],
+        "warmup_ms": round(warm["total_ms"], 3),
+        "warmup_steps": warm["steps"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    result = run(args)
+    print(json.dumps({"benchmark": "startup", "config": vars(args), **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
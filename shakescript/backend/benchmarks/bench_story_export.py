@@ -0,0 +1,116 @@
+"""
+Streaming story export (GET /stories/{id}/export, app/services/core_service/export_core.py).
+
+Synthetic stories of --small and --episodes episodes (--words words each) are
+seeded on the fake backends.
+
+  memory      tracemalloc peak while each format's body is consumed and
+              discarded, for both story sizes, next to get_story_info, which
+              loads every episode at once (epub's floor is zlib's window)
+
+That the peak does not grow with the story, that every format holds each
+episode once and in order (epub with a stored mimetype entry first), and
+that the body is read a page at a time are tested in
+tests/test_story_export.py.
+
+    python -m benchmarks.bench_story_export [--episodes 1000] [--small 100]
+        [--words 400] [--page-size 50]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import tracemalloc
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.core_service.export_core import EXPORT_FORMATS
+from benchmarks.bench_story_service import AUTH_ID, World, offline_world
+from benchmarks.fakes import _prose
+
+
+def seed(w: World, episodes: int, words: int) -> int:
+    """A finished story; episodes are four paragraphs of filler prose."""
+    story_id = w.seed_story(0, episodes, words)
+    w.db.table("episodes").insert(
+        [
+            {
+                "story_id": story_id,
+                "episode_number": n,
+                "title": f"Tide {n}",
+                "content": "\n\n".join(_prose(words // 4, n * 4 + p) for p in range(4)),
+                "summary": f"Summary of episode {n}",
+                "auth_id": AUTH_ID,
+            }
+            for n in range(1, episodes + 1)
+        ]
+    ).execute()
+    return story_id
+
+
+def peak_bytes(run) -> int:
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def drain(body) -> int:
+    return sum(len(chunk) for chunk in body)
+
+
+def memory(args):
+    out = {}
+    for size in (args.small, args.episodes):
+        w = offline_world()
+        story_id = seed(w, size, args.words)
+        service = w.service()
+        row = {}
+        for export_format in EXPORT_FORMATS:
+            sizes = []
+            row[export_format] = {
+                "peak_kb": round(
+                    peak_bytes(
+                        lambda: sizes.append(
+                            drain(service.export_story(story_id, AUTH_ID, export_format)["body"])
+                        )
+                    )
+                    / 1024
+                ),
+                "output_kb": round(sizes[0] / 1024),
+            }
+        row["get_story_info"] = {
+            "peak_kb": round(peak_bytes(lambda: service.get_story_info(story_id, AUTH_ID)) / 1024)
+        }
+        out[f"episodes_{size}"] = row
+    return out
+
+
+SCENARIOS = (memory,)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--small", type=int, default=100)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    page_size = settings.EXPORT_PAGE_SIZE
+    settings.EXPORT_PAGE_SIZE = args.page_size
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for scenario in SCENARIOS:
+                registry.clear()
+                results[scenario.__name__] = scenario(args)
+    finally:
+        settings.EXPORT_PAGE_SIZE = page_size
+    print(json.dumps({"benchmark": "story_export", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
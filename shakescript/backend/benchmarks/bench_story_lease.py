@@ -0,0 +1,132 @@
+"""
+Per-story lease and If-Match version check (core_service/lease_core.py).
+
+Runs the real routes through TestClient on the fake backends:
+
+  concurrent_generate  --clients generate-batch calls on one story at once
+                       (no Idempotency-Key), with the lease and without:
+                       statuses, LLM calls, the winner's latency and how
+                       fast the losers get their 409
+  if_match             latency of a stale If-Match answered 412 next to a
+                       current one that runs
+
+The lease is off by default and switched on here. Its behaviour (one runner
+per story, validate/generate exclusion, If-Match, takeover of a lapsed
+lease) is tested in tests/test_story_lease.py.
+
+    python -m benchmarks.bench_story_lease [--clients 8] [--llm-latency 0.02]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import threading
+import time
+from app.core.config import settings
+from app.main import app
+from app.utils.http_cache import story_etag
+from benchmarks.bench_story_service import API, AUTH_ID, client_for, offline_world
+
+HEADERS = {"Authorization": "Bearer bench"}
+
+
+def world(args):
+    w = offline_world(llm_latency=args.llm_latency, episode_words=200)
+    return w, w.seed_story(0, 4, 200)
+
+
+def generate(client, story_id, headers=None):
+    return client.post(
+        f"{API}/episodes/{story_id}/generate-batch",
+        params={"batch_size": 2, "refinement_type": "HUMAN"},
+        headers=dict(HEADERS, **(headers or {})),
+    )
+
+
+def race(calls):
+    """Start every call at once; returns [(response, ms)] in call order."""
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def call(i):
+        barrier.wait()
+        start = time.perf_counter()
+        response = calls[i]()
+        results[i] = (response, (time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(calls))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def burst(args, enabled: bool):
+    settings.STORY_LEASE_ENABLED = enabled
+    w, story_id = world(args)
+    results = race([lambda: generate(client_for(w), story_id) for _ in range(args.clients)])
+    won = [ms for r, ms in results if r.status_code == 200]
+    lost = [(r, ms) for r, ms in results if r.status_code == 409]
+    return {
+        "statuses": sorted(r.status_code for r, _ in results),
+        "episode_llm_calls": w.model.calls_by_kind.get("episode", 0),
+        "winner_ms": round(statistics.mean(won), 1) if won else None,
+        "conflict_max_ms": round(max(ms for _, ms in lost), 1) if lost else None,
+        "retry_after": sorted({r.headers.get("Retry-After") for r, _ in lost}),
+    }
+
+
+def concurrent_generate(args):
+    return {"with_lease": burst(args, True), "without_lease": burst(args, False)}
+
+
+def timed(call):
+    start = time.perf_counter()
+    response = call()
+    return response, round((time.perf_counter() - start) * 1000, 1)
+
+
+def if_match(args):
+    w, story_id = world(args)
+    client = client_for(w)
+    version = w.service().get_story_version(story_id, AUTH_ID)
+    stale, stale_ms = timed(
+        lambda: generate(client, story_id, {"If-Match": story_etag(story_id, version - 1)})
+    )
+    current, current_ms = timed(
+        lambda: generate(client, story_id, {"If-Match": story_etag(story_id, version)})
+    )
+    return {
+        "stale": {"status": stale.status_code, "ms": stale_ms},
+        "current": {"status": current.status_code, "ms": current_ms},
+    }
+
+
+SCENARIOS = (concurrent_generate, if_match)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    results = {}
+    enabled = settings.STORY_LEASE_ENABLED
+    try:
+        # redirect_stdout is process-wide, so it wraps the whole run once.
+        with contextlib.redirect_stdout(io.StringIO()):
+            for scenario in SCENARIOS:
+                settings.STORY_LEASE_ENABLED = True
+                results[scenario.__name__] = scenario(args)
+    finally:
+        settings.STORY_LEASE_ENABLED = enabled
+    app.dependency_overrides.clear()
+    print(json.dumps({"benchmark": "story_lease", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+End-to-end latency of the StoryService request paths, fully offline.
+
+Drives the real FastAPI routes through TestClient with the Supabase client,
+Gemini model and embedder replaced by benchmarks.fakes. For each story size
+(episodes already written) it measures create story, generate-batch (HUMAN
+and AI), refine-batch, validate-batch and the dashboard (cold and warm
+cache), reporting latency, DB round trips and LLM/embedding calls as JSON.
+
+    python -m benchmarks.bench_story_service [--sizes 5 25 100] [--repeat 3]
+        [--db-latency 0.004] [--llm-latency 0.0] [--embed-latency 0.0]
+        [--llm-fail-every 0]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from app.api.dependencies import (
+    get_priority_story_service,
+    get_story_service,
+    get_user_client,
+)
+from app.core.cache import read_cache, retrieval_cache
+from app.core.metrics import instrument_client
+from app.main import app
+from app.services.ai_service import AIService
+from app.services.ai_service.resilienceAI import RetryPolicy
+from app.services.ai_service.routerAI import FakeProvider, LLMRouter
+from app.services.bm25_index import indexes as bm25_indexes
+from app.services.core_service import StoryService
+from app.services.embedding_service import EmbeddingService, is_foundational
+from benchmarks.fakes import (
+    FakeClient,
+    FakeEmbedding,
+    FakeGenerativeModel,
+    FakeProviderError,
+    _prose,
+)
+
+AUTH_ID = "bench-user"
+API = "/api/v1"
+
+
+class World:
+    """One isolated fake backend: Supabase tables, model and embedder."""
+
+    def __init__(self, args):
+        self.db = FakeClient(latency=args.db_latency)
+        self.model = FakeGenerativeModel(
+            latency=args.llm_latency,
+            episode_words=args.episode_words,
+            quality_issue_every=args.quality_issue_every,
+        )
+        self.embedder = FakeEmbedding(latency=args.embed_latency)
+        self.llm = self.model
+        if args.llm_fail_every:
+            # Transient 503s every n-th call, absorbed by the router's retries.
+            self.llm = LLMRouter(
+                [
+                    FakeProvider(
+                        "gemini",
+                        model=self.model,
+                        fail_every=args.llm_fail_every,
+                        error=lambda msg: FakeProviderError(503),
+                    )
+                ],
+                hedge=False,
+                retry_policy=RetryPolicy(base_delay=0.001, max_delay=0.01),
+            )
+        self.db.table("users").insert(
+            {"auth_id": AUTH_ID, "name": "Bench", "email": "bench@example.com"}
+        ).execute()
+        read_cache.clear()
+        retrieval_cache.clear()
+        bm25_indexes.clear()
+
+    def service(self) -> StoryService:
+        # Same wrapping as get_user_client, so METRICS_ENABLED overhead is included.
+        db = instrument_client(self.db)
+        embedding_service = EmbeddingService(db, embedding_model=self.embedder)
+        ai_service = AIService(
+            db, model=self.llm, embedding_service=embedding_service, auth_id=AUTH_ID
+        )
+        return StoryService(
+            db, ai_service=ai_service, embedding_service=embedding_service
+        )
+
+    def counters(self):
+        return {
+            "db_round_trips": self.db.calls,
+            "llm_calls": self.model.calls,
+            "embedding_calls": self.embedder.calls,
+            "prompt_chars": self.model.prompt_chars,
+            "response_chars": self.model.response_chars,
+        }
+
+    def seed_story(self, episodes_done: int, remaining: int, words: int) -> int:
+        """Insert a story with `episodes_done` stored episodes and their chunks."""
+        story = self.db.table("stories").insert(
+            {
+                "title": "The Lantern Keeper",
+                "protagonist": json.dumps([{"Name": "Mira"}]),
+                "setting": json.dumps({"Harbour": "A fog-bound harbour"}),
+                "key_events": json.dumps([]),
+                "timeline": json.dumps([]),
+                "special_instructions": "suspenseful",
+                "story_outline": json.dumps(
+                    [{f"Ep 1-{episodes_done + remaining}": "Search", "Phase_name": "Exposition"}]
+                ),
+                "current_episode": episodes_done + 1,
+                "num_episodes": episodes_done + remaining,
+                "current_episodes_content": json.dumps([]),
+                "auth_id": AUTH_ID,
+                "genre": "Mystery",
+                "refinement_method": "HUMAN",
+            }
+        ).execute()
+        story_id = story.data[0]["id"]
+        self.db.table("characters").insert(
+            [
+                {
+                    "story_id": story_id,
+                    "name": name,
+                    "role": role,
+                    "description": role,
+                    "relationship": json.dumps({}),
+                    "emotional_state": "neutral",
+                    "is_active": True,
+                    "milestones": json.dumps([]),
+                    "auth_id": AUTH_ID,
+                }
+                for name, role in (("Mira", "Protagonist"), ("Captain Rhee", "Mentor"))
+            ]
+        ).execute()
+        episodes, chunks = [], []
+        for n in range(1, episodes_done + 1):
+            content = _prose(words, n)
+            episodes.append(
+                {
+                    "story_id": story_id,
+                    "episode_number": n,
+                    "title": f"Episode {n}",
+                    "content": content,
+                    "summary": _prose(60, n),
+                    "key_events": json.dumps([]),
+                    "emotional_state": "tense",
+                    "auth_id": AUTH_ID,
+                }
+            )
+            for c, start in enumerate(range(0, words, 150)):
+                text = " ".join(content.split()[start : start + 150])
+                chunks.append(
+                    {
+                        "story_id": story_id,
+                        "episode_number": n,
+                        "chunk_number": c,
+                        "content": text,
+                        "characters": ["Mira"],
+                        "embedding": self.embedder._vector(text),
+                        "is_foundational": is_foundational(n, episodes_done + remaining),
+                        "importance_score": 2 if n == 1 else 0,
+                        "auth_id": AUTH_ID,
+                    }
+                )
+        if episodes:
+            stored = self.db.table("episodes").insert(episodes).execute()
+            ids = {row["episode_number"]: row["id"] for row in stored.data}
+            for chunk in chunks:
+                chunk["episode_id"] = ids[chunk["episode_number"]]
+            self.db.table("chunks").insert(chunks).execute()
+        return story_id
+
+
+def offline_world(**options) -> World:
+    """A World with no simulated latency; keyword arguments override its options."""
+    defaults = dict(
+        db_latency=0.0,
+        llm_latency=0.0,
+        embed_latency=0.0,
+        episode_words=120,
+        quality_issue_every=0,
+        llm_fail_every=0,
+    )
+    return World(SimpleNamespace(**{**defaults, **options}))
+
+
+def client_for(world: World) -> TestClient:
+    app.dependency_overrides[get_user_client] = lambda: (
+        instrument_client(world.db),
+        {"id": AUTH_ID, "email": "bench@example.com"},
+    )
+    app.dependency_overrides[get_story_service] = world.service
+    app.dependency_overrides[get_priority_story_service] = world.service
+    return TestClient(app)
+
+
+def measure(world: World, request):
+    """Run one request, returning (response, elapsed ms, counter deltas)."""
+    before = world.counters()
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        response = request()
+        elapsed = (time.perf_counter() - start) * 1000
+    after = world.counters()
+    return response, elapsed, {k: after[k] - before[k] for k in after}
+
+
+def scenarios(args, size: int):
+    """Yield (name, setup) pairs; setup() returns (world, request callable)."""
+    batch = args.batch_size
+
+    def fresh(remaining=batch):
+        world = World(args)
+        story_id = world.seed_story(size, remaining, args.episode_words)
+        return world, client_for(world), story_id
+
+    def create():
+        world = World(args)
+        http = client_for(world)
+        body = {"prompt": "A lantern keeper searches for her father", "num_episodes": size + batch, "refinement": "HUMAN"}
+        return world, lambda: http.post(f"{API}/stories/", json=body)
+
+    def generate(kind):
+        def setup():
+            world, http, story_id = fresh()
+            return world, lambda: http.post(
+                f"{API}/episodes/{story_id}/generate-batch",
+                params={"batch_size": batch, "refinement_type": kind},
+            )
+
+        return setup
+
+    def pending(then):
+        def setup():
+            world, http, story_id = fresh()
+            with contextlib.redirect_stdout(io.StringIO()):
+                http.post(
+                    f"{API}/episodes/{story_id}/generate-batch",
+                    params={"batch_size": batch, "refinement_type": "HUMAN"},
+                )
+            return world, then(http, story_id)
+
+        return setup
+
+    def refine(http, story_id):
+        feedback = [
+            {"episode_number": size + i, "feedback": "Sharper dialogue"}
+            for i in range(1, batch + 1)
+        ]
+        return lambda: http.post(f"{API}/episodes/{story_id}/refine-batch", json=feedback)
+
+    def validate(http, story_id):
+        return lambda: http.post(f"{API}/episodes/{story_id}/validate-batch")
+
+    def dashboard(warm):
+        def setup():
+            world, http, _ = fresh()
+            if warm:
+                http.get(f"{API}/dashboard/")
+            return world, lambda: http.get(f"{API}/dashboard/")
+
+        return setup
+
+    yield "create_story", create
+    yield "generate_batch_human", generate("HUMAN")
+    yield "generate_batch_ai", generate("AI")
+    yield "refine_batch", pending(refine)
+    yield "validate_batch", pending(validate)
+    yield "dashboard_cold", dashboard(False)
+    yield "dashboard_warm", dashboard(True)
+
+
+def run(args):
+    results = []
+    for size in args.sizes:
+        for name, setup in scenarios(args, size):
+            timings, counts, status, server_timing = [], {}, None, None
+            for _ in range(args.repeat):
+                world, request = setup()
+                response, elapsed, counts = measure(world, request)
+                timings.append(elapsed)
+                status = response.status_code
+                server_timing = response.headers.get("server-timing")
+                if status >= 400:
+                    counts["error"] = response.text[:200]
+                    break
+            results.append(
+                {
+                    "scenario": name,
+                    "episodes": size,
+                    "status": status,
+                    "latency_ms": {
+                        "median": round(statistics.median(timings), 3),
+                        "min": round(min(timings), 3),
+                        "max": round(max(timings), 3),
+                    },
+                    **counts,
+                    "server_timing": server_timing,
+                }
+            )
+    app.dependency_overrides.clear()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 25, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--episode-words", type=int, default=450)
+    parser.add_argument("--db-latency", type=float, default=0.0, help="seconds per Supabase round trip")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per generate_content call")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds per embedding call")
+    parser.add_argument(
+        "--quality-issue-every",
+        type=int,
+        default=0,
+        help="every n-th AI quality check returns feedback (exercises the refine loop)",
+    )
+    parser.add_argument(
+        "--llm-fail-every",
+        type=int,
+        default=0,
+        help="every n-th LLM call fails with a transient 503 (exercises retries)",
+    )
+    args = parser.parse_args()
+
+    results = run(args)
+    print(
+        json.dumps(
+            {"benchmark": "story_service", "config": vars(args), "results": results},
+            indent=2,
+        )
+    )
+    sys.exit(1 if any(r["status"] >= 400 for r in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
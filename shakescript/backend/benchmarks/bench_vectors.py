@@ -0,0 +1,170 @@
+"""
+Embedding representations and encodings (app/utils/vectors.py).
+
+  memory      bytes held per 768-d embedding: list of Python floats, float32
+              array, int8 + scale (tracemalloc over --vectors embeddings)
+  payload     bytes per embedding on the wire for each EMBEDDING_WIRE_FORMAT
+              (JSON of the insert payload) and packed for the local cache, with
+              encode time
+  recall      top-k recall against float64 cosine on a clustered synthetic
+              corpus, when the stored vectors went through each wire format
+              and the query through each cache format
+  end_to_end  episodes chunked with process_and_store_batch on the fake
+              backends under each wire format: embedding bytes per chunk, and
+              how many retrieved chunks match the json format's
+
+The recall bounds (float32 within 0.1%, int8 within 5%), the size ordering
+and the end-to-end agreement are tested in tests/test_vectors.py.
+
+    python -m benchmarks.bench_vectors [--vectors 2000] [--queries 100] [--k 10]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import time
+import tracemalloc
+import numpy as np
+from app.core.config import settings
+from app.utils import vectors
+from benchmarks.bench_story_service import AUTH_ID, offline_world
+from benchmarks.fakes import _prose
+
+
+def corpus(args):
+    """Unit vectors around --clusters centres, like embeddings of one story."""
+    rng = np.random.default_rng(args.seed)
+    centres = rng.normal(size=(args.clusters, settings.VECTOR_DIMENSION))
+    docs = centres[rng.integers(args.clusters, size=args.vectors)]
+    docs = docs + rng.normal(scale=0.6, size=docs.shape)
+    queries = centres[rng.integers(args.clusters, size=args.queries)]
+    queries = queries + rng.normal(scale=0.8, size=queries.shape)
+    docs /= np.linalg.norm(docs, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return docs, queries
+
+
+def held_bytes(build) -> int:
+    tracemalloc.start()
+    held = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return size
+
+
+def memory(args):
+    docs, _ = corpus(args)
+    rows = docs.tolist()
+    per_vector = {
+        # Fresh float objects, as parsed from an embedding API response.
+        "list": held_bytes(lambda: json.loads(json.dumps(rows))) / len(rows),
+        "float32": held_bytes(lambda: vectors.as_matrix(rows)) / len(rows),
+        "int8": held_bytes(lambda: [vectors.quantize_int8(row) for row in rows]) / len(rows),
+    }
+    return {k: round(v) for k, v in per_vector.items()}
+
+
+def payload(args):
+    docs, _ = corpus(args)
+    rows = docs[:200].tolist()
+    out = {}
+    for wire_format in vectors.WIRE_FORMATS:
+        start = time.perf_counter()
+        # Including the JSON encoding of the request body.
+        encoded = [json.dumps({"embedding": vectors.encode_for_insert(row, wire_format)}) for row in rows]
+        elapsed = (time.perf_counter() - start) / len(rows)
+        out[wire_format] = {
+            "bytes": round(sum(map(len, encoded)) / len(rows)),
+            "encode_us": round(elapsed * 1e6, 1),
+        }
+    for kind in ("float32", "int8"):
+        out[f"cache_{kind}"] = {"bytes": round(sum(len(vectors.pack(row, kind)) for row in rows) / len(rows))}
+    return out
+
+
+def top_k(docs: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    norms = np.linalg.norm(docs, axis=1)
+    scores = (queries @ docs.T) / norms / np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.argsort(-scores, axis=1, kind="stable")[:, :k]
+
+
+def recall(args):
+    docs, queries = corpus(args)
+    exact = top_k(docs, queries, args.k)
+    stored = {
+        "float32": np.array([vectors.from_pgvector(vectors.encode_for_insert(d, "float32")) for d in docs]),
+        "int8": np.array([vectors.from_pgvector(vectors.encode_for_insert(d, "int8")) for d in docs]),
+    }
+    query_forms = {kind: np.array([vectors.unpack(vectors.pack(q, kind)) for q in queries]) for kind in ("float32", "int8")}
+    out = {}
+    for wire_format, matrix in stored.items():
+        for kind, query_matrix in query_forms.items():
+            found = top_k(matrix.astype(np.float64), query_matrix.astype(np.float64), args.k)
+            hits = sum(len(set(a) & set(b)) for a, b in zip(exact, found))
+            out[f"stored_{wire_format}_query_{kind}"] = round(hits / exact.size, 4)
+    return out
+
+
+def end_to_end(args):
+    results, payloads = {}, {}
+    wire_format = settings.EMBEDDING_WIRE_FORMAT
+    try:
+        for fmt in vectors.WIRE_FORMATS:
+            settings.EMBEDDING_WIRE_FORMAT = fmt
+            w = offline_world()
+            story_id = w.seed_story(0, 6, 300)
+            episodes = w.db.table("episodes").insert(
+                [{"story_id": story_id, "episode_number": n, "title": f"Episode {n}",
+                  "content": _prose(300, n), "auth_id": AUTH_ID} for n in range(1, 7)]
+            ).execute().data
+            service = w.service().embedding_service
+            service.process_and_store_batch(
+                [
+                    {"story_id": story_id, "episode_id": e["id"], "episode_number": e["episode_number"],
+                     "content": e["content"], "characters": ["Mira"], "auth_id": AUTH_ID}
+                    for e in episodes
+                ]
+            )
+            chunks = w.db.tables["chunks"]
+            payloads[fmt] = round(sum(len(json.dumps(c["embedding"])) for c in chunks) / len(chunks))
+            results[fmt] = [
+                [(c["episode_number"], c["chunk_number"])
+                 for c in service.retrieve_relevant_chunks(story_id, _prose(80, seed), AUTH_ID, k=5)]
+                for seed in range(5)
+            ]
+    finally:
+        settings.EMBEDDING_WIRE_FORMAT = wire_format
+    overlap = {
+        fmt: round(
+            sum(len(set(a) & set(b)) for a, b in zip(results[fmt], results["json"]))
+            / sum(len(set(b)) for b in results["json"]),
+            3,
+        )
+        for fmt in results
+    }
+    return {"embedding_bytes_per_chunk": payloads, "overlap_with_json": overlap}
+
+
+SCENARIOS = (memory, payload, recall, end_to_end)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--clusters", type=int, default=40)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for scenario in SCENARIOS:
+            results[scenario.__name__] = scenario(args)
+    print(json.dumps({"benchmark": "vectors", "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
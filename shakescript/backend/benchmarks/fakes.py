@@ -0,0 +1,704 @@
+"""
+In-process stand-ins for the external services the backend talks to.
+
+FakeClient      PostgREST-style subset of supabase.Client used by app/services/db_service
+                (table/select/eq/neq/gt/gte/lt/lte/in_/order/limit/single/insert/
+                upsert/update/delete/rpc). Counts round trips in `calls`.
+FakeGenerativeModel  Drop-in for genai.GenerativeModel; answers each prompt in
+                AIPrompts with a canned, well-formed response.
+FakeEmbedding   llama_index embedding with deterministic bag-of-words vectors.
+FakeProviderError  Exception shaped like the LLM SDKs' status errors (status_code,
+                Retry-After), for scripting FakeProvider failures.
+fake_backend    A FakeClient with users, a FakeGenerativeModel and a FakeEmbedding,
+                for driving app.batch_runner.BatchRunner offline.
+
+All fakes take a `latency` (seconds) that is slept on every call, so the
+benchmarks can model network cost without leaving the process.
+"""
+
+import copy
+import itertools
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+WORDS = (
+    "the storm rolled over the harbour while mira counted lanterns and the old "
+    "captain argued with the tide about promises nobody had kept until dawn"
+).split()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# Column defaults the real schema fills in on insert.
+TABLE_DEFAULTS: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "stories": lambda: {
+        "version": 1,
+        "is_completed": False,
+        "summary": None,
+        "created_at": _now(),
+    },
+    "users": lambda: {
+        "is_premium": False,
+        "avatar_url": None,
+        "episodes_timestamps": [],
+        "episodes_month_count": 0,
+        "month_start_date": None,
+        "created_at": datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+    },
+    "characters": lambda: {"last_episode": 0},
+    "chunks": lambda: {"is_foundational": False},
+    "embedding_jobs": lambda: {
+        "status": "pending",
+        "attempts": 0,
+        "available_at": _now(),
+        "enqueued_at": _now(),
+        "locked_by": None,
+        "locked_until": None,
+        "last_error": None,
+        "done_at": None,
+    },
+}
+
+
+class FakeResult:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeClient", table: str):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.columns = "*"
+        self.count = None
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+        self.ordering = []
+        self.row_limit = None
+        self.single_row = False
+
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        self.op, self.columns, self.count = "select", columns, count
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict: Optional[str] = None):
+        self.op, self.payload, self.on_conflict = "upsert", payload, on_conflict
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def _filter(self, column, predicate, value):
+        self.filters.append((column, predicate, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, lambda a, b: a == b, value)
+
+    def neq(self, column, value):
+        return self._filter(column, lambda a, b: a != b, value)
+
+    def gt(self, column, value):
+        return self._filter(column, lambda a, b: a is not None and a > b, value)
+
+    def gte(self, column, value):
+        return self._filter(column, lambda a, b: a is not None and a >= b, value)
+
+    def lt(self, column, value):
+        return self._filter(column, lambda a, b: a is not None and a < b, value)
+
+    def lte(self, column, value):
+        return self._filter(column, lambda a, b: a is not None and a <= b, value)
+
+    def in_(self, column, values):
+        return self._filter(column, lambda a, b: a in b, list(values))
+
+    def order(self, column, desc: bool = False):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, n: int):
+        self.row_limit = n
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def _matches(self, row) -> bool:
+        return all(pred(row.get(col), value) for col, pred, value in self.filters)
+
+    def _project(self, row):
+        if self.columns.strip() == "*":
+            return copy.deepcopy(row)
+        return {
+            col.strip(): copy.deepcopy(row.get(col.strip()))
+            for col in self.columns.split(",")
+        }
+
+    def execute(self) -> FakeResult:
+        self.client._round_trip(self.table, self.op)
+        with self.client.lock:
+            rows = self.client.tables.setdefault(self.table, [])
+            result = getattr(self, f"_execute_{self.op}")(rows)
+            if self.op != "select":
+                _story_version_triggers(self.client, self.table, self.op, self.payload, result.data)
+            return result
+
+    def _execute_select(self, rows):
+        out = [row for row in rows if self._matches(row)]
+        for column, desc in reversed(self.ordering):
+            out.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        total = len(out)
+        if self.row_limit is not None:
+            out = out[: self.row_limit]
+        out = [self._project(row) for row in out]
+        if self.single_row:
+            return FakeResult(out[0] if out else None, total)
+        return FakeResult(out, total if self.count else None)
+
+    def _execute_insert(self, rows):
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        keys = [k.strip() for k in (self.on_conflict or "").split(",") if k.strip()]
+        result = []
+        for item in payload:
+            existing = None
+            if self.op == "upsert" and keys:
+                existing = next(
+                    (r for r in rows if all(r.get(k) == item.get(k) for k in keys)),
+                    None,
+                )
+            if existing is not None:
+                existing.update(copy.deepcopy(item))
+                result.append(copy.deepcopy(existing))
+                continue
+            row = TABLE_DEFAULTS.get(self.table, dict)()
+            row.update(copy.deepcopy(item))
+            row.setdefault("id", next(self.client.ids))
+            rows.append(row)
+            result.append(copy.deepcopy(row))
+        return FakeResult(result)
+
+    _execute_upsert = _execute_insert
+
+    def _execute_update(self, rows):
+        result = []
+        for row in rows:
+            if self._matches(row):
+                row.update(copy.deepcopy(self.payload))
+                result.append(copy.deepcopy(row))
+        return FakeResult(result)
+
+    def _execute_delete(self, rows):
+        removed = [row for row in rows if self._matches(row)]
+        self.client.tables[self.table] = [r for r in rows if not self._matches(r)]
+        return FakeResult(removed)
+
+
+class FakeRpc:
+    def __init__(self, client: "FakeClient", name: str, params: Dict[str, Any]):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self) -> FakeResult:
+        self.client._round_trip(self.name, "rpc")
+        handler = self.client.rpcs.get(self.name)
+        if handler is None:
+            raise NotImplementedError(f"FakeClient has no rpc '{self.name}'")
+        with self.client.lock:
+            return FakeResult(handler(self.client, self.params))
+
+
+# stories columns whose changes do not bump the version.
+UNVERSIONED_STORY_COLUMNS = frozenset({"version", "lease_holder", "lease_expires_at"})
+
+
+def _story_version_triggers(client: "FakeClient", table: str, op: str, payload, changed):
+    """The triggers of migrations/006_story_version_triggers.sql."""
+    if table == "stories":
+        if op != "update" or "version" in payload or set(payload) <= UNVERSIONED_STORY_COLUMNS:
+            return
+        story_ids = {row["id"] for row in changed}
+    elif table in ("episodes", "characters"):
+        story_ids = {row.get("story_id") for row in changed}
+    else:
+        return
+    for row in client.tables.get("stories", []):
+        if row["id"] in story_ids:
+            row["version"] = row.get("version", 1) + 1
+
+
+def _story_row(client: "FakeClient", params):
+    for row in client.tables.get("stories", []):
+        if row["id"] == params["p_story_id"] and row["auth_id"] == params["p_auth_id"]:
+            return row
+    return None
+
+
+def _acquire_story_lease(client: "FakeClient", params):
+    row = _story_row(client, params)
+    if row is None:
+        return {"status": "missing"}
+    version = row.get("version", 1)
+    expected = params.get("p_expected_version")
+    if expected is not None and version != expected:
+        return {"status": "stale", "version": version}
+    now = time.time()
+    holder, expires = row.get("lease_holder"), row.get("lease_expires_at") or 0
+    if holder is not None and holder != params["p_holder"] and expires > now:
+        return {"status": "busy", "version": version, "retry_after": math.ceil(expires - now)}
+    row["lease_holder"] = params["p_holder"]
+    row["lease_expires_at"] = now + params["p_ttl_seconds"]
+    return {"status": "acquired", "version": version}
+
+
+def _release_story_lease(client: "FakeClient", params):
+    row = _story_row(client, params)
+    if row is not None and row.get("lease_holder") == params["p_holder"]:
+        row["lease_holder"] = row["lease_expires_at"] = None
+    return None
+
+
+def _store_episode_batch(client: "FakeClient", params):
+    """Same steps as migrations/003_store_episode_batch.sql, in one call."""
+    story = _story_row(client, params)
+    if story is None:
+        raise Exception(f"story {params['p_story_id']} not found")
+    auth_id, story_id = params["p_auth_id"], params["p_story_id"]
+    upsert = FakeQuery(client, "episodes").upsert(
+        params["p_episodes"], on_conflict="story_id,episode_number"
+    )
+    stored = upsert._execute_upsert(client.tables.setdefault("episodes", [])).data
+    if params.get("p_embedding_jobs") is not None:
+        ids = {r["episode_number"]: r["id"] for r in stored}
+        _enqueue_embedding_jobs(
+            client,
+            [
+                {
+                    "story_id": story_id,
+                    "episode_id": ids[job["episode_number"]],
+                    "episode_number": job["episode_number"],
+                    "auth_id": auth_id,
+                    "character_names": job.get("character_names", []),
+                }
+                for job in params["p_embedding_jobs"]
+            ],
+        )
+
+    characters = client.tables.setdefault("characters", [])
+    for change in params["p_characters"]:
+        row = next(
+            (
+                r
+                for r in characters
+                if r["story_id"] == story_id
+                and r["auth_id"] == auth_id
+                and r["name"] == change["name"]
+            ),
+            None,
+        )
+        if row is None:
+            state, milestones, last = None, [], 0
+        else:
+            state = row.get("emotional_state")
+            milestones = json.loads(row.get("milestones") or "[]")
+            last = row.get("last_episode") or 0
+        for new_state in change["emotional_states"]:
+            if row is None and last == 0:
+                state, last = new_state or "neutral", 1
+                continue
+            next_state = new_state or state or "neutral"
+            if next_state != state:
+                milestones.append({"event": f"Shift to {next_state}", "episode": last + 1})
+            state, last = next_state, last + 1
+        fields = {
+            "emotional_state": state,
+            "milestones": json.dumps(milestones[-5:]),
+            "last_episode": last,
+        }
+        if row is None:
+            row = TABLE_DEFAULTS["characters"]()
+            row.update(
+                id=next(client.ids),
+                story_id=story_id,
+                name=change["name"],
+                role=change["role"] or "Unknown",
+                description=change["description"] or "No description",
+                relationship=json.dumps(change["relationship"]),
+                is_active=True if change["is_active"] is None else change["is_active"],
+                auth_id=auth_id,
+                **fields,
+            )
+            characters.append(row)
+        else:
+            row.update(
+                role=change["role"] or row.get("role"),
+                description=change["description"] or row.get("description"),
+                relationship=json.dumps(
+                    {**json.loads(row.get("relationship") or "{}"), **change["relationship"]}
+                ),
+                is_active=row.get("is_active") if change["is_active"] is None else change["is_active"],
+                **fields,
+            )
+
+    key_events = json.loads(story.get("key_events") or "[]")
+    story.update(
+        current_episode=params["p_current_episode"],
+        setting=json.dumps({**json.loads(story.get("setting") or "{}"), **params["p_settings"]}),
+        key_events=json.dumps(key_events + [e for e in params["p_key_events"] if e not in key_events]),
+        timeline=json.dumps(json.loads(story.get("timeline") or "[]") + params["p_timeline"]),
+        version=story.get("version", 1) + 1,
+    )
+    if params.get("p_is_completed") is not None:
+        story["is_completed"] = params["p_is_completed"]
+    if params.get("p_clear_buffer"):
+        story["current_episodes_content"] = json.dumps([])
+    return [{"id": r["id"], "episode_number": r["episode_number"]} for r in stored]
+
+
+def _enqueue_embedding_jobs(client: "FakeClient", jobs):
+    rows = client.tables.setdefault("embedding_jobs", [])
+    for job in jobs:
+        row = next((r for r in rows if r["episode_id"] == job["episode_id"]), None)
+        if row is None:
+            row = {"id": next(client.ids)}
+            rows.append(row)
+        row.update(TABLE_DEFAULTS["embedding_jobs"]())
+        row.update(copy.deepcopy(job))
+
+
+def _claim_embedding_jobs(client: "FakeClient", params):
+    now = datetime.now(timezone.utc)
+    ready = [
+        r
+        for r in client.tables.get("embedding_jobs", [])
+        if (r["status"] == "pending" and datetime.fromisoformat(r["available_at"]) <= now)
+        or (r["status"] == "running" and datetime.fromisoformat(r["locked_until"]) < now)
+    ]
+    ready.sort(key=lambda r: r["available_at"])
+    episodes = {e["id"]: e for e in client.tables.get("episodes", [])}
+    claimed = []
+    for row in ready[: params["p_limit"]]:
+        row.update(
+            status="running",
+            locked_by=params["p_worker"],
+            locked_until=datetime.fromtimestamp(
+                now.timestamp() + params["p_lock_seconds"], timezone.utc
+            ).isoformat(),
+            attempts=row["attempts"] + 1,
+        )
+        job = copy.deepcopy(row)
+        job["content"] = episodes[row["episode_id"]]["content"]
+        claimed.append(job)
+    return claimed
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _vector(value) -> List[float]:
+    # pgvector columns and parameters may arrive as '[v1,v2,...]' text.
+    if isinstance(value, str):
+        return [float(v) for v in value.strip("[]").split(",")]
+    return value
+
+
+def _match_chunks(client: "FakeClient", params):
+    query = _vector(params["p_query_embedding"])
+    candidates = [
+        row
+        for row in client.tables.get("chunks", [])
+        if row["story_id"] == params["p_story_id"]
+        and row["auth_id"] == params["p_auth_id"]
+    ]
+    scored = sorted(
+        (
+            {
+                "id": row["id"],
+                "episode_number": row["episode_number"],
+                "chunk_number": row["chunk_number"],
+                "content": row["content"],
+                "importance_score": row.get("importance_score", 0),
+                "similarity": _cosine(query, _vector(row["embedding"])),
+            }
+            for row in candidates
+        ),
+        key=lambda r: r["similarity"],
+        reverse=True,
+    )
+    return scored[: params.get("p_k", 5)]
+
+
+class FakeClient:
+    """
+    In-memory PostgREST stand-in. `calls` counts every execute() (one HTTP
+    round trip against real Supabase); `calls_by_table` breaks it down.
+    Register extra SQL functions in `rpcs` as handler(client, params).
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.calls = 0
+        self.calls_by_table: Dict[str, int] = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.RLock()
+        self.rpcs: Dict[str, Callable] = {
+            "acquire_story_lease": _acquire_story_lease,
+            "release_story_lease": _release_story_lease,
+            "store_episode_batch": _store_episode_batch,
+            "claim_embedding_jobs": _claim_embedding_jobs,
+            "match_chunks": _match_chunks,
+        }
+
+    def _round_trip(self, target: str, op: str):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls += 1
+            key = f"{target}.{op}"
+            self.calls_by_table[key] = self.calls_by_table.get(key, 0) + 1
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> FakeRpc:
+        return FakeRpc(self, name, params)
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeProviderError(Exception):
+    def __init__(self, status_code: int = 503, retry_after: Optional[float] = None):
+        super().__init__(f"fake provider error {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _prose(words: int, seed: int) -> str:
+    return " ".join(WORDS[(seed * 7 + i * 3) % len(WORDS)] for i in range(words)) + "."
+
+
+def _rewrite(words: int, seed: int) -> str:
+    # Different word order from _prose, so a refined episode reads as rewritten.
+    return " ".join(WORDS[(seed * 5 + i * 11) % len(WORDS)] for i in range(words)) + "."
+
+
+class FakeGenerativeModel:
+    """
+    Answers each prompt from AIPrompts with a well-formed canned response.
+    `quality_issue_every` makes every n-th quality check return feedback so
+    the AI refinement loop can be exercised.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        episode_words: int = 450,
+        quality_issue_every: int = 0,
+    ):
+        self.latency = latency
+        self.episode_words = episode_words
+        self.quality_issue_every = quality_issue_every
+        self.calls = 0
+        self.calls_by_kind: Dict[str, int] = {}
+        self.prompt_chars = 0
+        self.response_chars = 0
+        self.lock = threading.Lock()
+
+    def _classify(self, prompt: str) -> str:
+        if "extract the following data" in prompt:
+            return "metadata"
+        if "We will now be generating the EPISODE" in prompt:
+            return "episode"
+        if "I have written episode" in prompt:
+            return "details"
+        if "to Hinglish" in prompt:
+            return "hinglish"
+        if "Analyze this story episode for quality" in prompt:
+            return "quality"
+        if "narrative consistency" in prompt:
+            return "consistency"
+        if "Refine this episode" in prompt:
+            return "refine"
+        if "engaging title" in prompt:
+            return "title"
+        if "audio teaser summary" in prompt:
+            return "summary"
+        return "other"
+
+    def _metadata(self, prompt: str) -> str:
+        match = re.search(r"would have (\d+) episodes", prompt)
+        episodes = int(match.group(1)) if match else 10
+        return json.dumps(
+            {
+                "Title": "The Lantern Keeper",
+                "Settings": {"Harbour": "A fog-bound harbour at the edge of the map"},
+                "Protagonist": [
+                    {"Name": "Mira", "Motivation": "find her father", "Fear": "the sea"}
+                ],
+                "Characters": [
+                    {
+                        "Name": "Mira",
+                        "Role": "Protagonist",
+                        "Description": "A lantern keeper",
+                        "Relationship": {"Captain Rhee": "Mentor"},
+                        "Emotional_State": "restless",
+                    },
+                    {
+                        "Name": "Captain Rhee",
+                        "Role": "Mentor",
+                        "Description": "An old captain",
+                        "Relationship": {"Mira": "Ward"},
+                        "Emotional_State": "guarded",
+                    },
+                ],
+                "Theme": "redemption",
+                "Story Outline": [
+                    {f"Ep 1-{episodes}": "Mira searches the harbour", "Phase_name": "Exposition"}
+                ],
+                "Special Instructions": "suspenseful",
+                "Genre": "Mystery",
+            }
+        )
+
+    def _respond(self, kind: str, prompt: str, count: int) -> str:
+        if kind == "metadata":
+            return self._metadata(prompt)
+        if kind in ("episode", "hinglish"):
+            number = re.search(r"EPISODE (\d+)", prompt)
+            n = int(number.group(1)) if number else count
+            return json.dumps(
+                {
+                    "episode_title": f"Episode {n}: Lanterns",
+                    "episode_content": _prose(self.episode_words, n),
+                    "episode_summary": _prose(40, n),
+                }
+            )
+        if kind == "details":
+            return json.dumps(
+                {
+                    "episode_summary": _prose(60, count),
+                    "episode_emotional_state": "tense",
+                    "characters_featured": [
+                        {
+                            "Name": "Mira",
+                            "Role": "Protagonist",
+                            "Description": "A lantern keeper",
+                            "Relationship": {"Captain Rhee": "Mentor"},
+                            "role_active": True,
+                            "Emotional_State": "tense" if count % 2 else "hopeful",
+                        }
+                    ],
+                    "Key Events": [
+                        {"event": f"Mira finds lantern {count}", "tier": "foundational"}
+                    ],
+                    "Settings": {"Harbour": "Fog rolling in"},
+                }
+            )
+        if kind == "quality":
+            if self.quality_issue_every and count % self.quality_issue_every == 0:
+                return "Dialogue feels flat; sharpen the exchange with the captain."
+            return "GOOD"
+        if kind == "consistency":
+            return "TRUE"
+        if kind == "refine":
+            return _rewrite(self.episode_words, count)
+        if kind == "title":
+            return "The Quiet Harbour"
+        if kind == "summary":
+            return _prose(170, count)
+        return "OK"
+
+    def generate_content(self, prompt, **kwargs) -> FakeResponse:
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = str(prompt)
+        kind = self._classify(prompt)
+        with self.lock:
+            self.calls += 1
+            self.calls_by_kind[kind] = self.calls_by_kind.get(kind, 0) + 1
+            count = self.calls_by_kind[kind]
+        text = self._respond(kind, prompt, count)
+        with self.lock:
+            self.prompt_chars += len(prompt)
+            self.response_chars += len(text)
+        return FakeResponse(text)
+
+
+class FakeEmbedding(BaseEmbedding):
+    """
+    Deterministic hashed bag-of-words vectors, so similar text gets similar
+    embeddings and the semantic splitter still finds breakpoints.
+    """
+
+    dimension: int = 768
+    latency: float = 0.0
+    calls: int = 0
+
+    def _vector(self, text: str) -> List[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls += 1
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % self.dimension] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # One request per batch, like the real embedding APIs.
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls += 1
+        return [self._embed(text) for text in texts]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._vector(query)
+
+
+def fake_backend(auth_ids, llm_latency: float = 0.0):
+    """(client, model, embedding model) with a users row per auth_id."""
+    client = FakeClient()
+    for auth_id in sorted(set(auth_ids)):
+        client.table("users").insert(
+            {"auth_id": auth_id, "name": auth_id, "email": f"{auth_id}@example.com"}
+        ).execute()
+    return client, FakeGenerativeModel(latency=llm_latency), FakeEmbedding()
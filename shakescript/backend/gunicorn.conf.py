@@ -0,0 +1,29 @@
+"""
+Gunicorn settings for the API (used by the Dockerfile).
+
+With preload_app the master imports app.main once and runs app.core.warmup
+before forking, so workers share the imported SDKs and read-only state
+copy-on-write instead of each importing them (or paying on first request).
+Set GUNICORN_PRELOAD=0 to load the app in each worker instead.
+"""
+
+import gc
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:80")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") not in ("0", "false", "False")
+
+
+def when_ready(server):
+    # Runs in the master after the (pre)loaded app and before workers fork.
+    if not preload_app:
+        return
+    from app.core import warmup
+
+    timings = warmup.warmup()
+    server.log.info("Pre-fork warmup: %.1f ms", sum(timings.values()))
+    # Keep warmed objects out of the collector so workers' GC passes do not
+    # touch (and un-share) their pages.
+    gc.freeze()
@@ -0,0 +1,6 @@
+-- Monotonic per-story version used for ETags and conditional GETs.
+-- Every write to stories, episodes or characters bumps it, through the
+-- triggers of 006_story_version_triggers.sql. Until this column exists the
+-- app serves stories without an ETag.
+
+alter table stories add column if not exists version bigint not null default 1;
@@ -0,0 +1,72 @@
+-- Per-story generation lease. generate-batch, refine-batch and validate-batch
+-- hold it for the whole request, so a concurrent call on the same story is
+-- answered 409 before any LLM work instead of generating the same episodes
+-- and overwriting them. A lease whose holder died expires and can be taken
+-- over. Taking the lease can also check stories.version (If-Match), which is
+-- answered 412 when stale. Leases do not bump the version.
+
+alter table stories add column if not exists lease_holder text;
+alter table stories add column if not exists lease_expires_at timestamptz;
+
+create or replace function acquire_story_lease(
+    p_story_id bigint,
+    p_auth_id text,
+    p_holder text,
+    p_ttl_seconds integer,
+    p_expected_version bigint default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    story record;
+begin
+    select id, version, lease_holder, lease_expires_at
+      into story
+      from stories
+     where id = p_story_id
+       and auth_id::text = p_auth_id
+       for update;
+
+    if not found then
+        return jsonb_build_object('status', 'missing');
+    end if;
+
+    if p_expected_version is not null and story.version <> p_expected_version then
+        return jsonb_build_object('status', 'stale', 'version', story.version);
+    end if;
+
+    if story.lease_holder is not null
+       and story.lease_holder <> p_holder
+       and story.lease_expires_at > now() then
+        return jsonb_build_object(
+            'status', 'busy',
+            'version', story.version,
+            'retry_after', ceil(extract(epoch from story.lease_expires_at - now()))
+        );
+    end if;
+
+    update stories
+       set lease_holder = p_holder,
+           lease_expires_at = now() + make_interval(secs => p_ttl_seconds)
+     where id = p_story_id;
+
+    return jsonb_build_object('status', 'acquired', 'version', story.version);
+end;
+$$;
+
+create or replace function release_story_lease(
+    p_story_id bigint,
+    p_auth_id text,
+    p_holder text
+)
+returns void
+language sql
+as $$
+    update stories
+       set lease_holder = null,
+           lease_expires_at = null
+     where id = p_story_id
+       and auth_id::text = p_auth_id
+       and lease_holder = p_holder;
+$$;
@@ -0,0 +1,161 @@
+-- Store a whole batch of episodes in one round trip and one transaction.
+-- EpisodesDB.store_episode_batch sends the episode rows, the batch's
+-- character changes merged per character, and the story-level deltas
+-- (settings, key events, timeline). This replaces, per episode, an upsert,
+-- a read and write per character, a story read and update and a version
+-- bump, then the progress update and buffer clear after the batch.
+--
+-- p_characters: [{name, role, description, relationship, is_active,
+--                 emotional_states: [state or null per appearance]}]
+--   role/description/is_active are null when the batch never set them.
+-- p_is_completed: null leaves is_completed as is.
+-- Returns [{id, episode_number}] for the stored episodes.
+
+create or replace function store_episode_batch(
+    p_story_id bigint,
+    p_auth_id text,
+    p_episodes jsonb,
+    p_characters jsonb,
+    p_settings jsonb,
+    p_key_events jsonb,
+    p_timeline jsonb,
+    p_current_episode integer,
+    p_is_completed boolean default null,
+    p_clear_buffer boolean default false
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    stored jsonb;
+    c jsonb;
+    cur record;
+    v_exists boolean;
+    v_state text;
+    v_next text;
+    v_milestones jsonb;
+    v_last integer;
+    s text;
+begin
+    perform 1
+      from stories
+     where id = p_story_id
+       and auth_id::text = p_auth_id
+       for update;
+    if not found then
+        raise exception 'story % not found', p_story_id;
+    end if;
+
+    with upserted as (
+        insert into episodes (
+            story_id, episode_number, title, content, summary,
+            key_events, emotional_state, auth_id
+        )
+        select story_id, episode_number, title, content, summary,
+               key_events, emotional_state, auth_id
+          from jsonb_populate_recordset(null::episodes, p_episodes)
+        on conflict (story_id, episode_number) do update
+           set title = excluded.title,
+               content = excluded.content,
+               summary = excluded.summary,
+               key_events = excluded.key_events,
+               emotional_state = excluded.emotional_state
+        returning id, episode_number
+    )
+    select coalesce(jsonb_agg(jsonb_build_object('id', id, 'episode_number', episode_number)), '[]'::jsonb)
+      into stored
+      from upserted;
+
+    for c in select value from jsonb_array_elements(p_characters) loop
+        select * into cur
+          from characters
+         where story_id = p_story_id
+           and auth_id::text = p_auth_id
+           and name = c->>'name'
+           for update;
+        v_exists := found;
+        if v_exists then
+            v_state := cur.emotional_state;
+            v_milestones := coalesce(nullif(cur.milestones, ''), '[]')::jsonb;
+            v_last := coalesce(cur.last_episode, 0);
+        else
+            v_state := null;
+            v_milestones := '[]'::jsonb;
+            v_last := 0;
+        end if;
+
+        -- Replay the batch's appearances in order, as one store_episode per
+        -- episode would: each one advances last_episode and records a shift.
+        for s in select value #>> '{}' from jsonb_array_elements(c->'emotional_states') loop
+            if v_last = 0 and not v_exists then
+                v_state := coalesce(s, 'neutral');
+                v_last := 1;
+            else
+                v_next := coalesce(s, v_state, 'neutral');
+                if v_next is distinct from v_state then
+                    v_milestones := v_milestones || jsonb_build_array(jsonb_build_object(
+                        'event', 'Shift to ' || v_next,
+                        'episode', v_last + 1
+                    ));
+                end if;
+                v_state := v_next;
+                v_last := v_last + 1;
+            end if;
+        end loop;
+
+        v_milestones := coalesce((
+            select jsonb_agg(value order by ordinality)
+              from jsonb_array_elements(v_milestones) with ordinality
+             where ordinality > jsonb_array_length(v_milestones) - 5
+        ), '[]'::jsonb);
+
+        if v_exists then
+            update characters
+               set role = coalesce(c->>'role', role),
+                   description = coalesce(c->>'description', description),
+                   relationship = (coalesce(nullif(relationship, ''), '{}')::jsonb
+                                   || coalesce(c->'relationship', '{}'::jsonb))::text,
+                   is_active = coalesce((c->>'is_active')::boolean, is_active),
+                   emotional_state = v_state,
+                   milestones = v_milestones::text,
+                   last_episode = v_last
+             where id = cur.id;
+        else
+            insert into characters (
+                story_id, name, role, description, relationship, is_active,
+                emotional_state, milestones, last_episode, auth_id
+            ) values (
+                p_story_id,
+                c->>'name',
+                coalesce(c->>'role', 'Unknown'),
+                coalesce(c->>'description', 'No description'),
+                coalesce(c->'relationship', '{}'::jsonb)::text,
+                coalesce((c->>'is_active')::boolean, true),
+                v_state,
+                v_milestones::text,
+                v_last,
+                p_auth_id::uuid
+            );
+        end if;
+    end loop;
+
+    update stories
+       set current_episode = p_current_episode,
+           is_completed = coalesce(p_is_completed, is_completed),
+           setting = (coalesce(nullif(setting, ''), '{}')::jsonb || p_settings)::text,
+           key_events = (
+               select coalesce(jsonb_agg(distinct value), '[]'::jsonb)
+                 from jsonb_array_elements(
+                     coalesce(nullif(key_events, ''), '[]')::jsonb || p_key_events
+                 )
+           )::text,
+           timeline = (coalesce(nullif(timeline, ''), '[]')::jsonb || p_timeline)::text,
+           current_episodes_content = case
+               when p_clear_buffer then '[]' else current_episodes_content
+           end,
+           version = version + 1
+     where id = p_story_id;
+
+    return stored;
+end;
+$$;
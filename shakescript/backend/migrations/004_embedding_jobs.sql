@@ -0,0 +1,242 @@
+-- Outbox for chunking + embedding validated episodes. Jobs are written in
+-- the same transaction as the episodes (store_episode_batch's new
+-- p_embedding_jobs: [{episode_number, character_names}]) and drained by
+-- app/workers/embedding_worker.py, so a worker restart no longer loses them
+-- the way FastAPI BackgroundTasks did. Re-validating an episode re-queues its
+-- job; the worker replaces the episode's chunks.
+--
+-- status: pending -> running (claimed, until locked_until) -> done, or back
+-- to pending with a backoff in available_at, or failed after the last
+-- attempt. A running job whose worker died is reclaimed after locked_until.
+
+create table if not exists embedding_jobs (
+    id bigint generated by default as identity primary key,
+    story_id bigint not null references stories (id) on delete cascade,
+    episode_id bigint not null unique references episodes (id) on delete cascade,
+    episode_number integer not null,
+    auth_id uuid not null,
+    character_names jsonb not null default '[]'::jsonb,
+    status text not null default 'pending'
+        check (status in ('pending', 'running', 'done', 'failed')),
+    attempts integer not null default 0,
+    available_at timestamptz not null default now(),
+    enqueued_at timestamptz not null default now(),
+    locked_by text,
+    locked_until timestamptz,
+    last_error text,
+    done_at timestamptz
+);
+
+create index if not exists embedding_jobs_ready
+    on embedding_jobs (available_at) where status in ('pending', 'running');
+create index if not exists embedding_jobs_story
+    on embedding_jobs (story_id) where status in ('pending', 'running');
+
+-- Claim up to p_limit ready jobs (with their episode's content) for one
+-- worker; SKIP LOCKED lets several workers claim concurrently.
+create or replace function claim_embedding_jobs(
+    p_worker text,
+    p_limit integer,
+    p_lock_seconds integer
+)
+returns jsonb
+language sql
+as $$
+    with picked as (
+        select id
+          from embedding_jobs
+         where (status = 'pending' and available_at <= now())
+            or (status = 'running' and locked_until < now())
+         order by available_at
+         limit p_limit
+           for update skip locked
+    ), claimed as (
+        update embedding_jobs j
+           set status = 'running',
+               locked_by = p_worker,
+               locked_until = now() + make_interval(secs => p_lock_seconds),
+               attempts = j.attempts + 1
+          from picked
+         where j.id = picked.id
+        returning j.*
+    )
+    select coalesce(jsonb_agg(to_jsonb(c) || jsonb_build_object('content', e.content)), '[]'::jsonb)
+      from claimed c
+      join episodes e on e.id = c.episode_id;
+$$;
+
+drop function if exists store_episode_batch(
+    bigint, text, jsonb, jsonb, jsonb, jsonb, jsonb, integer, boolean, boolean
+);
+
+create or replace function store_episode_batch(
+    p_story_id bigint,
+    p_auth_id text,
+    p_episodes jsonb,
+    p_characters jsonb,
+    p_settings jsonb,
+    p_key_events jsonb,
+    p_timeline jsonb,
+    p_current_episode integer,
+    p_is_completed boolean default null,
+    p_clear_buffer boolean default false,
+    p_embedding_jobs jsonb default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    stored jsonb;
+    c jsonb;
+    cur record;
+    v_exists boolean;
+    v_state text;
+    v_next text;
+    v_milestones jsonb;
+    v_last integer;
+    s text;
+begin
+    perform 1
+      from stories
+     where id = p_story_id
+       and auth_id::text = p_auth_id
+       for update;
+    if not found then
+        raise exception 'story % not found', p_story_id;
+    end if;
+
+    with upserted as (
+        insert into episodes (
+            story_id, episode_number, title, content, summary,
+            key_events, emotional_state, auth_id
+        )
+        select story_id, episode_number, title, content, summary,
+               key_events, emotional_state, auth_id
+          from jsonb_populate_recordset(null::episodes, p_episodes)
+        on conflict (story_id, episode_number) do update
+           set title = excluded.title,
+               content = excluded.content,
+               summary = excluded.summary,
+               key_events = excluded.key_events,
+               emotional_state = excluded.emotional_state
+        returning id, episode_number
+    )
+    select coalesce(jsonb_agg(jsonb_build_object('id', id, 'episode_number', episode_number)), '[]'::jsonb)
+      into stored
+      from upserted;
+
+    if p_embedding_jobs is not null then
+        insert into embedding_jobs (story_id, episode_id, episode_number, auth_id, character_names)
+        select p_story_id,
+               (e->>'id')::bigint,
+               (e->>'episode_number')::integer,
+               p_auth_id::uuid,
+               coalesce(j->'character_names', '[]'::jsonb)
+          from jsonb_array_elements(stored) e
+          join jsonb_array_elements(p_embedding_jobs) j
+            on (j->>'episode_number')::integer = (e->>'episode_number')::integer
+        on conflict (episode_id) do update
+           set character_names = excluded.character_names,
+               status = 'pending',
+               attempts = 0,
+               available_at = now(),
+               enqueued_at = now(),
+               locked_by = null,
+               locked_until = null,
+               last_error = null,
+               done_at = null;
+    end if;
+
+    for c in select value from jsonb_array_elements(p_characters) loop
+        select * into cur
+          from characters
+         where story_id = p_story_id
+           and auth_id::text = p_auth_id
+           and name = c->>'name'
+           for update;
+        v_exists := found;
+        if v_exists then
+            v_state := cur.emotional_state;
+            v_milestones := coalesce(nullif(cur.milestones, ''), '[]')::jsonb;
+            v_last := coalesce(cur.last_episode, 0);
+        else
+            v_state := null;
+            v_milestones := '[]'::jsonb;
+            v_last := 0;
+        end if;
+
+        -- Replay the batch's appearances in order, as one store_episode per
+        -- episode would: each one advances last_episode and records a shift.
+        for s in select value #>> '{}' from jsonb_array_elements(c->'emotional_states') loop
+            if v_last = 0 and not v_exists then
+                v_state := coalesce(s, 'neutral');
+                v_last := 1;
+            else
+                v_next := coalesce(s, v_state, 'neutral');
+                if v_next is distinct from v_state then
+                    v_milestones := v_milestones || jsonb_build_array(jsonb_build_object(
+                        'event', 'Shift to ' || v_next,
+                        'episode', v_last + 1
+                    ));
+                end if;
+                v_state := v_next;
+                v_last := v_last + 1;
+            end if;
+        end loop;
+
+        v_milestones := coalesce((
+            select jsonb_agg(value order by ordinality)
+              from jsonb_array_elements(v_milestones) with ordinality
+             where ordinality > jsonb_array_length(v_milestones) - 5
+        ), '[]'::jsonb);
+
+        if v_exists then
+            update characters
+               set role = coalesce(c->>'role', role),
+                   description = coalesce(c->>'description', description),
+                   relationship = (coalesce(nullif(relationship, ''), '{}')::jsonb
+                                   || coalesce(c->'relationship', '{}'::jsonb))::text,
+                   is_active = coalesce((c->>'is_active')::boolean, is_active),
+                   emotional_state = v_state,
+                   milestones = v_milestones::text,
+                   last_episode = v_last
+             where id = cur.id;
+        else
+            insert into characters (
+                story_id, name, role, description, relationship, is_active,
+                emotional_state, milestones, last_episode, auth_id
+            ) values (
+                p_story_id,
+                c->>'name',
+                coalesce(c->>'role', 'Unknown'),
+                coalesce(c->>'description', 'No description'),
+                coalesce(c->'relationship', '{}'::jsonb)::text,
+                coalesce((c->>'is_active')::boolean, true),
+                v_state,
+                v_milestones::text,
+                v_last,
+                p_auth_id::uuid
+            );
+        end if;
+    end loop;
+
+    update stories
+       set current_episode = p_current_episode,
+           is_completed = coalesce(p_is_completed, is_completed),
+           setting = (coalesce(nullif(setting, ''), '{}')::jsonb || p_settings)::text,
+           key_events = (
+               select coalesce(jsonb_agg(distinct value), '[]'::jsonb)
+                 from jsonb_array_elements(
+                     coalesce(nullif(key_events, ''), '[]')::jsonb || p_key_events
+                 )
+           )::text,
+           timeline = (coalesce(nullif(timeline, ''), '[]')::jsonb || p_timeline)::text,
+           current_episodes_content = case
+               when p_clear_buffer then '[]' else current_episodes_content
+           end,
+           version = version + 1
+     where id = p_story_id;
+
+    return stored;
+end;
+$$;
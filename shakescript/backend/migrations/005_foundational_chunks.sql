@@ -0,0 +1,18 @@
+-- Flag the chunks of a story's opening and midpoint episodes at ingestion,
+-- so retrieval can fetch them by (story_id) alone instead of reading
+-- num_episodes from the story to find the midpoint on every call.
+-- With FOUNDATIONAL_CHUNKS_ENABLED, EmbeddingService sets the flag with the
+-- same rule as the importance score: episode 1 or int(num_episodes * 0.5).
+
+alter table chunks add column if not exists is_foundational boolean not null default false;
+
+update chunks c
+   set is_foundational = true
+  from stories s
+ where c.story_id = s.id
+   and c.episode_number in (1, s.num_episodes / 2)
+   and not c.is_foundational;
+
+create index if not exists chunks_foundational_idx
+    on chunks (story_id, episode_number, chunk_number)
+ where is_foundational;
@@ -0,0 +1,54 @@
+-- Bump stories.version from triggers, in the same transaction as the write,
+-- instead of a separate bump_story_version() call after it (that function,
+-- left over from an earlier 001_story_version.sql, is dropped). The app no
+-- longer calls any SQL function to version a story, so its writes work on
+-- a database without these migrations (the version just stays put).
+-- Needs the version column from 001_story_version.sql.
+--
+-- A stories update bumps the version when any column other than the
+-- version and the lease (002_story_lease.sql) changes; an update that sets
+-- the version itself (store_episode_batch) is left alone. Every insert,
+-- update or delete of an episode or character bumps its story.
+
+drop function if exists bump_story_version(bigint, text);
+
+create or replace function bump_version_on_story_update()
+returns trigger
+language plpgsql
+as $$
+begin
+    if new.version = old.version
+       and (to_jsonb(new) - 'version' - 'lease_holder' - 'lease_expires_at')
+           is distinct from (to_jsonb(old) - 'version' - 'lease_holder' - 'lease_expires_at') then
+        new.version := old.version + 1;
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists stories_version on stories;
+create trigger stories_version
+    before update on stories
+    for each row execute function bump_version_on_story_update();
+
+create or replace function bump_story_version_on_child_write()
+returns trigger
+language plpgsql
+as $$
+begin
+    update stories
+       set version = version + 1
+     where id = case when tg_op = 'DELETE' then old.story_id else new.story_id end;
+    return null;
+end;
+$$;
+
+drop trigger if exists episodes_story_version on episodes;
+create trigger episodes_story_version
+    after insert or update or delete on episodes
+    for each row execute function bump_story_version_on_child_write();
+
+drop trigger if exists characters_story_version on characters;
+create trigger characters_story_version
+    after insert or update or delete on characters
+    for each row execute function bump_story_version_on_child_write();
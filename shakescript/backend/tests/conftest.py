@@ -0,0 +1,57 @@
+"""
+Shared fixtures. The tests run fully offline on the in-process fakes from
+benchmarks.fakes (importing the benchmarks package sets placeholder
+credentials so app.core.config loads without a .env file).
+"""
+
+import benchmarks  # noqa: F401
+import pytest
+from app.core import idempotency
+from app.core.cache import read_cache, retrieval_cache
+from app.core.metrics import registry
+from app.main import app
+from app.services import bm25_index
+from app.services.core_service import utils_core
+from benchmarks.bench_story_service import AUTH_ID, client_for, offline_world
+
+
+@pytest.fixture(autouse=True)
+def _reset_process_state():
+    registry.clear()
+    # The default store is a temp-dir file, so keys would outlive the run.
+    idempotency.store.clear()
+    # Story ids restart in every World, so per-story caches must not carry over.
+    read_cache.clear()
+    retrieval_cache.clear()
+    bm25_index.indexes.clear()
+    utils_core._embeddings_seen.clear()
+    yield
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def world():
+    """
+    Factory for an isolated World (fake Supabase tables, model and embedder)
+    with no simulated latency; keyword arguments override its options, e.g.
+    world(llm_latency=0.05).
+    """
+    return offline_world
+
+
+@pytest.fixture
+def story(world):
+    """(world, story_id) for a story with two stored episodes and two to go."""
+    w = world()
+    return w, w.seed_story(2, 2, 120)
+
+
+@pytest.fixture
+def client():
+    """TestClient for a World, with the user and StoryService overridden."""
+    return client_for
+
+
+@pytest.fixture
+def auth_id():
+    return AUTH_ID
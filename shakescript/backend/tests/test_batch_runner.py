@@ -0,0 +1,95 @@
+import json
+import pytest
+from app.batch_runner import BatchRunner, Checkpoint, load_manifest
+from app.models.schemas import BatchStoryRequest
+from app.services.core_service import StoryService
+from benchmarks.fakes import fake_backend
+
+
+def manifest(stories=4, episodes=4):
+    # One owner per story keeps each under the per-user daily episode limit.
+    return [
+        BatchStoryRequest(
+            key=f"story-{i}",
+            prompt=f"A lighthouse keeper finds letter number {i}",
+            num_episodes=episodes,
+            batch_size=2,
+            refinement="HUMAN" if i % 2 else "AI",
+            auth_id=f"catalogue-{i}",
+        )
+        for i in range(stories)
+    ]
+
+
+def runner(backend, checkpoint_path, workers=2):
+    client, model, embedder = backend
+    return BatchRunner(
+        client, Checkpoint(str(checkpoint_path)), workers=workers, model=model, embedding_model=embedder
+    )
+
+
+def episodes_per_story(client):
+    counts = {}
+    for row in client.tables.get("episodes", []):
+        key = (row["story_id"], row["episode_number"])
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def test_runs_every_story_to_completion(tmp_path):
+    entries = manifest()
+    backend = fake_backend([e.auth_id for e in entries])
+    report = runner(backend, tmp_path / "checkpoint").run(entries)
+    assert report["stories"] == {"done": 4}
+    assert report["episodes"] == 16
+    assert report["tokens"] > 0
+    assert sorted(episodes_per_story(backend[0]).values()) == [1] * 16
+
+
+def test_resumes_from_the_checkpoint(tmp_path):
+    entries = manifest()
+    backend = fake_backend([e.auth_id for e in entries])
+    client, model, _ = backend
+    first = runner(backend, tmp_path / "checkpoint")
+
+    class Stopping:
+        def generate_content(self, contents, *args, **kwargs):
+            if model.calls >= 20:
+                first.stop.set()
+            return model.generate_content(contents, *args, **kwargs)
+
+    first.model = Stopping()
+    interrupted = first.run(entries)
+    assert interrupted["stories"].get("interrupted", 0) > 0
+
+    resumed = runner(backend, tmp_path / "checkpoint").run(entries)
+    assert resumed["stories"].get("skipped", 0) == interrupted["stories"].get("done", 0)
+    assert resumed["stories"].get("done", 0) + resumed["stories"].get("skipped", 0) == 4
+    assert len(client.tables["stories"]) == 4
+    assert sorted(episodes_per_story(client).values()) == [1] * 16
+
+
+def test_story_without_progress_fails_instead_of_looping(tmp_path, monkeypatch):
+    monkeypatch.setattr(StoryService, "generate_and_refine_batch", lambda self, *args: {})
+    entries = manifest(stories=1)
+    r = runner(fake_backend([e.auth_id for e in entries]), tmp_path / "checkpoint")
+    assert r.run(entries)["stories"] == {"failed": 1}
+    record = r.checkpoint.get("story-0")
+    assert record["status"] == "failed"
+    assert record["error"] == "No progress past episode 1"
+
+
+def test_checkpoint_skips_a_torn_last_line(tmp_path):
+    path = tmp_path / "checkpoint"
+    Checkpoint(str(path)).record("a", status="done")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"key": "b", "sta')
+    assert Checkpoint(str(path)).state.keys() == {"a"}
+
+
+def test_manifest_rejects_duplicate_keys(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    line = json.dumps({"key": "x", "prompt": "p", "num_episodes": 2})
+    path.write_text(f"{line}\n\n{line}\n")
+    with pytest.raises(ValueError, match="line 3"):
+        load_manifest(str(path))
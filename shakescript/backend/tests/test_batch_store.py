@@ -0,0 +1,40 @@
+import json
+import pytest
+from fastapi import BackgroundTasks
+from app.core.config import settings
+from benchmarks.bench_batch_store import batch
+
+
+def snapshot(w, story_id):
+    """Episodes, characters and story state, without ids and version."""
+
+    def strip(row, *drop):
+        return {k: v for k, v in row.items() if k not in ("id", *drop)}
+
+    story = next(r for r in w.db.tables["stories"] if r["id"] == story_id)
+    story = strip(story, "version", "created_at", "lease_holder", "lease_expires_at")
+    story["key_events"] = sorted(json.loads(story["key_events"]))
+    return {
+        "story": story,
+        "episodes": sorted((strip(r) for r in w.db.tables["episodes"]), key=lambda r: r["episode_number"]),
+        "characters": sorted((strip(r) for r in w.db.tables["characters"]), key=lambda r: r["name"]),
+    }
+
+
+def store(world, auth_id, size, batched, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_EPISODE_STORE_ENABLED", batched)
+    w = world()
+    story_id = w.seed_story(0, size, 120)
+    before = w.db.calls
+    w.service().store_validated_episodes(story_id, batch(size), size, auth_id, BackgroundTasks())
+    return w.db.calls - before, snapshot(w, story_id)
+
+
+@pytest.mark.parametrize("size", [1, 2, 5])
+def test_batched_store_matches_per_episode_writes(world, auth_id, monkeypatch, size):
+    per_episode_trips, expected = store(world, auth_id, size, False, monkeypatch)
+    batched_trips, actual = store(world, auth_id, size, True, monkeypatch)
+    assert actual == expected
+    assert batched_trips == 1
+    assert per_episode_trips > batched_trips
+
@@ -0,0 +1,56 @@
+import multiprocessing
+import os
+from app.core.cache import MemoryCacheBackend, SqliteCacheBackend
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(ttl_seconds=60, max_entries=2)
+    backend.set("a", "1", 1)
+    backend.set("a", "2", 2)
+    backend.get("a", "1")
+    backend.set("b", "3", 3)
+    assert backend.get("a", "1") == 1
+    assert backend.get("a", "2") is None
+    assert backend.get("b", "3") == 3
+
+
+def test_memory_backend_invalidates_a_namespace():
+    backend = MemoryCacheBackend(ttl_seconds=60, max_entries=10)
+    backend.set("user-1", "dashboard", {"n": 1})
+    backend.set("user-2", "dashboard", {"n": 2})
+    backend.invalidate("user-1")
+    assert backend.get("user-1", "dashboard") is None
+    assert backend.get("user-2", "dashboard") == {"n": 2}
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer, reader = SqliteCacheBackend(path, 60, 10), SqliteCacheBackend(path, 60, 10)
+    writer.set("user-1", "stories", [1, 2])
+    assert reader.get("user-1", "stories") == [1, 2]
+    reader.invalidate("user-1")
+    assert writer.get("user-1", "stories") is None
+
+
+def test_sqlite_backend_keeps_no_connection_from_init(tmp_path):
+    backend = SqliteCacheBackend(str(tmp_path / "cache.sqlite3"), 60, 10)
+    assert getattr(backend._local, "conn", None) is None
+
+
+def _use_after_fork(backend, inherited_id, result):
+    conn = backend._conn()
+    backend.set("child", "k", os.getpid())
+    result.value = int(id(conn) != inherited_id and backend.get("child", "k") == os.getpid())
+
+
+def test_sqlite_backend_reopens_its_connection_after_fork(tmp_path):
+    backend = SqliteCacheBackend(str(tmp_path / "cache.sqlite3"), 60, 10)
+    backend.set("parent", "k", 1)
+    ctx = multiprocessing.get_context("fork")
+    result = ctx.Value("i", 0)
+    child = ctx.Process(target=_use_after_fork, args=(backend, id(backend._conn()), result))
+    child.start()
+    child.join()
+    assert child.exitcode == 0 and result.value == 1
+    assert backend.get("child", "k") is not None
+    assert backend.get("parent", "k") == 1
@@ -0,0 +1,224 @@
+import threading
+import time
+import pytest
+from fastapi import BackgroundTasks
+from app.core.cache import retrieval_cache
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.core_service import utils_core
+from app.services.embedding_service import EmbeddingService
+from app.workers.embedding_worker import EmbeddingWorker
+from benchmarks.bench_batch_store import batch
+
+
+@pytest.fixture(autouse=True)
+def queue_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_QUEUE_ENABLED", True)
+
+
+@pytest.fixture
+def queued(world, auth_id):
+    """Factory: a World with `stories` stories of `episodes` validated episodes queued."""
+
+    def make(stories=1, episodes=4, **options):
+        w = world(**options)
+        service = w.service()
+        story_ids = []
+        for _ in range(stories):
+            story_id = w.seed_story(0, episodes, 120)
+            service.store_validated_episodes(story_id, batch(episodes), episodes, auth_id, BackgroundTasks())
+            story_ids.append(story_id)
+        return w, story_ids
+
+    return make
+
+
+def worker_for(w, embedding_service=None, **kwargs):
+    service = w.service()
+    return EmbeddingWorker(
+        service.client,
+        embedding_service=embedding_service or service.embedding_service,
+        poll_interval=0.01,
+        **kwargs,
+    )
+
+
+def chunk_keys(w):
+    return [(c["episode_id"], c["chunk_number"]) for c in w.db.tables.get("chunks", [])]
+
+
+def statuses(w):
+    out = {}
+    for job in w.db.tables.get("embedding_jobs", []):
+        out[job["status"]] = out.get(job["status"], 0) + 1
+    return out
+
+
+def drain(queued, batch_size):
+    w, _ = queued(stories=3, episodes=4)
+    embeds, trips = w.embedder.calls, w.db.calls
+    worker_for(w, batch_size=batch_size, concurrency=2).run(until_idle=True)
+    return w, w.embedder.calls - embeds, w.db.calls - trips
+
+
+def test_batched_claims_drain_with_fewer_requests(queued):
+    single, single_embeds, single_trips = drain(queued, 1)
+    batched, batched_embeds, batched_trips = drain(queued, 8)
+    assert statuses(single) == statuses(batched) == {"done": 12}
+    keys = chunk_keys(batched)
+    assert len(chunk_keys(single)) == len(keys) > 0
+    assert len(keys) == len(set(keys))
+    assert batched_embeds < single_embeds
+    assert batched_trips < single_trips
+
+
+def test_jobs_of_a_dead_worker_are_redone_without_duplicates(queued):
+    w, _ = queued(episodes=4)
+    dead = worker_for(w)
+    claimed = dead.jobs.claim("dead-worker", 4, 0)
+    # The dead worker stores its chunks but never marks the jobs done.
+    dead.embedding_service.process_and_store_batch(
+        [{**job, "characters": job["character_names"]} for job in claimed]
+    )
+    time.sleep(0.01)
+    worker_for(w).run(until_idle=True)
+    keys = chunk_keys(w)
+    assert len(claimed) == 4
+    assert statuses(w) == {"done": 4}
+    assert keys and len(keys) == len(set(keys))
+
+
+class Flaky(EmbeddingService):
+    """Fails the first `transient` batches, and always on a poison episode."""
+
+    def __init__(self, client, embedding_model, transient, poison):
+        super().__init__(client, embedding_model=embedding_model)
+        self.transient = transient
+        self.poison = poison
+        self.lock = threading.Lock()
+        self.in_flight = self.max_in_flight = 0
+
+    def process_and_store_batch(self, episodes):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            fail = self.transient > 0
+            self.transient -= 1
+        try:
+            time.sleep(0.005)
+            if fail:
+                raise ConnectionError("embedding API unavailable")
+            if any(ep["episode_number"] == self.poison for ep in episodes):
+                raise ValueError("episode cannot be embedded")
+            return super().process_and_store_batch(episodes)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def test_transient_errors_retry_and_poison_fails_alone(queued, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_WORKER_RETRY_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "EMBEDDING_WORKER_MAX_ATTEMPTS", 3)
+    w, _ = queued(episodes=4)
+    flaky = Flaky(w.service().client, w.embedder, transient=1, poison=2)
+    worker = worker_for(w, embedding_service=flaky, batch_size=8)
+    deadline = time.monotonic() + 5
+    while (statuses(w).get("pending") or statuses(w).get("running")) and time.monotonic() < deadline:
+        worker.run(until_idle=True)
+        time.sleep(0.02)
+    poison = next(j for j in w.db.tables["embedding_jobs"] if j["episode_number"] == 2)
+    assert statuses(w) == {"done": 3, "failed": 1}
+    assert poison["attempts"] == 3
+    assert "cannot be embedded" in poison["last_error"]
+    assert registry.value("shakescript_embedding_jobs_total", outcome="retried") >= 1
+
+
+def test_in_flight_batches_stay_within_concurrency(queued):
+    w, _ = queued(stories=3, episodes=4)
+    counting = Flaky(w.service().client, w.embedder, transient=0, poison=-1)
+    worker_for(w, embedding_service=counting, batch_size=2, concurrency=2).run(until_idle=True)
+    assert 0 < counting.max_in_flight <= 2
+    assert statuses(w) == {"done": 12}
+
+
+def test_wait_gives_up_after_the_timeout(queued, auth_id):
+    w, (story_id,) = queued()
+    start = time.perf_counter()
+    assert not w.service().wait_for_embeddings(story_id, auth_id, timeout=0.1)
+    assert time.perf_counter() - start >= 0.1
+
+
+def test_wait_returns_once_a_late_worker_drains(queued, auth_id):
+    w, (story_id,) = queued()
+    late = threading.Timer(0.1, lambda: worker_for(w).run(until_idle=True))
+    late.start()
+    start = time.perf_counter()
+    assert w.service().wait_for_embeddings(story_id, auth_id, timeout=5)
+    late.join()
+    assert 0.1 <= time.perf_counter() - start < 5
+
+
+class Spy:
+    def __init__(self, target, calls):
+        self.target = target
+        self.calls = calls
+
+    def invalidate(self, story_id, **kwargs):
+        self.calls.append(story_id)
+        return self.target.invalidate(story_id, **kwargs)
+
+
+@pytest.fixture
+def invalidations(monkeypatch):
+    """Story ids whose retrieval cache wait_for_embeddings dropped."""
+    dropped = []
+    monkeypatch.setattr(utils_core, "retrieval_cache", Spy(retrieval_cache, dropped))
+    return dropped
+
+
+def test_idle_story_keeps_its_retrieval_cache(queued, auth_id, invalidations):
+    w, (story_id,) = queued()
+    worker_for(w).run(until_idle=True)
+    service = w.service()
+    service.wait_for_embeddings(story_id, auth_id, timeout=1)
+    dropped = len(invalidations)
+    service.wait_for_embeddings(story_id, auth_id, timeout=1)
+    service.wait_for_embeddings(story_id, auth_id, timeout=1)
+    assert len(invalidations) == dropped
+
+
+def test_pending_jobs_invalidate(queued, auth_id, invalidations):
+    w, (story_id,) = queued()
+    service = w.service()
+    worker_for(w).run(until_idle=True)
+    service.wait_for_embeddings(story_id, auth_id, timeout=1)
+    service.store_validated_episodes(story_id, batch(2), 4, auth_id, BackgroundTasks())
+    threading.Timer(0.05, lambda: worker_for(w).run(until_idle=True)).start()
+    before = len(invalidations)
+    assert service.wait_for_embeddings(story_id, auth_id, timeout=5)
+    assert len(invalidations) == before + 1
+
+
+def test_jobs_finished_elsewhere_invalidate(queued, auth_id, invalidations):
+    w, (story_id,) = queued()
+    service = w.service()
+    worker_for(w).run(until_idle=True)
+    service.wait_for_embeddings(story_id, auth_id, timeout=1)
+    # Queued and drained between two drafts, so the wait sees no pending job.
+    service.store_validated_episodes(story_id, batch(2), 4, auth_id, BackgroundTasks())
+    worker_for(w).run(until_idle=True)
+    before = len(invalidations)
+    service.wait_for_embeddings(story_id, auth_id, timeout=1)
+    assert len(invalidations) == before + 1
+    service.wait_for_embeddings(story_id, auth_id, timeout=1)
+    assert len(invalidations) == before + 1
+
+
+def test_backlog_metrics_are_exported(queued):
+    w, _ = queued(episodes=4)
+    worker = worker_for(w)
+    assert worker.refresh_backlog()["depth"] == 4
+    assert registry.value("shakescript_embedding_queue_depth") == 4
+    worker.run(until_idle=True)
+    assert registry.value("shakescript_embedding_queue_depth") == 0
+    assert "shakescript_embedding_job_lag_seconds_count" in registry.render()
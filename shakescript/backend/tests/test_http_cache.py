@@ -0,0 +1,48 @@
+import pytest
+from app.utils.http_cache import coded_etag, matched_etag, story_etag
+
+API = "/api/v1"
+
+
+def test_coded_etag_suffixes_strong_tags_only():
+    assert coded_etag('"story-1-v3"', "gzip") == '"story-1-v3-gzip"'
+    assert coded_etag('"story-1-v3"', None) == '"story-1-v3"'
+    assert coded_etag('W/"abc"', "br") == 'W/"abc"'
+
+
+def test_matched_etag_accepts_coded_variants():
+    etag = story_etag(1, 3)
+    assert matched_etag('"story-1-v3-gzip"', etag) == '"story-1-v3-gzip"'
+    assert matched_etag('W/"story-1-v3"', etag) == etag
+    assert matched_etag('"story-1-v2-gzip", "story-1-v3-br"', etag) == '"story-1-v3-br"'
+    assert matched_etag('"story-1-v2"', etag) is None
+    assert matched_etag('"story-1-v3-zstd"', etag) is None
+
+
+@pytest.mark.parametrize("coding", ["gzip", "identity"])
+def test_story_read_etag_depends_on_coding(story, client, coding):
+    w, story_id = story
+    http = client(w)
+    response = http.get(f"{API}/stories/{story_id}", headers={"Accept-Encoding": coding})
+    assert response.status_code == 200
+    if coding == "gzip":
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["etag"].endswith('-gzip"')
+    else:
+        assert "content-encoding" not in response.headers
+        assert not response.headers["etag"].endswith('-gzip"')
+    assert "Accept-Encoding" in response.headers["vary"]
+
+
+def test_coded_etag_revalidates_with_vary(story, client):
+    w, story_id = story
+    http = client(w)
+    first = http.get(f"{API}/stories/{story_id}", headers={"Accept-Encoding": "gzip"})
+    second = http.get(
+        f"{API}/stories/{story_id}",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]},
+    )
+    assert second.status_code == 304
+    assert second.headers["etag"] == first.headers["etag"]
+    assert "Accept-Encoding" in second.headers["vary"]
+
@@ -0,0 +1,80 @@
+import random
+from types import SimpleNamespace
+import pytest
+from app.core.cache import retrieval_cache
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.bm25_index import indexes as bm25_indexes
+from benchmarks.bench_hybrid_retrieval import CHARACTERS, PLACES, filler, query_sets, seed
+
+ARGS = SimpleNamespace(episodes=12, chunks_per_episode=4, k=5, seed=7)
+
+
+@pytest.fixture(autouse=True)
+def rankers_only(monkeypatch):
+    # Compare the rankers, not the retrieval cache.
+    monkeypatch.setattr(retrieval_cache, "enabled", False)
+
+
+def recall(world, auth_id, monkeypatch, hybrid):
+    monkeypatch.setattr(settings, "HYBRID_RETRIEVAL_ENABLED", hybrid)
+    w = world()
+    story_id, mentions = seed(w, ARGS)
+    service = w.service().embedding_service
+    out = {}
+    for name, queries in query_sets(ARGS).items():
+        embeds, recalls = w.embedder.calls, []
+        for query, entity in queries:
+            relevant = {chunk_id for chunk_id, names in mentions.items() if entity in names}
+            chunks = service.retrieve_relevant_chunks(story_id, query, auth_id, k=ARGS.k)
+            recalls.append(sum(c["id"] in relevant for c in chunks) / min(ARGS.k, len(relevant)))
+        out[name] = (sum(recalls) / len(recalls), (w.embedder.calls - embeds) / len(queries))
+    return out
+
+
+def test_hybrid_recall_is_at_least_vector_recall(world, auth_id, monkeypatch):
+    vector = recall(world, auth_id, monkeypatch, False)
+    registry.clear()
+    hybrid = recall(world, auth_id, monkeypatch, True)
+    for name in vector:
+        assert hybrid[name][0] >= vector[name][0]
+    # Prompt-like queries embed once; names take the lexical fast path.
+    assert hybrid["prompt"][1] == 1
+    lexical = registry.value("shakescript_hybrid_retrieval_total", path="lexical")
+    assert lexical >= len(CHARACTERS) + len(PLACES)
+
+
+def test_new_chunks_are_indexed_without_a_rebuild(world, auth_id, monkeypatch):
+    monkeypatch.setattr(settings, "HYBRID_RETRIEVAL_ENABLED", True)
+    w = world()
+    story_id, _ = seed(w, ARGS)
+    service = w.service().embedding_service
+    service.retrieve_relevant_chunks(story_id, "warm", auth_id, k=ARGS.k)
+    built = bm25_indexes.peek(story_id)
+
+    finale = ARGS.episodes + 1
+    episode = w.db.table("episodes").insert(
+        {"story_id": story_id, "episode_number": finale, "title": "Finale", "content": "", "auth_id": auth_id}
+    ).execute().data[0]
+    text = f"{filler(random.Random(0), 80)}. Ilsa Marrow rang the quicksilver lantern at Gullwing Quay."
+    service.process_and_store_batch(
+        [
+            {
+                "story_id": story_id,
+                "episode_id": episode["id"],
+                "episode_number": finale,
+                "content": text,
+                "characters": ["Ilsa Marrow"],
+                "auth_id": auth_id,
+            }
+        ]
+    )
+    found = service.retrieve_relevant_chunks(story_id, "quicksilver lantern", auth_id, k=ARGS.k)
+    assert any(c["episode_number"] == finale for c in found)
+    incremental = bm25_indexes.peek(story_id)
+    assert incremental is built
+
+    bm25_indexes.drop(story_id)
+    rebuilt = bm25_indexes.get(story_id, lambda: service._bm25_corpus(story_id, auth_id))
+    for query in (q for qs in query_sets(ARGS).values() for q, _ in qs):
+        assert [c["id"] for c in incremental.search(query, 10)] == [c["id"] for c in rebuilt.search(query, 10)]
@@ -0,0 +1,180 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import httpx
+from app.core import idempotency
+from app.core.idempotency import REPLAYED_HEADER, SqliteIdempotencyStore
+from app.core.config import settings
+from app.main import app
+from app.services.ai_service.resilienceAI import LLMUnavailableError
+from benchmarks.bench_story_service import API
+
+HEADERS = {"Authorization": "Bearer test"}
+
+
+def generate(client, story_id, key=None, batch_size=2):
+    return client.post(
+        f"{API}/episodes/{story_id}/generate-batch",
+        params={"batch_size": batch_size, "refinement_type": "HUMAN"},
+        headers=dict(HEADERS, **({"Idempotency-Key": key} if key else {})),
+    )
+
+
+def test_duplicates_on_one_event_loop_join_the_running_request(world, client):
+    w = world(llm_latency=0.05)
+    story_id = w.seed_story(0, 4, 120)
+    client(w)
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            posts = [
+                asyncio.ensure_future(
+                    http.post(
+                        f"{API}/episodes/{story_id}/generate-batch",
+                        params={"batch_size": 2, "refinement_type": "HUMAN"},
+                        headers=dict(HEADERS, **{"Idempotency-Key": "same"}),
+                    )
+                )
+                for _ in range(3)
+            ]
+            await asyncio.sleep(0.02)
+            # The batch runs in the threadpool, so the loop still serves.
+            read = await http.get(f"{API}/stories/{story_id}", headers=HEADERS)
+            running = not all(p.done() for p in posts)
+            return await asyncio.gather(*posts), read, running
+
+    responses, read, running = asyncio.run(burst())
+    assert read.status_code == 200 and running
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert len({r.text for r in responses}) == 1
+    assert sum(r.headers.get(REPLAYED_HEADER) == "true" for r in responses) == 2
+    assert w.model.calls_by_kind.get("episode", 0) == 2
+
+
+def test_create_story_does_not_block_the_event_loop(world, client):
+    w = world(llm_latency=0.5)
+    client(w)
+
+    async def concurrent():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            create = asyncio.ensure_future(
+                http.post(
+                    f"{API}/stories/",
+                    json={"prompt": "A lantern keeper", "num_episodes": 4},
+                    headers=dict(HEADERS, **{"Idempotency-Key": "create"}),
+                )
+            )
+            await asyncio.sleep(0.05)
+            start = time.perf_counter()
+            root = await http.get("/")
+            elapsed = time.perf_counter() - start
+            running = not create.done()
+            return await create, root, elapsed, running
+
+    created, root, elapsed, running = asyncio.run(concurrent())
+    assert created.status_code == 200 and root.status_code == 200
+    # Metadata extraction was still waiting on the LLM.
+    assert running and elapsed < 0.25
+    assert w.model.calls_by_kind.get("metadata", 0) == 1
+
+
+def test_retry_is_replayed_without_work(world, client):
+    w = world()
+    story_id = w.seed_story(0, 4, 120)
+    http = client(w)
+    first = generate(http, story_id, "retry")
+    before = w.counters()["llm_calls"]
+    second = generate(http, story_id, "retry")
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert second.headers.get(REPLAYED_HEADER) == "true"
+    assert w.counters()["llm_calls"] == before
+
+
+def test_key_reused_for_a_different_request_is_422(world, client):
+    w = world()
+    story_id = w.seed_story(0, 4, 120)
+    http = client(w)
+    assert generate(http, story_id, "reused", batch_size=2).status_code == 200
+    assert generate(http, story_id, "reused", batch_size=1).status_code == 422
+
+
+class DownOnce:
+    def __init__(self, model):
+        self.model = model
+        self.failed = False
+
+    def generate_content(self, contents, *args, **kwargs):
+        if not self.failed:
+            self.failed = True
+            raise LLMUnavailableError("LLM down", retry_after=1)
+        return self.model.generate_content(contents, *args, **kwargs)
+
+
+def test_server_error_is_not_stored(world, client):
+    w = world()
+    w.llm = DownOnce(w.model)
+    story_id = w.seed_story(0, 4, 120)
+    http = client(w)
+    assert generate(http, story_id, "down").status_code == 503
+    retry = generate(http, story_id, "down")
+    assert retry.status_code == 200
+    assert retry.headers.get(REPLAYED_HEADER) is None
+
+
+def test_held_lease_releases_the_key_for_a_retry(world, client, auth_id, monkeypatch):
+    monkeypatch.setattr(settings, "STORY_LEASE_ENABLED", True)
+    w = world()
+    story_id = w.seed_story(0, 4, 120)
+    http = client(w)
+    w.db.rpc(
+        "acquire_story_lease",
+        {"p_story_id": story_id, "p_auth_id": auth_id, "p_holder": "other", "p_ttl_seconds": 60},
+    ).execute()
+    busy = generate(http, story_id, "leased")
+    assert busy.status_code == 409
+
+    # The other holder's lease lapses; the same key now runs for real.
+    w.db.tables["stories"][0]["lease_expires_at"] = 0
+    retry = generate(http, story_id, "leased")
+    assert retry.status_code == 200
+    assert retry.headers.get(REPLAYED_HEADER) is None
+
+
+def test_not_found_is_replayed(world, client):
+    w = world()
+    story_id = w.seed_story(0, 4, 120)
+    http = client(w)
+    first = generate(http, story_id + 999, "missing")
+    second = generate(http, story_id + 999, "missing")
+    assert first.status_code == second.status_code == 404
+    assert second.headers.get(REPLAYED_HEADER) == "true"
+
+
+def test_default_store_is_shared_on_the_host():
+    assert isinstance(idempotency.store, SqliteIdempotencyStore)
+
+
+def _claim_after_fork(store, barrier, wins):
+    barrier.wait()
+    if store.claim("user", "race", "fp", 60) is None:
+        with wins.get_lock():
+            wins.value += 1
+
+
+def test_sqlite_store_is_shared_across_forked_workers(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    # Opened in the parent first, as with gunicorn --preload.
+    store = SqliteIdempotencyStore(os.path.join(tmp_path, "idempotency.db"), 100)
+    store.claim("user", "warm", "fp", 60)
+    barrier, wins = ctx.Barrier(4), ctx.Value("i", 0)
+    procs = [ctx.Process(target=_claim_after_fork, args=(store, barrier, wins)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert [p.exitcode for p in procs] == [0] * 4
+    assert wins.value == 1
@@ -0,0 +1,73 @@
+import json
+import time
+import pytest
+from app.utils.json_repair import extract_episode, extract_json, strip_code_fences
+
+TITLE = "Episode 7"
+CONTENT = "mira's lantern flickered as the tide said \"wait\" and the harbour held its breath"
+STRICT = json.dumps({"episode_title": TITLE, "episode_content": CONTENT, "episode_summary": "s"})
+RAW = '{"episode_title": "%s", "episode_content": "%s", "episode_summary": "s"}' % (TITLE, CONTENT)
+
+
+@pytest.mark.parametrize(
+    "text, content",
+    [
+        (STRICT, CONTENT),
+        (f"```json\n{STRICT}\n```", CONTENT),
+        (f"Sure! Here is the episode:\n{STRICT}\nLet me know if you want changes.", CONTENT),
+        (STRICT[:-1] + ",}", CONTENT),
+        (RAW, CONTENT),
+        (f"```json\n{RAW}\n```", CONTENT),
+        (RAW.replace('"', "'"), CONTENT.replace('"', "'")),
+    ],
+    ids=["strict", "fenced", "prose", "trailing_comma", "unescaped_quotes", "fenced_unescaped", "single_quoted"],
+)
+def test_recovers_episode_content(text, content):
+    episode = extract_episode(text, {"current_episode": 1}, include_summary=True)
+    assert episode["episode_title"] == TITLE
+    assert episode["episode_content"] == content
+    assert episode["episode_summary"] == "s"
+
+
+def test_truncated_output_keeps_a_prefix_of_the_content():
+    episode = extract_episode(STRICT[: int(len(STRICT) * 0.8)], {})
+    assert CONTENT.startswith(episode["episode_content"].rstrip("\\"))
+    assert episode["episode_content"]
+
+
+def test_unparseable_output_falls_back_to_raw_text():
+    episode = extract_episode("no json here", {"current_episode": 3}, include_summary=True)
+    assert episode == {
+        "episode_title": "Episode 3",
+        "episode_content": "no json here",
+        "episode_summary": "Episode summary not available.",
+    }
+
+
+def test_python_literals_and_unterminated_fence():
+    assert extract_json("```json\n{'done': True, 'next': None}") == {"done": True, "next": None}
+    assert strip_code_fences("before ```json\n{}\n``` after") == "{}\n"
+
+
+def _adversarial(size):
+    yield '{"episode_title": "T", "episode_content": "' + "a" * size
+    yield '{"episode_content": "' + 'x" ' * (size // 3)
+    yield "[" * size + "]" * (size // 2)
+    yield "{" * size
+
+
+def _per_char_seconds(text):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        extract_episode(text, {})
+        best = min(best, time.perf_counter() - start)
+    return max(best, 1e-5) / len(text)
+
+
+@pytest.mark.parametrize("case", range(4), ids=["unterminated_content", "quote_storm", "deep_nesting", "brace_soup"])
+def test_adversarial_inputs_parse_in_linear_time(case):
+    small = list(_adversarial(2000))[case]
+    large = list(_adversarial(64000))[case]
+    # A quadratic parser is 32x slower per character at 32x the size.
+    assert _per_char_seconds(large) < 6 * _per_char_seconds(small)
@@ -0,0 +1,84 @@
+import threading
+import time
+import pytest
+from app.services.ai_service.resilienceAI import LLMUnavailableError
+from app.services.ai_service.schedulerAI import LLMScheduler, ScheduledModel
+from app.services.db_service import DBService
+
+PROMPT = "Continue the story. " * 40
+
+
+def scheduler(tmp_path, **kwargs):
+    return LLMScheduler(
+        slots=1,
+        tokens_per_minute=0,
+        requests_per_minute=0,
+        lock_dir=str(tmp_path),
+        poll_interval=0.002,
+        max_wait=10,
+        **{"tier_max_queue": {}, "aging_seconds": 60, **kwargs},
+    )
+
+
+def served_order(sched, callers):
+    """Queue `callers` ((auth_id, tier), in order) behind a held slot; return who ran in what order."""
+    served = []
+
+    class Recording:
+        def generate_content(self, contents):
+            served.append(contents)
+
+    release = threading.Event()
+
+    def hold():
+        with sched.slot("holder", PROMPT):
+            release.wait(2)
+
+    def call(auth_id, tier):
+        ScheduledModel(Recording(), auth_id, scheduler=sched, tier=tier).generate_content(tier)
+
+    threads = [threading.Thread(target=hold)]
+    threads += [threading.Thread(target=call, args=caller) for caller in callers]
+    for t in threads:
+        t.start()
+        time.sleep(0.02)
+    release.set()
+    for t in threads:
+        t.join()
+    return served
+
+
+def test_lanes_share_capacity_by_weight(tmp_path):
+    sched = scheduler(tmp_path, tier_weights={"premium": 4, "free": 1})
+    callers = [(f"free-{i}", "free") for i in range(3)] + [(f"premium-{i}", "premium") for i in range(3)]
+    # One free call costs a free lane four premium calls' worth of stride.
+    assert served_order(sched, callers) == ["free", "premium", "premium", "premium", "free", "free"]
+
+
+def test_aged_waiter_goes_next_regardless_of_weight(tmp_path):
+    for aging, first in ((60, "premium"), (0, "free")):
+        sched = scheduler(tmp_path, tier_weights={"premium": 1000, "free": 1}, aging_seconds=aging)
+        free = sched._enqueue("free-0", "free", 100)
+        premium = sched._enqueue("premium-0", "premium", 100)
+        # The free lane has already been served a lot.
+        sched._lanes["free"].pass_value = 1e9
+        assert sched._next() is (premium if first == "premium" else free)
+
+
+def test_admission_sheds_only_the_saturated_tier(tmp_path):
+    sched = scheduler(tmp_path, tier_max_queue={"free": 2})
+    sched.admit("free")
+    for i in range(2):
+        sched._enqueue(f"free-{i}", "free", 100)
+    with pytest.raises(LLMUnavailableError) as shed:
+        sched.admit("free")
+    assert shed.value.retry_after > 0
+    sched.admit("premium")
+
+
+def test_user_tier_comes_from_is_premium(world, auth_id):
+    w = world()
+    db = DBService(w.db)
+    assert db.get_user_tier(auth_id) == "free"
+    w.db.table("users").insert({"auth_id": "paid", "is_premium": True}).execute()
+    assert db.get_user_tier("paid") == "premium"
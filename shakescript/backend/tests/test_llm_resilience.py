@@ -0,0 +1,104 @@
+import time
+import pytest
+from app.services.ai_service.resilienceAI import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    classify_error,
+)
+from app.services.ai_service.routerAI import FakeProvider, LLMRouter
+from benchmarks.fakes import FakeProviderError
+
+FAST = dict(attempts=3, base_delay=0.001, max_delay=0.01, max_wait=1.0)
+
+
+def router(*providers, threshold=5, reset=30.0):
+    return LLMRouter(
+        list(providers),
+        hedge=False,
+        retry_policy=RetryPolicy(**FAST),
+        breakers={
+            p.name: CircuitBreaker(p.name, failure_threshold=threshold, reset_timeout=reset)
+            for p in providers
+        },
+    )
+
+
+def down(name="primary"):
+    return FakeProvider(name, fail_every=1, error=lambda msg: FakeProviderError(503))
+
+
+@pytest.mark.parametrize(
+    "error, retryable",
+    [
+        (FakeProviderError(429), True),
+        (FakeProviderError(503), True),
+        (FakeProviderError(400), False),
+        (FakeProviderError(401), False),
+        (TimeoutError(), True),
+        (ValueError(), False),
+    ],
+)
+def test_classify_error(error, retryable):
+    assert classify_error(error)[0] is retryable
+
+
+def test_retry_after_is_honoured():
+    primary = FakeProvider("primary", text="ok", script=[FakeProviderError(429, retry_after=0.05)] * 2)
+    r = router(primary)
+    start = time.perf_counter()
+    assert r.generate_content("prompt").text == "ok"
+    assert primary.calls == 3
+    assert time.perf_counter() - start >= 0.1
+
+
+def test_bad_request_is_not_retried():
+    primary = FakeProvider("primary", text="ok", script=[FakeProviderError(400)])
+    with pytest.raises(FakeProviderError):
+        router(primary).generate_content("prompt")
+    assert primary.calls == 1
+
+
+def test_long_retry_after_fails_over_at_once():
+    primary = FakeProvider("primary", script=[FakeProviderError(429, retry_after=120)])
+    backup = FakeProvider("backup", text="ok")
+    r = router(primary, backup)
+    start = time.perf_counter()
+    assert r.generate_content("prompt").text == "ok"
+    assert primary.calls == 1
+    assert time.perf_counter() - start < 0.1
+
+
+def test_breaker_opens_and_short_circuits():
+    primary = down()
+    r = router(primary)
+    outcomes = []
+    for _ in range(10):
+        try:
+            r.generate_content("prompt")
+        except CircuitOpenError:
+            outcomes.append("short_circuit")
+        except FakeProviderError:
+            outcomes.append("error")
+    assert primary.calls == 5
+    assert r.breakers["primary"].state == "open"
+    assert outcomes.count("short_circuit") >= 8
+
+
+def test_open_breaker_fails_over_without_losing_requests():
+    primary, backup = down(), FakeProvider("backup", text="ok")
+    r = router(primary, backup)
+    assert all(r.generate_content("prompt").text == "ok" for _ in range(20))
+    assert primary.calls == 5
+
+
+def test_breaker_recovers_after_reset_timeout():
+    primary = FakeProvider("primary", text="ok", script=[FakeProviderError(503)] * 5)
+    r = router(primary, reset=0.1)
+    with pytest.raises(FakeProviderError):
+        r.generate_content("prompt")
+    with pytest.raises(CircuitOpenError):
+        r.generate_content("prompt")
+    time.sleep(0.15)
+    assert r.generate_content("prompt").text == "ok"
+    assert r.breakers["primary"].state == "closed"
@@ -0,0 +1,59 @@
+import time
+import pytest
+from app.services.ai_service.resilienceAI import RetryPolicy
+from app.services.ai_service.routerAI import FakeProvider, LLMRouter
+
+NO_RETRY = RetryPolicy(attempts=1, base_delay=0, max_delay=0, max_wait=0)
+
+
+def router(*providers, **options):
+    return LLMRouter(list(providers), retry_policy=NO_RETRY, **{"hedge": False, **options})
+
+
+def test_needs_a_provider():
+    with pytest.raises(ValueError):
+        LLMRouter([])
+
+
+def test_fails_over_to_the_next_provider():
+    primary = FakeProvider("primary", text="primary", fail_every=2)
+    backup = FakeProvider("backup", text="backup")
+    r = router(primary, backup)
+    texts = [r.generate_content("prompt").text for _ in range(4)]
+    assert texts == ["primary", "backup", "primary", "backup"]
+    assert r.stats()["primary"]["errors"] == 2
+
+
+def test_outage_of_every_provider_raises_the_last_error():
+    primary = FakeProvider("primary", fail_every=1)
+    backup = FakeProvider("backup", fail_every=1, error=TimeoutError)
+    with pytest.raises(TimeoutError):
+        router(primary, backup).generate_content("prompt")
+    assert (primary.calls, backup.calls) == (1, 1)
+
+
+def test_hedge_goes_to_the_backup_when_the_primary_is_slow():
+    primary = FakeProvider("primary", text="slow", latency=0.5)
+    backup = FakeProvider("backup", text="fast")
+    r = router(primary, backup, hedge=True, hedge_min_samples=100, hedge_default_delay_ms=20)
+    start = time.perf_counter()
+    assert r.generate_content("prompt").text == "fast"
+    assert time.perf_counter() - start < 0.4
+    assert r.stats()["backup"]["hedges_won"] == 1
+
+
+def test_hedged_call_fails_over_on_error():
+    primary = FakeProvider("primary", fail_every=1)
+    backup = FakeProvider("backup", text="ok")
+    r = router(primary, backup, hedge=True, hedge_min_samples=100, hedge_default_delay_ms=1000)
+    assert r.generate_content("prompt").text == "ok"
+    assert r.stats()["backup"]["hedges_won"] == 0
+
+
+def test_hedge_delay_follows_the_latency_percentile():
+    primary = FakeProvider("primary", text="ok")
+    r = router(primary, hedge_percentile=50, hedge_min_samples=3, hedge_default_delay_ms=999)
+    assert r.hedge_delay_ms(primary) == 999
+    for ms in (10, 20, 30):
+        r.provider_stats["primary"].observe(ms, True)
+    assert r.hedge_delay_ms(primary) == 20
@@ -0,0 +1,202 @@
+import multiprocessing
+import threading
+import time
+import pytest
+from app.services.ai_service.resilienceAI import RetryPolicy
+from app.services.ai_service.routerAI import FakeProvider, LLMRouter, LLMResponse
+from app.services.ai_service.schedulerAI import LLMQueueTimeout, LLMScheduler, ScheduledModel
+from benchmarks.fakes import FakeProviderError
+
+PROMPT = "Write the next episode. " * 20
+FAST = RetryPolicy(attempts=3, base_delay=0.001, max_delay=0.01, max_wait=1.0)
+
+
+class RecordingScheduler(LLMScheduler):
+    """Keeps every Permit it hands out."""
+
+    def __init__(self, lock_dir, **kwargs):
+        kwargs.setdefault("tokens_per_minute", 0)
+        kwargs.setdefault("requests_per_minute", 0)
+        super().__init__(lock_dir=str(lock_dir), poll_interval=0.005, **kwargs)
+        self.permits = []
+
+    def slot(self, auth_id, prompt, tier=None):
+        outer = super().slot(auth_id, prompt, tier)
+
+        class _Recorded:
+            def __enter__(inner):
+                permit = outer.__enter__()
+                self.permits.append(permit)
+                return permit
+
+            def __exit__(inner, *exc):
+                return outer.__exit__(*exc)
+
+        return _Recorded()
+
+
+def scheduled(model, sched, auth_id="user"):
+    return ScheduledModel(model, auth_id, scheduler=sched)
+
+
+def test_plain_model_takes_one_slot_per_call(tmp_path):
+    sched = RecordingScheduler(tmp_path, slots=1)
+    scheduled(FakeProvider("fake", text="ok"), sched).generate_content(PROMPT)
+    assert len(sched.permits) == 1
+    assert sched.permits[0].actual_tokens == len(PROMPT + "ok") // 4
+
+
+def test_router_retry_takes_a_slot_per_attempt(tmp_path):
+    sched = RecordingScheduler(tmp_path, slots=1)
+    primary = FakeProvider("primary", text="ok", script=[FakeProviderError(503)])
+    router = LLMRouter([primary], hedge=False, retry_policy=FAST)
+    assert scheduled(router, sched).generate_content(PROMPT).text == "ok"
+    assert primary.calls == 2
+    # The failed attempt is charged its estimate, the answered one its usage.
+    assert [p.actual_tokens for p in sched.permits] == [None, len(PROMPT + "ok") // 4]
+    assert sched.semaphore.in_use() == 0
+
+
+def test_router_failover_takes_a_slot_per_provider(tmp_path):
+    sched = RecordingScheduler(tmp_path, slots=1)
+    primary = FakeProvider("primary", fail_every=1, error=lambda msg: FakeProviderError(400))
+    backup = FakeProvider("backup", text="ok")
+    router = LLMRouter([primary, backup], hedge=False, retry_policy=FAST)
+    scheduled(router, sched).generate_content(PROMPT)
+    assert len(sched.permits) == 2
+
+
+def test_hedge_holds_its_own_slot(tmp_path):
+    sched = RecordingScheduler(tmp_path, slots=2)
+    seen = []
+
+    class Watching:
+        def __init__(self, name, latency):
+            self.name, self.latency = name, latency
+
+        def generate_content(self, contents):
+            seen.append(sched.semaphore.in_use())
+            time.sleep(self.latency)
+            return LLMResponse(self.name, total_tokens=7)
+
+    router = LLMRouter(
+        [Watching("primary", 0.3), Watching("backup", 0.0)],
+        hedge=True,
+        hedge_min_samples=100,
+        hedge_default_delay_ms=20,
+    )
+    assert scheduled(router, sched).generate_content(PROMPT).text == "backup"
+    time.sleep(0.4)
+    assert seen == [1, 2]
+    assert [p.actual_tokens for p in sched.permits] == [7, 7]
+    assert sched.semaphore.in_use() == 0
+
+
+def test_queue_timeout_does_not_fail_over(tmp_path):
+    sched = RecordingScheduler(tmp_path, slots=1, max_wait=0.05)
+    primary, backup = FakeProvider("primary", text="ok"), FakeProvider("backup", text="ok")
+    router = LLMRouter([primary, backup], hedge=False, retry_policy=FAST)
+    holding, done = threading.Event(), threading.Event()
+
+    def hold():
+        with sched.slot("other", PROMPT):
+            holding.set()
+            done.wait(2)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holding.wait(2)
+    try:
+        with pytest.raises(LLMQueueTimeout):
+            scheduled(router, sched).generate_content(PROMPT)
+    finally:
+        done.set()
+        holder.join()
+    assert (primary.calls, backup.calls) == (0, 0)
+    assert router.breakers["primary"].state == "closed"
+    assert sched.queue_depth() == 0
+
+
+def test_queue_timeout_with_plain_model(tmp_path):
+    sched = RecordingScheduler(tmp_path, slots=1, max_wait=0.1)
+    model = scheduled(FakeProvider("fake", text="ok", latency=0.5), sched)
+    outcomes = []
+
+    def attempt():
+        try:
+            model.generate_content(PROMPT)
+            outcomes.append("ok")
+        except LLMQueueTimeout:
+            outcomes.append("timeout")
+
+    threads = [threading.Thread(target=attempt) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(outcomes) == ["ok", "timeout"]
+    assert sched.queue_depth() == 0
+
+
+def _worker(lock_dir, slots, in_flight, peak, lock):
+    sched = RecordingScheduler(lock_dir, slots=slots)
+
+    class Counting:
+        def generate_content(self, contents):
+            with lock:
+                in_flight.value += 1
+                peak.value = max(peak.value, in_flight.value)
+            time.sleep(0.005)
+            with lock:
+                in_flight.value -= 1
+
+    model = scheduled(Counting(), sched)
+    threads = [
+        threading.Thread(target=lambda: [model.generate_content(PROMPT) for _ in range(5)])
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_slots_are_shared_across_processes(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    in_flight, peak, lock = ctx.Value("i", 0), ctx.Value("i", 0), ctx.Lock()
+    procs = [ctx.Process(target=_worker, args=(tmp_path, 2, in_flight, peak, lock)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+    assert 0 < peak.value <= 2
+
+
+def test_fair_queueing_serves_a_light_user_before_a_heavy_users_backlog(tmp_path):
+    sched = RecordingScheduler(tmp_path, slots=1)
+    served = []
+
+    class Recording:
+        def generate_content(self, contents):
+            served.append(contents)
+
+    release = threading.Event()
+
+    def hold():
+        with sched.slot("holder", PROMPT):
+            release.wait(2)
+
+    threads = [threading.Thread(target=hold)]
+    threads += [
+        threading.Thread(target=scheduled(Recording(), sched, user).generate_content, args=(user,))
+        for user in ("heavy", "heavy", "heavy", "light")
+    ]
+    for t in threads:
+        t.start()
+        time.sleep(0.02)
+    assert sched.queue_depth() == 4
+    release.set()
+    for t in threads:
+        t.join()
+    assert served == ["heavy", "light", "heavy", "heavy"]
@@ -0,0 +1,164 @@
+"""Per-request counters, the Server-Timing header and the /metrics endpoint."""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core import metrics
+from app.core.config import settings
+from app.core.metrics import (
+    InstrumentedClient,
+    InstrumentedModel,
+    MetricsMiddleware,
+    record,
+    registry,
+)
+from benchmarks.bench_story_service import API
+
+HEADERS = {"Authorization": "Bearer test"}
+
+
+def _timing(response) -> dict:
+    """Server-Timing entries by name, e.g. {"db": 'dur=1.2;desc="calls=3"'}."""
+    entries = {}
+    for part in response.headers["server-timing"].split(", "):
+        name, _, rest = part.partition(";")
+        entries[name] = rest
+    return entries
+
+
+def _generate(http, story_id):
+    return http.post(
+        f"{API}/episodes/{story_id}/generate-batch",
+        params={"batch_size": 1, "refinement_type": "AI"},
+        headers=HEADERS,
+    )
+
+
+@pytest.fixture
+def bare_app():
+    """A one-route app behind MetricsMiddleware, recording `calls` db calls."""
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int, calls: int = 0):
+        for _ in range(calls):
+            record("db", 2.0, 10)
+        if item_id == 0:
+            raise ValueError("boom")
+        return {"id": item_id}
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_server_timing_counts_the_requests_calls(bare_app):
+    response = bare_app.get("/items/1", params={"calls": 3})
+    timing = _timing(response)
+    assert timing["db"] == 'dur=6.0;desc="calls=3 bytes=30"'
+    assert timing["total"].startswith("dur=")
+
+    other = _timing(bare_app.get("/items/2"))
+    assert set(other) == {"total"}
+
+
+def test_server_timing_can_be_turned_off(bare_app, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_SERVER_TIMING", False)
+    response = bare_app.get("/items/1", params={"calls": 1})
+    assert "server-timing" not in response.headers
+    assert registry.value("shakescript_request_stage_calls_total", route="/items/{item_id}", stage="db") == 1
+
+
+def test_requests_are_recorded_by_route_template(bare_app):
+    bare_app.get("/items/1", params={"calls": 2})
+    bare_app.get("/items/2", params={"calls": 1})
+    assert bare_app.get("/items/0").status_code == 500
+    text = registry.render()
+    assert (
+        'shakescript_request_duration_seconds_count'
+        '{method="GET",route="/items/{item_id}",status="200"} 2'
+    ) in text
+    assert (
+        'shakescript_request_duration_seconds_count'
+        '{method="GET",route="/items/{item_id}",status="500"} 1'
+    ) in text
+    assert registry.value("shakescript_request_stage_calls_total", route="/items/{item_id}", stage="db") == 3
+    assert registry.value("shakescript_stage_calls_total", stage="db") == 3
+
+
+def test_story_route_reports_db_llm_and_embed_stages(story, client):
+    w, story_id = story
+    http = client(w)
+    response = _generate(http, story_id)
+    assert response.status_code == 200
+    timing = _timing(response)
+    assert {"db", "llm"} <= set(timing)
+    assert "tokens=" in timing["llm"]
+    # Rows are not re-serialised to count their bytes unless asked to.
+    assert "bytes=" not in timing["db"]
+
+
+def test_db_bytes_are_counted_when_enabled(story, client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_DB_BYTES", True)
+    w, story_id = story
+    response = client(w).get(f"{API}/stories/{story_id}", headers=HEADERS)
+    assert "bytes=" in _timing(response)["db"]
+    assert registry.value("shakescript_stage_bytes_total", stage="db") > 0
+
+
+def test_metrics_endpoint_renders_prometheus_text(story, client):
+    w, story_id = story
+    http = client(w)
+    http.get(f"{API}/stories/{story_id}", headers=HEADERS)
+    response = http.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert "# TYPE shakescript_request_duration_seconds histogram" in text
+    assert 'route="/api/v1/stories/{story_id}"' in text
+    assert 'le="+Inf"' in text
+    assert "# TYPE shakescript_stage_calls_total counter" in text
+    # Scrapes are not recorded as requests.
+    http.get("/metrics")
+    assert 'route="/metrics"' not in http.get("/metrics").text
+
+
+def test_metrics_endpoint_is_404_when_disabled(client, world, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+    assert client(world()).get("/metrics").status_code == 404
+
+
+def test_disabled_metrics_install_no_wrappers(story, client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+    w, story_id = story
+    model, db, embedder = object(), object(), w.embedder
+    assert metrics.instrument_client(db) is db
+    assert metrics.instrument_model(model) is model
+    assert metrics.instrument_embedding(embedder) is embedder
+
+    service = w.service()
+    assert service.client is w.db
+    assert not isinstance(service.db_service.client, InstrumentedClient)
+    assert service.embedding_service.embedding_model is w.embedder
+
+    assert _generate(client(w), story_id).status_code == 200
+    assert registry.value("shakescript_stage_calls_total", stage="db") == 0
+    assert registry.value("shakescript_stage_calls_total", stage="llm") == 0
+    assert not any(
+        isinstance(layer, InstrumentedModel) for layer in _model_layers(service.ai_service.model)
+    )
+
+
+def _model_layers(model):
+    """The model and every proxy it wraps."""
+    seen = []
+    while model is not None and model not in seen:
+        seen.append(model)
+        model = next(
+            (
+                getattr(model, name)
+                for name in ("_model", "model", "_inner")
+                if name in getattr(model, "__dict__", {})
+            ),
+            None,
+        )
+    return seen
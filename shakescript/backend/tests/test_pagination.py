@@ -0,0 +1,131 @@
+"""Cursor pagination of story episodes and the story list."""
+
+import pytest
+from benchmarks.bench_story_service import API
+
+HEADERS = {"Authorization": "Bearer test"}
+
+
+@pytest.fixture
+def long_story(world):
+    w = world()
+    return w, w.seed_story(5, 0, 20)
+
+
+def _numbers(episodes):
+    return [episode["number"] for episode in episodes]
+
+
+def test_story_pages_through_its_episodes(long_story, client):
+    w, story_id = long_story
+    http = client(w)
+    pages, cursor = [], 0
+    while cursor is not None:
+        story = http.get(
+            f"{API}/stories/{story_id}",
+            params={"episode_cursor": cursor, "episode_limit": 2},
+            headers=HEADERS,
+        ).json()["story"]
+        pages.append(_numbers(story["episodes"]))
+        cursor = story["next_episode_cursor"]
+    assert pages == [[1, 2], [3, 4], [5]]
+
+
+def test_story_without_content(long_story, client):
+    w, story_id = long_story
+    http = client(w)
+    story = http.get(
+        f"{API}/stories/{story_id}", params={"include_content": "false"}, headers=HEADERS
+    ).json()["story"]
+    assert _numbers(story["episodes"]) == [1, 2, 3, 4, 5]
+    assert all("content" not in episode for episode in story["episodes"])
+
+    full = http.get(f"{API}/stories/{story_id}", headers=HEADERS).json()["story"]
+    assert all(episode["content"] for episode in full["episodes"])
+
+
+@pytest.mark.parametrize(
+    "path, param, limit",
+    [
+        ("/stories/{}", "episode_limit", 50),
+        ("/stories/{}/episodes", "limit", 50),
+        ("/stories/all", "limit", 200),
+    ],
+)
+def test_page_size_is_bounded(long_story, client, path, param, limit):
+    w, story_id = long_story
+    http = client(w)
+    url = API + path.format(story_id)
+    assert http.get(url, params={param: limit}, headers=HEADERS).status_code == 200
+    assert http.get(url, params={param: limit + 1}, headers=HEADERS).status_code == 422
+    assert http.get(url, params={param: 0}, headers=HEADERS).status_code == 422
+
+
+def test_episodes_route_pages_metadata(long_story, client):
+    w, story_id = long_story
+    http = client(w)
+    page = http.get(
+        f"{API}/stories/{story_id}/episodes",
+        params={"cursor": 2, "limit": 2},
+        headers=HEADERS,
+    )
+    assert page.status_code == 200
+    assert page.headers["ETag"]
+    body = page.json()
+    assert _numbers(body["episodes"]) == [3, 4]
+    assert body["next_cursor"] == 4
+    assert all("content" not in episode for episode in body["episodes"])
+
+    last = http.get(
+        f"{API}/stories/{story_id}/episodes",
+        params={"cursor": 4, "include_content": "true"},
+        headers=HEADERS,
+    ).json()
+    assert _numbers(last["episodes"]) == [5]
+    assert last["episodes"][0]["content"]
+    assert last["next_cursor"] is None
+
+
+def test_single_episode(long_story, client):
+    w, story_id = long_story
+    http = client(w)
+    response = http.get(f"{API}/stories/{story_id}/episodes/3", headers=HEADERS)
+    assert response.status_code == 200
+    episode = response.json()["episode"]
+    assert episode["number"] == 3 and episode["content"]
+
+
+@pytest.mark.parametrize("path", ["/stories/{}/episodes", "/stories/{}/episodes/1"])
+def test_unknown_story_is_404(long_story, client, path):
+    w, story_id = long_story
+    http = client(w)
+    response = http.get(API + path.format(story_id + 100), headers=HEADERS)
+    assert response.status_code == 404
+
+
+def test_unknown_episode_is_404(long_story, client):
+    w, story_id = long_story
+    http = client(w)
+    response = http.get(f"{API}/stories/{story_id}/episodes/9", headers=HEADERS)
+    assert response.status_code == 404
+    assert "Episode 9" in response.json()["detail"]
+
+
+def test_story_list_pages_by_id(world, client):
+    w = world()
+    ids = [w.seed_story(0, 1, 20) for _ in range(5)]
+    http = client(w)
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        body = http.get(f"{API}/stories/all", params=params, headers=HEADERS).json()
+        pages.append([story["story_id"] for story in body["stories"]])
+        cursor = body.get("next_cursor")
+        if cursor is None:
+            break
+    assert pages == [ids[:2], ids[2:4], ids[4:]]
+
+    past_the_end = http.get(
+        f"{API}/stories/all", params={"cursor": ids[-1]}, headers=HEADERS
+    ).json()
+    assert past_the_end["stories"] == []
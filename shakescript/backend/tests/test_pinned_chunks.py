@@ -0,0 +1,116 @@
+import pytest
+from postgrest.exceptions import APIError
+from app.core.cache import retrieval_cache
+from app.core.config import settings
+from benchmarks.bench_pinned_chunks import current, previous, queries
+from benchmarks.fakes import FakeQuery, _prose
+
+
+@pytest.fixture(autouse=True, params=[True, False], ids=["flagged", "by-episode"])
+def foundational_flag(request, monkeypatch):
+    monkeypatch.setattr(settings, "FOUNDATIONAL_CHUNKS_ENABLED", request.param)
+    return request.param
+
+
+def rewrite(w, story_id, episode_number, content, auth_id):
+    episode = next(
+        e for e in w.db.tables["episodes"] if e["story_id"] == story_id and e["episode_number"] == episode_number
+    )
+    w.service().embedding_service.process_and_store_batch(
+        [
+            {
+                "story_id": story_id,
+                "episode_id": episode["id"],
+                "episode_number": episode_number,
+                "content": content,
+                "characters": ["Mira"],
+                "auth_id": auth_id,
+            }
+        ]
+    )
+
+
+@pytest.mark.parametrize("cached", [False, True])
+@pytest.mark.parametrize("length", [1, 2, 3, 6, 11])
+def test_ranking_matches_the_previous_lookup(world, monkeypatch, cached, length):
+    monkeypatch.setattr(retrieval_cache, "enabled", cached)
+    w = world()
+    story_id = w.seed_story(length, 0, 400)
+    service = w.service()
+    for query in queries(3):
+        for k in (2, 5):
+            assert current(service, story_id, query, k) == previous(service, story_id, query, k)
+
+
+def test_cached_pins_leave_one_round_trip_per_new_query(world):
+    w = world()
+    story_id = w.seed_story(11, 0, 400)
+    service = w.service()
+    trips = []
+    for query in queries(4):
+        before = w.db.calls
+        current(service, story_id, query)
+        trips.append(w.db.calls - before)
+    assert trips[1:] == [1, 1, 1]
+
+
+def test_only_rechunking_a_foundational_episode_reloads_the_pins(world, auth_id):
+    w = world()
+    story_id = w.seed_story(11, 0, 400)
+    service = w.service()
+    first, second, third = queries(3)
+    current(service, story_id, first)
+
+    selects = w.db.calls_by_table.get("chunks.select", 0)
+    rewrite(w, story_id, 11, _prose(400, 41), auth_id)
+    current(service, story_id, second)
+    assert w.db.calls_by_table.get("chunks.select", 0) == selects
+
+    rewrite(w, story_id, 1, "lighthouse " * 30 + _prose(200, 43), auth_id)
+    after = current(service, story_id, third)
+    assert any("lighthouse" in c["content"] for c in after if c["episode_number"] == 1)
+
+
+def test_partly_chunked_foundation_is_not_pinned(world, auth_id, monkeypatch):
+    w = world()
+    story_id = w.seed_story(0, 6, 400)
+    service = w.service()
+    w.db.table("episodes").insert(
+        [
+            {"story_id": story_id, "episode_number": n, "title": f"Episode {n}",
+             "content": _prose(400, n), "auth_id": auth_id}
+            for n in (1, 2)
+        ]
+    ).execute()
+    rewrite(w, story_id, 2, _prose(400, 2), auth_id)
+    first, second = queries(2)
+    assert not any(c["episode_number"] == 1 for c in current(service, story_id, first))
+    # Chunked by a worker on another host, which cannot invalidate this cache.
+    monkeypatch.setattr(retrieval_cache, "enabled", False)
+    rewrite(w, story_id, 1, _prose(400, 1), auth_id)
+    monkeypatch.setattr(retrieval_cache, "enabled", True)
+    filled = current(service, story_id, second)
+    assert any(c["episode_number"] == 1 for c in filled)
+    assert filled == previous(service, story_id, second)
+
+
+@pytest.mark.parametrize("foundational_flag", [False], indirect=True)
+def test_flag_off_never_touches_the_column(world, auth_id, monkeypatch):
+    execute = FakeQuery.execute
+
+    def without_column(query):
+        # A database without migrations/005.
+        rows = query.payload if isinstance(query.payload, list) else [query.payload or {}]
+        if any(column == "is_foundational" for column, _, _ in query.filters) or any(
+            "is_foundational" in row for row in rows
+        ):
+            raise APIError({"code": "42703", "message": "column chunks.is_foundational does not exist"})
+        return execute(query)
+
+    w = world()
+    story_id = w.seed_story(6, 0, 400)
+    monkeypatch.setattr(FakeQuery, "execute", without_column)
+    service = w.service()
+    rewrite(w, story_id, 3, _prose(400, 3), auth_id)
+    pinned = current(service, story_id, queries(1)[0])
+    assert {c["episode_number"] for c in pinned} >= {1, 3}
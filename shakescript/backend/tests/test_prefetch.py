@@ -0,0 +1,97 @@
+import pytest
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.schemas import Feedback
+from app.services.core_service import prefetch_core
+
+BATCHES, BATCH_SIZE = 3, 2
+
+
+@pytest.fixture(autouse=True)
+def prefetch_on(monkeypatch):
+    monkeypatch.setattr(settings, "SPECULATIVE_PREFETCH_ENABLED", True)
+    prefetch_core.buffer.clear()
+    yield
+    prefetch_core.buffer.clear()
+    # Let speculations still running finish here: story ids restart in every
+    # World, so one writing to the process caches later would leak into the
+    # next test.
+    prefetch_core._pool().shutdown(wait=True)
+    prefetch_core._executor = None
+
+
+@pytest.fixture
+def human_story(world):
+    def make(**options):
+        w = world(**options)
+        story_id = w.seed_story(0, BATCHES * BATCH_SIZE, 300)
+        w.db.table("stories").update({"refinement_method": "HUMAN"}).eq("id", story_id).execute()
+        return w, w.service(), story_id
+
+    return make
+
+
+def outcomes():
+    names = ("hit", "miss", "invalidated", "stale", "expired", "failed", "timeout")
+    counts = {o: int(registry.value("shakescript_prefetch_total", outcome=o)) for o in names}
+    return {o: n for o, n in counts.items() if n}
+
+
+def settle(story_id, auth_id):
+    """Wait for the buffered speculation, as a reviewer reading the batch would."""
+    speculation = prefetch_core.buffer.get((auth_id, story_id))
+    if speculation is not None:
+        speculation.future.result()
+
+
+def stored_episodes(w, story_id):
+    return sorted(ep["episode_number"] for ep in w.db.tables["episodes"] if ep["story_id"] == story_id)
+
+
+def test_accepted_drafts_are_served_from_the_speculation(human_story, auth_id):
+    w, service, story_id = human_story()
+    for _ in range(BATCHES):
+        service.generate_and_refine_batch(story_id, BATCH_SIZE, False, "HUMAN", auth_id)
+        settle(story_id, auth_id)
+        service.validate_episode_batch(story_id, auth_id, None)
+    assert outcomes() == {"hit": BATCHES - 1}
+    assert registry.value("shakescript_prefetch_tokens_total", outcome="wasted") == 0
+    assert stored_episodes(w, story_id) == list(range(1, BATCHES * BATCH_SIZE + 1))
+
+
+@pytest.mark.parametrize("target, expected", [(0, {"hit": 1}), (-1, {"hit": 1, "invalidated": 1})])
+def test_refining_the_last_episode_restarts_the_speculation(human_story, auth_id, target, expected):
+    w, service, story_id = human_story()
+    episodes = service.generate_and_refine_batch(story_id, BATCH_SIZE, False, "HUMAN", auth_id)
+    settle(story_id, auth_id)
+    feedback = [Feedback(episode_number=episodes[target]["episode_number"], feedback="Darker")]
+    service.refine_episode_batch(story_id, feedback, auth_id)
+    settle(story_id, auth_id)
+    service.validate_episode_batch(story_id, auth_id, None)
+    service.generate_and_refine_batch(story_id, BATCH_SIZE, False, "HUMAN", auth_id)
+    assert outcomes() == expected
+
+
+def test_story_written_after_scheduling_discards_the_speculation(human_story, auth_id):
+    w, service, story_id = human_story()
+    service.generate_and_refine_batch(story_id, BATCH_SIZE, False, "HUMAN", auth_id)
+    settle(story_id, auth_id)
+    w.db.table("stories").update({"title": "Edited elsewhere"}).eq("id", story_id).execute()
+    service.validate_episode_batch(story_id, auth_id, None)
+    episodes = service.generate_and_refine_batch(story_id, BATCH_SIZE, False, "HUMAN", auth_id)
+    assert outcomes() == {"invalidated": 1}
+    assert [ep["episode_number"] for ep in episodes] == [3, 4]
+
+
+def test_slow_speculation_falls_back_to_normal_generation(human_story, auth_id, monkeypatch):
+    monkeypatch.setattr(settings, "PREFETCH_WAIT_SECONDS", 0.01)
+    w, service, story_id = human_story(llm_latency=0.05)
+    service.generate_and_refine_batch(story_id, BATCH_SIZE, False, "HUMAN", auth_id)
+    service.validate_episode_batch(story_id, auth_id, None)
+    speculation = prefetch_core.buffer.get((auth_id, story_id))
+    episodes = service.generate_and_refine_batch(story_id, BATCH_SIZE, False, "HUMAN", auth_id)
+    assert outcomes() == {"timeout": 1}
+    assert [ep["episode_number"] for ep in episodes] == [3, 4]
+    speculation.future.result()
+    service.validate_episode_batch(story_id, auth_id, None)
+    assert stored_episodes(w, story_id) == [1, 2, 3, 4]
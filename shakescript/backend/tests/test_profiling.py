@@ -0,0 +1,43 @@
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.profiling import ProfilingMiddleware, _ProfilingRoute, profile_store
+
+TOKEN = "admin-secret"
+
+
+@pytest.fixture
+def profiled(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_ADMIN_TOKEN", TOKEN)
+    profile_store.clear()
+    router = APIRouter(route_class=_ProfilingRoute)
+
+    @router.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(ProfilingMiddleware)
+    yield TestClient(app)
+    profile_store.clear()
+
+
+def test_header_token_profiles_the_request(profiled):
+    response = profiled.get("/ping", headers={"X-Profile-Token": TOKEN})
+    assert response.status_code == 200
+    record = profile_store.get(response.headers["x-profile-id"])
+    assert record is not None and record.meta["path"] == "/ping"
+
+
+def test_query_token_is_ignored(profiled):
+    response = profiled.get("/ping", params={"__profile": TOKEN})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert profile_store.list() == []
+
+
+def test_wrong_token_is_ignored(profiled):
+    response = profiled.get("/ping", headers={"X-Profile-Token": "guess"})
+    assert "x-profile-id" not in response.headers
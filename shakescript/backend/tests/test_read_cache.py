@@ -0,0 +1,93 @@
+"""Per-user read cache behind the dashboard and story list routes."""
+
+import os
+import tempfile
+import pytest
+from app.core import cache
+from app.core.cache import MemoryCacheBackend, SqliteCacheBackend, read_cache
+from app.core.config import settings
+from app.services.db_service import DBService
+from benchmarks.bench_story_service import API
+
+HEADERS = {"Authorization": "Bearer test"}
+ROUTES = {"dashboard": f"{API}/dashboard/", "stories": f"{API}/stories/all"}
+
+EPISODE = {
+    "episode_title": "The Bell",
+    "episode_content": "Mira rang the bell.",
+    "episode_summary": "A bell rings.",
+    "Key Events": [{"event": "The bell rings", "tier": "foundational"}],
+    "Settings": {"Belfry": "A cold tower"},
+    "characters_featured": [{"Name": "Mira", "Emotional_State": "afraid"}],
+}
+
+WRITES = {
+    "store_story_metadata": lambda db, s, a: db.store_story_metadata(
+        {"Title": "Second", "Characters": []}, 3, "AI", a
+    ),
+    "update_story": lambda db, s, a: db.update_story(s, {"summary": "New"}, a),
+    "set_story_completed": lambda db, s, a: db.set_story_completed(s, True, a),
+    "delete_story": lambda db, s, a: db.delete_story(s, a),
+    "store_episode": lambda db, s, a: db.store_episode(s, EPISODE, 3, a),
+    "store_episode_batch": lambda db, s, a: db.store_episode_batch(
+        s, [{**EPISODE, "episode_number": 3}], a
+    ),
+    "check_and_update_episode_limits": lambda db, s, a: (
+        db.check_and_update_episode_limits(a)
+    ),
+}
+
+
+@pytest.mark.parametrize("route", ROUTES)
+def test_revalidation_returns_304(story, client, route):
+    w, _ = story
+    http = client(w)
+    first = http.get(ROUTES[route], headers=HEADERS)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    before = w.db.calls
+    again = http.get(ROUTES[route], headers={**HEADERS, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert not again.content
+    assert w.db.calls == before
+
+
+@pytest.mark.parametrize("write", WRITES)
+def test_write_drops_the_users_entries(story, client, auth_id, write):
+    w, story_id = story
+    http = client(w)
+    for route in ROUTES.values():
+        assert http.get(route, headers=HEADERS).status_code == 200
+    assert read_cache.get(auth_id, "dashboard") is not None
+    read_cache.set("someone-else", "dashboard", {"etag": "x", "body": {}})
+
+    WRITES[write](DBService(w.db), story_id, auth_id)
+
+    assert read_cache.get(auth_id, "dashboard") is None
+    assert read_cache.get(auth_id, "stories:None:50") is None
+    assert read_cache.get("someone-else", "dashboard") is not None
+
+
+def test_write_changes_the_served_list(story, client, auth_id):
+    w, story_id = story
+    http = client(w)
+    etag = http.get(ROUTES["stories"], headers=HEADERS).headers["ETag"]
+    DBService(w.db).update_story(story_id, {"title": "Renamed"}, auth_id)
+
+    response = http.get(ROUTES["stories"], headers={**HEADERS, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["stories"][0]["title"] == "Renamed"
+
+
+def test_default_backend_is_a_shared_file(monkeypatch):
+    monkeypatch.setattr(settings, "READ_CACHE_PATH", "")
+    backend = cache._build_read_cache().backend
+    assert isinstance(backend, SqliteCacheBackend)
+    assert backend.path == os.path.join(
+        tempfile.gettempdir(), "shakescript-read-cache.sqlite3"
+    )
+
+    monkeypatch.setattr(settings, "READ_CACHE_PATH", cache.MEMORY_PATH)
+    assert isinstance(cache._build_read_cache().backend, MemoryCacheBackend)
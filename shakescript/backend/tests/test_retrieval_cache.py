@@ -0,0 +1,107 @@
+import os
+from fastapi import BackgroundTasks
+from app.core import cache
+from app.core.cache import RetrievalCache, SqliteCacheBackend, retrieval_cache
+from app.core.config import settings
+from app.workers.embedding_worker import EmbeddingWorker
+from benchmarks.bench_batch_store import batch
+from benchmarks.fakes import _prose
+
+QUERY = "EPISODE 3\nCONTENT: the harbour bell rang twice before dawn"
+
+
+def retrieve(w, story_id, auth_id, query=QUERY):
+    return w.service().embedding_service.retrieve_relevant_chunks(story_id, query, auth_id, k=5)
+
+
+def test_repeated_retrieval_embeds_once(world, auth_id, monkeypatch):
+    w = world()
+    story_id = w.seed_story(6, 4, 300)
+    monkeypatch.setattr(retrieval_cache, "enabled", False)
+    expected = [retrieve(w, story_id, auth_id) for _ in range(3)]
+    monkeypatch.setattr(retrieval_cache, "enabled", True)
+    embeds = w.embedder.calls
+    assert [retrieve(w, story_id, auth_id) for _ in range(3)] == expected
+    assert w.embedder.calls - embeds == 1
+
+
+def test_new_chunks_invalidate_only_their_story(world, auth_id):
+    w = world()
+    story_id, other_id = w.seed_story(6, 4, 300), w.seed_story(6, 4, 300)
+    content = _prose(300, 99)
+    before = retrieve(w, story_id, auth_id, content)
+    retrieve(w, other_id, auth_id, content)
+    episode = w.db.table("episodes").insert(
+        {"story_id": story_id, "episode_number": 7, "title": "New", "content": content, "auth_id": auth_id}
+    ).execute().data[0]
+    w.service().embedding_service.process_and_store_batch(
+        [
+            {
+                "story_id": story_id,
+                "episode_id": episode["id"],
+                "episode_number": 7,
+                "content": content,
+                "characters": ["Mira"],
+                "auth_id": auth_id,
+            }
+        ]
+    )
+
+    def matches():
+        return w.db.calls_by_table.get("match_chunks.rpc", 0)
+
+    start = matches()
+    after = retrieve(w, story_id, auth_id, content)
+    assert matches() == start + 1
+    retrieve(w, other_id, auth_id, content)
+    assert matches() == start + 1
+    assert not any(c["episode_number"] == 7 for c in before)
+    assert any(c["episode_number"] == 7 for c in after)
+
+
+def test_chunks_from_another_host_are_seen_after_the_wait(world, auth_id, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_QUEUE_ENABLED", True)
+    w = world()
+    story_id = w.seed_story(0, 4, 120)
+    service = w.service()
+    service.store_validated_episodes(story_id, batch(4), 4, auth_id, BackgroundTasks())
+    assert retrieve(w, story_id, auth_id) == []
+    # A worker on another host: its writes do not touch this cache.
+    monkeypatch.setattr(retrieval_cache, "enabled", False)
+    EmbeddingWorker(service.client, embedding_service=service.embedding_service, poll_interval=0.01).run(
+        until_idle=True
+    )
+    monkeypatch.setattr(retrieval_cache, "enabled", True)
+    assert retrieve(w, story_id, auth_id) == []
+    assert service.wait_for_embeddings(story_id, auth_id, timeout=1)
+    assert retrieve(w, story_id, auth_id)
+
+
+def test_invalidation_is_shared_through_the_sqlite_backend(tmp_path, auth_id):
+    path = os.path.join(tmp_path, "retrieval.sqlite3")
+    api, worker = (RetrievalCache(SqliteCacheBackend(path, 600, 4096)) for _ in range(2))
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return [{"content": f"load {len(loads)}"}]
+
+    first = api.get_or_load(1, auth_id, QUERY, 5, loader)
+    assert api.get_or_load(1, auth_id, QUERY, 5, loader) == first
+    worker.invalidate(1)
+    assert api.get_or_load(1, auth_id, QUERY, 5, loader) != first
+    assert len(loads) == 2
+
+
+def test_per_process_cache_uses_the_short_ttl(monkeypatch):
+    monkeypatch.setattr(settings, "RETRIEVAL_CACHE_PATH", "")
+    built = cache._build_retrieval_cache()
+    assert built.backend.ttl_seconds == settings.RETRIEVAL_CACHE_MEMORY_TTL_SECONDS
+    assert built.backend.ttl_seconds < settings.RETRIEVAL_CACHE_TTL_SECONDS
+
+
+def test_shared_cache_keeps_the_full_ttl(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RETRIEVAL_CACHE_PATH", os.path.join(tmp_path, "retrieval.sqlite3"))
+    built = cache._build_retrieval_cache()
+    assert isinstance(built.backend, SqliteCacheBackend)
+    assert built.backend.ttl_seconds == settings.RETRIEVAL_CACHE_TTL_SECONDS
@@ -0,0 +1,27 @@
+import json
+import subprocess
+import sys
+from app.core.warmup import HEAVY_MODULES
+
+IMPORTED_AFTER = (
+    "import json, sys; import app.main; {extra}"
+    "print(json.dumps(sorted(m for m in {modules!r} if m in sys.modules)))"
+)
+
+
+def _imported(extra: str = ""):
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", IMPORTED_AFTER.format(extra=extra, modules=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_app_main_leaves_heavy_sdks_unimported():
+    assert _imported() == []
+
+
+def test_warmup_imports_heavy_sdks():
+    assert _imported("from app.core import warmup; warmup.warmup(); ") == sorted(HEAVY_MODULES)
@@ -0,0 +1,108 @@
+import io
+import json
+import math
+import re
+import zipfile
+import pytest
+from app.core.config import settings
+from app.services.core_service.export_core import EXPORT_FORMATS
+from benchmarks.bench_story_export import drain, peak_bytes, seed
+from benchmarks.bench_story_service import API
+
+HEADERS = {"Authorization": "Bearer test"}
+PAGE_SIZE = 10
+
+
+@pytest.fixture(autouse=True)
+def page_size(monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_PAGE_SIZE", PAGE_SIZE)
+
+
+def numbers(pattern, text):
+    return [int(n) for n in re.findall(pattern, text, flags=re.M)]
+
+
+def episode_numbers(export_format, body):
+    if export_format == "txt":
+        return numbers(r"^Episode (\d+): Tide \d+$", body.decode())
+    if export_format == "md":
+        return numbers(r"^## Episode (\d+): ", body.decode())
+    if export_format == "jsonl":
+        lines = [json.loads(line) for line in body.decode().splitlines()]
+        assert lines[0]["type"] == "story"
+        assert all(line["content"].count("\n\n") == 3 for line in lines[1:])
+        return [line["number"] for line in lines[1:]]
+    with zipfile.ZipFile(io.BytesIO(body)) as book:
+        assert book.testzip() is None
+        assert "OEBPS/content.opf" in book.namelist()
+        parts = sorted(n for n in book.namelist() if n.startswith("OEBPS/part-"))
+        return numbers(r'<section id="episode-(\d+)">', "".join(book.read(n).decode() for n in parts))
+
+
+@pytest.mark.parametrize("export_format", list(EXPORT_FORMATS))
+def test_export_has_every_episode_once_in_order(world, client, auth_id, export_format):
+    w = world()
+    story_id = seed(w, 35, 80)
+    http = client(w)
+    before = w.db.calls_by_table.get("episodes.select", 0)
+    response = http.get(f"{API}/stories/{story_id}/export", params={"format": export_format}, headers=HEADERS)
+    queries = w.db.calls_by_table.get("episodes.select", 0) - before
+    media_type, extension = EXPORT_FORMATS[export_format]
+    assert response.status_code == 200
+    assert response.headers["content-type"] == media_type
+    assert response.headers["content-disposition"].endswith(f'.{extension}"')
+    assert "etag" in response.headers
+    assert queries == math.ceil(35 / PAGE_SIZE)
+    assert episode_numbers(export_format, response.content) == list(range(1, 36))
+
+
+def test_epub_mimetype_entry_comes_first_with_sizes_in_its_header(world, client):
+    w = world()
+    story_id = seed(w, 3, 80)
+    body = client(w).get(f"{API}/stories/{story_id}/export", params={"format": "epub"}, headers=HEADERS).content
+    # The OCF check: "mimetype" then its content at fixed offsets.
+    assert body[30:58] == b"mimetypeapplication/epub+zip"
+    with zipfile.ZipFile(io.BytesIO(body)) as book:
+        first = book.infolist()[0]
+        assert first.filename == "mimetype"
+        assert first.compress_type == zipfile.ZIP_STORED
+        assert first.flag_bits & 0x08 == 0
+        assert book.read("mimetype") == b"application/epub+zip"
+
+
+def test_unknown_story_and_format(world, client):
+    w = world()
+    story_id = seed(w, 2, 80)
+    http = client(w)
+    assert http.get(f"{API}/stories/{story_id + 999}/export", headers=HEADERS).status_code == 404
+    assert http.get(f"{API}/stories/{story_id}/export", params={"format": "pdf"}, headers=HEADERS).status_code == 422
+
+
+@pytest.mark.parametrize("export_format", list(EXPORT_FORMATS))
+def test_body_is_produced_one_page_at_a_time(world, auth_id, export_format):
+    w = world()
+    story_id = seed(w, 35, 80)
+    before = w.db.calls_by_table.get("episodes.select", 0)
+    body = w.service().export_story(story_id, auth_id, export_format)["body"]
+    assert w.db.calls_by_table.get("episodes.select", 0) == before
+    # Past the title/container chunk, to the first episode.
+    next(body), next(body)
+    assert w.db.calls_by_table.get("episodes.select", 0) - before == 1
+    body.close()
+
+
+@pytest.mark.parametrize("export_format", list(EXPORT_FORMATS))
+def test_memory_does_not_grow_with_the_story(world, auth_id, export_format):
+    def peak(episodes):
+        w = world()
+        story_id = seed(w, episodes, 200)
+        service = w.service()
+
+        def export():
+            return drain(service.export_story(story_id, auth_id, export_format)["body"])
+
+        # Warm up first, so one-off allocations (regexes, zlib) are not counted.
+        export()
+        return peak_bytes(export)
+
+    assert peak(300) <= peak(30) * 1.25
@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+from app.core.config import settings
+from app.utils.http_cache import story_etag
+from benchmarks.bench_story_service import API
+
+HEADERS = {"Authorization": "Bearer test"}
+
+
+@pytest.fixture(autouse=True)
+def lease_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "STORY_LEASE_ENABLED", True)
+
+
+def generate(client, story_id, headers=None):
+    return client.post(
+        f"{API}/episodes/{story_id}/generate-batch",
+        params={"batch_size": 2, "refinement_type": "HUMAN"},
+        headers=dict(HEADERS, **(headers or {})),
+    )
+
+
+def race(calls):
+    """Start every call at once; returns [(response, ms)] in call order."""
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def call(i):
+        barrier.wait()
+        start = time.perf_counter()
+        response = calls[i]()
+        results[i] = (response, (time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(calls))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_generate_runs_once(world, client):
+    w = world(llm_latency=0.05)
+    story_id = w.seed_story(0, 4, 120)
+    results = race([lambda: generate(client(w), story_id) for _ in range(6)])
+    statuses = sorted(r.status_code for r, _ in results)
+    assert statuses == [200] + [409] * 5
+    assert w.model.calls_by_kind.get("episode", 0) == 2
+    winner = next(ms for r, ms in results if r.status_code == 200)
+    lost = [(r, ms) for r, ms in results if r.status_code == 409]
+    # Refused before any LLM work, with a bounded Retry-After.
+    assert max(ms for _, ms in lost) < winner
+    assert all(1 <= int(r.headers["Retry-After"]) <= settings.STORY_LEASE_RETRY_AFTER for r, _ in lost)
+
+
+def test_disabled_lease_lets_every_request_run(world, client, monkeypatch):
+    monkeypatch.setattr(settings, "STORY_LEASE_ENABLED", False)
+    w = world(llm_latency=0.02)
+    story_id = w.seed_story(0, 4, 120)
+    race([lambda: generate(client(w), story_id) for _ in range(3)])
+    assert w.model.calls_by_kind.get("episode", 0) > 2
+    assert "acquire_story_lease.rpc" not in w.db.calls_by_table
+
+
+def test_validate_waits_out_a_running_generate(world, client):
+    w = world(llm_latency=0.05)
+    story_id = w.seed_story(0, 4, 120)
+    assert generate(client(w), story_id).status_code == 200
+    row = next(r for r in w.db.tables["stories"] if r["id"] == story_id)
+    running = []
+    thread = threading.Thread(target=lambda: running.append(generate(client(w), story_id)))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while row.get("lease_holder") is None and time.monotonic() < deadline:
+        time.sleep(0.001)
+    validate = client(w).post(f"{API}/episodes/{story_id}/validate-batch", headers=HEADERS)
+    thread.join()
+    assert validate.status_code == 409
+    assert running[0].status_code == 200
+
+
+@pytest.mark.parametrize("lease", [True, False])
+def test_stale_if_match_is_412_before_llm_work(world, client, auth_id, monkeypatch, lease):
+    monkeypatch.setattr(settings, "STORY_LEASE_ENABLED", lease)
+    w = world()
+    story_id = w.seed_story(0, 4, 120)
+    http = client(w)
+    version = w.service().get_story_version(story_id, auth_id)
+    stale = generate(http, story_id, {"If-Match": story_etag(story_id, version - 1)})
+    assert stale.status_code == 412
+    assert stale.headers["ETag"] == story_etag(story_id, version)
+    assert w.model.calls_by_kind.get("episode", 0) == 0
+    assert generate(http, story_id, {"If-Match": story_etag(story_id, version)}).status_code == 200
+    assert ("acquire_story_lease.rpc" in w.db.calls_by_table) is lease
+
+
+def test_lapsed_lease_is_taken_over(world, client):
+    w = world()
+    story_id = w.seed_story(0, 4, 120)
+    http = client(w)
+    row = next(r for r in w.db.tables["stories"] if r["id"] == story_id)
+    row.update(lease_holder="dead-worker", lease_expires_at=time.time() + 60)
+    assert generate(http, story_id).status_code == 409
+    row["lease_expires_at"] = time.time() - 1
+    assert generate(http, story_id).status_code == 200
+    assert row["lease_holder"] is None
@@ -0,0 +1,114 @@
+"""Every write to a story, its episodes or its characters bumps stories.version."""
+
+import json
+import pytest
+from postgrest.exceptions import APIError
+from app.services.db_service import DBService
+from benchmarks.fakes import FakeQuery
+
+EPISODE = {
+    "episode_title": "The Bell",
+    "episode_content": "Mira rang the bell.",
+    "episode_summary": "A bell rings.",
+    "episode_emotional_state": "tense",
+    "Key Events": [{"event": "The bell rings", "tier": "foundational"}],
+    "Settings": {"Belfry": "A cold tower"},
+    "characters_featured": [
+        {"Name": "Mira", "Emotional_State": "afraid"},
+        {"Name": "Oren", "Role": "Bell ringer", "Description": "Deaf"},
+    ],
+}
+
+WRITES = {
+    "update_story": lambda db, s, a: db.update_story(s, {"summary": "New"}, a),
+    "set_story_completed": lambda db, s, a: db.set_story_completed(s, True, a),
+    "update_story_current_episodes_content": lambda db, s, a: (
+        db.update_story_current_episodes_content(s, [EPISODE], a)
+    ),
+    "clear_current_episodes_content": lambda db, s, a: db.clear_current_episodes_content(s, a),
+    "store_episode": lambda db, s, a: db.store_episode(s, EPISODE, 3, a),
+    "store_episode_batch": lambda db, s, a: db.store_episode_batch(
+        s, [{**EPISODE, "episode_number": 3}], a
+    ),
+    "update_character_state": lambda db, s, a: db.update_character_state(
+        s, EPISODE["characters_featured"], a
+    ),
+}
+
+
+@pytest.mark.parametrize("write", WRITES)
+def test_write_bumps_version(story, auth_id, write):
+    w, story_id = story
+    db = DBService(w.db)
+    before = db.get_story_version(story_id, auth_id)
+    WRITES[write](db, story_id, auth_id)
+    assert db.get_story_version(story_id, auth_id) > before
+
+
+def test_reads_and_leases_do_not_bump_version(story, auth_id):
+    w, story_id = story
+    db = DBService(w.db)
+    before = db.get_story_version(story_id, auth_id)
+    db.get_story_info(story_id, auth_id)
+    db.get_episodes_page(story_id, auth_id)
+    db.acquire_story_lease(story_id, auth_id, "holder", 30)
+    db.release_story_lease(story_id, auth_id, "holder")
+    assert db.get_story_version(story_id, auth_id) == before
+
+
+def test_writes_make_no_version_rpc(story, auth_id):
+    w, story_id = story
+    db = DBService(w.db)
+    for write in WRITES.values():
+        write(db, story_id, auth_id)
+    rpcs = {name for name in w.db.calls_by_table if name.endswith(".rpc")}
+    assert rpcs <= {"store_episode_batch.rpc", "acquire_story_lease.rpc", "release_story_lease.rpc"}
+
+
+def test_validate_batch_changes_the_etag(story, client, auth_id):
+    w, story_id = story
+    http = client(w)
+    first = http.get(f"/api/v1/stories/{story_id}")
+    http.post(
+        f"/api/v1/episodes/{story_id}/generate-batch",
+        params={"batch_size": 1, "refinement_type": "HUMAN"},
+    )
+    assert http.post(f"/api/v1/episodes/{story_id}/validate-batch").status_code == 200
+    second = http.get(f"/api/v1/stories/{story_id}", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.headers["etag"] != first.headers["etag"]
+    assert json.loads(second.content)["story"]["current_episode"] == 4
+
+
+@pytest.fixture
+def unversioned(story, monkeypatch):
+    """The story on a database without migrations/001 (no stories.version)."""
+    w, story_id = story
+    execute = FakeQuery.execute
+
+    def without_version(query):
+        if query.table == "stories" and query.op == "select" and "version" in query.columns:
+            raise APIError({"code": "42703", "message": "column stories.version does not exist"})
+        return execute(query)
+
+    monkeypatch.setattr(FakeQuery, "execute", without_version)
+    for row in w.db.tables["stories"]:
+        row.pop("version", None)
+    return w, story_id
+
+
+@pytest.mark.parametrize("path", ["", "/episodes", "/episodes/1"])
+def test_story_without_version_column_is_served_without_etag(unversioned, client, path):
+    w, story_id = unversioned
+    http = client(w)
+    response = http.get(
+        f"/api/v1/stories/{story_id}{path}", headers={"If-None-Match": '"story-1-v1"'}
+    )
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+
+
+def test_missing_story_without_version_column_is_404(unversioned, client):
+    w, story_id = unversioned
+    response = client(w).get(f"/api/v1/stories/{story_id + 1}/episodes")
+    assert response.status_code == 404
@@ -0,0 +1,233 @@
+"""Spans, their context across background tasks, and the exporters' encodings."""
+
+import json
+import multiprocessing
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.tracing import (
+    InMemorySpanExporter,
+    JsonLinesSpanExporter,
+    OtlpHttpSpanExporter,
+    Span,
+    TracingMiddleware,
+    propagate,
+    span,
+    traced,
+    tracer,
+)
+from benchmarks.bench_story_service import API
+
+
+@pytest.fixture
+def spans():
+    exporter = InMemorySpanExporter()
+    tracer.add_exporter(exporter)
+    yield exporter
+    tracer.remove_exporter(exporter)
+
+
+def _named(exporter, name):
+    return [s for s in exporter.get_finished_spans() if s.name == name]
+
+
+@traced("test.inner", "story_id")
+def _inner(story_id, other):
+    with span("test.leaf", attempt=2):
+        pass
+
+
+@traced("test.outer")
+def _outer():
+    _inner(7, other="x")
+
+
+def test_nested_spans_share_the_trace_and_link_to_their_parent(spans):
+    _outer()
+    (outer,) = _named(spans, "test.outer")
+    (inner,) = _named(spans, "test.inner")
+    (leaf,) = _named(spans, "test.leaf")
+    assert outer.parent_id is None
+    assert inner.parent_id == outer.span_id
+    assert leaf.parent_id == inner.span_id
+    assert outer.trace_id == inner.trace_id == leaf.trace_id
+    assert len(outer.trace_id) == 32 and len(outer.span_id) == 16
+    assert inner.attributes == {"story_id": 7}
+    assert leaf.attributes == {"attempt": 2}
+    assert outer.start_ns <= inner.start_ns <= leaf.end_ns <= inner.end_ns <= outer.end_ns
+
+
+def test_error_is_recorded_and_reraised(spans):
+    with pytest.raises(ValueError):
+        with span("test.failing"):
+            raise ValueError("boom")
+    (failing,) = _named(spans, "test.failing")
+    assert failing.error == "ValueError: boom"
+    assert failing.end_ns is not None
+
+
+def test_no_spans_without_an_exporter():
+    with span("test.untraced") as current:
+        current.set_attribute("ignored", True)
+    assert not hasattr(current, "span_id")
+
+
+def test_generation_spans_carry_story_episode_and_attempt(story, client, spans):
+    w, story_id = story
+    response = client(w).post(
+        f"{API}/episodes/{story_id}/generate-batch",
+        params={"batch_size": 1, "refinement_type": "AI"},
+    )
+    assert response.status_code == 200
+
+    episodes = _named(spans, "ai.generate_episode")
+    assert [s.attributes["episode_number"] for s in episodes] == [3, 4]
+    assert all(s.attributes["story_id"] == story_id for s in episodes)
+    attempts = _named(spans, "ai.refinement_attempt")
+    assert attempts and all(s.attributes["attempt"] == 1 for s in attempts)
+    assert all(s.attributes["story_id"] == story_id for s in attempts)
+
+    # Each following batch is generated within the first one's span.
+    batches = _named(spans, "story.generate_and_refine_batch")
+    (first,) = [s for s in batches if s.parent_id is None]
+    assert {s.trace_id for s in batches + episodes + attempts} == {first.trace_id}
+
+
+def test_background_chunking_joins_the_request_trace(story, client, spans):
+    w, story_id = story
+    http = client(w)
+    http.post(
+        f"{API}/episodes/{story_id}/generate-batch",
+        params={"batch_size": 1, "refinement_type": "HUMAN"},
+    )
+    spans.clear()
+    assert http.post(f"{API}/episodes/{story_id}/validate-batch").status_code == 200
+
+    (stored,) = _named(spans, "story.store_validated_episodes")
+    (validate,) = _named(spans, "story.validate_episode_batch")
+    (chunks,) = _named(spans, "embedding.process_and_store_chunks")
+    assert chunks.trace_id == validate.trace_id
+    assert chunks.parent_id == stored.span_id
+    assert chunks.attributes == {"story_id": story_id, "episode_number": 3}
+    # It ran as a BackgroundTask, after the route had returned.
+    assert chunks.start_ns >= validate.end_ns
+
+
+def test_middleware_opens_the_request_span_and_honours_traceparent(spans):
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        with span("test.handler", item_id=item_id):
+            return {"id": item_id}
+
+    trace_id, parent_id = "c" * 32, "d" * 16
+    response = TestClient(app).get(
+        "/items/5", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"}
+    )
+    (root,) = _named(spans, "GET /items/{item_id}")
+    (handler,) = _named(spans, "test.handler")
+    assert root.trace_id == handler.trace_id == trace_id
+    assert root.parent_id == parent_id
+    assert handler.parent_id == root.span_id
+    assert root.attributes["http.status_code"] == 200
+    assert root.attributes["http.route"] == "/items/{item_id}"
+    assert response.headers["traceparent"] == f"00-{trace_id}-{root.span_id}-01"
+
+
+def _task():
+    with span("test.task") as current:
+        return current.parent_id
+
+
+def test_propagate_binds_the_span_it_was_created_under(spans):
+    with span("test.request") as request:
+        task = propagate(_task)
+    assert task() == request.span_id
+    # Outside any span there is nothing to carry.
+    assert propagate(_task) is _task
+
+
+def test_jsonl_exporter_writes_one_object_per_span(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = JsonLinesSpanExporter(str(path))
+    tracer.add_exporter(exporter)
+    try:
+        with span("test.parent", story_id=3):
+            with span("test.child", ratio=0.5):
+                pass
+    finally:
+        tracer.remove_exporter(exporter)
+
+    child, parent = [json.loads(line) for line in path.read_text().splitlines()]
+    assert child["name"] == "test.child" and parent["name"] == "test.parent"
+    assert child["parent_id"] == parent["span_id"]
+    assert child["trace_id"] == parent["trace_id"]
+    assert parent["attributes"] == {"story_id": 3}
+    assert parent["end_ns"] >= parent["start_ns"] and parent["duration_ms"] >= 0
+    assert parent["error"] is None
+
+
+def test_otlp_encoding():
+    exporter = OtlpHttpSpanExporter("http://collector:4318/", "svc")
+    assert exporter.url == "http://collector:4318/v1/traces"
+    root = Span("root", "a" * 32)
+    root.end_ns = root.start_ns + 5
+    child = Span("child", root.trace_id, root.span_id)
+    child.attributes.update({"story_id": 4, "hit": True, "ratio": 0.25, "kind": "AI"})
+    child.error = "ValueError: boom"
+
+    (resource,) = exporter.encode([root, child])["resourceSpans"]
+    assert resource["resource"]["attributes"] == [
+        {"key": "service.name", "value": {"stringValue": "svc"}}
+    ]
+    encoded_root, encoded_child = resource["scopeSpans"][0]["spans"]
+    assert encoded_root["traceId"] == "a" * 32
+    assert encoded_root["parentSpanId"] == ""
+    assert encoded_root["endTimeUnixNano"] == str(root.end_ns)
+    assert encoded_root["status"] == {"code": 1}
+    assert encoded_child["parentSpanId"] == root.span_id
+    # An unfinished span is sent as a zero-length one.
+    assert encoded_child["endTimeUnixNano"] == encoded_child["startTimeUnixNano"]
+    assert encoded_child["attributes"] == [
+        {"key": "story_id", "value": {"intValue": "4"}},
+        {"key": "hit", "value": {"boolValue": True}},
+        {"key": "ratio", "value": {"doubleValue": 0.25}},
+        {"key": "kind", "value": {"stringValue": "AI"}},
+    ]
+    assert encoded_child["status"] == {"code": 2, "message": "ValueError: boom"}
+
+
+class _CountingExporter(OtlpHttpSpanExporter):
+    def __init__(self, sent):
+        super().__init__("http://collector:4318", "svc", flush_interval=0.01)
+        self.sent = sent
+
+    def _send(self, spans):
+        with self.sent.get_lock():
+            self.sent.value += len(spans)
+
+
+def _export_in_child(exporter):
+    exporter.export(Span("child", "b" * 32))
+    exporter.shutdown()
+
+
+def test_otlp_exporter_flushes_in_forked_workers():
+    ctx = multiprocessing.get_context("fork")
+    exporter = _CountingExporter(ctx.Value("i", 0))
+    # Built before the fork (gunicorn --preload), and used in the master too.
+    exporter.export(Span("parent", "a" * 32))
+    child = ctx.Process(target=_export_in_child, args=(exporter,))
+    child.start()
+    child.join()
+    exporter.shutdown()
+    assert child.exitcode == 0
+    assert exporter.sent.value == 2
+
+
+def test_otlp_exporter_starts_no_thread_until_used():
+    exporter = OtlpHttpSpanExporter("http://collector:4318", "svc")
+    assert exporter._thread is None
+    exporter.shutdown()
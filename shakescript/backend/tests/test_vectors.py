@@ -0,0 +1,83 @@
+import json
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.utils import vectors
+from benchmarks.bench_vectors import corpus, held_bytes, top_k
+from benchmarks.fakes import _prose
+
+ARGS = SimpleNamespace(vectors=500, queries=40, clusters=20, k=10, seed=7)
+
+
+@pytest.fixture(scope="module")
+def docs_and_queries():
+    return corpus(ARGS)
+
+
+def test_compact_forms_hold_less_memory(docs_and_queries):
+    rows = docs_and_queries[0][:100].tolist()
+    as_list = held_bytes(lambda: json.loads(json.dumps(rows)))
+    as_float32 = held_bytes(lambda: vectors.as_matrix(rows))
+    as_int8 = held_bytes(lambda: [vectors.quantize_int8(row) for row in rows])
+    assert as_float32 < as_list / 5
+    assert as_int8 < as_float32
+
+
+def test_compact_encodings_are_smaller(docs_and_queries):
+    rows = docs_and_queries[0][:50].tolist()
+
+    def wire(fmt):
+        return sum(len(json.dumps({"embedding": vectors.encode_for_insert(row, fmt)})) for row in rows)
+
+    def cached(kind):
+        return sum(len(vectors.pack(row, kind)) for row in rows)
+
+    assert wire("float32") < wire("json") * 0.6
+    assert wire("int8") < wire("float32")
+    assert cached("int8") < cached("float32") / 3
+
+
+def test_encodings_keep_recall(docs_and_queries):
+    docs, queries = docs_and_queries
+    exact = top_k(docs, queries, ARGS.k)
+    for wire_format in ("float32", "int8"):
+        stored = np.array([vectors.from_pgvector(vectors.encode_for_insert(d, wire_format)) for d in docs])
+        for kind in ("float32", "int8"):
+            query_matrix = np.array([vectors.unpack(vectors.pack(q, kind)) for q in queries])
+            found = top_k(stored.astype(np.float64), query_matrix.astype(np.float64), ARGS.k)
+            recall = sum(len(set(a) & set(b)) for a, b in zip(exact, found)) / exact.size
+            if wire_format == kind == "float32":
+                assert recall >= 0.999
+            assert recall >= 0.95, (wire_format, kind)
+
+
+def retrieved(world, auth_id, monkeypatch, wire_format):
+    monkeypatch.setattr(settings, "EMBEDDING_WIRE_FORMAT", wire_format)
+    w = world()
+    story_id = w.seed_story(0, 6, 300)
+    episodes = w.db.table("episodes").insert(
+        [{"story_id": story_id, "episode_number": n, "title": f"Episode {n}",
+          "content": _prose(300, n), "auth_id": auth_id} for n in range(1, 7)]
+    ).execute().data
+    service = w.service().embedding_service
+    service.process_and_store_batch(
+        [
+            {"story_id": story_id, "episode_id": e["id"], "episode_number": e["episode_number"],
+             "content": e["content"], "characters": ["Mira"], "auth_id": auth_id}
+            for e in episodes
+        ]
+    )
+    return [
+        {(c["episode_number"], c["chunk_number"])
+         for c in service.retrieve_relevant_chunks(story_id, _prose(80, seed), auth_id, k=5)}
+        for seed in range(5)
+    ]
+
+
+def test_wire_formats_retrieve_the_same_chunks(world, auth_id, monkeypatch):
+    expected = retrieved(world, auth_id, monkeypatch, "json")
+    assert retrieved(world, auth_id, monkeypatch, "float32") == expected
+    int8 = retrieved(world, auth_id, monkeypatch, "int8")
+    overlap = sum(len(a & b) for a, b in zip(int8, expected)) / sum(map(len, expected))
+    assert overlap >= 0.8